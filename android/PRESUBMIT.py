@@ -94,8 +94,13 @@ def CommonChecks(input_api, output_api):
           input_api,
           output_api,
           unit_tests=[
+              J('.', 'adb_logcat_printer_test.py'),
+              J('.', 'apk_operations_test.py'),
+              J('.', 'diff_resource_sizes_test.py'),
               J('.', 'emma_coverage_stats_test.py'),
               J('.', 'list_class_verification_failures_test.py'),
+              J('.', 'method_count_test.py'),
+              J('.', 'resource_sizes_test.py'),
               J('pylib', 'constants', 'host_paths_unittest.py'),
               J('pylib', 'gtest', 'gtest_test_instance_test.py'),
               J('pylib', 'instrumentation',
@@ -110,13 +115,22 @@ def CommonChecks(input_api, output_api):
               J('pylib', 'output', 'noop_output_manager_test.py'),
               J('pylib', 'output', 'remote_output_manager_test.py'),
               J('pylib', 'results', 'json_results_test.py'),
+              J('pylib', 'symbols', 'deobfuscator_test.py'),
+              J('pylib', 'symbols', 'llvm_symbolizer_test.py'),
+              J('pylib', 'symbols', 'stack_symbolizer_test.py'),
+              J('pylib', 'utils', 'binary_resources_test.py'),
               J('pylib', 'utils', 'chrome_proxy_utils_test.py'),
               J('pylib', 'utils', 'decorators_test.py'),
               J('pylib', 'utils', 'device_dependencies_test.py'),
               J('pylib', 'utils', 'dexdump_test.py'),
+              J('pylib', 'utils', 'file_digest_test.py'),
               J('pylib', 'utils', 'gold_utils_test.py'),
               J('pylib', 'utils', 'test_filter_test.py'),
+              J('pylib', 'utils', 'test_data_manifest_test.py'),
+              J('gyp', 'util', 'action_startup_test.py'),
               J('gyp', 'util', 'build_utils_test.py'),
+              J('gyp', 'util', 'dwarf_cfi_test.py'),
+              J('gyp', 'util', 'elf_reader_test.py'),
               J('gyp', 'util', 'manifest_utils_test.py'),
               J('gyp', 'util', 'md5_check_test.py'),
               J('gyp', 'util', 'resource_utils_test.py'),
@@ -11,7 +11,8 @@ To test, call './adb_logcat_printer.py <base_dir>' where
 logcat_<deviceID>_<sequenceNum>
 
 The script will print the files to out, and will combine multiple
-logcats from a single device if there is overlap.
+logcats from a single device if there is overlap. With --merge-devices, the
+logcats of all devices are merged into a single log ordered by timestamp.
 
 Additionally, if a <base_dir>/LOGCAT_MONITOR_PID exists, the script
 will attempt to terminate the contained PID by sending a SIGINT and
@@ -20,7 +21,9 @@ monitoring for the deletion of the aforementioned file.
 # pylint: disable=W0702
 
 import argparse
+import heapq
 import io
+import itertools
 import logging
 import os
 import re
@@ -32,41 +35,66 @@ import time
 # Set this to debug for more verbose output
 LOG_LEVEL = logging.INFO
 
+_TIMESTAMP_RE = re.compile(r'^\d{2}-\d{2} \d{2}:\d{2}:\d{2}.\d{3} ')
 
-def CombineLogFiles(list_of_lists, logger):
+
+def _IterLines(path):
+  """Lazily yields the lines of |path|, as split by f.read().splitlines()."""
+  with open(path) as f:
+    for line in f:
+      # Also splits on the other line boundaries of str.splitlines(), such as
+      # form feeds.
+      yield from line.splitlines()
+
+
+def _FindSpliceIndex(path, last_line):
+  """Returns the index of the first line of |path| equal to |last_line|.
+
+  Returns None if there is no such line.
+  """
+  for i, line in enumerate(_IterLines(path)):
+    if line == last_line:
+      return i
+  return None
+
+
+def CombineLogFiles(log_files, logger):
   """Splices together multiple logcats from the same device.
 
+  Files are read lazily, so only a few lines are held in memory at a time.
+
   Args:
-    list_of_lists: list of pairs (filename, list of timestamped lines)
+    log_files: sorted list of logcat file paths of a device.
     logger: handler to log events
 
-  Returns:
-    list of lines with duplicates removed
+  Yields:
+    lines with duplicates removed
   """
-  cur_device_log = ['']
-  for cur_file, cur_file_lines in list_of_lists:
+  # The last line yielded from log files.
+  last_line = None
+  for cur_file in log_files:
     # Ignore files with just the logcat header
-    if len(cur_file_lines) < 2:
+    if len(list(itertools.islice(_IterLines(cur_file), 2))) < 2:
       continue
     common_index = 0
-    # Skip this step if list just has empty string
-    if len(cur_device_log) > 1:
-      try:
-        line = cur_device_log[-1]
-        # Used to make sure we only splice on a timestamped line
-        if re.match(r'^\d{2}-\d{2} \d{2}:\d{2}:\d{2}.\d{3} ', line):
-          common_index = cur_file_lines.index(line)
-        else:
-          logger.warning('splice error - no timestamp in "%s"?', line.strip())
-      except ValueError:
-        # The last line was valid but wasn't found in the next file
-        cur_device_log += ['***** POSSIBLE INCOMPLETE LOGCAT *****']
-        logger.info('Unable to splice %s. Incomplete logcat?', cur_file)
-
-    cur_device_log += ['*'*30 + '  %s' % cur_file]
-    cur_device_log.extend(cur_file_lines[common_index:])
-
-  return cur_device_log
+    # Skip this step if nothing was yielded yet
+    if last_line is not None:
+      # Used to make sure we only splice on a timestamped line
+      if _TIMESTAMP_RE.match(last_line):
+        common_index = _FindSpliceIndex(cur_file, last_line)
+        if common_index is None:
+          # The last line was valid but wasn't found in the next file
+          common_index = 0
+          yield '***** POSSIBLE INCOMPLETE LOGCAT *****'
+          logger.info('Unable to splice %s. Incomplete logcat?', cur_file)
+      else:
+        logger.warning('splice error - no timestamp in "%s"?',
+                       last_line.strip())
+
+    yield '*' * 30 + '  %s' % cur_file
+    for line in itertools.islice(_IterLines(cur_file), common_index, None):
+      last_line = line
+      yield line
 
 
 def FindLogFiles(base_dir):
@@ -96,32 +124,64 @@ def FindLogFiles(base_dir):
   return file_map
 
 
-def GetDeviceLogs(log_filenames, logger):
-  """Read log files, combine and format.
+def _DeviceLinePrefix(device):
+  # Prepend each line with a short unique ID so it's easy to see
+  # when the device changes.  We don't use the start of the device
+  # ID because it can be the same among devices.  Example lines:
+  # AB324:  foo
+  # AB324:  blah
+  return '\n' + device[-5:] + ':  '
+
+
+def WriteDeviceLogs(log_filenames, output_file, logger):
+  """Read log files, combine, format and write them one device at a time.
 
   Args:
     log_filenames: mapping of device_id to sorted list of file paths
+    output_file: file to write the logs to
     logger: logger handle for logging events
-
-  Returns:
-    list of formatted device logs, one for each device.
   """
-  device_logs = []
-
+  separator = '\n' + '*' * 80 + '\n\n'
   for device, device_files in log_filenames.items():
     logger.debug('%s: %s', device, str(device_files))
-    device_file_lines = []
-    for cur_file in device_files:
-      with open(cur_file) as f:
-        device_file_lines += [(cur_file, f.read().splitlines())]
-    combined_lines = CombineLogFiles(device_file_lines, logger)
-    # Prepend each line with a short unique ID so it's easy to see
-    # when the device changes.  We don't use the start of the device
-    # ID because it can be the same among devices.  Example lines:
-    # AB324:  foo
-    # AB324:  blah
-    device_logs += [('\n' + device[-5:] + ':  ').join(combined_lines)]
-  return device_logs
+    prefix = _DeviceLinePrefix(device)
+    for line in CombineLogFiles(device_files, logger):
+      output_file.write(prefix)
+      output_file.write(line)
+    output_file.write(separator)
+
+
+def _IterTimestampedLines(device, device_files, logger):
+  """Yields (timestamp, line prefix, line) for the combined logs of a device.
+
+  Lines without a timestamp get the timestamp of the line before them, so that
+  they stay with it when merging.
+  """
+  prefix = _DeviceLinePrefix(device)
+  timestamp = ''
+  for line in CombineLogFiles(device_files, logger):
+    m = _TIMESTAMP_RE.match(line)
+    if m:
+      timestamp = m.group(0)
+    yield timestamp, prefix, line
+
+
+def WriteMergedDeviceLogs(log_filenames, output_file, logger):
+  """Writes the logs of all devices merged into one log by timestamp.
+
+  Args:
+    log_filenames: mapping of device_id to sorted list of file paths
+    output_file: file to write the log to
+    logger: logger handle for logging events
+  """
+  device_lines = [
+      _IterTimestampedLines(device, device_files, logger)
+      for device, device_files in sorted(log_filenames.items())
+  ]
+  for _, prefix, line in heapq.merge(*device_lines, key=lambda x: x[0]):
+    output_file.write(prefix)
+    output_file.write(line)
+  output_file.write('\n' + '*' * 80 + '\n\n')
 
 
 def ShutdownLogcatMonitor(base_dir, logger):
@@ -156,6 +216,10 @@ def main(argv):
   parser.add_argument(
       '--output-path',
       help='Output file path (if unspecified, prints to stdout)')
+  parser.add_argument(
+      '--merge-devices',
+      action='store_true',
+      help='Merge the logcats of all devices by timestamp.')
   parser.add_argument('log_dir')
   args = parser.parse_args(argv)
   base_dir = args.log_dir
@@ -203,10 +267,10 @@ def main(argv):
 
     assert os.path.exists(base_dir), '%s does not exist' % base_dir
     ShutdownLogcatMonitor(base_dir, logger)
-    separator = '\n' + '*' * 80 + '\n\n'
-    for log in GetDeviceLogs(FindLogFiles(base_dir), logger):
-      output_file.write(log)
-      output_file.write(separator)
+    if args.merge_devices:
+      WriteMergedDeviceLogs(FindLogFiles(base_dir), output_file, logger)
+    else:
+      WriteDeviceLogs(FindLogFiles(base_dir), output_file, logger)
     with open(os.path.join(base_dir, 'eventlog')) as f:
       output_file.write('\nLogcat Monitor Event Log\n')
       output_file.write(f.read())
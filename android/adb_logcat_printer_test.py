@@ -0,0 +1,133 @@
+#!/usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import io
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+import adb_logcat_printer
+
+_HEADER = '--------- beginning of main'
+
+
+def _Line(second, message):
+  return '01-01 00:00:%02d.000  100  100 I Tag: %s' % (second, message)
+
+
+class AdbLogcatPrinterTest(unittest.TestCase):
+
+  def setUp(self):
+    self._base_dir = tempfile.mkdtemp()
+    self._logger = logging.getLogger('AdbLogcatPrinterTest')
+
+  def tearDown(self):
+    shutil.rmtree(self._base_dir)
+
+  def _WriteLogcat(self, device, sequence_number, lines):
+    path = os.path.join(self._base_dir,
+                        'logcat_%s_%d' % (device, sequence_number))
+    with open(path, 'w') as f:
+      f.write('\n'.join(lines) + '\n')
+    return path
+
+  def _Combine(self, paths):
+    return list(adb_logcat_printer.CombineLogFiles(paths, self._logger))
+
+  def testCombineLogFiles_splice(self):
+    first = self._WriteLogcat('ABC', 0, [_HEADER, _Line(1, 'a'), _Line(2, 'b')])
+    second = self._WriteLogcat(
+        'ABC', 1, [_HEADER, _Line(1, 'a'),
+                   _Line(2, 'b'), _Line(3, 'c\x0cd')])
+    self.assertEqual([
+        '*' * 30 + '  ' + first,
+        _HEADER,
+        _Line(1, 'a'),
+        _Line(2, 'b'),
+        '*' * 30 + '  ' + second,
+        _Line(2, 'b'),
+        # Form feeds split lines, as with str.splitlines().
+        _Line(3, 'c'),
+        'd',
+    ], self._Combine([first, second]))
+
+  def testCombineLogFiles_duplicateLines(self):
+    first = self._WriteLogcat(
+        'ABC', 0, [_HEADER, _Line(1, 'dup'),
+                   _Line(2, 'a'), _Line(1, 'dup')])
+    second = self._WriteLogcat(
+        'ABC', 1, [_HEADER, _Line(1, 'dup'),
+                   _Line(2, 'a'), _Line(1, 'dup'), _Line(3, 'b')])
+    # Splices at the first occurrence of the last line.
+    self.assertEqual([
+        '*' * 30 + '  ' + first,
+        _HEADER,
+        _Line(1, 'dup'),
+        _Line(2, 'a'),
+        _Line(1, 'dup'),
+        '*' * 30 + '  ' + second,
+        _Line(1, 'dup'),
+        _Line(2, 'a'),
+        _Line(1, 'dup'),
+        _Line(3, 'b'),
+    ], self._Combine([first, second]))
+
+  def testCombineLogFiles_noCommonLine(self):
+    first = self._WriteLogcat('ABC', 0, [_HEADER, _Line(1, 'a')])
+    header_only = self._WriteLogcat('ABC', 1, [_HEADER])
+    second = self._WriteLogcat('ABC', 2, [_HEADER, _Line(2, 'b')])
+    self.assertEqual([
+        '*' * 30 + '  ' + first,
+        _HEADER,
+        _Line(1, 'a'),
+        '***** POSSIBLE INCOMPLETE LOGCAT *****',
+        '*' * 30 + '  ' + second,
+        _HEADER,
+        _Line(2, 'b'),
+    ], self._Combine([first, header_only, second]))
+
+  def testWriteMergedDeviceLogs(self):
+    first = self._WriteLogcat(
+        'DEVICE1', 0, [_HEADER, _Line(1, 'a'), 'a2',
+                       _Line(3, 'c')])
+    second = self._WriteLogcat('DEVICE2', 0,
+                               [_HEADER, _Line(2, 'b'),
+                                _Line(4, 'd')])
+    output = io.StringIO()
+    adb_logcat_printer.WriteMergedDeviceLogs(
+        adb_logcat_printer.FindLogFiles(self._base_dir), output, self._logger)
+
+    self.assertEqual([
+        '',
+        'VICE1:  ' + '*' * 30 + '  ' + first,
+        'VICE1:  ' + _HEADER,
+        'VICE2:  ' + '*' * 30 + '  ' + second,
+        'VICE2:  ' + _HEADER,
+        'VICE1:  ' + _Line(1, 'a'),
+        # Lines without a timestamp stay with the line before them.
+        'VICE1:  a2',
+        'VICE2:  ' + _Line(2, 'b'),
+        'VICE1:  ' + _Line(3, 'c'),
+        'VICE2:  ' + _Line(4, 'd'),
+        '*' * 80,
+        '',
+        '',
+    ], output.getvalue().split('\n'))
+
+  def testWriteDeviceLogs(self):
+    path = self._WriteLogcat('DEVICE1', 0, [_HEADER, _Line(1, 'a')])
+    output = io.StringIO()
+    adb_logcat_printer.WriteDeviceLogs({'DEVICE1': [path]}, output,
+                                       self._logger)
+    self.assertEqual(
+        '\nVICE1:  ' + '*' * 30 + '  ' + path + '\nVICE1:  ' + _HEADER +
+        '\nVICE1:  ' + _Line(1, 'a') + '\n' + '*' * 80 + '\n\n',
+        output.getvalue())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -12,9 +12,11 @@ import argparse
 import collections
 import json
 import logging
+import math
 import os
 import pipes
 import posixpath
+import queue
 import random
 import re
 import shlex
@@ -23,6 +25,7 @@ import subprocess
 import sys
 import tempfile
 import textwrap
+import threading
 import zipfile
 
 import adb_command_line
@@ -58,6 +61,10 @@ with devil_env.SysPath(
 
 BASE_MODULE = 'base'
 
+_COMPILATION_FILTERS = [
+    'verify', 'quicken', 'space-profile', 'space', 'speed-profile', 'speed'
+]
+
 
 def _Colorize(text, style=''):
   return (style
@@ -65,10 +72,17 @@ def _Colorize(text, style=''):
       + colorama.Style.RESET_ALL)
 
 
-def _InstallApk(devices, apk, install_dict):
+def _InstallApk(devices, apk, install_dict, streaming=False):
   def install(device):
     if install_dict:
       installer.Install(device, install_dict, apk=apk, permissions=[])
+    elif streaming and device.build_version_sdk >= version_codes.NOUGAT:
+      # Streams the apk over adb rather than pushing a copy of it to the device
+      # first. Devices installed to in parallel share the host's read of it.
+      device.adb.Install(apk.path,
+                         allow_downgrade=True,
+                         reinstall=True,
+                         streaming=True)
     else:
       device.Install(apk, permissions=[], allow_downgrade=True, reinstall=True)
 
@@ -125,6 +139,49 @@ def _GenerateBundleApks(info,
       optimize_for=optimize_for)
 
 
+def _BundleDeviceSpec(device):
+  """Returns the bundletool device spec of |device|.
+
+  The spec is also the key that extracted splits are cached by, so devices that
+  differ only in ways bundletool ignores should get the same spec.
+  """
+  abis = device.GetProp('ro.product.cpu.abilist', cache=True)
+  # Only the current system locale is included, unlike bundletool
+  # get-device-spec, which lists all locales of the device. Splits for other
+  # locales are not installed.
+  locale = (device.GetProp('persist.sys.locale')
+            or device.GetProp('ro.product.locale', cache=True))
+  density = device.GetProp('ro.sf.lcd_density', cache=True)
+  return {
+      # Our .aab files are already split on abi, so it only matters for the
+      # rare multi-abi bundle.
+      'supportedAbis': abis.split(',') if abis else [device.product_cpu_abi],
+      'supportedLocales': [locale] if locale else [],
+      # Ignored since we don't split on density. Devices that do not report
+      # one share cache entries with those that report 1000.
+      'screenDensity': int(density) if density else 1000,
+      'sdkVersion': device.build_version_sdk,
+      # Conditional modules can depend on device features. Sorted so that the
+      # cache key does not depend on the order "pm list features" prints them.
+      'deviceFeatures': sorted(device.GetFeatures()),
+  }
+
+
+def _InstallSplitApks(device, apk_paths):
+  base_apk = next(
+      (p for p in apk_paths if os.path.basename(p) == 'base-master.apk'), None)
+  if base_apk:
+    split_apks = [p for p in apk_paths if p != base_apk]
+    device.InstallSplitApk(base_apk,
+                           split_apks,
+                           allow_downgrade=True,
+                           permissions=[])
+  else:
+    # Devices without split support get a single standalone apk.
+    assert len(apk_paths) == 1, apk_paths
+    device.Install(apk_paths[0], permissions=[], allow_downgrade=True)
+
+
 def _InstallBundle(devices, apk_helper_instance, modules, fake_modules):
 
   def Install(device):
@@ -148,7 +205,25 @@ def _InstallBundle(devices, apk_helper_instance, modules, fake_modules):
         '\'-f FAKE\' must be accompanied by \'-m {}\''.format(BASE_MODULE))
 
   logging.info('Installing bundle.')
-  device_utils.DeviceUtils.parallel(devices).pMap(Install)
+  parallel_devices = device_utils.DeviceUtils.parallel(devices)
+  if fake_modules:
+    parallel_devices.pMap(Install)
+    return
+
+  # Extract the splits once per distinct device spec (they are cached across
+  # invocations too), rather than once per device.
+  device_specs = parallel_devices.pMap(_BundleDeviceSpec).pGet(None)
+  apk_paths_by_spec = {}
+  apk_paths_by_serial = {}
+  for device, device_spec in zip(devices, device_specs):
+    spec_key = json.dumps(device_spec, sort_keys=True)
+    if spec_key not in apk_paths_by_spec:
+      apk_paths_by_spec[spec_key] = app_bundle_utils.ExtractSplitApks(
+          apk_helper_instance.path, device_spec, modules)
+    apk_paths_by_serial[device.serial] = apk_paths_by_spec[spec_key]
+
+  parallel_devices.pMap(
+      lambda d: _InstallSplitApks(d, apk_paths_by_serial[d.serial]))
 
 
 def _UninstallApk(devices, install_dict, package_name):
@@ -317,11 +392,15 @@ def _RunMemUsage(devices, package_name, query_app=False):
     cmd_args.append('--local')
 
   def mem_usage_helper(d):
-    ret = []
-    for process in sorted(_GetPackageProcesses(d, package_name)):
-      meminfo = d.RunShellCommand(cmd_args + [str(process.pid)])
-      ret.append((process.name, '\n'.join(meminfo)))
-    return ret
+    processes = sorted(_GetPackageProcesses(d, package_name))
+    if not processes:
+      return []
+    meminfos = _RunBatchedShellCommands(
+        d, [' '.join(cmd_args + [str(p.pid)]) for p in processes])
+    if meminfos is None:
+      raise Exception('Failed to run dumpsys meminfo on %s' % d)
+    return [(p.name, '\n'.join(meminfo))
+            for p, meminfo in zip(processes, meminfos)]
 
   parallel_devices = device_utils.DeviceUtils.parallel(devices)
   all_results = parallel_devices.pMap(mem_usage_helper).pGet(None)
@@ -335,20 +414,50 @@ def _RunMemUsage(devices, package_name, query_app=False):
         print(usage)
 
 
-def _DuHelper(device, path_spec, run_as=None):
-  """Runs "du -s -k |path_spec|" on |device| and returns parsed result.
+# Echoed before each command run by _RunBatchedShellCommands().
+_BATCH_SEPARATOR = '<<<apk_operations batch separator>>>'
+
+
+def _RunBatchedShellCommands(device, cmds, **kwargs):
+  """Runs shell commands on |device| with a single adb shell round trip.
 
   Args:
     device: A DeviceUtils instance.
-    path_spec: The list of paths to run du on. May contain shell expansions
-        (will not be escaped).
-    run_as: Package name to run as, or None to run as shell user. If not None
-        and app is not android:debuggable (run-as fails), then command will be
-        run as root.
+    cmds: The list of commands to run. May contain shell expansions (will not
+        be escaped).
+    kwargs: Passed on to device.RunShellCommand() (e.g. run_as or as_root).
 
   Returns:
-    A dict of path->size in KiB containing all paths in |path_spec| that exist
-    on device. Paths that do not exist are silently ignored.
+    A list with the output lines of each command in |cmds|, or None if the
+    commands did not run at all (e.g. run-as failed).
+  """
+  separator = pipes.quote(_BATCH_SEPARATOR)
+  script = ';'.join('echo {};{}'.format(separator, cmd) for cmd in cmds)
+  lines = device.RunShellCommand(script, shell=True, check_return=False,
+                                 **kwargs)
+  outputs = None
+  for line in lines:
+    if line == _BATCH_SEPARATOR:
+      if outputs is None:
+        outputs = []
+      outputs.append([])
+    elif outputs is not None:
+      outputs[-1].append(line)
+  if outputs is None:
+    logging.debug('Batched shell commands failed:\n%s', '\n'.join(lines))
+  return outputs
+
+
+def _BatchedDuHelper(device, path_specs, run_as=None):
+  """Runs "du -s -k |path_spec|" for each of |path_specs| in one round trip.
+
+  Args:
+    device: A DeviceUtils instance.
+    path_specs: A list of path specs as accepted by _DuHelper().
+    run_as: See _DuHelper().
+
+  Returns:
+    A list with the result of _DuHelper() for each of |path_specs|.
   """
   # Example output for: du -s -k /data/data/org.chromium.chrome/{*,.*}
   # 144     /data/data/org.chromium.chrome/cache
@@ -358,28 +467,48 @@ def _DuHelper(device, path_spec, run_as=None):
 
   # The -d flag works differently across android version, so use -s instead.
   # Without the explicit 2>&1, stderr and stdout get combined at random :(.
-  cmd_str = 'du -s -k ' + path_spec + ' 2>&1'
-  lines = device.RunShellCommand(cmd_str, run_as=run_as, shell=True,
-                                 check_return=False)
-  output = '\n'.join(lines)
+  cmds = ['du -s -k ' + path_spec + ' 2>&1' for path_spec in path_specs]
+  outputs = _RunBatchedShellCommands(device, cmds, run_as=run_as)
   # run-as: Package 'com.android.chrome' is not debuggable
-  if output.startswith('run-as:'):
-    # check_return=False needed for when some paths in path_spec do not exist.
-    lines = device.RunShellCommand(cmd_str, as_root=True, shell=True,
-                                   check_return=False)
-  ret = {}
-  try:
-    for line in lines:
-      # du: .*: No such file or directory
-      if line.startswith('du:'):
-        continue
-      size, subpath = line.split(None, 1)
-      ret[subpath] = int(size)
-    return ret
-  except ValueError:
-    logging.error('du command was: %s', cmd_str)
-    logging.error('Failed to parse du output:\n%s', output)
-    raise
+  if outputs is None and run_as:
+    outputs = _RunBatchedShellCommands(device, cmds, as_root=True)
+  if outputs is None:
+    raise Exception('Failed to run du on %s: %s' % (device, cmds))
+
+  ret = []
+  for cmd, lines in zip(cmds, outputs):
+    sizes = {}
+    try:
+      for line in lines:
+        # du: .*: No such file or directory
+        if line.startswith('du:'):
+          continue
+        size, subpath = line.split(None, 1)
+        sizes[subpath] = int(size)
+    except ValueError:
+      logging.error('du command was: %s', cmd)
+      logging.error('Failed to parse du output:\n%s', '\n'.join(lines))
+      raise
+    ret.append(sizes)
+  return ret
+
+
+def _DuHelper(device, path_spec, run_as=None):
+  """Runs "du -s -k |path_spec|" on |device| and returns parsed result.
+
+  Args:
+    device: A DeviceUtils instance.
+    path_spec: The list of paths to run du on. May contain shell expansions
+        (will not be escaped).
+    run_as: Package name to run as, or None to run as shell user. If not None
+        and app is not android:debuggable (run-as fails), then command will be
+        run as root.
+
+  Returns:
+    A dict of path->size in KiB containing all paths in |path_spec| that exist
+    on device. Paths that do not exist are silently ignored.
+  """
+  return _BatchedDuHelper(device, [path_spec], run_as=run_as)[0]
 
 
 def _RunDiskUsage(devices, package_name):
@@ -463,25 +592,25 @@ def _RunDiskUsage(devices, package_name):
       compilation_filters.add(m.group(1))
     compilation_filter = ','.join(sorted(compilation_filters))
 
-    data_dir_sizes = _DuHelper(d, '%s/{*,.*}' % data_dir, run_as=package_name)
     # Measure code_cache separately since it can be large.
-    code_cache_sizes = {}
+    data_dir_sizes, code_cache_sizes = _BatchedDuHelper(
+        d, ['%s/{*,.*}' % data_dir,
+            '%s/code_cache/{*,.*}' % data_dir],
+        run_as=package_name)
     code_cache_dir = next(
         (k for k in data_dir_sizes if k.endswith('/code_cache')), None)
     if code_cache_dir:
       data_dir_sizes.pop(code_cache_dir)
-      code_cache_sizes = _DuHelper(d, '%s/{*,.*}' % code_cache_dir,
-                                   run_as=package_name)
 
     apk_path_spec = code_path
     if not apk_path_spec.endswith('.apk'):
       apk_path_spec += '/*.apk'
-    apk_sizes = _DuHelper(d, apk_path_spec)
     if lib_path.endswith('/lib'):
       # Shows architecture subdirectory.
-      lib_sizes = _DuHelper(d, '%s/{*,.*}' % lib_path)
+      lib_path_spec = '%s/{*,.*}' % lib_path
     else:
-      lib_sizes = _DuHelper(d, lib_path)
+      lib_path_spec = lib_path
+    apk_sizes, lib_sizes = _BatchedDuHelper(d, [apk_path_spec, lib_path_spec])
 
     # Look at all possible locations for odex files.
     odex_paths = []
@@ -536,6 +665,14 @@ def _RunDiskUsage(devices, package_name):
     print('Total: %s KiB (%.1f MiB)' % (total, total / 1024.0))
 
 
+# Maximum number of logcat lines to process before printing them.
+_MAX_LOGCAT_BATCH_SIZE = 1000
+
+# Maximum number of logcat lines read ahead of processing. Bounds memory when
+# processing (e.g. symbolizing stacks) is slower than logcat.
+_MAX_QUEUED_LOGCAT_LINES = 10 * _MAX_LOGCAT_BATCH_SIZE
+
+
 class _LogcatProcessor:
   ParsedLine = collections.namedtuple(
       'ParsedLine',
@@ -636,6 +773,8 @@ class _LogcatProcessor:
     else:
       self._exit_on_match = None
     self._found_exit_match = False
+    # (parsed_line, dim) tuples to print in FlushOutput().
+    self._pending_output = []
     self._native_stack_symbolizer = _LogcatProcessor.NativeStackSymbolizer(
         stack_script_context, self._PrintParsedLine)
     # Process ID for the app's main process (with no :name suffix).
@@ -709,26 +848,22 @@ class _LogcatProcessor:
 
   def _ParseLine(self, line):
     tokens = line.split(None, 6)
+    num_tokens = len(tokens)
 
-    def consume_token_or_default(default):
-      return tokens.pop(0) if len(tokens) > 0 else default
-
-    def consume_integer_token_or_default(default):
-      if len(tokens) == 0:
+    def integer_token_or_default(index, default):
+      if index >= num_tokens:
         return default
-
       try:
-        return int(tokens.pop(0))
+        return int(tokens[index])
       except ValueError:
         return default
 
-    date = consume_token_or_default('')
-    invokation_time = consume_token_or_default('')
-    pid = consume_integer_token_or_default(-1)
-    tid = consume_integer_token_or_default(-1)
-    priority = consume_token_or_default('')
-    tag = consume_token_or_default('')
-    original_message = consume_token_or_default('')
+    # Pad so that missing tokens default to ''.
+    if num_tokens < 7:
+      tokens += [''] * (7 - num_tokens)
+    date, invokation_time, _, _, priority, tag, original_message = tokens
+    pid = integer_token_or_default(2, -1)
+    tid = integer_token_or_default(3, -1)
 
     # Example:
     #   09-19 06:35:51.113  9060  9154 W GCoreFlp: No location...
@@ -745,11 +880,14 @@ class _LogcatProcessor:
   def _PrintParsedLine(self, parsed_line, dim=False):
     if self._exit_on_match and self._exit_on_match.search(parsed_line.message):
       self._found_exit_match = True
+    # Lines are printed in batches by FlushOutput().
+    self._pending_output.append((parsed_line, dim))
 
+  def _FormatParsedLine(self, parsed_line, dim, messages):
     tid_style = colorama.Style.NORMAL
     user_match = self._user_defined_highlight and (
-        re.search(self._user_defined_highlight, parsed_line.tag)
-        or re.search(self._user_defined_highlight, parsed_line.message))
+        self._user_defined_highlight.search(parsed_line.tag)
+        or self._user_defined_highlight.search(parsed_line.message))
 
     # Make the main thread bright.
     if not dim and parsed_line.pid == parsed_line.tid:
@@ -764,14 +902,27 @@ class _LogcatProcessor:
                     pid_style + ('' if dim else colorama.Style.BRIGHT))
     priority = _Colorize(parsed_line.priority,
                          self._GetPriorityStyle(parsed_line.priority))
-    messages = [parsed_line.message]
-    if self._deobfuscator:
-      messages = self._deobfuscator.TransformLines(messages)
     for message in messages:
       message = _Colorize(message, msg_style)
-      sys.stdout.write('{} {} {} {} {} {}: {}\n'.format(
-          parsed_line.date, parsed_line.invokation_time, pid_str, tid_str,
-          priority, tag, message))
+      yield '{} {} {} {} {} {}: {}\n'.format(parsed_line.date,
+                                              parsed_line.invokation_time,
+                                              pid_str, tid_str, priority, tag,
+                                              message)
+
+  def FlushOutput(self):
+    """Deobfuscates and prints the lines processed since the last call."""
+    pending_output = self._pending_output
+    self._pending_output = []
+    if not pending_output:
+      return
+    output = []
+    for parsed_line, dim in pending_output:
+      messages = [parsed_line.message]
+      if self._deobfuscator:
+        messages = self._deobfuscator.TransformLines(messages)
+      output.extend(self._FormatParsedLine(parsed_line, dim, messages))
+    sys.stdout.write(''.join(output))
+    sys.stdout.flush()
 
   def _TriggerNonceFound(self):
     # Once the nonce is hit, we have confidence that we know which lines
@@ -821,16 +972,19 @@ class _LogcatProcessor:
           self._my_pids.add(m.group(1))
 
     owned_pid = log.pid in self._my_pids
+    # Most lines are from other processes, so check cheap conditions first.
+    if not (owned_pid or self._verbose or log.priority == 'F'  # Java crash dump
+            or log.tag in self._ALLOWLISTED_TAGS):
+      return
+
     if owned_pid and not self._verbose and log.tag == 'dalvikvm':
       if self._DALVIK_IGNORE_PATTERN.match(log.message):
         return
 
-    if owned_pid or self._verbose or (log.priority == 'F' or  # Java crash dump
-                                      log.tag in self._ALLOWLISTED_TAGS):
-      if nonce_found:
-        self._native_stack_symbolizer.AddLine(log, not owned_pid)
-      else:
-        self._initial_buffered_lines.append((log, not owned_pid))
+    if nonce_found:
+      self._native_stack_symbolizer.AddLine(log, not owned_pid)
+    else:
+      self._initial_buffered_lines.append((log, not owned_pid))
 
 
 def _RunLogcat(device,
@@ -848,18 +1002,75 @@ def _RunLogcat(device,
                                       exit_on_match=exit_on_match,
                                       extra_package_names=extra_package_names)
   device.RunShellCommand(['log', logcat_processor.nonce])
-  for line in device.adb.Logcat(logcat_format='threadtime'):
+
+  # Read logcat on a separate thread, so that lines are processed and printed
+  # in batches of whatever has arrived in the meantime.
+  lines_queue = queue.Queue(maxsize=_MAX_QUEUED_LOGCAT_LINES)
+  reader_exception = []
+  # Set once lines are no longer consumed, so that the reader stops.
+  stop_reading = threading.Event()
+
+  def put_line(line):
+    # Times out periodically so that a full queue does not block the reader
+    # forever once |stop_reading| is set.
+    while not stop_reading.is_set():
+      try:
+        lines_queue.put(line, timeout=1)
+        return True
+      except queue.Full:
+        pass
+    return False
+
+  def read_lines():
+    logcat = device.adb.Logcat(logcat_format='threadtime')
     try:
-      logcat_processor.ProcessLine(line)
-      if logcat_processor.FoundExitMatch():
+      for line in logcat:
+        if not put_line(line):
+          break
+    except Exception as e:  # pylint: disable=broad-except
+      reader_exception.append(e)
+    finally:
+      # Stops the adb logcat process.
+      logcat.close()
+      put_line(None)
+
+  reader_thread = threading.Thread(target=read_lines, name='logcat_reader')
+  reader_thread.daemon = True
+  reader_thread.start()
+  try:
+    _ProcessLogcatLines(logcat_processor, lines_queue, reader_exception)
+  finally:
+    stop_reading.set()
+
+
+def _ProcessLogcatLines(logcat_processor, lines_queue, reader_exception):
+  while True:
+    lines = [lines_queue.get()]
+    while lines[-1] is not None and len(lines) < _MAX_LOGCAT_BATCH_SIZE:
+      try:
+        lines.append(lines_queue.get_nowait())
+      except queue.Empty:
+        break
+    for line in lines:
+      if line is None:
+        logcat_processor.FlushOutput()
+        if reader_exception:
+          raise reader_exception[0]
         return
-    except:
-      sys.stderr.write('Failed to process line: ' + line + '\n')
-      # Skip stack trace for the common case of the adb server being
-      # restarted.
-      if 'unexpected EOF' in line:
-        sys.exit(1)
-      raise
+      try:
+        logcat_processor.ProcessLine(line)
+        if logcat_processor.FoundExitMatch():
+          logcat_processor.FlushOutput()
+          return
+      except:
+        logcat_processor.FlushOutput()
+        sys.stderr.write('Failed to process line: ' + line + '\n')
+        # Skip stack trace for the common case of the adb server being
+        # restarted.
+        if 'unexpected EOF' in line:
+          sys.exit(1)
+        raise
+    logcat_processor.FlushOutput()
 
 
 def _GetPackageProcesses(device, package_name):
@@ -946,6 +1157,229 @@ def _RunProfile(device, package_name, host_build_directory, pprof_out_path,
         """ % {'s': pprof_out_path}))
 
 
+# Launch times reported by "am start -W", in milliseconds.
+_STARTUP_METRICS = ('TotalTime', 'WaitTime')
+# Two-sided 95% quantiles of Student's t-distribution, indexed by degrees of
+# freedom - 1. The normal quantile is close enough beyond these.
+_T_95 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+         2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+         2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+
+
+def _T95(degrees_of_freedom):
+  if degrees_of_freedom < 1:
+    return 0.0
+  if degrees_of_freedom > len(_T_95):
+    return 1.96
+  return _T_95[degrees_of_freedom - 1]
+
+
+def _Percentile(sorted_values, percent):
+  """Returns the linearly interpolated |percent|th percentile."""
+  pos = (len(sorted_values) - 1) * percent / 100.0
+  lo = int(pos)
+  hi = min(lo + 1, len(sorted_values) - 1)
+  return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos -
+                                                                        lo)
+
+
+def _StartupStats(values):
+  """Summarizes a list of launch times.
+
+  Returns:
+    A dict with the count, mean, sample standard deviation, min, p50, p90 and
+    max of |values|, and the 95% confidence interval of the mean as a
+    [low, high] list.
+  """
+  n = len(values)
+  sorted_values = sorted(values)
+  mean = sum(sorted_values) / float(n)
+  stdev = 0.0
+  if n > 1:
+    stdev = math.sqrt(sum((v - mean)**2 for v in sorted_values) / (n - 1))
+  half_width = _T95(n - 1) * stdev / math.sqrt(n)
+  return {
+      'count': n,
+      'mean': mean,
+      'stdev': stdev,
+      'min': sorted_values[0],
+      'p50': _Percentile(sorted_values, 50),
+      'p90': _Percentile(sorted_values, 90),
+      'max': sorted_values[-1],
+      'ci95': [mean - half_width, mean + half_width],
+  }
+
+
+def _MeanDifference(baseline, experiment):
+  """Returns the difference of means and its 95% confidence interval.
+
+  Uses Welch's approximation, with the smaller sample's degrees of freedom.
+  """
+  diff = experiment['mean'] - baseline['mean']
+  stderr = math.sqrt(baseline['stdev']**2 / baseline['count'] +
+                     experiment['stdev']**2 / experiment['count'])
+  half_width = _T95(min(baseline['count'], experiment['count']) - 1) * stderr
+  return diff, [diff - half_width, diff + half_width]
+
+
+def _ParseAmStartTimes(lines):
+  """Returns {metric: milliseconds} parsed from "am start -W" output."""
+  times = {}
+  for line in lines:
+    key, _, value = line.partition(':')
+    value = value.strip()
+    if key.strip() in _STARTUP_METRICS and value.isdigit():
+      times[key.strip()] = int(value)
+  return times
+
+
+def _RunStartupBench(devices, package_name, repeat, warmup, cold, drop_caches,
+                     profile_path_template):
+  """Launches the app |repeat| times on each device and collects launch times.
+
+  Args:
+    devices: Devices to launch on, in parallel.
+    package_name: The app to launch. It must already be installed.
+    repeat: Number of timed launches per device.
+    warmup: Number of untimed launches per device that precede them.
+    cold: Whether to force-stop the app before each launch. Otherwise, the app
+        is sent to the background and brought back (a hot start).
+    drop_caches: Whether to also drop the page cache before cold launches.
+        Requires root, and is skipped with a warning otherwise.
+    profile_path_template: If set, an additional launch per device is profiled
+        with simpleperf, and written to this path formatted with the device
+        serial.
+
+  Returns:
+    A list parallel to |devices| of {metric: [milliseconds]}.
+  """
+  launch_cmd = [
+      'am', 'start', '-W', '-p', package_name, '-c',
+      'android.intent.category.LAUNCHER', '-a', 'android.intent.action.MAIN'
+  ]
+
+  def bench(device):
+    should_drop_caches = cold and drop_caches
+    if should_drop_caches and not device.HasRoot():
+      logging.warning('%s is not rooted. Not dropping the page cache.', device)
+      should_drop_caches = False
+
+    def prepare():
+      if cold:
+        device.ForceStop(package_name)
+        if should_drop_caches:
+          device.RunShellCommand('sync; echo 3 > /proc/sys/vm/drop_caches',
+                                 shell=True,
+                                 as_root=True,
+                                 check_return=True)
+      else:
+        device.RunShellCommand(['input', 'keyevent', 'KEYCODE_HOME'],
+                               check_return=True)
+
+    def launch():
+      output = device.RunShellCommand(launch_cmd, check_return=True)
+      times = _ParseAmStartTimes(output)
+      if 'TotalTime' not in times:
+        raise Exception('Failed to time the launch of %s on %s:\n%s' %
+                        (package_name, device, '\n'.join(output)))
+      return times
+
+    for _ in range(warmup):
+      prepare()
+      launch()
+    samples = collections.defaultdict(list)
+    for _ in range(repeat):
+      prepare()
+      for metric, value in launch().items():
+        samples[metric].append(value)
+
+    if profile_path_template:
+      simpleperf.PrepareDevice(device)
+      device_simpleperf_path = simpleperf.InstallSimpleperf(
+          device, package_name)
+      prepare()
+      with simpleperf.RunSimpleperfForAppStart(
+          device, device_simpleperf_path, package_name, [],
+          profile_path_template.format(serial=device.serial)):
+        launch()
+    return dict(samples)
+
+  parallel_devices = device_utils.DeviceUtils.parallel(devices)
+  return parallel_devices.pMap(bench).pGet(None)
+
+
+def _FormatStartupStats(stats):
+  return ('p50={p50:.0f} p90={p90:.0f} mean={mean:.1f} '
+          '(95% CI {ci95[0]:.1f}-{ci95[1]:.1f}) min={min} max={max} '
+          'n={count}'.format(**stats))
+
+
+def _StartupChartJson(samples_by_label):
+  """Returns launch times in the chartjson format of perf_tests_results_helper.
+
+  Args:
+    samples_by_label: An ordered list of (label, {metric: [milliseconds]}).
+        When there are two labels, the first is treated as the baseline of the
+        second.
+  """
+  # Only needed for --output-json, so other commands do not pay for importing
+  # it.
+  with devil_env.SysPath(
+      os.path.join(_DIR_SOURCE_ROOT, 'build', 'util', 'lib', 'common')):
+    import perf_tests_results_helper  # pylint: disable=import-error
+
+  chart_data = {
+      'format_version': '1.0',
+      'benchmark_name': 'startup_bench',
+      'charts': {},
+  }
+  stats_by_label = {}
+  for label, samples in samples_by_label:
+    for metric, values in sorted(samples.items()):
+      stats = _StartupStats(values)
+      stats_by_label.setdefault(label, {})[metric] = stats
+      chart_data['charts'].setdefault(metric, {})[label] = {
+          'type': 'list_of_scalar_values',
+          'values': values,
+          'std': stats['stdev'],
+          'units': 'ms',
+          'improvement_direction': 'down',
+          'important': True,
+      }
+      for key in ('p50', 'p90'):
+        perf_tests_results_helper.ReportPerfResult(chart_data,
+                                                   '%s_%s' % (metric, key),
+                                                   label, stats[key], 'ms')
+      for bound, value in zip(('low', 'high'), stats['ci95']):
+        perf_tests_results_helper.ReportPerfResult(chart_data,
+                                                   '%s_ci95_%s' % (metric,
+                                                                   bound),
+                                                   label,
+                                                   value,
+                                                   'ms',
+                                                   important=False)
+  if len(samples_by_label) == 2:
+    (baseline, baseline_stats), (experiment, experiment_stats) = [
+        (label, stats_by_label.get(label, {})) for label, _ in samples_by_label
+    ]
+    trace = '%s-%s' % (experiment, baseline)
+    for metric in sorted(set(baseline_stats) & set(experiment_stats)):
+      diff, ci95 = _MeanDifference(baseline_stats[metric],
+                                   experiment_stats[metric])
+      perf_tests_results_helper.ReportPerfResult(chart_data,
+                                                 '%s_mean_delta' % metric,
+                                                 trace, diff, 'ms')
+      for bound, value in zip(('low', 'high'), ci95):
+        perf_tests_results_helper.ReportPerfResult(chart_data,
+                                                   '%s_mean_delta_ci95_%s' %
+                                                   (metric, bound),
+                                                   trace,
+                                                   value,
+                                                   'ms',
+                                                   important=False)
+  return chart_data
+
+
 class _StackScriptContext:
   """Maintains temporary files needed by stack.py."""
 
@@ -1104,6 +1538,10 @@ class _Command:
   def _RegisterExtraArgs(self, group):
     pass
 
+  def ShouldSaveDeviceCaches(self):
+    """Whether device caches should be saved after Run()."""
+    return True
+
   def RegisterArgs(self, parser):
     subp = parser.add_parser(
         self.name, help=self.description,
@@ -1338,18 +1776,29 @@ class _InstallCommand(_Command):
                          choices=self.default_modules,
                          default=[],
                          help='Module to exclude from default install.')
+    else:
+      group.add_argument(
+          '--streaming',
+          action='store_true',
+          help='Stream non-incremental apks to devices with adb install '
+          '--streaming, without checking whether they are already installed.')
+
+  def ShouldSaveDeviceCaches(self):
+    # Streamed installs bypass the device cache's record of installed apks.
+    return not getattr(self.args, 'streaming', False)
 
   def Run(self):
+    streaming = getattr(self.args, 'streaming', False)
     if self.additional_apk_helpers:
       for additional_apk_helper in self.additional_apk_helpers:
-        _InstallApk(self.devices, additional_apk_helper, None)
+        _InstallApk(self.devices, additional_apk_helper, None, streaming)
     if self.is_bundle:
       modules = list(
           set(self.args.module) - set(self.args.no_module) -
           set(self.args.fake))
       _InstallBundle(self.devices, self.apk_helper, modules, self.args.fake)
     else:
-      _InstallApk(self.devices, self.apk_helper, self.install_dict)
+      _InstallApk(self.devices, self.apk_helper, self.install_dict, streaming)
 
 
 class _UninstallCommand(_Command):
@@ -1357,6 +1806,10 @@ class _UninstallCommand(_Command):
   description = 'Removes the APK or bundle from one or more devices.'
   needs_package_name = True
 
+  def ShouldSaveDeviceCaches(self):
+    # Incremental install depends on the cache being cleared when uninstalling.
+    return False
+
   def Run(self):
     _UninstallApk(self.devices, self.install_dict, self.args.package_name)
 
@@ -1622,8 +2075,7 @@ class _CompileDexCommand(_Command):
   def _RegisterExtraArgs(self, group):
     group.add_argument(
         'compilation_filter',
-        choices=['verify', 'quicken', 'space-profile', 'space',
-                 'speed-profile', 'speed'],
+        choices=_COMPILATION_FILTERS,
         help='For WebView/Monochrome, use "speed". For other apks, use '
              '"speed-profile".')
 
@@ -1779,6 +2231,139 @@ class _ProfileCommand(_Command):
                 extra_args)
 
 
+class _StartupBenchCommand(_Command):
+  name = 'startup-bench'
+  description = ('Launch the app repeatedly and report the distribution of its '
+                 'startup time, as measured by "am start -W".')
+  long_description = description + textwrap.dedent("""
+
+      Launch times are collected on all selected devices in parallel. With
+      --compare-apk, this APK and the given one are installed and measured in
+      turn, and the difference of their means is reported too.
+
+      Run with --output-json to write results in chartjson format.
+  """)
+  needs_package_name = True
+
+  def _RegisterExtraArgs(self, group):
+    group.add_argument('--repeat',
+                       type=int,
+                       default=10,
+                       help='Number of timed launches per device (and APK).')
+    group.add_argument('--warmup',
+                       type=int,
+                       default=1,
+                       help='Number of untimed launches preceding them.')
+    group.add_argument('--hot',
+                       action='store_true',
+                       help='Time hot starts (bringing the running app back '
+                       'from the background) instead of cold starts.')
+    group.add_argument('--no-drop-caches',
+                       action='store_true',
+                       help='Do not drop the page cache before cold starts. '
+                       'Dropping it requires a rooted device.')
+    group.add_argument('--compilation-filter',
+                       choices=_COMPILATION_FILTERS,
+                       help='Compile dex with this filter (see compile-dex) '
+                       'before launching.')
+    group.add_argument('--compare-apk',
+                       help='APK of the same package to compare with (A/B). '
+                       'Both APKs are installed by this command. Bundles are '
+                       'not supported.')
+    group.add_argument('--rounds',
+                       type=int,
+                       default=1,
+                       help='With --compare-apk, number of times to alternate '
+                       'between the two APKs, so that drift (e.g. thermal '
+                       'throttling) affects both alike.')
+    group.add_argument('--simpleperf-dir',
+                       help='Profile one additional launch per device (and '
+                       'APK) with simpleperf, and write the perf.data files '
+                       'to this directory.')
+    group.add_argument('--output-json',
+                       help='Write the results in chartjson format to this '
+                       'file.')
+
+  def Run(self):
+    apks = [('baseline', None)]
+    if self.args.compare_apk:
+      if not self.apk_helper:
+        self._parser.error('--compare-apk requires this app to be built.')
+      if not self.args.compare_apk.endswith('.apk'):
+        # Comparison targets are installed with _InstallApk(), which does not
+        # support bundles.
+        self._parser.error('--compare-apk must be an .apk file: %s' %
+                           self.args.compare_apk)
+      compare_apk_helper = apk_helper.ToHelper(self.args.compare_apk)
+      if compare_apk_helper.GetPackageName() != self.args.package_name:
+        self._parser.error('--compare-apk must have the package name %s.' %
+                           self.args.package_name)
+      apks = [('baseline', self.apk_helper), ('experiment', compare_apk_helper)]
+    if self.args.simpleperf_dir and not os.path.isdir(self.args.simpleperf_dir):
+      os.makedirs(self.args.simpleperf_dir)
+
+    # Maps label -> list parallel to self.devices of {metric: [milliseconds]}.
+    results = collections.OrderedDict(
+        (label, [collections.defaultdict(list) for _ in self.devices])
+        for label, _ in apks)
+    for round_index in range(self.args.rounds if self.args.compare_apk else 1):
+      for label, apk in apks:
+        if apk is self.apk_helper and self.is_bundle:
+          logging.warning('Installing bundle...')
+          _InstallBundle(self.devices, apk, None, None)
+        elif apk:
+          logging.warning('Installing %s...', apk.path)
+          _InstallApk(self.devices, apk,
+                      self.install_dict if apk is self.apk_helper else None)
+        if self.args.compilation_filter:
+          _RunCompileDex(self.devices, self.args.package_name,
+                         self.args.compilation_filter)
+        profile_path_template = None
+        if self.args.simpleperf_dir and round_index == 0:
+          profile_path_template = os.path.join(self.args.simpleperf_dir,
+                                               label + '-{serial}.perf.data')
+        logging.warning('Launching %s %d times...', label, self.args.repeat)
+        device_samples = _RunStartupBench(self.devices, self.args.package_name,
+                                          self.args.repeat, self.args.warmup,
+                                          not self.args.hot,
+                                          not self.args.no_drop_caches,
+                                          profile_path_template)
+        for merged, samples in zip(results[label], device_samples):
+          for metric, values in samples.items():
+            merged[metric].extend(values)
+
+    samples_by_label = []
+    for label, device_samples in results.items():
+      pooled = collections.defaultdict(list)
+      if len(apks) > 1:
+        print(_Colorize('%s:' % label, colorama.Style.BRIGHT))
+      for samples in _PrintPerDeviceOutput(self.devices, device_samples):
+        for metric, values in sorted(samples.items()):
+          pooled[metric].extend(values)
+          print('  %s: %s' %
+                (metric, _FormatStartupStats(_StartupStats(values))))
+      if len(self.devices) > 1:
+        print(_Colorize('All devices:', colorama.Fore.YELLOW))
+        for metric, values in sorted(pooled.items()):
+          print('  %s: %s' %
+                (metric, _FormatStartupStats(_StartupStats(values))))
+      samples_by_label.append((label, dict(pooled)))
+
+    if len(samples_by_label) == 2:
+      (_, baseline), (_, experiment) = samples_by_label
+      print(_Colorize('experiment - baseline:', colorama.Style.BRIGHT))
+      for metric in sorted(set(baseline) & set(experiment)):
+        diff, ci95 = _MeanDifference(_StartupStats(baseline[metric]),
+                                     _StartupStats(experiment[metric]))
+        print('  %s: mean %+.1fms (95%% CI %+.1f to %+.1f)' %
+              (metric, diff, ci95[0], ci95[1]))
+
+    if self.args.output_json:
+      with open(self.args.output_json, 'w') as f:
+        json.dump(_StartupChartJson(samples_by_label), f, indent=2)
+      logging.warning('Wrote results to %s', self.args.output_json)
+
+
 class _RunCommand(_InstallCommand, _LaunchCommand, _LogcatCommand):
   name = 'run'
   description = 'Install, launch, and show logcat (when targeting one device).'
@@ -1899,6 +2484,7 @@ _COMMANDS = [
     _CompileDexCommand,
     _PrintCertsCommand,
     _ProfileCommand,
+    _StartupBenchCommand,
     _RunCommand,
     _StackCommand,
 ]
@@ -1953,8 +2539,7 @@ def _RunInternal(parser,
         raise Exception('Invalid additional APK path "{}"'.format(path))
   args.command.ProcessArgs(args)
   args.command.Run()
-  # Incremental install depends on the cache being cleared when uninstalling.
-  if args.command.name != 'uninstall':
+  if args.command.ShouldSaveDeviceCaches():
     _SaveDeviceCaches(args.command.devices, output_directory)
 
 
@@ -0,0 +1,126 @@
+#!/usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import argparse
+import itertools
+import math
+import threading
+import unittest
+from unittest import mock
+
+import apk_operations
+
+# pylint: disable=protected-access
+
+
+class StartupStatsTest(unittest.TestCase):
+
+  def testStartupStats(self):
+    stats = apk_operations._StartupStats([40, 10, 30, 20])
+    self.assertEqual(4, stats['count'])
+    self.assertEqual(25, stats['mean'])
+    self.assertAlmostEqual(math.sqrt(500 / 3.0), stats['stdev'])
+    self.assertEqual(10, stats['min'])
+    self.assertEqual(25, stats['p50'])
+    self.assertAlmostEqual(37, stats['p90'])
+    self.assertEqual(40, stats['max'])
+    # t(0.975, 3 degrees of freedom) = 3.182.
+    half_width = 3.182 * stats['stdev'] / 2
+    self.assertAlmostEqual(25 - half_width, stats['ci95'][0])
+    self.assertAlmostEqual(25 + half_width, stats['ci95'][1])
+
+  def testStartupStats_singleValue(self):
+    stats = apk_operations._StartupStats([12])
+    self.assertEqual(0, stats['stdev'])
+    self.assertEqual(12, stats['p50'])
+    self.assertEqual(12, stats['p90'])
+    self.assertEqual([12, 12], stats['ci95'])
+
+  def testStartupStats_manyValues(self):
+    # Uses the normal quantile beyond 30 degrees of freedom.
+    stats = apk_operations._StartupStats([10, 20] * 50)
+    half_width = 1.96 * stats['stdev'] / 10
+    self.assertAlmostEqual(15 + half_width, stats['ci95'][1])
+
+  def testMeanDifference(self):
+    baseline = apk_operations._StartupStats([10, 20, 30, 40])
+    experiment = apk_operations._StartupStats([20, 30, 40, 50, 60])
+    diff, ci95 = apk_operations._MeanDifference(baseline, experiment)
+    self.assertEqual(15, diff)
+    stderr = math.sqrt(baseline['stdev']**2 / 4 + experiment['stdev']**2 / 5)
+    # Uses the degrees of freedom of the smaller sample.
+    self.assertAlmostEqual(15 - 3.182 * stderr, ci95[0])
+    self.assertAlmostEqual(15 + 3.182 * stderr, ci95[1])
+
+  def testMeanDifference_noVariance(self):
+    stats = apk_operations._StartupStats([10, 10])
+    self.assertEqual((0, [0, 0]),
+                     apk_operations._MeanDifference(stats, stats))
+
+  def testStartupChartJson(self):
+    chart_data = apk_operations._StartupChartJson([
+        ('baseline', {
+            'TotalTime': [10, 20]
+        }),
+        ('experiment', {
+            'TotalTime': [20, 30]
+        }),
+    ])
+    charts = chart_data['charts']
+    self.assertEqual([10, 20], charts['TotalTime']['baseline']['values'])
+    self.assertEqual(15, charts['TotalTime_p50']['baseline']['value'])
+    self.assertEqual(25, charts['TotalTime_p50']['experiment']['value'])
+    self.assertEqual(
+        10, charts['TotalTime_mean_delta']['experiment-baseline']['value'])
+
+
+class StartupBenchCommandTest(unittest.TestCase):
+
+  def testRejectsBundleToCompare(self):
+    command = apk_operations._StartupBenchCommand(False, False, False)
+    command.RegisterArgs(argparse.ArgumentParser().add_subparsers())
+    command.args = mock.Mock(compare_apk='ChromePublic.aab')
+    command.apk_helper = mock.Mock()
+    with mock.patch.object(apk_operations.apk_helper, 'ToHelper') as to_helper:
+      with self.assertRaises(SystemExit):
+        command.Run()
+    to_helper.assert_not_called()
+
+
+class RunLogcatTest(unittest.TestCase):
+
+  def testStopsReadingOnExitMatch(self):
+    read_lines = []
+    logcat_closed = threading.Event()
+
+    def logcat(**_kwargs):
+      try:
+        for i in itertools.count():
+          read_lines.append(i)
+          yield 'exit' if i == 5 else 'line'
+      finally:
+        logcat_closed.set()
+
+    device = mock.Mock()
+    device.adb.Logcat.side_effect = logcat
+    processor = mock.Mock()
+    processed_lines = []
+    processor.ProcessLine.side_effect = processed_lines.append
+    processor.FoundExitMatch.side_effect = lambda: 'exit' in processed_lines
+
+    with mock.patch.object(apk_operations,
+                           '_LogcatProcessor',
+                           return_value=processor):
+      apk_operations._RunLogcat(device, 'org.chromium.foo', None, None, False)
+
+    self.assertEqual(['line'] * 5 + ['exit'], processed_lines)
+    self.assertTrue(logcat_closed.wait(timeout=10))
+    # At most a full queue is read ahead of the exit match.
+    self.assertLessEqual(len(read_lines),
+                         apk_operations._MAX_QUEUED_LOGCAT_LINES + 7)
+
+
+if __name__ == '__main__':
+  unittest.main()
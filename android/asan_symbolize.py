@@ -14,6 +14,7 @@ import sys
 
 from pylib import constants
 from pylib.constants import host_paths
+from pylib.symbols import llvm_symbolizer
 
 # pylint: disable=wrong-import-order
 # Uses symbol.py from third_party/android_platform, not python's.
@@ -36,6 +37,12 @@ _RE_ASAN = re.compile(
     \)                       # match the char ")".
     """, re.VERBOSE)
 
+# Marks the end of an ASan report.
+_RE_ASAN_END = re.compile(r'==\d+==ABORTING')
+
+# Maximum number of lines to symbolize at once when streaming.
+_MAX_LINES_PER_BATCH = 10000
+
 # This named tuple models a parsed Asan log line.
 AsanParsedLine = collections.namedtuple('AsanParsedLine',
                                         'prefix,library,pos,rel_address')
@@ -75,15 +82,85 @@ def _TranslateLibPath(library, asan_libs):
   return symbol.TranslateLibPath(library)
 
 
-def _PrintSymbolized(asan_input, arch):
-  """Print symbolized logcat output for Asan symbols.
+def _SymbolizeWithSymbolModule(libraries, asan_libs, arch):
+  """Symbolizes ASan frames using symbol.py.
 
   Args:
-    asan_input: list of input lines.
+    libraries: A dict mapping library -> [ AsanParsedLine... ]
+    asan_libs: The list of host ASan runtime libraries.
     arch: Target CPU architecture.
+
+  Returns:
+    A dict mapping library -> { address -> (symbol, location) }
   """
-  asan_libs = _FindASanLibraries()
+  all_symbols = collections.defaultdict(dict)
+
+  for library, items in libraries.items():
+    libname = _TranslateLibPath(library, asan_libs)
+    lib_relative_addrs = set(i.rel_address for i in items)
+    # pylint: disable=no-member
+    symbols_by_library = symbol.SymbolInformationForSet(libname,
+                                                        lib_relative_addrs,
+                                                        True,
+                                                        cpu_arch=arch)
+    if symbols_by_library:
+      # NOTE: symbols_by_library[address] is a never-emtpy list of tuples.
+      # NOTE: The documentation for SymbolInformationForSet() indicates
+      # that usually one wants to display the last list item, not the first.
+      # The code below takes the first, is this the best choice here?
+      all_symbols[library] = {
+          address: infos[0][:2]
+          for address, infos in symbols_by_library.items()
+      }
+  return all_symbols
+
+
+def _SymbolizeWithLLVMSymbolizer(libraries, asan_libs):
+  """Symbolizes ASan frames using the shared llvm-symbolizer service.
+
+  Each (library, address) pair is only symbolized once per process, since
+  results are cached across batches, and libraries are symbolized in
+  parallel.
+
+  Args:
+    libraries: A dict mapping library -> [ AsanParsedLine... ]
+    asan_libs: The list of host ASan runtime libraries.
+
+  Returns:
+    A dict mapping library -> { address -> (symbol, location) }
+  """
+  host_libs = {}
+  for library in libraries:
+    libname = _TranslateLibPath(library, asan_libs)
+    if libname and os.path.isfile(libname):
+      host_libs[library] = libname
+
+  lib_addrs = set()
+  for library, items in libraries.items():
+    if library in host_libs:
+      lib_addrs.update((host_libs[library], i.rel_address) for i in items)
+  frames_by_lib_addr = llvm_symbolizer.GetSharedSymbolizer().SymbolizeBatch(
+      lib_addrs)
+
+  all_symbols = collections.defaultdict(dict)
+  for library, items in libraries.items():
+    for i in items:
+      # The first frame is the innermost inlined function, as with symbol.py.
+      frames = frames_by_lib_addr.get((host_libs.get(library), i.rel_address))
+      if frames:
+        all_symbols[library][i.rel_address] = frames[0]
+  return all_symbols
 
+
+def _PrintSymbolizedLines(asan_input, symbolize):
+  """Print symbolized logcat output for Asan symbols.
+
+  Args:
+    asan_input: list of input lines.
+    symbolize: A function taking a dict mapping library ->
+      [ AsanParsedLine... ] and returning a dict mapping library ->
+      { address -> (symbol, location) }.
+  """
   # Maps library -> [ AsanParsedLine... ]
   libraries = collections.defaultdict(list)
 
@@ -95,37 +172,56 @@ def _PrintSymbolized(asan_input, arch):
       libraries[parsed.library].append(parsed)
     asan_log_lines.append(AsanLogLine(raw=line, parsed=parsed))
 
-  # Maps library -> { address -> [(symbol, location, obj_sym_with_offset)...] }
-  all_symbols = collections.defaultdict(dict)
-
-  for library, items in libraries.items():
-    libname = _TranslateLibPath(library, asan_libs)
-    lib_relative_addrs = set(i.rel_address for i in items)
-    # pylint: disable=no-member
-    symbols_by_library = symbol.SymbolInformationForSet(libname,
-                                                        lib_relative_addrs,
-                                                        True,
-                                                        cpu_arch=arch)
-    if symbols_by_library:
-      all_symbols[library] = symbols_by_library
+  all_symbols = symbolize(libraries)
 
   for log_line in asan_log_lines:
     m = log_line.parsed
     if (m and m.library in all_symbols and
         m.rel_address in all_symbols[m.library]):
-      # NOTE: all_symbols[lib][address] is a never-emtpy list of tuples.
-      # NOTE: The documentation for SymbolInformationForSet() indicates
-      # that usually one wants to display the last list item, not the first.
-      # The code below takes the first, is this the best choice here?
-      s = all_symbols[m.library][m.rel_address][0]
-      symbol_name = s[0]
-      symbol_location = s[1]
+      symbol_name, symbol_location = all_symbols[m.library][m.rel_address]
       print('%s%s %s %s @ \'%s\'' %
             (m.prefix, m.pos, hex(m.rel_address), symbol_name, symbol_location))
     else:
       print(log_line.raw)
 
 
+def _IterBatches(asan_input):
+  """Yields lists of lines that end with an ASan report, or are large."""
+  batch = []
+  for line in asan_input:
+    batch.append(line)
+    if _RE_ASAN_END.search(line) or len(batch) >= _MAX_LINES_PER_BATCH:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+
+def _PrintSymbolized(asan_input, arch):
+  """Print symbolized logcat output for Asan symbols.
+
+  When llvm-symbolizer is available, the input is symbolized and printed one
+  ASan report (or batch of lines) at a time, so that output streams when
+  reading from a pipe.
+
+  Args:
+    asan_input: iterable of input lines.
+    arch: Target CPU architecture.
+  """
+  asan_libs = _FindASanLibraries()
+  if not llvm_symbolizer.IsAvailable():
+    _PrintSymbolizedLines(
+        asan_input, lambda libraries: _SymbolizeWithSymbolModule(
+            libraries, asan_libs, arch))
+    return
+
+  for batch in _IterBatches(asan_input):
+    _PrintSymbolizedLines(
+        batch, lambda libraries: _SymbolizeWithLLVMSymbolizer(
+            libraries, asan_libs))
+    sys.stdout.flush()
+
+
 def main():
   parser = argparse.ArgumentParser()
   parser.add_argument('-l',
@@ -147,7 +243,7 @@ def main():
   else:
     asan_input = sys.stdin
 
-  _PrintSymbolized(asan_input.readlines(), args.arch)
+  _PrintSymbolized(asan_input, args.arch)
 
 
 if __name__ == "__main__":
@@ -5,12 +5,19 @@
 # found in the LICENSE file.
 
 import argparse
+import bisect
 import collections
 import functools
+import hashlib
 import logging
+import os
+import pickle
 import re
 import subprocess
 import sys
+import zipfile
+
+from pylib.dex import dex_parser
 
 DEX_CLASS_NAME_RE = re.compile(r'\'L(?P<class_name>[^;]+);\'')
 DEX_METHOD_NAME_RE = re.compile(r'\'(?P<method_name>[^\']+)\'')
@@ -54,6 +61,10 @@ TYPE_DESCRIPTOR_RE = re.compile(
     r'[VZBSCIJFD]'
     r')')
 
+# Bump whenever the format of the mapping index changes.
+_MAPPING_INDEX_VERSION = 1
+_MAPPING_INDEX_SUFFIX = '.convert_dex_profile_index'
+
 DOT_NOTATION_MAP = {
     '': '',
     'boolean': 'Z',
@@ -103,10 +114,13 @@ class Method:
 class Class:
   def __init__(self, name):
     self.name = name
-    self._methods = []
+    # {String: [(Method, tuple(int))]} method name to methods with that name and
+    # their sorted line numbers.
+    self._methods_by_name = collections.defaultdict(list)
 
   def AddMethod(self, method, line_numbers):
-    self._methods.append((method, set(line_numbers)))
+    self._methods_by_name[method.name].append(
+        (method, tuple(sorted(set(line_numbers)))))
 
   def FindMethodsAtLine(self, method_name, line_start, line_end=None):
     """Searches through dex class for a method given a name and line numbers
@@ -125,43 +139,38 @@ class Class:
       A list of Method objects that could match the hints given, or None if no
       method is found.
     """
-    found_methods = []
     if line_end is None:
-      hint_lines = set([line_start])
-    else:
-      hint_lines = set(range(line_start, line_end+1))
-
-    named_methods = [(method, l) for method, l in self._methods
-                     if method.name == method_name]
+      line_end = line_start
 
-    if len(named_methods) == 1:
-      return [method for method, l in named_methods]
-    if len(named_methods) == 0:
+    named_methods = self._methods_by_name.get(method_name)
+    if not named_methods:
       return None
+    if len(named_methods) == 1:
+      return [named_methods[0][0]]
 
+    # Methods with a line number within the hint range.
+    found_methods = []
     for method, line_numbers in named_methods:
-      if not hint_lines.isdisjoint(line_numbers):
+      index = bisect.bisect_left(line_numbers, line_start)
+      if index < len(line_numbers) and line_numbers[index] <= line_end:
         found_methods.append(method)
 
-    if len(found_methods) > 0:
-      if len(found_methods) > 1:
-        logging.warning('ambigous methods in dex %s at lines %s in class "%s"',
-            found_methods, hint_lines, self.name)
-      return found_methods
-
-    for method, line_numbers in named_methods:
-      if (max(hint_lines) >= min(line_numbers)
-          and min(hint_lines) <= max(line_numbers)):
-        found_methods.append(method)
+    if not found_methods:
+      # Methods whose line range overlaps the hint range.
+      found_methods = [
+          method for method, line_numbers in named_methods
+          if line_end >= line_numbers[0] and line_start <= line_numbers[-1]
+      ]
 
     if len(found_methods) > 0:
       if len(found_methods) > 1:
-        logging.warning('ambigous methods in dex %s at lines %s in class "%s"',
-            found_methods, hint_lines, self.name)
+        logging.warning(
+            'ambigous methods in dex %s at lines %d-%d in class "%s"',
+            found_methods, line_start, line_end, self.name)
       return found_methods
     logging.warning(
         'No method named "%s" in class "%s" is '
-        'mapped to lines %s', method_name, self.name, hint_lines)
+        'mapped to lines %d-%d', method_name, self.name, line_start, line_end)
     return None
 
 
@@ -352,34 +361,87 @@ def ProcessDex(dex_dump):
   return classes_by_name
 
 
-def ProcessProguardMapping(proguard_mapping_lines, dex):
-  """Parses a proguard mapping file
+def ProcessDexFiles(dexfiles):
+  """Reads dex files in-process returning a dict of class names to Class objects
 
-  This takes proguard mapping file lines and then uses the obfuscated dex to
-  create a mapping of unobfuscated methods to obfuscated ones and vice versa.
+  Equivalent to ProcessDex() on the dexdump output of the given dex files, but
+  reads the method line numbers directly from the dex debug info.
 
-  The dex is used because the proguard mapping file only has the name of the
-  obfuscated methods but not their signature, thus the dex is read to look up
-  which method with a specific name was mapped to the lines mentioned in the
-  proguard mapping file.
+  Args:
+    dexfiles: An iterable of dex_parser.DexFile.
+
+  Returns:
+    A dict that maps from class names in type descriptor format (but without the
+    surrounding 'L' and ';') to Class objects.
+  """
+  classes_by_name = {}
+  for dexfile in dexfiles:
+    for class_def_item in dexfile.class_def_item_list:
+      class_descriptor = dexfile.GetTypeString(class_def_item.class_idx)
+      current_class = Class(class_descriptor[1:-1])
+      classes_by_name[current_class.name] = current_class
+      for encoded_method in dexfile.IterEncodedMethods(class_def_item):
+        line_numbers = dexfile.GetLineNumbers(encoded_method.code_off)
+        if not line_numbers:
+          continue
+        method_item = dexfile.method_item_list[encoded_method.method_idx]
+        proto_item = dexfile.proto_item_list[method_item.proto_idx]
+        current_class.AddMethod(
+            Method(
+                dexfile.GetString(method_item.name_idx), class_descriptor,
+                ''.join(
+                    dexfile.GetTypeListStringsByOffset(
+                        proto_item.parameters_off)),
+                dexfile.GetTypeString(proto_item.return_type_idx)),
+            line_numbers)
+  return classes_by_name
+
+
+def _ReadDexFiles(dex_path):
+  """Returns a DexFile for each dex in a .dex file or a .jar/.apk/.zip."""
+  if zipfile.is_zipfile(dex_path):
+    with zipfile.ZipFile(dex_path) as z:
+      return [
+          dex_parser.DexFile(bytearray(z.read(name))) for name in z.namelist()
+          if re.match(r'(.*/)?classes[0-9]*\.dex$', name)
+      ]
+  with open(dex_path, 'rb') as f:
+    return [dex_parser.DexFile(bytearray(f.read()))]
+
+
+def _LoadDex(dex_path, dexdump_path=None):
+  if dexdump_path:
+    return ProcessDex(_RunDexDump(dexdump_path, dex_path))
+  return ProcessDexFiles(_ReadDexFiles(dex_path))
+
+
+def _ParseProguardMapping(proguard_mapping_lines):
+  """Extracts the classes and methods of a proguard mapping file
+
+  This is the part of processing a mapping which does not depend on the dex, so
+  that it can be cached in a mapping index.
 
   Args:
     proguard_mapping_lines: Array of strings, each is a line from the proguard
                             mapping file (in order).
-    dex: a dict of class name (in type descriptor format but without the
-         enclosing 'L' and ';') to a Class object.
+
   Returns:
-    Two dicts the first maps from obfuscated methods to a set of non-obfuscated
-    ones. It also maps the obfuscated class names to original class names, both
-    in type descriptor format (with the enclosing 'L' and ';')
+    A list of (obfuscated class name, class mapping, method mappings) tuples,
+    one for each class in the mapping. The obfuscated class name is in dot
+    notation and the class mapping is a tuple of the original and obfuscated
+    class names in type descriptor format. Method mappings are a list of
+    (original method, obfuscated name, line start, line end) tuples, where the
+    original method is serialized with Method.serialize(), and the line range
+    is None for methods without line numbers. Inlined methods and fields are
+    omitted.
   """
-  mapping = ProguardMapping()
-  reverse_mapping = ProguardMapping()
-  to_be_obfuscated = []
+  classes = []
   current_class_orig = None
-  current_class_obfs = None
+  current_methods = None
+  next_match = None
+  next_match_index = None
   for index, line in enumerate(proguard_mapping_lines):
-    if line.strip() == '':
+    if line.strip() == '' or line.lstrip().startswith('#'):
       continue
     if not line.startswith(' '):
       match = PROGUARD_CLASS_MAPPING_RE.search(line)
@@ -388,50 +450,76 @@ def ProcessProguardMapping(proguard_mapping_lines, dex):
             'Malformed class mapping', index)
       current_class_orig = match.group('original_name')
       current_class_obfs = match.group('obfuscated_name')
-      mapping.AddClassMapping(_ToTypeDescriptor(current_class_obfs),
-                              _ToTypeDescriptor(current_class_orig))
-      reverse_mapping.AddClassMapping(_ToTypeDescriptor(current_class_orig),
-                                      _ToTypeDescriptor(current_class_obfs))
+      current_methods = []
+      classes.append(
+          (current_class_obfs, (_ToTypeDescriptor(current_class_orig),
+                                _ToTypeDescriptor(current_class_obfs)),
+           current_methods))
       continue
 
     assert current_class_orig is not None
-    assert current_class_obfs is not None
-    line = line.strip()
-    match = PROGUARD_METHOD_MAPPING_RE.search(line)
+    if next_match_index == index:
+      match = next_match
+    else:
+      match = PROGUARD_METHOD_MAPPING_RE.search(line.strip())
     # check if is a method mapping (we ignore field mappings)
     if match is not None:
       # check if this line is an inlining by reading ahead 1 line.
       if index + 1 < len(proguard_mapping_lines):
         next_match = PROGUARD_METHOD_MAPPING_RE.search(
             proguard_mapping_lines[index+1].strip())
+        next_match_index = index + 1
         if (next_match and match.group('line_start') is not None
             and next_match.group('line_start') == match.group('line_start')
             and next_match.group('line_end') == match.group('line_end')):
           continue # This is an inlining, skip
 
-      original_method = Method(
-          match.group('original_method_name'),
+      original_method = (
           _ToTypeDescriptor(
               match.group('original_method_class') or current_class_orig),
+          match.group('original_method_name'),
           _DotNotationListToTypeDescriptorList(match.group('params')),
           _ToTypeDescriptor(match.group('return_type')))
+      line_start = match.group('line_start')
+      if line_start is not None:
+        current_methods.append(
+            (original_method, match.group('obfuscated_name'), int(line_start),
+             int(match.group('line_end'))))
+      else:
+        current_methods.append(
+            (original_method, match.group('obfuscated_name'), None, None))
+  return classes
 
-      if match.group('line_start') is not None:
-        obfs_methods = (dex[current_class_obfs.replace('.', '/')]
-            .FindMethodsAtLine(
-                match.group('obfuscated_name'),
-                int(match.group('line_start')),
-                int(match.group('line_end'))))
 
-        if obfs_methods is None:
-          continue
+def _BuildProguardMappings(parsed_mapping, dex):
+  """Creates mappings from the output of _ParseProguardMapping and the dex.
 
-        for obfs_method in obfs_methods:
-          mapping.AddMethodMapping(obfs_method, original_method)
-          reverse_mapping.AddMethodMapping(original_method, obfs_method)
-      else:
-        to_be_obfuscated.append(
-            (original_method, match.group('obfuscated_name')))
+  See ProcessProguardMapping().
+  """
+  mapping = ProguardMapping()
+  reverse_mapping = ProguardMapping()
+  to_be_obfuscated = []
+  for class_obfs, (class_orig_desc, class_obfs_desc), methods in parsed_mapping:
+    mapping.AddClassMapping(class_obfs_desc, class_orig_desc)
+    reverse_mapping.AddClassMapping(class_orig_desc, class_obfs_desc)
+    dex_class = None
+    for serialized_method, obfuscated_name, line_start, line_end in methods:
+      class_name, name, param_types, return_type = serialized_method
+      original_method = Method(name, class_name, param_types, return_type)
+      if line_start is None:
+        to_be_obfuscated.append((original_method, obfuscated_name))
+        continue
+
+      if dex_class is None:
+        dex_class = dex[class_obfs.replace('.', '/')]
+      obfs_methods = dex_class.FindMethodsAtLine(obfuscated_name, line_start,
+                                                 line_end)
+      if obfs_methods is None:
+        continue
+
+      for obfs_method in obfs_methods:
+        mapping.AddMethodMapping(obfs_method, original_method)
+        reverse_mapping.AddMethodMapping(original_method, obfs_method)
 
   for original_method, obfuscated_name in to_be_obfuscated:
     obfuscated_method = Method(
@@ -444,6 +532,84 @@ def ProcessProguardMapping(proguard_mapping_lines, dex):
   return mapping, reverse_mapping
 
 
+def ProcessProguardMapping(proguard_mapping_lines, dex):
+  """Parses a proguard mapping file
+
+  This takes proguard mapping file lines and then uses the obfuscated dex to
+  create a mapping of unobfuscated methods to obfuscated ones and vice versa.
+
+  The dex is used because the proguard mapping file only has the name of the
+  obfuscated methods but not their signature, thus the dex is read to look up
+  which method with a specific name was mapped to the lines mentioned in the
+  proguard mapping file.
+
+  Args:
+    proguard_mapping_lines: Array of strings, each is a line from the proguard
+                            mapping file (in order).
+    dex: a dict of class name (in type descriptor format but without the
+         enclosing 'L' and ';') to a Class object.
+  Returns:
+    Two dicts the first maps from obfuscated methods to a set of non-obfuscated
+    ones. It also maps the obfuscated class names to original class names, both
+    in type descriptor format (with the enclosing 'L' and ';')
+  """
+  return _BuildProguardMappings(_ParseProguardMapping(proguard_mapping_lines),
+                                dex)
+
+
+def _LoadProguardMappingIndex(index_path, digest):
+  try:
+    with open(index_path, 'rb') as f:
+      header = pickle.load(f)
+      if (header.get('VERSION') != _MAPPING_INDEX_VERSION
+          or header.get('DIGEST') != digest):
+        return None
+      return pickle.load(f)
+  except (IOError, EOFError, pickle.UnpicklingError, AttributeError) as e:
+    logging.info('Could not load mapping index %s: %s', index_path, e)
+    return None
+
+
+def _SaveProguardMappingIndex(index_path, digest, parsed_mapping):
+  tmp_path = index_path + '.tmp'
+  try:
+    with open(tmp_path, 'wb') as f:
+      pickle.dump({
+          'VERSION': _MAPPING_INDEX_VERSION,
+          'DIGEST': digest
+      }, f, pickle.HIGHEST_PROTOCOL)
+      pickle.dump(parsed_mapping, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, index_path)
+  except IOError as e:
+    logging.warning('Could not write mapping index %s: %s', index_path, e)
+
+
+def ProcessProguardMappingFile(proguard_mapping_path, dex):
+  """Like ProcessProguardMapping(), but reads the mapping from a file.
+
+  The dex independent part of the parsed mapping is stored in an index next to
+  the mapping file, which is reused for as long as the contents of the mapping
+  file do not change.
+
+  Args:
+    proguard_mapping_path: path to the proguard mapping file.
+    dex: a dict of class name (in type descriptor format but without the
+         enclosing 'L' and ';') to a Class object.
+  Returns:
+    See ProcessProguardMapping().
+  """
+  with open(proguard_mapping_path, 'rb') as f:
+    data = f.read()
+  digest = hashlib.sha256(data).hexdigest()
+  index_path = proguard_mapping_path + _MAPPING_INDEX_SUFFIX
+  parsed_mapping = _LoadProguardMappingIndex(index_path, digest)
+  if parsed_mapping is None:
+    parsed_mapping = _ParseProguardMapping(
+        data.decode('utf-8').splitlines(True))
+    _SaveProguardMappingIndex(index_path, digest, parsed_mapping)
+  return _BuildProguardMappings(parsed_mapping, dex)
+
+
 def ProcessProfile(input_profile, proguard_mapping):
   """Parses an android profile and uses the proguard mapping to (de)obfuscate it
 
@@ -498,12 +664,12 @@ def ObfuscateProfile(nonobfuscated_profile, dex_file, proguard_mapping,
     dex_file: path to the dex file matching the mapping.
     proguard_mapping: a mapping from nonobfuscated to obfuscated symbols used
       in the dex file.
-    dexdump_path: path to the dexdump utility.
+    dexdump_path: path to the dexdump utility, or None to read the dex file
+      in-process.
     output_filename: output filename in which to write the obfuscated profile.
   """
-  dexinfo = ProcessDex(_RunDexDump(dexdump_path, dex_file))
-  _, reverse_mapping = ProcessProguardMapping(
-      _ReadFile(proguard_mapping), dexinfo)
+  dexinfo = _LoadDex(dex_file, dexdump_path)
+  _, reverse_mapping = ProcessProguardMappingFile(proguard_mapping, dexinfo)
   obfuscated_profile = ProcessProfile(
       _ReadFile(nonobfuscated_profile), reverse_mapping)
   obfuscated_profile.WriteToFile(output_filename)
@@ -513,12 +679,13 @@ def main(args):
   parser = argparse.ArgumentParser()
   parser.add_argument(
       '--dexdump-path',
-      required=True,
-      help='Path to dexdump binary.')
+      help='Path to dexdump binary. When omitted, the dex file is read '
+      'in-process.')
   parser.add_argument(
       '--dex-path',
       required=True,
-      help='Path to dex file corresponding to the proguard mapping file.')
+      help='Path to dex file (or .jar/.apk containing dex files) corresponding '
+      'to the proguard mapping file.')
   parser.add_argument(
       '--proguard-mapping-path',
       required=True,
@@ -551,9 +718,9 @@ def main(args):
     log_level = logging.ERROR
   logging.basicConfig(format='%(levelname)s: %(message)s', level=log_level)
 
-  dex = ProcessDex(_RunDexDump(options.dexdump_path, options.dex_path))
-  proguard_mapping, reverse_proguard_mapping = ProcessProguardMapping(
-      _ReadFile(options.proguard_mapping_path), dex)
+  dex = _LoadDex(options.dex_path, options.dexdump_path)
+  proguard_mapping, reverse_proguard_mapping = ProcessProguardMappingFile(
+      options.proguard_mapping_path, dex)
   if options.obfuscate:
     profile = ProcessProfile(
         _ReadFile(options.input_profile_path),
@@ -11,11 +11,13 @@ Can be run from build/android/:
 """
 
 import os
+import struct
 import sys
 import tempfile
 import unittest
 
 import convert_dex_profile as cp
+import mock  # pylint: disable=import-error
 
 sys.path.insert(1, os.path.join(os.path.dirname(__file__), 'gyp'))
 from util import build_utils
@@ -163,6 +165,128 @@ PLorg/chromium/Original;->another()Lorg/chromium/Original;
 HPSLorg/chromium/Original;->getInstance()Lorg/chromium/Original;
 HPLorg/chromium/Original;->initialize()V"""
 
+# The classes and methods of DEX_DUMP_2 as (name, type, line numbers), for
+# building an equivalent dex file with _BuildDex().
+DEX_2_CLASS = 'La;'
+DEX_2_DIRECT_METHODS = [
+    ('<clinit>', ('V', 'Ljava/lang/String;'), [310, 313]),
+    ('<init>', ('V', ), []),
+]
+DEX_2_VIRTUAL_METHODS = [
+    ('a', ('I', 'Ljava/lang/String;'), [2, 3, 8]),
+    ('c', ('I', 'Ljava/lang/Object;'), [8, 9]),
+    ('b', ('La;', ), [1]),
+]
+
+
+def _ULeb128(value):
+  ret = bytearray()
+  while True:
+    byte = value & 0x7f
+    value >>= 7
+    if value:
+      ret.append(byte | 0x80)
+    else:
+      ret.append(byte)
+      return bytes(ret)
+
+
+def _DebugInfo(line_numbers):
+  """Encodes a debug_info_item with a position for each line number."""
+  ret = _ULeb128(line_numbers[0]) + _ULeb128(0)
+  # DBG_SET_PROLOGUE_END and DBG_ADVANCE_PC should be skipped.
+  ret += b'\x07\x01' + _ULeb128(1)
+  line = line_numbers[0]
+  for line_number in line_numbers:
+    delta = line_number - line
+    if delta > 4:
+      # DBG_ADVANCE_LINE, its sleb128 operand fits into a byte for these tests.
+      assert delta < 64
+      ret += bytes([0x02, delta])
+      delta = 0
+    # A special opcode that advances the line by |delta| and the address by 1.
+    ret += bytes([0x0a + (delta + 4) + 15])
+    line = line_number
+  return ret + b'\x00'
+
+
+def _BuildDex(class_name, direct_methods, virtual_methods):
+  """Returns the contents of a minimal dex file with a single class."""
+  all_methods = direct_methods + virtual_methods
+  protos = sorted(set(proto for _, proto, _ in all_methods))
+  types = sorted(set([class_name] + [t for proto in protos for t in proto]))
+  strings = sorted(set(types + [name for name, _, _ in all_methods]))
+
+  header_size = 0x70
+  string_ids_off = header_size
+  type_ids_off = string_ids_off + 4 * len(strings)
+  proto_ids_off = type_ids_off + 4 * len(types)
+  method_ids_off = proto_ids_off + 12 * len(protos)
+  class_defs_off = method_ids_off + 8 * len(all_methods)
+  data = bytearray(b'\x00' * (class_defs_off + 32))
+
+  def append(item, alignment=1):
+    data.extend(b'\x00' * (-len(data) % alignment))
+    offset = len(data)
+    data.extend(item)
+    return offset
+
+  for i, string in enumerate(strings):
+    offset = append(_ULeb128(len(string)) + string.encode('utf-8') + b'\x00')
+    struct.pack_into('<I', data, string_ids_off + 4 * i, offset)
+  for i, descriptor in enumerate(types):
+    struct.pack_into('<I', data, type_ids_off + 4 * i, strings.index(descriptor))
+  type_list_offsets = []
+  for i, (return_type, *params) in enumerate(protos):
+    parameters_off = 0
+    if params:
+      parameters_off = append(
+          struct.pack('<I', len(params)) +
+          b''.join(struct.pack('<H', types.index(p)) for p in params), 4)
+      type_list_offsets.append(parameters_off)
+    struct.pack_into('<III', data, proto_ids_off + 12 * i,
+                     strings.index(return_type), types.index(return_type),
+                     parameters_off)
+  method_ids = sorted((name, proto) for name, proto, _ in all_methods)
+  for i, (name, proto) in enumerate(method_ids):
+    struct.pack_into('<HHI', data, method_ids_off + 8 * i,
+                     types.index(class_name), protos.index(proto),
+                     strings.index(name))
+
+  code_offs = {}
+  for name, proto, line_numbers in all_methods:
+    debug_info_off = append(_DebugInfo(line_numbers)) if line_numbers else 0
+    code_offs[(name, proto)] = append(
+        struct.pack('<HHHHII', 1, 1, 0, 0, debug_info_off, 0), 4)
+
+  class_data = _ULeb128(0) + _ULeb128(0) + _ULeb128(
+      len(direct_methods)) + _ULeb128(len(virtual_methods))
+  for methods in (direct_methods, virtual_methods):
+    method_idx = 0
+    for name, proto, _ in sorted(methods):
+      idx = method_ids.index((name, proto))
+      class_data += _ULeb128(idx - method_idx) + _ULeb128(1) + _ULeb128(
+          code_offs[(name, proto)])
+      method_idx = idx
+  class_data_off = append(class_data)
+  struct.pack_into('<8I', data, class_defs_off, types.index(class_name), 1,
+                   types.index(class_name), 0, 0, 0, class_data_off, 0)
+
+  # Only the type list entry of the map list is used by dex_parser.
+  map_off = append(
+      struct.pack('<IHHII', 1, 0x1001, 0, len(type_list_offsets),
+                  min(type_list_offsets)), 4)
+  data[0:8] = b'dex\n035\x00'
+  # file_size, header_size and endian_tag.
+  struct.pack_into('<III', data, 0x20, len(data), header_size, 0x12345678)
+  struct.pack_into('<I', data, 0x34, map_off)
+  struct.pack_into('<IIIIII', data, 0x38, len(strings), string_ids_off,
+                   len(types), type_ids_off, len(protos), proto_ids_off)
+  struct.pack_into('<IIII', data, 0x58, len(all_methods), method_ids_off, 1,
+                   class_defs_off)
+  return bytes(data)
+
+
 class GenerateProfileTests(unittest.TestCase):
   def testProcessDex(self):
     dex = cp.ProcessDex(DEX_DUMP.splitlines())
@@ -250,6 +374,52 @@ class GenerateProfileTests(unittest.TestCase):
         for a, b in zip(sorted(f), sorted(UNOBFUSCATED_PROFILE.splitlines())):
           self.assertEqual(a.strip(), b.strip())
 
+  def testProcessDexFiles(self):
+    with build_utils.TempDir() as temp_dir:
+      dex_path = os.path.join(temp_dir, 'classes.dex')
+      with open(dex_path, 'wb') as dex_file:
+        dex_file.write(
+            _BuildDex(DEX_2_CLASS, DEX_2_DIRECT_METHODS,
+                      DEX_2_VIRTUAL_METHODS))
+      dex = cp.ProcessDexFiles(cp._ReadDexFiles(dex_path))
+    dex_from_dump = cp.ProcessDex(DEX_DUMP_2.splitlines())
+
+    self.assertEqual(dex_from_dump.keys(), dex.keys())
+    self.assertEqual(dex_from_dump['a']._methods_by_name,
+                     dex['a']._methods_by_name)
+
+  def testProcessProguardMappingFile(self):
+    dex = cp.ProcessDex(DEX_DUMP.splitlines())
+    with build_utils.TempDir() as temp_dir:
+      mapping_path = os.path.join(temp_dir, 'mapping')
+      with open(mapping_path, 'w') as mapping_file:
+        mapping_file.write(PROGUARD_MAPPING)
+      expected_mapping, _ = cp.ProcessProguardMapping(
+          PROGUARD_MAPPING.splitlines(), dex)
+
+      mapping, _ = cp.ProcessProguardMappingFile(mapping_path, dex)
+      self.assertEqual(expected_mapping._method_mapping,
+                       mapping._method_mapping)
+      self.assertEqual(expected_mapping._class_mapping, mapping._class_mapping)
+
+      # The second run uses the index, which is not parsed again.
+      index_path = mapping_path + cp._MAPPING_INDEX_SUFFIX
+      self.assertTrue(os.path.exists(index_path))
+      with mock.patch.object(cp, '_ParseProguardMapping') as parse_mock:
+        mapping, _ = cp.ProcessProguardMappingFile(mapping_path, dex)
+        parse_mock.assert_not_called()
+      self.assertEqual(expected_mapping._method_mapping,
+                       mapping._method_mapping)
+
+      # Changing the mapping invalidates the index.
+      with open(mapping_path, 'w') as mapping_file:
+        mapping_file.write(PROGUARD_MAPPING.replace('another', 'other'))
+      mapping, _ = cp.ProcessProguardMappingFile(mapping_path, dex)
+      self.assertEqual(
+          {cp.Method('other', 'Lorg/chromium/Original;', '',
+                     'Lorg/chromium/Original;')},
+          mapping.GetMethodMapping(cp.Method('b', 'La;', '', 'La;')))
+
   def testObfuscateProfile(self):
     with build_utils.TempDir() as temp_dir:
       # The dex dump is used as the dexfile, by passing /bin/cat as the dexdump
@@ -38,6 +38,8 @@ _BASE_CHART = {
 
 _CHARTJSON_FILENAME = 'results-chart.json'
 _HISTOGRAMS_FILENAME = 'perf_results.json'
+_ENTRY_SIZES_FILENAME = 'entry-sizes.json'
+_MAX_PRINTED_ENTRY_DIFFS = 20
 
 
 def DiffResults(chartjson, base_results, diff_results):
@@ -84,6 +86,44 @@ def AddIntermediateResults(chartjson, base_results, diff_results):
           trace['important'])
 
 
+def DiffEntrySizes(base_entry_sizes, diff_entry_sizes):
+  """Returns the size changes of individual files between two APKs.
+
+  Args:
+    base_entry_sizes: The --entry-sizes-output-file results of the base APK.
+    diff_entry_sizes: The --entry-sizes-output-file results of the diff APK.
+
+  Returns:
+    A list of dicts describing each file whose size changed, largest change
+    first. Sizes of added or removed files are 0 on the missing side.
+  """
+  def flatten(entry_sizes_by_prefix):
+    return {
+        prefix + path: value
+        for prefix, entry_sizes in entry_sizes_by_prefix.items()
+        for path, value in entry_sizes.items()
+    }
+
+  base = flatten(base_entry_sizes)
+  diff = flatten(diff_entry_sizes)
+  ret = []
+  for path in set(base).union(diff):
+    base_group, base_size, base_uncompressed_size = base.get(path, (None, 0, 0))
+    diff_group, diff_size, diff_uncompressed_size = diff.get(path, (None, 0, 0))
+    if (base_size, base_uncompressed_size) == (diff_size,
+                                               diff_uncompressed_size):
+      continue
+    ret.append({
+        'path': path,
+        'group': diff_group or base_group,
+        'size': diff_size - base_size,
+        'uncompressed_size': diff_uncompressed_size - base_uncompressed_size,
+    })
+  ret.sort(key=lambda d: (-abs(d['size']), -abs(d['uncompressed_size']),
+                          d['path']))
+  return ret
+
+
 def _CreateArgparser():
   def chromium_path(arg):
     if arg.startswith('//'):
@@ -92,7 +132,8 @@ def _CreateArgparser():
 
   argparser = argparse.ArgumentParser(
       description='Diff resource sizes of two APKs. Arguments not listed here '
-                  'will be passed on to both invocations of resource_sizes.py.')
+                  '(e.g. --cache-dir) will be passed on to both invocations '
+                  'of resource_sizes.py.')
   argparser.add_argument('--chromium-output-directory-base',
                          dest='out_dir_base',
                          type=chromium_path,
@@ -116,6 +157,11 @@ def _CreateArgparser():
                          action='store_true',
                          help='Include the results from the resource_sizes.py '
                               'runs in the chartjson output.')
+  argparser.add_argument('--entry-diffs-output',
+                         type=chromium_path,
+                         help='Path to write the size changes of individual '
+                              'files to, as JSON. The largest changes are '
+                              'also printed.')
   argparser.add_argument('--output-dir',
                          default='.',
                          type=chromium_path,
@@ -149,6 +195,11 @@ def main():
                    + unknown_args)
 
     base_args = shared_args + ['--output-dir', base_dir, args.base_apk]
+    if args.entry_diffs_output:
+      base_args += [
+          '--entry-sizes-output-file',
+          os.path.join(base_dir, _ENTRY_SIZES_FILENAME)
+      ]
     if args.out_dir_base:
       base_args += ['--chromium-output-directory', args.out_dir_base]
     try:
@@ -158,6 +209,11 @@ def main():
       raise
 
     diff_args = shared_args + ['--output-dir', diff_dir, args.diff_apk]
+    if args.entry_diffs_output:
+      diff_args += [
+          '--entry-sizes-output-file',
+          os.path.join(diff_dir, _ENTRY_SIZES_FILENAME)
+      ]
     if args.out_dir_diff:
       diff_args += ['--chromium-output-directory', args.out_dir_diff]
     try:
@@ -175,6 +231,20 @@ def main():
     if args.include_intermediate_results:
       AddIntermediateResults(chartjson, base_results, diff_results)
 
+    if args.entry_diffs_output:
+      with open(os.path.join(base_dir, _ENTRY_SIZES_FILENAME)) as f:
+        base_entry_sizes = json.load(f)
+      with open(os.path.join(diff_dir, _ENTRY_SIZES_FILENAME)) as f:
+        diff_entry_sizes = json.load(f)
+      entry_diffs = DiffEntrySizes(base_entry_sizes, diff_entry_sizes)
+      with open(args.entry_diffs_output, 'w') as f:
+        json.dump(entry_diffs, f, indent=2)
+      print('Largest changes of individual files (zipped / uncompressed):')
+      for entry_diff in entry_diffs[:_MAX_PRINTED_ENTRY_DIFFS]:
+        print('  {:+10} {:+10}  {}'.format(entry_diff['size'],
+                                           entry_diff['uncompressed_size'],
+                                           entry_diff['path']))
+
     if args.output_format:
       chartjson_path = os.path.join(os.path.abspath(args.output_dir),
                                     _CHARTJSON_FILENAME)
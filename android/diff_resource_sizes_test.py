@@ -0,0 +1,71 @@
+#!/usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+import diff_resource_sizes
+
+
+class DiffEntrySizesTest(unittest.TestCase):
+
+  def testDiffEntrySizes(self):
+    base = {
+        'Chrome_': {
+            'classes.dex': ['Dex', 100, 200],
+            'res/a.png': ['Other', 10, 10],
+            'res/removed.png': ['Other', 30, 30],
+        },
+        'WebView_': {
+            'classes.dex': ['Dex', 50, 100],
+        },
+    }
+    diff = {
+        'Chrome_': {
+            'classes.dex': ['Dex', 120, 260],
+            'res/a.png': ['Other', 10, 10],
+            'res/added.png': ['Other', 5, 8],
+        },
+        'WebView_': {
+            'classes.dex': ['Dex', 50, 90],
+        },
+    }
+    # Ordered by the largest change first. res/a.png is unchanged, and so is
+    # omitted.
+    self.assertEqual([
+        {
+            'path': 'Chrome_res/removed.png',
+            'group': 'Other',
+            'size': -30,
+            'uncompressed_size': -30,
+        },
+        {
+            'path': 'Chrome_classes.dex',
+            'group': 'Dex',
+            'size': 20,
+            'uncompressed_size': 60,
+        },
+        {
+            'path': 'Chrome_res/added.png',
+            'group': 'Other',
+            'size': 5,
+            'uncompressed_size': 8,
+        },
+        {
+            'path': 'WebView_classes.dex',
+            'group': 'Dex',
+            'size': 0,
+            'uncompressed_size': -10,
+        },
+    ], diff_resource_sizes.DiffEntrySizes(base, diff))
+
+  def testDiffEntrySizes_identical(self):
+    entry_sizes = {'': {'classes.dex': ['Dex', 100, 200]}}
+    self.assertEqual([],
+                     diff_resource_sizes.DiffEntrySizes(entry_sizes,
+                                                        entry_sizes))
+
+
+if __name__ == '__main__':
+  unittest.main()
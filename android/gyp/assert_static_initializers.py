@@ -12,33 +12,21 @@ import os
 import re
 import subprocess
 import sys
-import tempfile
 import zipfile
 
 from util import build_utils
+from util import elf_reader
 
 _DUMP_STATIC_INITIALIZERS_PATH = os.path.join(build_utils.DIR_SOURCE_ROOT,
                                               'tools', 'linux',
                                               'dump-static-initializers.py')
 
 
-def _RunReadelf(so_path, options, tool_prefix=''):
-  return subprocess.check_output(
-      [tool_prefix + 'readobj', '--elf-output-style=GNU'] + options +
-      [so_path]).decode('utf8')
-
-
-def _ParseLibBuildId(so_path, tool_prefix):
-  """Returns the Build ID of the given native library."""
-  stdout = _RunReadelf(so_path, ['-n'], tool_prefix)
-  match = re.search(r'Build ID: (\w+)', stdout)
-  return match.group(1) if match else None
-
-
-def _VerifyLibBuildIdsMatch(tool_prefix, *so_files):
-  if len(set(_ParseLibBuildId(f, tool_prefix) for f in so_files)) > 1:
-    raise Exception('Found differing build ids in output directory and apk. '
-                    'Your output directory is likely stale.')
+def _VerifyLibBuildIdsMatch(apk_so_build_id, so_path):
+  with elf_reader.ElfFile(so_path) as elf:
+    if elf.GetBuildId() != apk_so_build_id:
+      raise Exception('Found differing build ids in output directory and apk. '
+                      'Your output directory is likely stale.')
 
 
 def _GetStaticInitializers(so_path, tool_prefix):
@@ -49,52 +37,31 @@ def _GetStaticInitializers(so_path, tool_prefix):
   return output.splitlines()[:-1], int(summary.group(1))
 
 
-def _PrintDumpSIsCount(apk_so_name, unzipped_so, out_dir, tool_prefix):
+def _PrintDumpSIsCount(apk_so_name, apk_so_build_id, out_dir, tool_prefix):
   lib_name = os.path.basename(apk_so_name).replace('crazy.', '')
   so_with_symbols_path = os.path.join(out_dir, 'lib.unstripped', lib_name)
   if not os.path.exists(so_with_symbols_path):
     raise Exception('Unstripped .so not found. Looked here: %s' %
                     so_with_symbols_path)
-  _VerifyLibBuildIdsMatch(tool_prefix, unzipped_so, so_with_symbols_path)
+  _VerifyLibBuildIdsMatch(apk_so_build_id, so_with_symbols_path)
   sis, _ = _GetStaticInitializers(so_with_symbols_path, tool_prefix)
   for si in sis:
     print(si)
 
 
-# Mostly copied from //infra/scripts/legacy/scripts/slave/chromium/sizes.py.
-def _ReadInitArray(so_path, tool_prefix, expect_no_initializers):
-  stdout = _RunReadelf(so_path, ['-SW'], tool_prefix)
-  # Matches: .init_array INIT_ARRAY 000000000516add0 5169dd0 000010 00 WA 0 0 8
-  match = re.search(r'\.init_array.*$', stdout, re.MULTILINE)
+def _CountStaticInitializers(elf, so_name, expect_no_initializers):
+  # Find the number of files with global static initializers.
+  # NOTE: this is very implementation-specific and makes assumptions
+  # about how compiler and linker implement global static initializers.
+  init_array_count = elf.CountInitArrayEntries()
   if expect_no_initializers:
-    if match:
+    if init_array_count is not None:
       raise Exception(
-          'Expected no initializers for %s, yet some were found' % so_path)
+          'Expected no initializers for %s, yet some were found' % so_name)
     return 0
-  if not match:
-    raise Exception('Did not find section: .init_array in {}:\n{}'.format(
-        so_path, stdout))
-  size_str = re.split(r'\W+', match.group(0))[5]
-  return int(size_str, 16)
-
-
-def _CountStaticInitializers(so_path, tool_prefix, expect_no_initializers):
-  # Find the number of files with at least one static initializer.
-  # First determine if we're 32 or 64 bit
-  stdout = _RunReadelf(so_path, ['-h'], tool_prefix)
-  elf_class_line = re.search('Class:.*$', stdout, re.MULTILINE).group(0)
-  elf_class = re.split(r'\W+', elf_class_line)[1]
-  if elf_class == 'ELF32':
-    word_size = 4
-  else:
-    word_size = 8
-
-  # Then find the number of files with global static initializers.
-  # NOTE: this is very implementation-specific and makes assumptions
-  # about how compiler and linker implement global static initializers.
-  init_array_size = _ReadInitArray(so_path, tool_prefix, expect_no_initializers)
-  assert init_array_size % word_size == 0
-  return init_array_size // word_size
+  if init_array_count is None:
+    raise Exception('Did not find section: .init_array in ' + so_name)
+  return init_array_count
 
 
 def _AnalyzeStaticInitializers(apk_or_aab, tool_prefix, dump_sis, out_dir,
@@ -123,16 +90,16 @@ def _AnalyzeStaticInitializers(apk_or_aab, tool_prefix, dump_sis, out_dir,
     for f in files_to_check:
       lib_basename = os.path.basename(f.filename)
       expect_no_initializers = lib_basename in no_initializers_libs
-      with tempfile.NamedTemporaryFile(prefix=lib_basename) as temp:
-        temp.write(z.read(f))
-        temp.flush()
-        si_count += _CountStaticInitializers(temp.name, tool_prefix,
+      # Stored libraries are read in place, without extracting them.
+      with elf_reader.OpenZipEntry(z, f) as elf:
+        si_count += _CountStaticInitializers(elf, f.filename,
                                              expect_no_initializers)
-        if dump_sis:
-          # Print count and list of SIs reported by dump-static-initializers.py.
-          # Doesn't work well on all archs (particularly arm), which is why
-          # the readelf method is used for tracking SI counts.
-          _PrintDumpSIsCount(f.filename, temp.name, out_dir, tool_prefix)
+        build_id = elf.GetBuildId()
+      if dump_sis:
+        # Print count and list of SIs reported by dump-static-initializers.py.
+        # Doesn't work well on all archs (particularly arm), which is why
+        # the .init_array size is used for tracking SI counts.
+        _PrintDumpSIsCount(f.filename, build_id, out_dir, tool_prefix)
   return si_count
 
 
@@ -6,6 +6,7 @@
 
 import abc
 import argparse
+import array
 import collections
 import enum
 import json
@@ -18,6 +19,8 @@ from typing import (Dict, Iterable, List, NamedTuple, Sequence, TextIO, Tuple,
                     Union)
 
 from util import build_utils
+from util import dwarf_cfi
+from util import elf_reader
 
 _STACK_CFI_INIT_REGEX = re.compile(
     r'^STACK CFI INIT ([0-9a-f]+) ([0-9a-f]+) (.+)$')
@@ -495,6 +498,12 @@ def EncodeUnwindInstructionTable(complete_instruction_sequences: Iterable[bytes]
   ref_counts: Dict[bytes, int] = collections.defaultdict(int)
   for sequence in complete_instruction_sequences:
     ref_counts[sequence] += 1
+  return _EncodeUnwindInstructionTableFromRefCounts(ref_counts)
+
+
+def _EncodeUnwindInstructionTableFromRefCounts(
+    ref_counts: Dict[bytes, int]) -> Tuple[bytes, Dict[bytes, int]]:
+  """Implements `EncodeUnwindInstructionTable` given each sequence's count."""
 
   def ComputeScore(sequence):
     """ Score for each sequence is computed as  ref_count / size_of_sequence.
@@ -1017,6 +1026,170 @@ def GenerateUnwindTables(
           unwind_instruction_table)
 
 
+class UnwindTableEncoder:
+  """Encodes function unwinds into unwind tables as they are generated.
+
+  Produces the same tables as
+  `GenerateUnwindTables(EncodeFunctionUnwinds(function_unwinds, ...))`, but
+  without holding every function's unwind records in memory: each function is
+  encoded as soon as it is added, and only its address, size and the id of its
+  (deduplicated) encoded address unwind sequence are kept, in arrays.
+
+  Usage:
+    encoder = UnwindTableEncoder(text_section_start_address)
+    for function_unwind in function_unwinds:
+      encoder.AddFunctionUnwind(function_unwind)
+    (page_table, function_table, function_offset_table,
+     unwind_instruction_table) = encoder.EncodeTables()
+  """
+
+  def __init__(self, text_section_start_address: int):
+    self._text_section_start_address = text_section_start_address
+    self._addresses = array.array('Q')
+    self._sizes = array.array('Q')
+    self._sequence_ids = array.array('L')
+    # Maps complete instruction sequences to their ids, and back.
+    self._instruction_sequence_ids: Dict[bytes, int] = {}
+    self._instruction_sequences: List[bytes] = []
+    # Maps encoded address unwind sequences, packed as (address_offset,
+    # instruction sequence id) pairs, to their ids, and back.
+    self._address_unwind_sequence_ids: Dict[bytes, int] = {}
+    self._address_unwind_sequences: List[array.array] = []
+    self._trivial_unwind_id = self._InternAddressUnwindSequence(TRIVIAL_UNWIND)
+    self._refuse_to_unwind_id = self._InternAddressUnwindSequence(
+        REFUSE_TO_UNWIND)
+
+  def _InternAddressUnwindSequence(
+      self, encoded_address_unwinds: Tuple[EncodedAddressUnwind, ...]) -> int:
+    pairs = array.array('L')
+    for address_offset, sequence in encoded_address_unwinds:
+      sequence_id = self._instruction_sequence_ids.setdefault(
+          sequence, len(self._instruction_sequences))
+      if sequence_id == len(self._instruction_sequences):
+        self._instruction_sequences.append(sequence)
+      pairs.append(address_offset)
+      pairs.append(sequence_id)
+
+    key = pairs.tobytes()
+    unwind_sequence_id = self._address_unwind_sequence_ids.setdefault(
+        key, len(self._address_unwind_sequences))
+    if unwind_sequence_id == len(self._address_unwind_sequences):
+      self._address_unwind_sequences.append(pairs)
+    return unwind_sequence_id
+
+  def AddFunctionUnwind(self, function_unwind: FunctionUnwind) -> None:
+    self._addresses.append(function_unwind.address)
+    self._sizes.append(function_unwind.size)
+    self._sequence_ids.append(
+        self._InternAddressUnwindSequence(
+            EncodeAddressUnwinds(function_unwind.address_unwinds)))
+
+  def _IterEncodedFunctionUnwinds(self) -> Iterable[Tuple[int, int, int]]:
+    """Mirrors `EncodeFunctionUnwinds`.
+
+    Returns:
+      An iterable over (page_number, page_offset, address unwind sequence id)
+      tuples, ordered by ascending address.
+    """
+    text_section_start_address = self._text_section_start_address
+    addresses = self._addresses
+    assert addresses, 'No function unwinds.'
+    # Sorting is stable, so ties keep the order in which they were added, as in
+    # `EncodeFunctionUnwinds`.
+    order = sorted(range(len(addresses)), key=addresses.__getitem__)
+
+    if addresses[order[0]] > text_section_start_address:
+      yield 0, 0, self._refuse_to_unwind_id
+
+    prev_func_end_address = addresses[order[0]]
+    gaps = 0
+    for i in order:
+      address = addresses[i]
+      assert prev_func_end_address <= address, (
+          'Detected overlap between functions.')
+
+      if prev_func_end_address < address:
+        gaps += 1
+        offset = prev_func_end_address - text_section_start_address
+        yield offset >> 17, (offset >> 1) & 0xffff, self._trivial_unwind_id
+
+      offset = address - text_section_start_address
+      yield offset >> 17, (offset >> 1) & 0xffff, self._sequence_ids[i]
+
+      prev_func_end_address = address + self._sizes[i]
+
+    offset = prev_func_end_address - text_section_start_address
+    if (offset >> 1) & 0xffff != 0:
+      yield offset >> 17, (offset >> 1) & 0xffff, self._refuse_to_unwind_id
+
+    logging.info('%d/%d gaps between functions filled with trivial unwind.',
+                 gaps, len(addresses))
+
+  def EncodeTables(self) -> Tuple[bytes, bytes, bytes, bytes]:
+    """Generates all unwind tables as bytes.
+
+    Returns:
+      A tuple containing:
+      - The page table as bytes.
+      - The function table as bytes.
+      - The function offset table as bytes.
+      - The unwind instruction table as bytes.
+    """
+    # The unwind instruction table is ordered by how often each complete
+    # instruction sequence is referenced, so count references first.
+    use_counts = array.array('L', [0]) * len(self._address_unwind_sequences)
+    for _, _, unwind_sequence_id in self._IterEncodedFunctionUnwinds():
+      use_counts[unwind_sequence_id] += 1
+    ref_counts: Dict[bytes, int] = collections.defaultdict(int)
+    for pairs, use_count in zip(self._address_unwind_sequences, use_counts):
+      if use_count:
+        for sequence_id in pairs[1::2]:
+          ref_counts[self._instruction_sequences[sequence_id]] += use_count
+    unwind_instruction_table, unwind_instruction_table_offsets = (
+        _EncodeUnwindInstructionTableFromRefCounts(ref_counts))
+    instruction_table_offsets = [
+        unwind_instruction_table_offsets.get(sequence)
+        for sequence in self._instruction_sequences
+    ]
+
+    function_offset_table = bytearray()
+    # Function offset table offset of each address unwind sequence id, or -1.
+    function_offset_table_offsets = (array.array('l', [-1]) *
+                                     len(self._address_unwind_sequences))
+    raw_page_table = array.array('L')
+    function_table = bytearray()
+    last_page_offset = 0
+    for page_number, page_offset, unwind_sequence_id in (
+        self._IterEncodedFunctionUnwinds()):
+      function_offset_table_offset = function_offset_table_offsets[
+          unwind_sequence_id]
+      if function_offset_table_offset == -1:
+        function_offset_table_offset = len(function_offset_table)
+        function_offset_table_offsets[unwind_sequence_id] = (
+            function_offset_table_offset)
+        pairs = self._address_unwind_sequences[unwind_sequence_id]
+        for j in range(0, len(pairs), 2):
+          function_offset_table += (
+              Uleb128Encode(pairs[j] >> 1) +
+              Uleb128Encode(instruction_table_offsets[pairs[j + 1]]))
+
+      # Entries arrive ordered by page, then page offset, so the page table can
+      # be filled in as in `EncodePageTableAndFunctionTable`.
+      if page_number > len(raw_page_table) - 1:
+        raw_page_table.extend([len(function_table) // 4] *
+                              (page_number - len(raw_page_table) + 1))
+      else:
+        assert page_number == len(raw_page_table) - 1
+        assert page_offset >= last_page_offset
+      last_page_offset = page_offset
+      function_table += struct.pack('HH', page_offset,
+                                    function_offset_table_offset)
+
+    page_table = struct.pack(f'{len(raw_page_table)}I', *raw_page_table)
+    return (page_table, bytes(function_table), bytes(function_offset_table),
+            unwind_instruction_table)
+
+
 def ReadTextSectionStartAddress(readobj_path: str, libchrome_path: str) -> int:
   """Reads the .text section start address of libchrome ELF.
 
@@ -1040,6 +1213,16 @@ def ReadTextSectionStartAddress(readobj_path: str, libchrome_path: str) -> int:
               if s['Section']['Name']['Value'] == '.text')
 
 
+def _GenerateUnwindsForChunk(stack_cfis: List[dwarf_cfi.StackCfi]
+                             ) -> List[FunctionUnwind]:
+  """Generates the function unwinds of a chunk of functions read in-process."""
+  function_cfis = (FunctionCfi(
+      stack_cfi.size,
+      tuple(AddressCfi(address, rules) for address, rules in stack_cfi.rows))
+                   for stack_cfi in stack_cfis)
+  return list(GenerateUnwinds(function_cfis, parsers=ALL_PARSERS))
+
+
 def main():
   build_utils.InitLogging('CREATE_UNWIND_TABLE_DEBUG')
   parser = argparse.ArgumentParser(description=__doc__)
@@ -1052,34 +1235,48 @@ def main():
                       required=True,
                       metavar='FILE')
   parser.add_argument('--dump_syms_path',
-                      required=True,
-                      help='The path of the dump_syms binary.',
+                      help='The path of the dump_syms binary. If given, CFI '
+                      'is read from its output rather than in-process.',
                       metavar='FILE')
   parser.add_argument('--readobj_path',
-                      required=True,
-                      help='The path of the llvm-readobj binary.',
+                      help='The path of the llvm-readobj binary. Required '
+                      'with --dump_syms_path.',
                       metavar='FILE')
 
   args = parser.parse_args()
-  proc = subprocess.Popen(['./' + args.dump_syms_path, args.input_path, '-v'],
-                          stdout=subprocess.PIPE,
-                          encoding='ascii')
-
-  function_cfis = ReadFunctionCfi(proc.stdout)
-  function_unwinds = GenerateUnwinds(function_cfis, parsers=ALL_PARSERS)
-  encoded_function_unwinds = EncodeFunctionUnwinds(
-      function_unwinds,
-      ReadTextSectionStartAddress(args.readobj_path, args.input_path))
+  if args.dump_syms_path:
+    if not args.readobj_path:
+      parser.error('--readobj_path is required with --dump_syms_path.')
+    proc = subprocess.Popen(['./' + args.dump_syms_path, args.input_path, '-v'],
+                            stdout=subprocess.PIPE,
+                            encoding='ascii')
+
+    function_cfis = ReadFunctionCfi(proc.stdout)
+    function_unwinds = GenerateUnwinds(function_cfis, parsers=ALL_PARSERS)
+    encoder = UnwindTableEncoder(
+        ReadTextSectionStartAddress(args.readobj_path, args.input_path))
+    for function_unwind in function_unwinds:
+      encoder.AddFunctionUnwind(function_unwind)
+
+    if proc.wait():
+      logging.critical('dump_syms exited with return code %d', proc.returncode)
+      sys.exit(proc.returncode)
+  else:
+    with elf_reader.ElfFile(args.input_path) as elf:
+      encoder = UnwindTableEncoder(elf.GetSection('.text').address)
+    # Chunks are returned in address order, so the tables do not depend on
+    # how the work was split.
+    for function_unwinds in dwarf_cfi.MapStackCfi(args.input_path,
+                                                  _GenerateUnwindsForChunk):
+      for function_unwind in function_unwinds:
+        encoder.AddFunctionUnwind(function_unwind)
+
   (page_table, function_table, function_offset_table,
-   unwind_instruction_table) = GenerateUnwindTables(encoded_function_unwinds)
+   unwind_instruction_table) = encoder.EncodeTables()
   unwind_info: bytes = EncodeUnwindInfo(page_table, function_table,
                                         function_offset_table,
                                         unwind_instruction_table)
 
-  if proc.wait():
-    logging.critical('dump_syms exited with return code %d', proc.returncode)
-    sys.exit(proc.returncode)
-
   with open(args.output_path, 'wb') as f:
     f.write(unwind_info)
 
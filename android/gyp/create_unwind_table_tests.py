@@ -24,7 +24,7 @@ from create_unwind_table import (
     EncodeUnwindInstructionTable, GenerateUnwinds, GenerateUnwindTables,
     NullParser, ParseAddressCfi, PushOrSubSpParser, ReadFunctionCfi,
     REFUSE_TO_UNWIND, StoreSpParser, TRIVIAL_UNWIND, Uleb128Encode,
-    UnwindInstructionsParser, UnwindType, VPushParser)
+    UnwindInstructionsParser, UnwindTableEncoder, UnwindType, VPushParser)
 
 
 class _TestReadFunctionCfi(unittest.TestCase):
@@ -1180,3 +1180,45 @@ class _TestGenerateUnwindTables(unittest.TestCase):
 
     self.assertEqual(4 * 4, len(page_table))
     self.assertEqual((0, 2, 3, 3), struct.unpack('4I', page_table))
+
+
+class _TestUnwindTableEncoder(unittest.TestCase):
+  def _AssertSameTables(self, function_unwinds, text_section_start_address):
+    encoder = UnwindTableEncoder(text_section_start_address)
+    for function_unwind in function_unwinds:
+      encoder.AddFunctionUnwind(function_unwind)
+    self.assertEqual(
+        GenerateUnwindTables(
+            EncodeFunctionUnwinds(function_unwinds,
+                                  text_section_start_address)),
+        encoder.EncodeTables())
+
+  def testMatchesGenerateUnwindTables(self):
+    return_to_lr = AddressUnwind(0, UnwindType.RETURN_TO_LR, 0, ())
+    push = AddressUnwind(2, UnwindType.UPDATE_SP_AND_OR_POP_REGISTERS, 0,
+                         (4, 14))
+    sub_sp = AddressUnwind(4, UnwindType.UPDATE_SP_AND_OR_POP_REGISTERS, 8, ())
+    no_action = AddressUnwind(6, UnwindType.NO_ACTION, 0, ())
+    restore_sp = AddressUnwind(8, UnwindType.RESTORE_SP_FROM_REGISTER, 4,
+                               (7, ))
+    function_unwinds = [
+        # Out of order, with gaps, duplicates, a zero-size function and
+        # functions spanning pages.
+        FunctionUnwind(0x1100, 0x20, (return_to_lr, push, sub_sp)),
+        FunctionUnwind(0x1000, 0x40, (return_to_lr, push)),
+        FunctionUnwind(0x1040, 0, (return_to_lr, )),
+        FunctionUnwind(0x1040, 0x10, (return_to_lr, push)),
+        FunctionUnwind(0x1200, 3 * PAGE_SIZE,
+                       (return_to_lr, push, no_action, restore_sp)),
+        FunctionUnwind(0x1200 + 3 * PAGE_SIZE, 0x80,
+                       (return_to_lr, no_action)),
+        FunctionUnwind(0x1400 + 3 * PAGE_SIZE, 0x100, (return_to_lr, )),
+    ]
+    self._AssertSameTables(function_unwinds, 0x1000)
+    self._AssertSameTables(function_unwinds, 0x800)
+
+  def testFunctionEndsAtPageBoundary(self):
+    self._AssertSameTables([
+        FunctionUnwind(0, PAGE_SIZE,
+                       (AddressUnwind(0, UnwindType.RETURN_TO_LR, 0, ()), )),
+    ], 0)
@@ -66,6 +66,8 @@ import subprocess
 import sys
 import tempfile
 
+from util import dwarf_cfi
+
 
 _CFA_REG = '.cfa'
 _RA_REG = '.ra'
@@ -255,6 +257,14 @@ def _WriteCfiData(cfi_data, out_file):
     _Write2Bytes(out_file, data)
 
 
+def _FormatStackCfiChunk(stack_cfis):
+  """Returns dump_syms' STACK CFI lines for a chunk of functions, as bytes."""
+  return [
+      line.encode('utf8') for stack_cfi in stack_cfis
+      for line in dwarf_cfi.FormatStackCfi(stack_cfi)
+  ]
+
+
 def main():
   parser = argparse.ArgumentParser()
   parser.add_argument(
@@ -264,17 +274,25 @@ def main():
       '--output_path', required=True,
       help='The path of the output file')
   parser.add_argument(
-      '--dump_syms_path', required=True,
-      help='The path of the dump_syms binary')
+      '--dump_syms_path',
+      help='The path of the dump_syms binary. If given, CFI is read from its '
+      'output rather than in-process.')
 
   args = parser.parse_args()
-  cmd = ['./' + args.dump_syms_path, args.input_path, '-v']
-  proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-  cfi_data = _GetAllCfiRows(proc.stdout)
-  if proc.wait():
-    sys.stderr.write('dump_syms exited with code {} after {} symbols\n'.format(
-        proc.returncode, len(cfi_data)))
-    sys.exit(proc.returncode)
+  if args.dump_syms_path:
+    cmd = ['./' + args.dump_syms_path, args.input_path, '-v']
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    cfi_data = _GetAllCfiRows(proc.stdout)
+    if proc.wait():
+      sys.stderr.write(
+          'dump_syms exited with code {} after {} symbols\n'.format(
+              proc.returncode, len(cfi_data)))
+      sys.exit(proc.returncode)
+  else:
+    cfi_data = _GetAllCfiRows(
+        line for lines in dwarf_cfi.MapStackCfi(args.input_path,
+                                                _FormatStackCfiChunk)
+        for line in lines)
   with open(args.output_path, 'wb') as out_file:
     _WriteCfiData(cfi_data, out_file)
 
@@ -0,0 +1,211 @@
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Helpers to measure and reduce the startup overhead of python actions.
+
+Most actions spend more time starting up than doing work, so it adds up across
+the thousands of actions of a build. To record a trace of all of them:
+  rm -f /tmp/actions.json
+  ANDROID_ACTION_TRACE_FILE=/tmp/actions.json autoninja -C out/Debug
+and then load the file in chrome://tracing or https://ui.perfetto.dev.
+
+For every action that imports build_utils, the trace shows:
+  * The wall time of the process, from its creation until it exits.
+  * "startup": Time until build_utils was imported. This is interpreter startup
+    plus whatever the script imported before build_utils.
+  * Each subsequent import that took at least 1ms, nested within the import
+    that triggered it.
+"""
+
+import atexit
+import builtins
+import os
+import sys
+import time
+import _thread
+
+_TRACE_FILE_ENV = 'ANDROID_ACTION_TRACE_FILE'
+
+# Imports faster than this are left out of the trace to keep it small.
+_MIN_IMPORT_DURATION = 0.001
+
+_profiler = None
+
+
+def LazyImport(name):
+  """Returns the module |name|, which is executed only once it is first used.
+
+  For modules that are slow to import and needed by only some code paths.
+  Modules that are already imported are returned as-is. print_python_deps.py
+  lists lazy modules without loading them when computing depfiles, and follows
+  LazyImport() calls with constant names when writing .pydeps files.
+
+  importlib.util.LazyLoader is not thread-safe before Python 3.12: threads that
+  first use the module concurrently can see it half loaded. Only use this for
+  modules that are not first used from several threads at once.
+
+  Args:
+    name: Absolute name of the module. E.g. "proto.Resources_pb2".
+
+  Raises:
+    ModuleNotFoundError: If |name| does not exist.
+  """
+  module = sys.modules.get(name)
+  if module is not None:
+    return module
+  import importlib.util
+  spec = importlib.util.find_spec(name)
+  if spec is None:
+    raise ModuleNotFoundError('No module named %r' % name, name=name)
+  spec.loader = importlib.util.LazyLoader(spec.loader)
+  module = importlib.util.module_from_spec(spec)
+  sys.modules[name] = module
+  spec.loader.exec_module(module)
+  parent_name, _, child_name = name.rpartition('.')
+  if parent_name:
+    setattr(sys.modules[parent_name], child_name, module)
+  return module
+
+
+def _GetProcessStartTime():
+  """Returns when this process was created, as a time.time(), or None."""
+  try:
+    with open('/proc/self/stat') as f:
+      # The command name is in parentheses and can contain spaces.
+      fields = f.read().rsplit(')', 1)[1].split()
+    with open('/proc/uptime') as f:
+      uptime = float(f.read().split()[0])
+    # "starttime" is the 22nd field, in clock ticks since boot.
+    start_ticks = int(fields[19])
+  except (OSError, IndexError, ValueError):
+    return None
+  return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+
+
+def _AppendToTrace(path, events):
+  """Appends |events| to a JSON Array Format trace, creating it if needed.
+
+  The closing "]" is optional in this format, which allows concurrent actions
+  to each append with a single write.
+  """
+  import json
+  data = ''.join(json.dumps(e, separators=(',', ':')) + ',\n'
+                 for e in events).encode('utf-8')
+  if not os.path.exists(path):
+    # Publishes the file along with its opening "[" so that concurrent writers
+    # never append before it.
+    import tempfile
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        f.write(b'[\n' + data)
+      try:
+        os.link(tmp_path, path)
+        return
+      except FileExistsError:
+        pass
+    finally:
+      os.unlink(tmp_path)
+  fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+  try:
+    os.write(fd, data)
+  finally:
+    os.close(fd)
+
+
+class _Profiler:
+  """Times imports of the main thread, and writes a trace on exit."""
+
+  def __init__(self, trace_path):
+    self._trace_path = trace_path
+    self._pid = os.getpid()
+    self._thread_id = _thread.get_ident()
+    self._start_time = time.time()
+    self._process_start_time = _GetProcessStartTime() or self._start_time
+    self._original_import = builtins.__import__
+    self._imports = []
+    self._import_depth = 0
+    self._import_time = 0
+
+  def _TimedImport(self, name, *args, **kwargs):
+    if _thread.get_ident() != self._thread_id:
+      return self._original_import(name, *args, **kwargs)
+    label = name
+    if not label:
+      # Relative imports of the form "from . import foo".
+      fromlist = args[2] if len(args) > 2 else kwargs.get('fromlist')
+      label = ', '.join(fromlist or ())
+    self._import_depth += 1
+    start = time.time()
+    try:
+      return self._original_import(name, *args, **kwargs)
+    finally:
+      duration = time.time() - start
+      self._import_depth -= 1
+      if self._import_depth == 0:
+        self._import_time += duration
+      if duration >= _MIN_IMPORT_DURATION:
+        self._imports.append((label, start, duration))
+
+  def Start(self):
+    builtins.__import__ = self._TimedImport
+    atexit.register(self._OnExit)
+
+  def _OnExit(self):
+    builtins.__import__ = self._original_import
+    # Do not write for fork'ed processes.
+    if os.getpid() != self._pid:
+      return
+    end_time = time.time()
+    pid = self._pid
+
+    def event(name, start, duration, **kwargs):
+      ret = {
+          'name': name,
+          'ph': 'X',
+          'pid': pid,
+          'tid': pid,
+          'ts': int(start * 1e6),
+          'dur': int(duration * 1e6),
+      }
+      ret.update(kwargs)
+      return ret
+
+    script_name = os.path.basename(sys.argv[0])
+    startup_time = self._start_time - self._process_start_time
+    events = [
+        {
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': pid,
+            'args': {
+                'name': script_name
+            },
+        },
+        event(script_name,
+              self._process_start_time,
+              end_time - self._process_start_time,
+              cat='action',
+              args={
+                  'startup_ms': round(startup_time * 1000, 1),
+                  'import_ms': round(self._import_time * 1000, 1),
+              }),
+        event('startup', self._process_start_time, startup_time,
+              cat='startup'),
+    ]
+    events.extend(
+        event('import ' + name, start, duration, cat='import')
+        for name, start, duration in self._imports)
+    try:
+      _AppendToTrace(self._trace_path, events)
+    except OSError as e:
+      sys.stderr.write('Failed to write %s: %s\n' % (self._trace_path, e))
+
+
+def MaybeStartProfiling():
+  """Starts recording a trace if ANDROID_ACTION_TRACE_FILE is set."""
+  global _profiler
+  trace_path = os.environ.get(_TRACE_FILE_ENV)
+  if trace_path and not _profiler:
+    _profiler = _Profiler(os.path.abspath(trace_path))
+    _profiler.Start()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+_GYP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, _GYP_DIR)
+from util import action_startup
+
+sys.path.insert(1, os.path.join(_GYP_DIR, os.pardir, os.pardir))
+import print_python_deps
+
+_SCRIPT = """
+import sys
+sys.path.insert(0, {gyp_dir!r})
+from util import build_utils
+import {module}
+"""
+
+
+class ActionStartupTest(unittest.TestCase):
+  def setUp(self):
+    self._tmp_dir = tempfile.TemporaryDirectory()
+    self._module_names = []
+    sys.path.insert(0, self._tmp_dir.name)
+
+  def tearDown(self):
+    for name in self._module_names:
+      sys.modules.pop(name, None)
+    sys.path.remove(self._tmp_dir.name)
+    self._tmp_dir.cleanup()
+
+  def _WriteModule(self, name, source):
+    self._module_names.append(name)
+    with open(os.path.join(self._tmp_dir.name, name + '.py'), 'w') as f:
+      f.write(source)
+
+  def testLazyImport(self):
+    self._WriteModule('lazy_import_test_module', 'VALUE = 1\n')
+    module = action_startup.LazyImport('lazy_import_test_module')
+    self.assertIs(module, sys.modules['lazy_import_test_module'])
+    # Neither importing nor listing dependencies executes the module.
+    print_python_deps.ComputePythonDependencies()
+    self.assertNotIn('VALUE', object.__getattribute__(module, '__dict__'))
+    self.assertEqual(1, module.VALUE)
+    self.assertIs(module, action_startup.LazyImport('lazy_import_test_module'))
+
+  def testLazyImport_alreadyImported(self):
+    self.assertIs(os, action_startup.LazyImport('os'))
+
+  def testLazyImport_missing(self):
+    with self.assertRaises(ImportError):
+      action_startup.LazyImport('lazy_import_test_missing_module')
+
+  def testTrace(self):
+    self._WriteModule('trace_test_module', 'import time\ntime.sleep(0.01)\n')
+    trace_path = os.path.join(self._tmp_dir.name, 'trace.json')
+    env = dict(os.environ)
+    env['ANDROID_ACTION_TRACE_FILE'] = trace_path
+    env['PYTHONPATH'] = self._tmp_dir.name
+    script = _SCRIPT.format(gyp_dir=_GYP_DIR, module='trace_test_module')
+    for _ in range(2):
+      subprocess.check_call([sys.executable, '-c', script], env=env)
+
+    with open(trace_path) as f:
+      data = f.read()
+    self.assertTrue(data.startswith('['))
+    events = json.loads(data.rstrip(',\n') + ']')
+    pids = {e['pid'] for e in events}
+    self.assertEqual(2, len(pids))
+    for pid in pids:
+      names = [e['name'] for e in events if e['pid'] == pid]
+      self.assertIn('process_name', names)
+      self.assertIn('-c', names)
+      self.assertIn('startup', names)
+      self.assertIn('import trace_test_module', names)
+    action = next(e for e in events if e['name'] == '-c')
+    self.assertGreaterEqual(action['args']['import_ms'], 10)
+
+
+if __name__ == '__main__':
+  unittest.main()
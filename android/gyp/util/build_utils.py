@@ -4,6 +4,10 @@
 
 """Contains common helpers for GN action()s."""
 
+# Imported first so that it can time the imports that follow.
+from util import action_startup  # pylint: disable=wrong-import-order
+action_startup.MaybeStartProfiling()
+
 import atexit
 import collections
 import contextlib
@@ -12,7 +16,6 @@ import fnmatch
 import json
 import logging
 import os
-import pipes
 import re
 import shlex
 import shutil
@@ -198,7 +201,7 @@ class CalledProcessError(Exception):
     # A user should be able to simply copy and paste the command that failed
     # into their shell.
     copyable_command = '( cd {}; {} )'.format(os.path.abspath(self.cwd),
-        ' '.join(map(pipes.quote, self.args)))
+        ' '.join(map(shlex.quote, self.args)))
     return 'Command failed: {}\n{}'.format(copyable_command, self.output)
 
 
@@ -0,0 +1,521 @@
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Reads DWARF call frame information (CFI) of ARM ELF files in-process.
+
+Produces the per-function CFI rows that `dump_syms -v` prints as "STACK CFI"
+records (see
+https://github.com/google/breakpad/blob/master/docs/symbol_files.md), by
+interpreting the .debug_frame and .eh_frame sections directly. Functions are
+read in chunks of page-aligned .text ranges, in parallel.
+"""
+
+import collections
+import logging
+import struct
+
+from util import elf_reader
+from util import parallel
+
+_EM_ARM = 40
+
+# Chunks of functions are split on boundaries of pages of this size.
+_CHUNK_PAGE_SIZE = 1 << 17
+# Minimum number of functions per chunk, so that each process gets a
+# worthwhile amount of work.
+_MIN_FUNCTIONS_PER_CHUNK = 4096
+
+_CFA = '.cfa'
+_RA = '.ra'
+_UNDEFINED = '.undef'
+
+# The names breakpad gives to ARM DWARF registers. The others are called
+# "unnamed_register<number>".
+_ARM_REGISTER_NAMES = ('r0', 'r1', 'r2', 'r3', 'r4', 'r5', 'r6', 'r7', 'r8',
+                       'r9', 'r10', 'r11', 'r12', 'sp', 'lr', 'pc')
+
+_DW_EH_PE_OMIT = 0xff
+_DW_EH_PE_PCREL = 0x10
+
+# Formats of fixed-size DWARF pointer encodings, by the encoding's low nibble.
+_POINTER_FORMATS = {
+    0x02: 'H',
+    0x03: 'I',
+    0x04: 'Q',
+    0x0a: 'h',
+    0x0b: 'i',
+    0x0c: 'q',
+}
+
+# The CFI of a function: its address, size, and (address, rules) rows, where
+# rules are in breakpad's postfix notation. The first row is for the function's
+# address, and holds all of the initial rules. Later rows hold only the rules
+# that change at their address.
+StackCfi = collections.namedtuple('StackCfi', ['address', 'size', 'rows'])
+
+
+class _UnsupportedEncodingError(Exception):
+  """A DWARF pointer encoding that is not supported."""
+
+
+def _CheckPointerEncoding(encoding, apply_relative=True):
+  """Raises _UnsupportedEncodingError if |encoding| cannot be read."""
+  if encoding == _DW_EH_PE_OMIT:
+    return
+  value_format = encoding & 0x0f
+  if value_format not in (0x00, 0x01, 0x09) and (value_format
+                                                 not in _POINTER_FORMATS):
+    raise _UnsupportedEncodingError('0x%x' % encoding)
+  # Only absolute and pc-relative pointers are supported.
+  if apply_relative and encoding & 0x70 not in (0, _DW_EH_PE_PCREL):
+    raise _UnsupportedEncodingError('0x%x' % encoding)
+
+
+_Cie = collections.namedtuple('_Cie', [
+    'code_alignment', 'data_alignment', 'ra_register', 'fde_encoding',
+    'has_augmentation_data', 'address_size', 'instructions_start',
+    'instructions_end'
+])
+
+
+def _ReadULeb128(data, pos):
+  result = 0
+  shift = 0
+  while True:
+    byte = data[pos]
+    pos += 1
+    result |= (byte & 0x7f) << shift
+    shift += 7
+    if byte < 0x80:
+      return result, pos
+
+
+def _ReadSLeb128(data, pos):
+  result = 0
+  shift = 0
+  while True:
+    byte = data[pos]
+    pos += 1
+    result |= (byte & 0x7f) << shift
+    shift += 7
+    if byte < 0x80:
+      if byte & 0x40:
+        result -= 1 << shift
+      return result, pos
+
+
+def _RegisterName(register):
+  if register < len(_ARM_REGISTER_NAMES):
+    return _ARM_REGISTER_NAMES[register]
+  return 'unnamed_register%d' % register
+
+
+def _DefinedRules(rules):
+  # Like breakpad's CFIToModule::UndefinedRule, registers that cannot be
+  # recovered get no rule, rather than one that unwinders would not accept.
+  return {name: rule for name, rule in rules.items() if rule != _UNDEFINED}
+
+
+def _FormatRules(rules):
+  return ' '.join('%s: %s' % (name, rules[name]) for name in sorted(rules))
+
+
+class _CfiSection:
+  """The .debug_frame or .eh_frame section of an ELF file."""
+
+  def __init__(self, elf, section):
+    self.name = section.name
+    self._is_eh_frame = section.name == '.eh_frame'
+    self._address = section.address
+    self._start = elf.offset + section.offset
+    self._end = self._start + section.size
+    self._data = elf.data
+    self._endian = elf.endian
+    self._address_size = 8 if elf.is_64_bit else 4
+    # Maps file offset -> _Cie, or None for unsupported CIEs.
+    self._cies = {}
+
+  def _Unpack(self, fmt, pos):
+    value, = struct.unpack_from(self._endian + fmt, self._data, pos)
+    return value, pos + struct.calcsize(fmt)
+
+  def _ReadAddress(self, pos, address_size):
+    return self._Unpack('Q' if address_size == 8 else 'I', pos)
+
+  def _ReadEncodedPointer(self, encoding, pos, address_size,
+                          apply_relative=True):
+    if encoding == _DW_EH_PE_OMIT:
+      return 0, pos
+    _CheckPointerEncoding(encoding, apply_relative)
+    field_pos = pos
+    value_format = encoding & 0x0f
+    if value_format == 0x00:
+      value, pos = self._ReadAddress(pos, address_size)
+    elif value_format == 0x01:
+      value, pos = _ReadULeb128(self._data, pos)
+    elif value_format == 0x09:
+      value, pos = _ReadSLeb128(self._data, pos)
+    else:
+      value, pos = self._Unpack(_POINTER_FORMATS[value_format], pos)
+    if apply_relative and encoding & 0x70 == _DW_EH_PE_PCREL:
+      value += self._address + field_pos - self._start
+    return value & ((1 << (8 * address_size)) - 1), pos
+
+  def _ReadEntryHeader(self, pos):
+    """Returns (entry end, CIE id or pointer position, its value, next pos).
+
+    The id position is None for zero-length (padding) entries.
+    """
+    length, pos = self._Unpack('I', pos)
+    id_format = 'I'
+    if length == 0xffffffff:
+      length, pos = self._Unpack('Q', pos)
+      id_format = 'Q'
+    end = pos + length
+    if length == 0:
+      return end, None, None, pos
+    id_pos = pos
+    cie_id, pos = self._Unpack(id_format, pos)
+    return end, id_pos, cie_id, pos
+
+  def _IsCie(self, cie_id):
+    if self._is_eh_frame:
+      return cie_id == 0
+    return cie_id in (0xffffffff, 0xffffffffffffffff)
+
+  def _GetCie(self, pos):
+    if pos not in self._cies:
+      self._cies[pos] = self._ParseCie(pos)
+    return self._cies[pos]
+
+  def _ParseCie(self, pos):
+    data = self._data
+    cie_pos = pos
+    end, _, _, pos = self._ReadEntryHeader(pos)
+    version = data[pos]
+    pos += 1
+    augmentation_end = data.find(b'\0', pos, end)
+    augmentation = bytes(data[pos:augmentation_end]).decode('ascii', 'replace')
+    pos = augmentation_end + 1
+    address_size = self._address_size
+    if augmentation == 'eh':
+      pos += address_size
+    if version >= 4:
+      address_size = data[pos]
+      pos += 2  # Skips segment_selector_size too.
+    code_alignment, pos = _ReadULeb128(data, pos)
+    data_alignment, pos = _ReadSLeb128(data, pos)
+    if version == 1:
+      ra_register = data[pos]
+      pos += 1
+    else:
+      ra_register, pos = _ReadULeb128(data, pos)
+
+    fde_encoding = 0
+    has_augmentation_data = augmentation.startswith('z')
+    if has_augmentation_data:
+      augmentation_length, pos = _ReadULeb128(data, pos)
+      augmentation_data_end = pos + augmentation_length
+      try:
+        for c in augmentation[1:]:
+          if c == 'R':
+            fde_encoding = data[pos]
+            _CheckPointerEncoding(fde_encoding)
+            pos += 1
+          elif c == 'L':
+            pos += 1
+          elif c == 'P':
+            personality_encoding = data[pos]
+            _, pos = self._ReadEncodedPointer(personality_encoding,
+                                              pos + 1,
+                                              address_size,
+                                              apply_relative=False)
+          elif c not in 'SB':
+            break
+      except _UnsupportedEncodingError as e:
+        # Like dump_syms, skips the CIE and its FDEs rather than failing.
+        logging.warning('Skipping CIE at 0x%x in %s: unsupported pointer '
+                        'encoding %s', cie_pos - self._start, self.name, e)
+        return None
+      pos = augmentation_data_end
+    elif augmentation not in ('', 'eh'):
+      logging.info('Unsupported CIE augmentation: %s', augmentation)
+      return None
+    return _Cie(code_alignment, data_alignment, ra_register, fde_encoding,
+                has_augmentation_data, address_size, pos, end)
+
+  def _ParseFde(self, pos):
+    """Returns (CIE, address, size, instructions start, end), or None."""
+    end, id_pos, cie_pointer, pos = self._ReadEntryHeader(pos)
+    if self._is_eh_frame:
+      cie = self._GetCie(id_pos - cie_pointer)
+    else:
+      cie = self._GetCie(self._start + cie_pointer)
+    if cie is None:
+      return None
+    if self._is_eh_frame:
+      address, pos = self._ReadEncodedPointer(cie.fde_encoding, pos,
+                                              cie.address_size)
+      size, pos = self._ReadEncodedPointer(cie.fde_encoding & 0x0f, pos,
+                                           cie.address_size,
+                                           apply_relative=False)
+    else:
+      address, pos = self._ReadAddress(pos, cie.address_size)
+      size, pos = self._ReadAddress(pos, cie.address_size)
+    if cie.has_augmentation_data:
+      augmentation_length, pos = _ReadULeb128(self._data, pos)
+      pos += augmentation_length
+    return cie, address, size, pos, end
+
+  def IterFdes(self):
+    """Yields (FDE position, function address) for each FDE."""
+    pos = self._start
+    while pos + 4 <= self._end:
+      entry_pos = pos
+      pos, id_pos, cie_id, _ = self._ReadEntryHeader(pos)
+      if id_pos is None or self._IsCie(cie_id):
+        continue
+      fde = self._ParseFde(entry_pos)
+      if fde:
+        yield entry_pos, fde[1]
+
+  def ReadStackCfi(self, fde_pos):
+    """Interprets the CFI instructions of an FDE.
+
+    Returns:
+      A StackCfi, or None if the FDE uses unsupported instructions.
+    """
+    cie, address, size, instructions_start, end = self._ParseFde(fde_pos)
+    ra_register = cie.ra_register
+    data = self._data
+    data_alignment = cie.data_alignment
+    code_alignment = cie.code_alignment
+
+    def name_of(register):
+      return _RA if register == ra_register else _RegisterName(register)
+
+    # Maps address -> {rule name: rule}, for rules set at the address.
+    rule_changes = collections.defaultdict(dict)
+    rules = {}
+    cfa = [None, 0]  # Register and offset.
+    remembered = []
+    initial_rules = {}
+    current = [address]
+
+    def set_rule(name, rule):
+      rules[name] = rule
+      rule_changes[current[0]][name] = rule
+
+    def set_cfa(register, offset):
+      cfa[:] = [register, offset]
+      set_rule(_CFA, '%s %d +' % (name_of(register), offset))
+
+    def run(pos, end):
+      while pos < end:
+        opcode = data[pos]
+        pos += 1
+        operand = opcode & 0x3f
+        if opcode & 0xc0 == 0x40:  # DW_CFA_advance_loc
+          current[0] += operand * code_alignment
+        elif opcode & 0xc0 == 0x80:  # DW_CFA_offset
+          offset, pos = _ReadULeb128(data, pos)
+          set_rule(name_of(operand), '.cfa %d + ^' % (offset * data_alignment))
+        elif opcode & 0xc0 == 0xc0:  # DW_CFA_restore
+          name = name_of(operand)
+          set_rule(name, initial_rules.get(name, name))
+        elif opcode == 0x00:  # DW_CFA_nop
+          pass
+        elif opcode == 0x01:  # DW_CFA_set_loc
+          if self._is_eh_frame:
+            current[0], pos = self._ReadEncodedPointer(cie.fde_encoding, pos,
+                                                       cie.address_size)
+          else:
+            current[0], pos = self._ReadAddress(pos, cie.address_size)
+        elif opcode in (0x02, 0x03, 0x04):  # DW_CFA_advance_loc1/2/4
+          delta, pos = self._Unpack({2: 'B', 3: 'H', 4: 'I'}[opcode], pos)
+          current[0] += delta * code_alignment
+        elif opcode in (0x05, 0x2f):
+          # DW_CFA_offset_extended, DW_CFA_GNU_negative_offset_extended
+          register, pos = _ReadULeb128(data, pos)
+          offset, pos = _ReadULeb128(data, pos)
+          if opcode == 0x2f:
+            offset = -offset
+          set_rule(name_of(register),
+                   '.cfa %d + ^' % (offset * data_alignment))
+        elif opcode == 0x06:  # DW_CFA_restore_extended
+          register, pos = _ReadULeb128(data, pos)
+          name = name_of(register)
+          set_rule(name, initial_rules.get(name, name))
+        elif opcode == 0x07:  # DW_CFA_undefined
+          register, pos = _ReadULeb128(data, pos)
+          set_rule(name_of(register), _UNDEFINED)
+        elif opcode == 0x08:  # DW_CFA_same_value
+          register, pos = _ReadULeb128(data, pos)
+          set_rule(name_of(register), name_of(register))
+        elif opcode == 0x09:  # DW_CFA_register
+          register, pos = _ReadULeb128(data, pos)
+          other_register, pos = _ReadULeb128(data, pos)
+          set_rule(name_of(register), name_of(other_register))
+        elif opcode == 0x0a:  # DW_CFA_remember_state
+          remembered.append((dict(rules), list(cfa)))
+        elif opcode == 0x0b:  # DW_CFA_restore_state
+          if not remembered:
+            return False
+          old_rules = dict(rules)
+          new_rules, cfa[:] = remembered.pop()
+          rules.clear()
+          rules.update(new_rules)
+          # Rules dropped by the transition revert to "same value".
+          for name in set(old_rules) | set(new_rules):
+            if old_rules.get(name) != new_rules.get(name):
+              rule_changes[current[0]][name] = new_rules.get(name, name)
+        elif opcode == 0x0c:  # DW_CFA_def_cfa
+          register, pos = _ReadULeb128(data, pos)
+          offset, pos = _ReadULeb128(data, pos)
+          set_cfa(register, offset)
+        elif opcode == 0x0d:  # DW_CFA_def_cfa_register
+          register, pos = _ReadULeb128(data, pos)
+          if cfa[0] is None:
+            return False
+          set_cfa(register, cfa[1])
+        elif opcode in (0x0e, 0x13):
+          # DW_CFA_def_cfa_offset, DW_CFA_def_cfa_offset_sf
+          if opcode == 0x0e:
+            offset, pos = _ReadULeb128(data, pos)
+          else:
+            offset, pos = _ReadSLeb128(data, pos)
+            offset *= data_alignment
+          if cfa[0] is None:
+            return False
+          set_cfa(cfa[0], offset)
+        elif opcode == 0x0f:  # DW_CFA_def_cfa_expression
+          # Expressions are not supported by breakpad either, and are ignored.
+          length, pos = _ReadULeb128(data, pos)
+          pos += length
+        elif opcode in (0x10, 0x16):
+          # DW_CFA_expression, DW_CFA_val_expression
+          _, pos = _ReadULeb128(data, pos)
+          length, pos = _ReadULeb128(data, pos)
+          pos += length
+        elif opcode == 0x11:  # DW_CFA_offset_extended_sf
+          register, pos = _ReadULeb128(data, pos)
+          offset, pos = _ReadSLeb128(data, pos)
+          set_rule(name_of(register),
+                   '.cfa %d + ^' % (offset * data_alignment))
+        elif opcode == 0x12:  # DW_CFA_def_cfa_sf
+          register, pos = _ReadULeb128(data, pos)
+          offset, pos = _ReadSLeb128(data, pos)
+          set_cfa(register, offset * data_alignment)
+        elif opcode in (0x14, 0x15):
+          # DW_CFA_val_offset, DW_CFA_val_offset_sf
+          register, pos = _ReadULeb128(data, pos)
+          if opcode == 0x14:
+            offset, pos = _ReadULeb128(data, pos)
+          else:
+            offset, pos = _ReadSLeb128(data, pos)
+          set_rule(name_of(register), '.cfa %d +' % (offset * data_alignment))
+        elif opcode == 0x2e:  # DW_CFA_GNU_args_size
+          _, pos = _ReadULeb128(data, pos)
+        else:
+          logging.info('Unsupported CFI opcode 0x%x in FDE at 0x%x', opcode,
+                       fde_pos)
+          return False
+      return True
+
+    if not run(cie.instructions_start, cie.instructions_end):
+      return None
+    initial_rules = dict(rules)
+    current[0] = address
+    if not run(instructions_start, end):
+      return None
+
+    # Like breakpad, the return address is in its register unless stated.
+    entry_rules = _DefinedRules(rule_changes.pop(address, {}))
+    entry_rules.setdefault(_RA, _RegisterName(ra_register))
+    rows = [(address, _FormatRules(entry_rules))]
+    for row_address in sorted(rule_changes):
+      changes = _DefinedRules(rule_changes[row_address])
+      if changes:
+        rows.append((row_address, _FormatRules(changes)))
+    return StackCfi(address, size, rows)
+
+
+def _GetCfiSections(elf):
+  """Returns the _CfiSections, with the preferred one first."""
+  if elf.machine != _EM_ARM:
+    raise ValueError('Only ARM ELF files are supported: ' + elf.path)
+  sections = []
+  for name in ('.debug_frame', '.eh_frame'):
+    section = elf.GetSection(name)
+    if section and section.size:
+      sections.append(_CfiSection(elf, section))
+  return sections
+
+
+def _ChunkFunctions(elf):
+  """Splits all FDEs into lists of (section name, FDE position).
+
+  Functions with address 0 are dead code tombstones, and are skipped. When a
+  function has multiple FDEs, the first one of the preferred section is used.
+  Chunks are ordered by address, and never split a page of .text.
+  """
+  fdes = {}
+  for section in _GetCfiSections(elf):
+    for fde_pos, address in section.IterFdes():
+      if address:
+        fdes.setdefault(address, (section.name, fde_pos))
+  if not fdes:
+    return []
+
+  text_section = elf.GetSection('.text')
+  page_start_address = text_section.address if text_section else min(fdes)
+  chunks = [[]]
+  last_page = None
+  for address in sorted(fdes):
+    page = (address - page_start_address) // _CHUNK_PAGE_SIZE
+    if len(chunks[-1]) >= _MIN_FUNCTIONS_PER_CHUNK and page != last_page:
+      chunks.append([])
+    chunks[-1].append(fdes[address])
+    last_page = page
+  return chunks
+
+
+def _ProcessChunk(elf_path, chunk, chunk_func):
+  with elf_reader.ElfFile(elf_path) as elf:
+    sections = {s.name: s for s in _GetCfiSections(elf)}
+    stack_cfis = []
+    for section_name, fde_pos in chunk:
+      stack_cfi = sections[section_name].ReadStackCfi(fde_pos)
+      if stack_cfi:
+        stack_cfis.append(stack_cfi)
+    return chunk_func(stack_cfis)
+
+
+def MapStackCfi(elf_path, func):
+  """Reads the CFI of all functions of an ELF file, in parallel chunks.
+
+  Args:
+    elf_path: Path to an unstripped ARM ELF file.
+    func: A module-level function called, in a forked process, with the list
+      of StackCfi of each chunk, ordered by address. Its return value must be
+      picklable.
+
+  Returns:
+    An iterable over the return values of |func|, in address order of the
+    chunks.
+  """
+  with elf_reader.ElfFile(elf_path) as elf:
+    chunks = _ChunkFunctions(elf)
+  logging.info('Reading CFI of %d functions in %d chunks.',
+               sum(len(c) for c in chunks), len(chunks))
+  return parallel.BulkForkAndCall(_ProcessChunk,
+                                  ((elf_path, chunk) for chunk in chunks),
+                                  chunk_func=func)
+
+
+def FormatStackCfi(stack_cfi):
+  """Returns the "STACK CFI" lines that dump_syms prints for a function."""
+  (address, rules), later_rows = stack_cfi.rows[0], stack_cfi.rows[1:]
+  lines = ['STACK CFI INIT %x %x %s' % (address, stack_cfi.size, rules)]
+  lines.extend('STACK CFI %x %s' % row for row in later_rows)
+  return lines
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from util import dwarf_cfi
+from util import elf_test_utils
+
+_TESTDATA_DIR = os.path.join(os.path.dirname(__file__), 'testdata')
+
+_TEXT_ADDRESS = 0x1000
+_EH_FRAME_ADDRESS = 0x2000
+
+
+def _Entry(entry_id, body):
+  """Returns a CIE or FDE with the given id/pointer, padded with nops."""
+  body = struct.pack('<I', entry_id) + body
+  body += b'\0' * (-len(body) % 4)
+  return struct.pack('<I', len(body)) + body
+
+
+def _DebugFrame():
+  # CIE: version 1, no augmentation, code alignment 2, data alignment -4,
+  # return address in lr. Initially, cfa = sp + 0.
+  cie = _Entry(0xffffffff, b'\x01\0\x02\x7c\x0e' + b'\x0c\x0d\x00')
+  fde_instructions = bytes([
+      0x41,  # advance_loc 2 bytes
+      0x0e, 0x08,  # def_cfa_offset 8
+      0x8e, 0x01,  # offset lr, cfa - 4
+      0x84, 0x02,  # offset r4, cfa - 8
+      0x42,  # advance_loc 4 bytes
+      0x0a,  # remember_state
+      0x0d, 0x07,  # def_cfa_register r7
+      0x41,  # advance_loc 2 bytes
+      0x0b,  # restore_state
+  ])
+  return (cie + _Entry(0, struct.pack('<II', _TEXT_ADDRESS, 0x20) +
+                       fde_instructions) +
+          # A tombstone for dead code.
+          _Entry(0, struct.pack('<II', 0, 0x20)) +
+          _Entry(0, struct.pack('<II', _TEXT_ADDRESS + 0x20, 4)))
+
+
+def _EhFrame():
+  # CIE with "zR" augmentation, and pc-relative sdata4 FDE addresses.
+  cie = _Entry(0, b'\x01zR\0\x02\x7c\x0e\x01\x1b' + b'\x0c\x0d\x00')
+  fde_pos = len(cie)
+  # The pc_begin field follows the FDE's length and CIE pointer.
+  pc_begin = _TEXT_ADDRESS + 0x30 - (_EH_FRAME_ADDRESS + fde_pos + 8)
+  fde = _Entry(fde_pos + 4,
+               struct.pack('<iIB', pc_begin, 8, 0) + bytes([0x41, 0x0e, 0x10]))
+  # Described by .debug_frame too, which takes precedence.
+  fde_pos += len(fde)
+  pc_begin = _TEXT_ADDRESS - (_EH_FRAME_ADDRESS + fde_pos + 8)
+  duplicate_fde = _Entry(fde_pos + 4, struct.pack('<iIB', pc_begin, 0x20, 0))
+  return cie + fde + duplicate_fde + b'\0' * 4
+
+
+def _WriteElf(path, sections):
+  """Writes a 32-bit ARM ELF file with the given (name, address, data)."""
+  with open(path, 'wb') as f:
+    f.write(
+        elf_test_utils.CreateElf([
+            elf_test_utils.Section(name, data, address=address)
+            for name, address, data in sections
+        ]))
+
+
+class DwarfCfiTest(unittest.TestCase):
+  def setUp(self):
+    self._tmp_file = tempfile.NamedTemporaryFile(suffix='.so')
+    _WriteElf(self._tmp_file.name, [
+        ('.text', _TEXT_ADDRESS, b'\0' * 0x40),
+        ('.eh_frame', _EH_FRAME_ADDRESS, _EhFrame()),
+        ('.debug_frame', 0, _DebugFrame()),
+    ])
+
+  def tearDown(self):
+    self._tmp_file.close()
+
+  def testMapStackCfi(self):
+    chunks = list(dwarf_cfi.MapStackCfi(self._tmp_file.name, list))
+    self.assertEqual([[
+        dwarf_cfi.StackCfi(_TEXT_ADDRESS, 0x20, [
+            (0x1000, '.cfa: sp 0 + .ra: lr'),
+            (0x1002, '.cfa: sp 8 + .ra: .cfa -4 + ^ r4: .cfa -8 + ^'),
+            (0x1006, '.cfa: r7 8 +'),
+            (0x1008, '.cfa: sp 8 +'),
+        ]),
+        dwarf_cfi.StackCfi(_TEXT_ADDRESS + 0x20, 4, [
+            (0x1020, '.cfa: sp 0 + .ra: lr'),
+        ]),
+        dwarf_cfi.StackCfi(_TEXT_ADDRESS + 0x30, 8, [
+            (0x1030, '.cfa: sp 0 + .ra: lr'),
+            (0x1032, '.cfa: sp 16 +'),
+        ]),
+    ]], chunks)
+
+  def testUnsupportedPointerEncoding(self):
+    eh_frame = _EhFrame()
+    # CIE with "zR" augmentation, and datarel sdata4 FDE addresses.
+    cie_pos = len(eh_frame)
+    eh_frame += _Entry(0, b'\x01zR\0\x02\x7c\x0e\x01\x3b' + b'\x0c\x0d\x00')
+    fde_pos = len(eh_frame)
+    eh_frame += _Entry(fde_pos + 4 - cie_pos,
+                       struct.pack('<iIB', 0x38, 4, 0))
+    _WriteElf(self._tmp_file.name, [
+        ('.text', _TEXT_ADDRESS, b'\0' * 0x40),
+        ('.eh_frame', _EH_FRAME_ADDRESS, eh_frame),
+    ])
+    with self.assertLogs(level='WARNING') as logs:
+      chunks = list(dwarf_cfi.MapStackCfi(self._tmp_file.name, list))
+    self.assertIn('unsupported pointer encoding 0x3b', logs.output[0])
+    # Only the FDEs of the supported CIE are read.
+    self.assertEqual([_TEXT_ADDRESS, _TEXT_ADDRESS + 0x30],
+                     [stack_cfi.address for stack_cfi in chunks[0]])
+
+  def testMatchesDumpSyms(self):
+    # libcfi_fixture.so.sym holds the "STACK CFI" records of `dump_syms -v`.
+    # It was written by hand following breakpad's rules, and must be
+    # regenerated with dump_syms (see cfi_fixture.S) before
+    # use_in_process_dwarf_cfi is enabled by default.
+    elf_path = os.path.join(_TESTDATA_DIR, 'libcfi_fixture.so')
+    with open(elf_path + '.sym') as f:
+      expected = [l.rstrip('\n') for l in f if l.startswith('STACK CFI')]
+    actual = []
+    for chunk in dwarf_cfi.MapStackCfi(elf_path, list):
+      for stack_cfi in chunk:
+        actual.extend(dwarf_cfi.FormatStackCfi(stack_cfi))
+    self.assertEqual(expected, actual)
+
+  def testFormatStackCfi(self):
+    self.assertEqual([
+        'STACK CFI INIT 1000 20 .cfa: sp 0 + .ra: lr',
+        'STACK CFI 1002 .cfa: sp 8 +',
+    ],
+                     dwarf_cfi.FormatStackCfi(
+                         dwarf_cfi.StackCfi(0x1000, 0x20, [
+                             (0x1000, '.cfa: sp 0 + .ra: lr'),
+                             (0x1002, '.cfa: sp 8 +'),
+                         ])))
+
+
+if __name__ == '__main__':
+  unittest.main()
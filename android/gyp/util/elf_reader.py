@@ -0,0 +1,217 @@
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Reads sections and segments of ELF files in-process.
+
+The file is memory mapped, so reading a section does not copy it until its
+contents are sliced. Uncompressed libraries within an APK are mapped in place.
+"""
+
+import collections
+import mmap
+import shutil
+import struct
+import tempfile
+import zipfile
+
+SHT_NOTE = 7
+SHT_NOBITS = 8
+
+PT_LOAD = 1
+
+NT_GNU_BUILD_ID = 3
+
+_ELF_MAGIC = b'\x7fELF'
+_ZIP_LOCAL_HEADER_SIZE = 30
+_ZIP_LOCAL_HEADER_MAGIC = b'PK\x03\x04'
+
+Section = collections.namedtuple(
+    'Section',
+    ['name', 'type', 'flags', 'address', 'offset', 'size', 'entry_size'])
+
+Segment = collections.namedtuple(
+    'Segment', ['type', 'flags', 'offset', 'address', 'file_size', 'mem_size'])
+
+
+class ElfFile:
+  """A memory mapped ELF file.
+
+  Usage:
+    with elf_reader.ElfFile(path) as elf:
+      text = elf.GetSection('.text')
+
+  Attributes:
+    path: The path of the mapped file.
+    offset: Offset of the ELF within the mapped file. File offsets of sections
+      and segments, and those passed to methods, are relative to it.
+  """
+
+  def __init__(self, path, offset=0):
+    self.path = path
+    self.offset = offset
+    with open(path, 'rb') as f:
+      self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+      self._ParseHeaders()
+    except:
+      self.Close()
+      raise
+
+  def _ParseHeaders(self):
+    ident = self._mmap[self.offset:self.offset + 16]
+    if len(ident) < 16 or ident[:4] != _ELF_MAGIC:
+      raise ValueError('Not an ELF file: ' + self.path)
+    self.is_64_bit = ident[4] == 2
+    self.endian = '<' if ident[5] == 1 else '>'
+    if self.is_64_bit:
+      header_format = 'HHIQQQIHHHHHH'
+      section_format = 'IIQQQQIIQQ'
+      segment_format = 'IIQQQQQQ'
+    else:
+      header_format = 'HHIIIIIHHHHHH'
+      section_format = 'IIIIIIIIII'
+      segment_format = 'IIIIIIII'
+    (_, self.machine, _, _, phoff, shoff, _, _, phentsize, phnum, shentsize,
+     shnum, shstrndx) = self.Unpack(header_format, 16)
+
+    self.segments = []
+    for i in range(phnum):
+      fields = self.Unpack(segment_format, phoff + i * phentsize)
+      if self.is_64_bit:
+        p_type, p_flags, p_offset, p_vaddr, _, p_filesz, p_memsz, _ = fields
+      else:
+        p_type, p_offset, p_vaddr, _, p_filesz, p_memsz, p_flags, _ = fields
+      self.segments.append(
+          Segment(p_type, p_flags, p_offset, p_vaddr, p_filesz, p_memsz))
+
+    raw_sections = [
+        self.Unpack(section_format, shoff + i * shentsize)
+        for i in range(shnum)
+    ]
+    # Maps section name -> Section, in section header order.
+    self.sections = collections.OrderedDict()
+    if not raw_sections:
+      return
+    shstrtab = raw_sections[shstrndx]
+    for (sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size, _, _, _,
+         sh_entsize) in raw_sections:
+      name = self.ReadCString(shstrtab[4] + sh_name)
+      self.sections.setdefault(
+          name,
+          Section(name, sh_type, sh_flags, sh_addr, sh_offset, sh_size,
+                  sh_entsize))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.Close()
+
+  def Close(self):
+    self._mmap.close()
+
+  @property
+  def data(self):
+    """The contents of the whole mapped file, as a read-only buffer.
+
+    The ELF starts at |offset| within it.
+    """
+    return self._mmap
+
+  def Unpack(self, fmt, offset):
+    """Unpacks |fmt| (without byte order) at the file offset."""
+    return struct.unpack_from(self.endian + fmt, self._mmap,
+                              self.offset + offset)
+
+  def ReadCString(self, offset):
+    offset += self.offset
+    end = self._mmap.find(b'\0', offset)
+    return self._mmap[offset:end].decode('utf-8', 'replace')
+
+  def GetSection(self, name):
+    """Returns the Section with the given name, or None."""
+    return self.sections.get(name)
+
+  def ReadSection(self, name):
+    """Returns the contents of the named section as bytes, or None."""
+    section = self.sections.get(name)
+    if section is None:
+      return None
+    if section.type == SHT_NOBITS:
+      return b''
+    start = self.offset + section.offset
+    return self._mmap[start:start + section.size]
+
+  def GetBuildId(self):
+    """Returns the GNU build ID as a hex string, or None if there is none."""
+    for section in self.sections.values():
+      if section.type != SHT_NOTE:
+        continue
+      pos = section.offset
+      end = pos + section.size
+      while pos + 12 <= end:
+        name_size, desc_size, note_type = self.Unpack('III', pos)
+        name_pos = pos + 12
+        desc_pos = name_pos + _Align4(name_size)
+        if (note_type == NT_GNU_BUILD_ID
+            and self.ReadCString(name_pos) == 'GNU'):
+          start = self.offset + desc_pos
+          return self._mmap[start:start + desc_size].hex()
+        pos = desc_pos + _Align4(desc_size)
+    return None
+
+  def CountInitArrayEntries(self):
+    """Returns the number of pointers in .init_array, or None if it is absent.
+
+    Each translation unit with static initializers usually adds one entry.
+    """
+    section = self.sections.get('.init_array')
+    if section is None:
+      return None
+    word_size = 8 if self.is_64_bit else 4
+    assert section.size % word_size == 0, 'Invalid .init_array size'
+    return section.size // word_size
+
+  def CountDynamicSymbols(self):
+    """Returns the number of entries of .dynsym, or 0 if it is absent."""
+    section = self.sections.get('.dynsym')
+    if section is None or not section.entry_size:
+      return 0
+    return section.size // section.entry_size
+
+
+def _Align4(value):
+  return (value + 3) & ~3
+
+
+def IsElf(path):
+  """Returns whether the file at |path| starts with the ELF magic."""
+  with open(path, 'rb') as f:
+    return f.read(len(_ELF_MAGIC)) == _ELF_MAGIC
+
+
+def OpenZipEntry(zip_file, zip_info):
+  """Returns an ElfFile for an entry of an open zip file, e.g. an APK.
+
+  Stored entries of zip files opened by path are mapped in place. Compressed
+  entries are extracted to a temporary file first. Safe to call from multiple
+  threads at once for the same |zip_file|.
+  """
+  if zip_info.compress_type == zipfile.ZIP_STORED and zip_file.filename:
+    with open(zip_file.filename, 'rb') as f:
+      f.seek(zip_info.header_offset)
+      header = f.read(_ZIP_LOCAL_HEADER_SIZE)
+    # The local header's extra field can differ from the central directory's,
+    # e.g. due to zipalign.
+    magic, name_size, extra_size = struct.unpack('<4s22xHH', header)
+    if magic != _ZIP_LOCAL_HEADER_MAGIC:
+      raise ValueError('Invalid local header for ' + zip_info.filename)
+    return ElfFile(zip_file.filename,
+                   offset=(zip_info.header_offset + _ZIP_LOCAL_HEADER_SIZE +
+                           name_size + extra_size))
+  # The mapping outlives the temporary file.
+  with tempfile.NamedTemporaryFile(suffix='.so') as extracted:
+    with zip_file.open(zip_info) as src:
+      shutil.copyfileobj(src, extracted)
+    extracted.flush()
+    return ElfFile(extracted.name)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import struct
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from util import elf_reader
+from util import elf_test_utils
+
+_SHT_DYNSYM = 11
+_SHT_INIT_ARRAY = 14
+
+_BUILD_ID = bytes(range(20))
+
+
+def _Note(name, note_type, desc):
+  name = name + b'\0'
+  return (struct.pack('<III', len(name), len(desc), note_type) + name +
+          b'\0' * (-len(name) % 4) + desc + b'\0' * (-len(desc) % 4))
+
+
+def _Library(is_64_bit=False):
+  word_size = 8 if is_64_bit else 4
+  symbol_size = 24 if is_64_bit else 16
+  return elf_test_utils.CreateElf([
+      elf_test_utils.Section('.note.android.ident',
+                             _Note(b'Android', 1, b'\x1e\0\0\0'),
+                             type=elf_reader.SHT_NOTE),
+      elf_test_utils.Section('.note.gnu.build-id',
+                             _Note(b'GNU', elf_reader.NT_GNU_BUILD_ID,
+                                   _BUILD_ID),
+                             type=elf_reader.SHT_NOTE),
+      elf_test_utils.Section('.dynsym',
+                             b'\0' * symbol_size * 5,
+                             type=_SHT_DYNSYM,
+                             entry_size=symbol_size),
+      elf_test_utils.Section('.text', b'\0' * 16),
+      elf_test_utils.Section('.init_array',
+                             b'\0' * word_size * 3,
+                             type=_SHT_INIT_ARRAY,
+                             entry_size=word_size),
+      elf_test_utils.Section('.bss', 100, type=elf_reader.SHT_NOBITS),
+  ], is_64_bit)
+
+
+class ElfReaderTest(unittest.TestCase):
+  def setUp(self):
+    self._tmp_dir = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self._tmp_dir.cleanup()
+
+  def _WriteFile(self, name, data):
+    path = os.path.join(self._tmp_dir.name, name)
+    with open(path, 'wb') as f:
+      f.write(data)
+    return path
+
+  def _CheckLibrary(self, elf, is_64_bit):
+    self.assertEqual(is_64_bit, elf.is_64_bit)
+    self.assertEqual([
+        '', '.note.android.ident', '.note.gnu.build-id', '.dynsym', '.text',
+        '.init_array', '.bss', '.shstrtab'
+    ], list(elf.sections))
+    self.assertEqual(100, elf.GetSection('.bss').size)
+    self.assertEqual(b'', elf.ReadSection('.bss'))
+    self.assertEqual(b'\0' * 16, elf.ReadSection('.text'))
+    self.assertEqual(_BUILD_ID.hex(), elf.GetBuildId())
+    self.assertEqual(3, elf.CountInitArrayEntries())
+    self.assertEqual(5, elf.CountDynamicSymbols())
+
+  def testElfFile(self):
+    for is_64_bit in (False, True):
+      path = self._WriteFile('lib.so', _Library(is_64_bit))
+      with elf_reader.ElfFile(path) as elf:
+        self._CheckLibrary(elf, is_64_bit)
+
+  def testElfFile_missingSections(self):
+    path = self._WriteFile('lib.so', elf_test_utils.CreateElf([]))
+    with elf_reader.ElfFile(path) as elf:
+      self.assertIsNone(elf.GetBuildId())
+      self.assertIsNone(elf.CountInitArrayEntries())
+      self.assertEqual(0, elf.CountDynamicSymbols())
+
+  def testElfFile_notElf(self):
+    path = self._WriteFile('lib.so', b'PK\x03\x04' + b'\0' * 64)
+    self.assertFalse(elf_reader.IsElf(path))
+    with self.assertRaises(ValueError):
+      elf_reader.ElfFile(path)
+
+  def testOpenZipEntry(self):
+    apk_path = os.path.join(self._tmp_dir.name, 'test.apk')
+    with zipfile.ZipFile(apk_path, 'w') as z:
+      z.writestr('assets/foo.txt', b'foo')
+      stored = zipfile.ZipInfo('lib/arm64-v8a/libstored.so')
+      # Moves the data to an unaligned offset.
+      stored.extra = b'\0' * 5
+      z.writestr(stored, _Library(True))
+      z.writestr('lib/armeabi-v7a/libcompressed.so',
+                 _Library(False),
+                 compress_type=zipfile.ZIP_DEFLATED)
+
+    with zipfile.ZipFile(apk_path) as z:
+      with elf_reader.OpenZipEntry(
+          z, z.getinfo('lib/arm64-v8a/libstored.so')) as elf:
+        self.assertEqual(apk_path, elf.path)
+        self.assertNotEqual(0, elf.offset)
+        self._CheckLibrary(elf, True)
+      with elf_reader.OpenZipEntry(
+          z, z.getinfo('lib/armeabi-v7a/libcompressed.so')) as elf:
+        self.assertEqual(0, elf.offset)
+        self._CheckLibrary(elf, False)
+
+
+if __name__ == '__main__':
+  unittest.main()
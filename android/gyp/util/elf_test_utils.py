@@ -0,0 +1,65 @@
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Builds small ELF files for tests of code that reads them."""
+
+import collections
+import struct
+
+EM_ARM = 40
+EM_AARCH64 = 183
+
+SHT_PROGBITS = 1
+SHT_STRTAB = 3
+SHT_NOBITS = 8
+
+# A section of an ELF file built by CreateElf(). |data| is the size of NOBITS
+# sections.
+Section = collections.namedtuple(
+    'Section', ['name', 'data', 'type', 'address', 'entry_size'],
+    defaults=(SHT_PROGBITS, 0, 0))
+
+
+def CreateElf(sections, is_64_bit=False, machine=None):
+  """Returns a little-endian ELF shared library with the given sections.
+
+  Args:
+    sections: A list of Sections. A .shstrtab section is added after them.
+    is_64_bit: Whether to create an ELFCLASS64 file.
+    machine: The e_machine of the file. Defaults to EM_AARCH64 for 64-bit files
+      and EM_ARM otherwise.
+  """
+  if machine is None:
+    machine = EM_AARCH64 if is_64_bit else EM_ARM
+  names = b'\0'
+  name_offsets = []
+  for section in sections:
+    name_offsets.append(len(names))
+    names += section.name.encode() + b'\0'
+  name_offsets.append(len(names))
+  names += b'.shstrtab\0'
+  sections = list(sections) + [Section('.shstrtab', names, SHT_STRTAB)]
+
+  header_size = 64 if is_64_bit else 52
+  section_format = '<IIQQQQIIQQ' if is_64_bit else '<IIIIIIIIII'
+  body = b''
+  headers = [b'\0' * struct.calcsize(section_format)]
+  for name_offset, section in zip(name_offsets, sections):
+    offset = header_size + len(body)
+    if section.type == SHT_NOBITS:
+      size = section.data
+    else:
+      size = len(section.data)
+      body += section.data + b'\0' * (-size % 8)
+    headers.append(
+        struct.pack(section_format, name_offset, section.type, 0,
+                    section.address, offset, size, 0, 0, 4,
+                    section.entry_size))
+  shoff = header_size + len(body)
+  header_format = '<HHIQQQIHHHHHH' if is_64_bit else '<HHIIIIIHHHHHH'
+  ident = b'\x7fELF' + bytes([2 if is_64_bit else 1, 1, 1]) + b'\0' * 9
+  header = ident + struct.pack(header_format, 3, machine, 1, 0, 0, shoff, 0,
+                               header_size, 0, 0, len(headers[0]),
+                               len(headers), len(headers) - 1)
+  return header + body + b''.join(headers)
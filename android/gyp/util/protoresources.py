@@ -13,6 +13,7 @@ import struct
 import sys
 import zipfile
 
+from util import action_startup
 from util import build_utils
 from util import resource_utils
 
@@ -24,7 +25,8 @@ sys.path[1:1] = [
                  'python'),
 ]
 
-from proto import Resources_pb2
+# Loaded when first used, since importing protobuf is slow.
+Resources_pb2 = action_startup.LazyImport('proto.Resources_pb2')
 
 # First bytes in an .flat.arsc file.
 # uint32: Magic ("ARSC"), version (1), num_entries (1), type (0)
@@ -14,13 +14,15 @@ import tempfile
 import zipfile
 from xml.etree import ElementTree
 
+from util import action_startup
 import util.build_utils as build_utils
 
 _SOURCE_ROOT = os.path.abspath(
     os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
 # Import jinja2 from third_party/jinja2
 sys.path.insert(1, os.path.join(_SOURCE_ROOT, 'third_party'))
-from jinja2 import Template # pylint: disable=F0401
+# Only needed to generate R.java files.
+jinja2 = action_startup.LazyImport('jinja2')
 
 
 # A variation of these maps also exists in:
@@ -648,7 +650,7 @@ def _GetNonSystemIndex(entry):
 
 def _RenderRJavaSource(package, root_r_java_package, rjava_build_options):
   """Generates the contents of a R.java file."""
-  template = Template(
+  template = jinja2.Template(
       """/* AUTO-GENERATED FILE.  DO NOT MODIFY. */
 
 package {{ package }};
@@ -707,7 +709,7 @@ def _RenderRootRJavaSource(package, all_resources_by_type, rjava_build_options,
   # --proguard-conditional-keep-rules. E.g.:
   # Rule precondition matches static final fields javac has inlined.
   # Such rules are unsound as the shrinker cannot infer the inlining precisely.
-  template = Template("""/* AUTO-GENERATED FILE.  DO NOT MODIFY. */
+  template = jinja2.Template("""/* AUTO-GENERATED FILE.  DO NOT MODIFY. */
 
 package {{ package }};
 
@@ -38,6 +38,9 @@ sys.path = prev_sys_path
 _R8_PATH = os.path.join(build_utils.DIR_SOURCE_ROOT, 'third_party', 'r8', 'lib',
                         'r8.jar')
 _SHARD_JSON_FILENAME = 'shards.json'
+# Bump whenever the format of shards.json changes.
+_SHARD_JSON_VERSION = 2
+_HOT_SHARD_NAME = 'hot.dex.jar'
 
 
 def _DeviceCachePath(device):
@@ -62,48 +65,99 @@ def _GetDeviceIncrementalDir(package):
   return '/data/local/tmp/incremental-app-%s' % package
 
 
-def _IsStale(src_paths, old_src_paths, dest_path):
-  """Returns if |dest| is older than any of |src_paths|, or missing."""
-  if not os.path.exists(dest_path):
-    return True
-  # Always mark as stale if any paths were added or removed.
-  if set(src_paths) != set(old_src_paths):
-    return True
-  dest_time = os.path.getmtime(dest_path)
-  for path in src_paths:
-    if os.path.getmtime(path) > dest_time:
-      return True
-  return False
-
-
 def _LoadPrevShards(dex_staging_dir):
   shards_json_path = os.path.join(dex_staging_dir, _SHARD_JSON_FILENAME)
   if not os.path.exists(shards_json_path):
     return {}
   with open(shards_json_path) as f:
-    return json.load(f)
+    prev_state = json.load(f)
+  if prev_state.get('version') != _SHARD_JSON_VERSION:
+    return {}
+  return prev_state
 
 
-def _SaveNewShards(shards, dex_staging_dir):
+def _SaveNewShards(state, dex_staging_dir):
   shards_json_path = os.path.join(dex_staging_dir, _SHARD_JSON_FILENAME)
   with open(shards_json_path, 'w') as f:
-    json.dump(shards, f)
+    json.dump(dict(state, version=_SHARD_JSON_VERSION), f)
+
 
+def _ComputeFileInfos(dex_files, prev_file_infos):
+  """Returns a dict of path -> [mtime_ns, size, md5 of contents].
 
-def _AllocateDexShards(dex_files):
-  """Divides input dex files into buckets."""
+  Files whose mtime and size are unchanged reuse their previous digest.
+  """
+  file_infos = {}
+  for path in dex_files:
+    st = os.stat(path)
+    prev_info = prev_file_infos.get(path)
+    if prev_info and prev_info[:2] == [st.st_mtime_ns, st.st_size]:
+      file_infos[path] = prev_info
+      continue
+    with open(path, 'rb') as f:
+      digest = hashlib.md5(f.read()).hexdigest()
+    file_infos[path] = [st.st_mtime_ns, st.st_size, digest]
+  return file_infos
+
+
+def _AllocateDexShards(dex_files, file_infos, prev_state):
+  """Divides input dex files into buckets.
+
+  Args:
+    dex_files: List of dex file paths.
+    file_infos: Result of _ComputeFileInfos() for |dex_files|.
+    prev_state: The state saved by the previous install (see
+      _LoadPrevShards()).
+
+  Returns:
+    A tuple of (shards, hot_files), where shards is a dict of shard name to
+    list of dex files, and hot_files is the list of files in the hot shard.
+  """
   # Goals:
   # * Make shards small enough that they are fast to merge.
   # * Minimize the number of shards so they load quickly on device.
   # * Partition files into shards such that a change in one file results in only
   #   one shard having to be re-created.
+  # * Keep files that are being edited in a small "hot" shard, so that editing
+  #   them again re-creates only that shard. A file is never in two shards, so
+  #   the shard a file moves out of is re-created once.
   shards = collections.defaultdict(list)
   # As of Oct 2019, 10 shards results in a min/max size of 582K/2.6M.
   NUM_CORE_SHARDS = 10
   # As of Oct 2019, 17 dex files are larger than 1M.
   SHARD_THRESHOLD = 2**20
+  # Edited files stay hot until the hot shard would grow larger than this.
+  HOT_SHARD_THRESHOLD = 2**20
+
+  def total_size(paths):
+    return sum(file_infos[p][1] for p in paths)
+
+  hot_files = []
+  prev_file_infos = prev_state.get('file_infos')
+  if prev_file_infos:
+    # New or edited files.
+    changed_files = [
+        p for p in dex_files if file_infos[p][1] < SHARD_THRESHOLD and (
+            p not in prev_file_infos or prev_file_infos[p][2] != file_infos[p][2])
+    ]
+    hot_files = [
+        p for p in prev_state.get('hot_files', [])
+        if p in file_infos and file_infos[p][1] < SHARD_THRESHOLD
+    ]
+    hot_files += sorted(set(changed_files).difference(hot_files))
+    if total_size(hot_files) > HOT_SHARD_THRESHOLD:
+      # Move previously hot files back into core shards.
+      hot_files = changed_files
+      if total_size(hot_files) > HOT_SHARD_THRESHOLD:
+        hot_files = []
+    if hot_files:
+      shards[_HOT_SHARD_NAME] = hot_files
+
+  hot_files_set = set(hot_files)
   for src_path in dex_files:
-    if os.path.getsize(src_path) >= SHARD_THRESHOLD:
+    if src_path in hot_files_set:
+      continue
+    if file_infos[src_path][1] >= SHARD_THRESHOLD:
       # Use the path as the name rather than an incrementing number to ensure
       # that it shards to the same name every time.
       name = os.path.relpath(src_path, constants.GetOutDirectory()).replace(
@@ -116,24 +170,41 @@ def _AllocateDexShards(dex_files):
       hex_hash = hashlib.md5(src_path.encode('utf-8')).hexdigest()
       name = 'shard{}.dex.jar'.format(int(hex_hash, 16) % NUM_CORE_SHARDS)
       shards[name].append(src_path)
-  logging.info('Sharding %d dex files into %d buckets', len(dex_files),
-               len(shards))
-  return shards
+  logging.info('Sharding %d dex files into %d buckets (%d hot files)',
+               len(dex_files), len(shards), len(hot_files))
+  return shards, hot_files
+
+
+def _ShardKey(src_paths, file_infos):
+  """Returns a key that changes whenever the contents of a shard change."""
+  md5 = hashlib.md5()
+  for path in sorted(src_paths):
+    md5.update(('%s:%s\n' % (path, file_infos[path][2])).encode('utf-8'))
+  return md5.hexdigest()
 
 
-def _CreateDexFiles(shards, prev_shards, dex_staging_dir, min_api,
-                    use_concurrency):
-  """Creates dex files within |dex_staging_dir| defined by |shards|."""
+def _CreateDexFiles(shards, file_infos, prev_shard_keys, dex_staging_dir,
+                    min_api, use_concurrency):
+  """Creates dex files within |dex_staging_dir| defined by |shards|.
+
+  Only shards whose contents changed since they were last created are merged.
+
+  Returns:
+    A dict of shard name -> _ShardKey() of the created dex files.
+  """
+  shard_keys = {}
   tasks = []
   for name, src_paths in shards.items():
     dest_path = os.path.join(dex_staging_dir, name)
-    if _IsStale(src_paths=src_paths,
-                old_src_paths=prev_shards.get(name, []),
-                dest_path=dest_path):
+    shard_keys[name] = _ShardKey(src_paths, file_infos)
+    if (not os.path.exists(dest_path)
+        or prev_shard_keys.get(name) != shard_keys[name]):
       tasks.append(
           functools.partial(dex.MergeDexForIncrementalInstall, _R8_PATH,
-                            src_paths, dest_path, min_api))
+                            sorted(src_paths), dest_path, min_api))
+  logging.info('Merging %d of %d dex shards', len(tasks), len(shards))
 
+  # Each merge runs in its own d8 process.
   # TODO(agrieve): It would be more performant to write a custom d8.jar
   #     wrapper in java that would process these in bulk, rather than spinning
   #     up a new process for each one.
@@ -143,6 +214,7 @@ def _CreateDexFiles(shards, prev_shards, dex_staging_dir, min_api,
   for name in os.listdir(dex_staging_dir):
     if name not in shards:
       os.unlink(os.path.join(dex_staging_dir, name))
+  return shard_keys
 
 
 def Uninstall(device, package, enable_device_cache=False):
@@ -238,14 +310,23 @@ def Install(device, install_json, apk=None, enable_device_cache=False,
 
     def do_merge_dex():
       merge_dex_timer.Start()
-      prev_shards = _LoadPrevShards(dex_staging_dir)
-      shards = _AllocateDexShards(dex_files)
+      prev_state = _LoadPrevShards(dex_staging_dir)
+      file_infos = _ComputeFileInfos(dex_files,
+                                     prev_state.get('file_infos', {}))
+      shards, hot_files = _AllocateDexShards(dex_files, file_infos, prev_state)
       build_utils.MakeDirectory(dex_staging_dir)
-      _CreateDexFiles(shards, prev_shards, dex_staging_dir,
-                      apk.GetMinSdkVersion(), use_concurrency)
+      shard_keys = _CreateDexFiles(shards, file_infos,
+                                   prev_state.get('shard_keys', {}),
+                                   dex_staging_dir, apk.GetMinSdkVersion(),
+                                   use_concurrency)
       # New shard information must be saved after _CreateDexFiles since
       # _CreateDexFiles removes all non-dex files from the staging dir.
-      _SaveNewShards(shards, dex_staging_dir)
+      _SaveNewShards(
+          {
+              'file_infos': file_infos,
+              'hot_files': hot_files,
+              'shard_keys': shard_keys,
+          }, dex_staging_dir)
       merge_dex_timer.Stop(log=False)
 
     def do_push_dex():
@@ -6,6 +6,9 @@
 from __future__ import print_function
 
 import argparse
+import array
+import base64
+import hashlib
 import os
 import re
 import zipfile
@@ -13,12 +16,62 @@ import zipfile
 from pylib.dex import dex_parser
 
 
+# Odd multipliers that combine the hashes of the parts of a method signature.
+_CLASS_MULTIPLIER = 0x9e3779b97f4a7c15
+_PROTO_MULTIPLIER = 0xc2b2ae3d27d4eb4f
+_HASH_MASK = (1 << 64) - 1
+
+
+def _Hash64(value):
+  digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+  return int.from_bytes(digest, 'little')
+
+
+def _HashMethodSignatures(dexfile):
+  """Returns an array('Q') of 64-bit hashes of the dex file's method signatures.
+
+  Tracking hashes rather than signature tuples keeps unique method accounting
+  compact when there are millions of methods (e.g. for Trichrome). Collisions
+  are unlikely enough (~1e-6 for 5 million methods) to not affect counts.
+  """
+  # Classes, prototypes and names are shared by many methods, so each is
+  # hashed only once.
+  type_hashes = {}
+  proto_hashes = {}
+  name_hashes = {}
+  ret = array.array('Q')
+  for type_idx, proto_idx, name_idx in dexfile.method_item_list:
+    class_hash = type_hashes.get(type_idx)
+    if class_hash is None:
+      class_hash = _Hash64(dexfile.GetTypeString(type_idx))
+      type_hashes[type_idx] = class_hash
+    proto_hash = proto_hashes.get(proto_idx)
+    if proto_hash is None:
+      proto_item = dexfile.proto_item_list[proto_idx]
+      parameter_types = dexfile.GetTypeListStringsByOffset(
+          proto_item.parameters_off)
+      proto_hash = _Hash64('{}\0{}'.format(
+          dexfile.GetTypeString(proto_item.return_type_idx),
+          ','.join(parameter_types)))
+      proto_hashes[proto_idx] = proto_hash
+    name_hash = name_hashes.get(name_idx)
+    if name_hash is None:
+      name_hash = _Hash64(dexfile.GetString(name_idx))
+      name_hashes[name_idx] = name_hash
+    ret.append((class_hash * _CLASS_MULTIPLIER + proto_hash * _PROTO_MULTIPLIER
+                + name_hash) & _HASH_MASK)
+  return ret
+
+
 class DexStatsCollector:
   """Tracks count of method/field/string/type as well as unique methods."""
 
   def __init__(self):
-    # Signatures of all methods from all seen dex files.
-    self._unique_methods = set()
+    # Hashes of the method signatures of each seen dex file. Arrays are shared
+    # with merged collectors rather than copied, and duplicates are removed
+    # only when counting.
+    self._method_hashes = []
+    self._unique_method_count = None
     # Map of label -> { metric -> count }.
     self._counts_by_label = {}
 
@@ -30,16 +83,21 @@ class DexStatsCollector:
         'strings': dexfile.header.string_ids_size,
         'types': dexfile.header.type_ids_size,
     }
-    self._unique_methods.update(dexfile.IterMethodSignatureParts())
+    self._method_hashes.append(_HashMethodSignatures(dexfile))
+    self._unique_method_count = None
 
   def CollectFromZip(self, label, path):
     """Add dex stats from an .apk/.jar/.aab/.zip."""
     with zipfile.ZipFile(path, 'r') as z:
-      for subpath in z.namelist():
-        if not re.match(r'.*classes\d*\.dex$', subpath):
-          continue
-        dexfile = dex_parser.DexFile(bytearray(z.read(subpath)))
-        self._CollectFromDexfile('{}!{}'.format(label, subpath), dexfile)
+      self.CollectFromZipFile(label, z)
+
+  def CollectFromZipFile(self, label, zip_file):
+    """Add dex stats from an already opened zipfile.ZipFile."""
+    for subpath in zip_file.namelist():
+      if not re.match(r'.*classes\d*\.dex$', subpath):
+        continue
+      dexfile = dex_parser.DexFile(bytearray(zip_file.read(subpath)))
+      self._CollectFromDexfile('{}!{}'.format(label, subpath), dexfile)
 
   def CollectFromDex(self, label, path):
     """Add dex stats from a .dex file."""
@@ -48,17 +106,48 @@ class DexStatsCollector:
     self._CollectFromDexfile(label, dexfile)
 
   def MergeFrom(self, parent_label, other):
-    """Add dex stats from another DexStatsCollector."""
+    """Add dex stats from another DexStatsCollector.
+
+    Labels from |other| are prefixed with |parent_label|, unless it is None.
+    """
     # pylint: disable=protected-access
     for label, other_counts in other._counts_by_label.items():
-      new_label = '{}-{}'.format(parent_label, label)
+      new_label = label
+      if parent_label is not None:
+        new_label = '{}-{}'.format(parent_label, label)
+      assert new_label not in self._counts_by_label, 'exists: ' + new_label
       self._counts_by_label[new_label] = other_counts.copy()
-    self._unique_methods.update(other._unique_methods)
+    self._method_hashes.extend(other._method_hashes)
+    self._unique_method_count = None
     # pylint: enable=protected-access
 
+  def _GetUniqueMethodHashes(self):
+    # The union iterates over the arrays in C, so the only Python objects are
+    # the ints in the resulting set.
+    return set().union(*self._method_hashes)
+
+  def ToJsonDict(self):
+    """Returns the collected stats as a JSON-serializable dict."""
+    method_hashes = array.array('Q', sorted(self._GetUniqueMethodHashes()))
+    return {
+        'counts_by_label': self._counts_by_label,
+        'method_hashes': base64.b64encode(method_hashes.tobytes()).decode(),
+    }
+
+  @classmethod
+  def FromJsonDict(cls, json_dict):
+    """Creates a DexStatsCollector from the result of ToJsonDict()."""
+    ret = cls()
+    ret._counts_by_label = json_dict['counts_by_label']
+    ret._method_hashes.append(
+        array.array('Q', base64.b64decode(json_dict['method_hashes'])))
+    return ret
+
   def GetUniqueMethodCount(self):
     """Returns total number of unique methods across encountered dex files."""
-    return len(self._unique_methods)
+    if self._unique_method_count is None:
+      self._unique_method_count = len(self._GetUniqueMethodHashes())
+    return self._unique_method_count
 
   def GetCountsByLabel(self):
     """Returns dict of label -> {metric -> count}."""
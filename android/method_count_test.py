@@ -0,0 +1,125 @@
+#!/usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import collections
+import json
+import unittest
+
+import method_count
+
+# pylint: disable=protected-access
+
+_Header = collections.namedtuple(
+    '_Header',
+    ['field_ids_size', 'method_ids_size', 'string_ids_size', 'type_ids_size'])
+_ProtoItem = collections.namedtuple('_ProtoItem',
+                                    ['return_type_idx', 'parameters_off'])
+
+
+class _FakeDexFile:
+  """The parts of dex_parser.DexFile used by DexStatsCollector.
+
+  Args:
+    signatures: A list of (class name, return type, method name, (parameter
+      type, ...)), as returned by DexFile.IterMethodSignatureParts().
+  """
+
+  def __init__(self, signatures):
+    self._signatures = signatures
+    self._types = sorted({s[0] for s in signatures} | {s[1] for s in signatures}
+                         | {t for s in signatures for t in s[3]})
+    self._names = sorted({s[2] for s in signatures})
+    self._type_lists = sorted({s[3] for s in signatures})
+    self.proto_item_list = sorted({
+        _ProtoItem(self._types.index(s[1]), self._type_lists.index(s[3]))
+        for s in signatures
+    })
+    self.method_item_list = [
+        (self._types.index(class_name),
+         self.proto_item_list.index(
+             _ProtoItem(self._types.index(return_type),
+                        self._type_lists.index(parameter_types))),
+         self._names.index(name))
+        for class_name, return_type, name, parameter_types in signatures
+    ]
+    self.header = _Header(field_ids_size=1,
+                          method_ids_size=len(signatures),
+                          string_ids_size=len(self._names),
+                          type_ids_size=len(self._types))
+
+  def GetTypeString(self, type_item_idx):
+    return self._types[type_item_idx]
+
+  def GetString(self, string_item_idx):
+    return self._names[string_item_idx]
+
+  def GetTypeListStringsByOffset(self, offset):
+    return list(self._type_lists[offset])
+
+  def IterMethodSignatureParts(self):
+    return iter(self._signatures)
+
+
+_DEX_1 = _FakeDexFile([
+    ('LFoo;', 'V', '<init>', ()),
+    ('LFoo;', 'I', 'bar', ('I', 'LBar;')),
+    ('LBar;', 'I', 'bar', ('I', 'LBar;')),
+])
+_DEX_2 = _FakeDexFile([
+    ('LFoo;', 'V', '<init>', ()),
+    ('LFoo;', 'I', 'bar', ('I', )),
+    ('LBaz;', 'V', 'baz', ()),
+])
+
+
+def _Collect(*dexfiles):
+  collector = method_count.DexStatsCollector()
+  for i, dexfile in enumerate(dexfiles):
+    collector._CollectFromDexfile('classes%d.dex' % i, dexfile)
+  return collector
+
+
+class DexStatsCollectorTest(unittest.TestCase):
+
+  def testJsonRoundTrip(self):
+    collector = _Collect(_DEX_1, _DEX_2)
+    restored = method_count.DexStatsCollector.FromJsonDict(
+        json.loads(json.dumps(collector.ToJsonDict())))
+    self.assertEqual(collector.GetCountsByLabel(), restored.GetCountsByLabel())
+    self.assertEqual(collector.GetTotalCounts(), restored.GetTotalCounts())
+    self.assertEqual(collector.GetUniqueMethodCount(),
+                     restored.GetUniqueMethodCount())
+    self.assertEqual(
+        collector.GetDexCacheSize(pre_oreo=True),
+        restored.GetDexCacheSize(pre_oreo=True))
+    self.assertEqual(collector.ToJsonDict(), restored.ToJsonDict())
+
+  def testUniqueMethodCount_overlappingDexFiles(self):
+    # The signature tuples that were counted before hashes were used.
+    expected = len(
+        set(_DEX_1.IterMethodSignatureParts())
+        | set(_DEX_2.IterMethodSignatureParts()))
+    self.assertEqual(5, expected)
+
+    collector = _Collect(_DEX_1)
+    collector.MergeFrom('Chrome', _Collect(_DEX_1, _DEX_2))
+    self.assertEqual(expected, collector.GetUniqueMethodCount())
+    # Counts are updated by merges after a count was computed.
+    collector = _Collect(_DEX_1)
+    self.assertEqual(3, collector.GetUniqueMethodCount())
+    collector.MergeFrom('WebView', _Collect(_DEX_2))
+    self.assertEqual(expected, collector.GetUniqueMethodCount())
+
+    restored = method_count.DexStatsCollector.FromJsonDict(
+        json.loads(json.dumps(collector.ToJsonDict())))
+    self.assertEqual(expected, restored.GetUniqueMethodCount())
+    merged = method_count.DexStatsCollector()
+    merged.MergeFrom('Chrome', restored)
+    merged.MergeFrom('WebView', _Collect(_DEX_2))
+    self.assertEqual(expected, merged.GetUniqueMethodCount())
+
+
+if __name__ == '__main__':
+  unittest.main()
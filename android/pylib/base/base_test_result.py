@@ -7,6 +7,7 @@
 
 import functools
 import sys
+import tempfile
 import threading
 
 from lib.results import result_types  # pylint: disable=import-error
@@ -33,10 +34,66 @@ class ResultType:
             ResultType.NOTRUN]
 
 
+# Logs larger than this are moved to a temporary file rather than being kept in
+# memory, since suites with many tests and large logs otherwise use GBs of RAM.
+_MAX_IN_MEMORY_LOG_SIZE = 16 * 1024
+
+
+class _LogSpillFile:
+  """An append-only temporary file holding large test logs."""
+
+  def __init__(self):
+    self._file = None
+    self._lock = threading.Lock()
+
+  def Write(self, data):
+    """Appends |data| and returns its offset in the file."""
+    with self._lock:
+      if self._file is None:
+        self._file = tempfile.TemporaryFile(prefix='test_logs')
+      self._file.seek(0, 2)
+      offset = self._file.tell()
+      self._file.write(data)
+      return offset
+
+  def Read(self, offset, size):
+    with self._lock:
+      self._file.seek(offset)
+      return self._file.read(size)
+
+
+_log_spill_file = _LogSpillFile()
+
+
+class _SpilledLog:
+  """A reference to a log stored in |_log_spill_file|."""
+  __slots__ = ('_offset', '_size', '_is_bytes')
+
+  def __init__(self, log):
+    self._is_bytes = isinstance(log, bytes)
+    data = log if self._is_bytes else log.encode('utf-8', 'surrogatepass')
+    self._offset = _log_spill_file.Write(data)
+    self._size = len(data)
+
+  def Get(self):
+    data = _log_spill_file.Read(self._offset, self._size)
+    return data if self._is_bytes else data.decode('utf-8', 'surrogatepass')
+
+
+def _MaybeSpillLog(log):
+  if log and len(log) > _MAX_IN_MEMORY_LOG_SIZE:
+    return _SpilledLog(log)
+  return log
+
+
 @functools.total_ordering
 class BaseTestResult:
   """Base class for a single test result."""
 
+  # Suites can have 100k+ results, so avoid a __dict__ per result.
+  __slots__ = ('_name', '_test_type', '_duration', '_log', '_failure_reason',
+               '_links')
+
   def __init__(self, name, test_type, duration=0, log='', failure_reason=None):
     """Construct a BaseTestResult.
 
@@ -51,9 +108,10 @@ class BaseTestResult:
     self._name = name
     self._test_type = test_type
     self._duration = duration
-    self._log = log
+    self._log = _MaybeSpillLog(log)
     self._failure_reason = failure_reason
-    self._links = {}
+    # Most results never get links, so the dict is created lazily.
+    self._links = None
 
   def __str__(self):
     return self._name
@@ -97,10 +155,12 @@ class BaseTestResult:
 
   def SetLog(self, log):
     """Set the test log."""
-    self._log = log
+    self._log = _MaybeSpillLog(log)
 
   def GetLog(self):
     """Get the test log."""
+    if isinstance(self._log, _SpilledLog):
+      return self._log.Get()
     return self._log
 
   def SetFailureReason(self, failure_reason):
@@ -121,11 +181,13 @@ class BaseTestResult:
 
   def SetLink(self, name, link_url):
     """Set link with test result data."""
+    if self._links is None:
+      self._links = {}
     self._links[name] = link_url
 
   def GetLinks(self):
     """Get dict containing links to test result data."""
-    return self._links
+    return self._links if self._links is not None else {}
 
 
 class TestRunResults:
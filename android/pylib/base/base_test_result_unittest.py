@@ -73,6 +73,15 @@ class TestTestRunResults(unittest.TestCase):
                    '3 FAILED TESTS')
     self.assertEqual(gtest_print, self.tr.GetGtestForm())
 
+  def testLargeLogRoundTrip(self):
+    log = u'\u2603 log line\n' * 10000
+    r = BaseTestResult('l1', ResultType.FAIL, log=log)
+    self.assertEqual(log, r.GetLog())
+    r.SetLog(log.encode('utf-8'))
+    self.assertEqual(log.encode('utf-8'), r.GetLog())
+    r.SetLog('short')
+    self.assertEqual('short', r.GetLog())
+
   def testRunPassed(self):
     self.assertFalse(self.tr.DidRunPass())
     tr2 = TestRunResults()
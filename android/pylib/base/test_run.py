@@ -21,6 +21,8 @@ class TestRun:
     # Some subclasses have different teardown behavior on receiving SIGTERM.
     self._received_sigterm = False
 
+    self._on_results_finalized = None
+
   def TestPackage(self):
     raise NotImplementedError
 
@@ -37,6 +39,18 @@ class TestRun:
     """
     raise NotImplementedError
 
+  def SetOnResultsFinalized(self, callback):
+    """Sets a callable to invoke with results that will no longer change.
+
+    Test runs that support it call |callback| with a list of
+    |base_test_result.BaseTestResult| as each test or batch of tests finishes,
+    possibly from several threads, while other tests are still running.
+
+    Args:
+      callback: A callable taking a list of results, or None.
+    """
+    self._on_results_finalized = callback
+
   def GetTestsForListing(self):
     """Returns a list of test names."""
     raise NotImplementedError
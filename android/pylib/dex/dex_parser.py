@@ -63,6 +63,30 @@ _ClassDefItem = collections.namedtuple(
     'ClassDefItem',
     'class_idx,access_flags,superclass_idx,interfaces_off,source_file_idx,'
     'annotations_off,class_data_off,static_values_off')
+_EncodedMethod = collections.namedtuple('EncodedMethod',
+                                        'method_idx,access_flags,code_off')
+
+# https://source.android.com/devices/tech/dalvik/dex-format#debug-info-item
+_DBG_END_SEQUENCE = 0x00
+_DBG_ADVANCE_PC = 0x01
+_DBG_ADVANCE_LINE = 0x02
+_DBG_START_LOCAL = 0x03
+_DBG_START_LOCAL_EXTENDED = 0x04
+_DBG_END_LOCAL = 0x05
+_DBG_RESTART_LOCAL = 0x06
+_DBG_SET_FILE = 0x09
+_DBG_FIRST_SPECIAL = 0x0a
+_DBG_LINE_BASE = -4
+_DBG_LINE_RANGE = 15
+# Number of uleb128 operands of each non-special opcode that has any.
+_DBG_OPCODE_OPERAND_COUNTS = {
+    _DBG_ADVANCE_PC: 1,
+    _DBG_START_LOCAL: 3,
+    _DBG_START_LOCAL_EXTENDED: 4,
+    _DBG_END_LOCAL: 1,
+    _DBG_RESTART_LOCAL: 1,
+    _DBG_SET_FILE: 1,
+}
 
 
 class _MemoryItemList:
@@ -243,6 +267,25 @@ class _DexReader:
   def ReadUInt(self):
     return self._ReadData('<I')
 
+  def ReadULeb128(self):
+    value, length = self._ReadULeb128(self._pos)
+    self._pos += length
+    return value
+
+  def ReadSLeb128(self):
+    value = 0
+    shift = 0
+    while True:
+      byte = self._data[self._pos]
+      self._pos += 1
+      value |= (byte & 0b01111111) << shift
+      shift += 7
+      if (byte & 0b10000000) == 0:
+        break
+    if byte & 0b01000000:
+      value -= 1 << shift
+    return value
+
   def ReadString(self, data_offset):
     string_length, string_offset = self._ReadULeb128(data_offset)
     string_data_offset = string_offset + data_offset
@@ -440,6 +483,71 @@ class DexFile:
       yield (class_name_string, return_type_string, method_name_string,
              parameter_types)
 
+  def IterEncodedMethods(self, class_def_item):
+    """Yields an _EncodedMethod for each direct and virtual method of a class.
+
+    Args:
+      class_def_item: A _ClassDefItem from class_def_item_list.
+    """
+    if not class_def_item.class_data_off:
+      return
+    reader = self.reader
+    reader.Seek(class_def_item.class_data_off)
+    static_fields_size = reader.ReadULeb128()
+    instance_fields_size = reader.ReadULeb128()
+    direct_methods_size = reader.ReadULeb128()
+    virtual_methods_size = reader.ReadULeb128()
+    # Each encoded_field is a (field_idx_diff, access_flags) pair.
+    for _ in range(2 * (static_fields_size + instance_fields_size)):
+      reader.ReadULeb128()
+    methods = []
+    for methods_size in (direct_methods_size, virtual_methods_size):
+      # Method indices are delta encoded, restarting for each list.
+      method_idx = 0
+      for _ in range(methods_size):
+        method_idx += reader.ReadULeb128()
+        methods.append(
+            _EncodedMethod(method_idx, reader.ReadULeb128(),
+                           reader.ReadULeb128()))
+    # Callers may move the reader, so only yield once the class data is read.
+    yield from methods
+
+  def GetLineNumbers(self, code_off):
+    """Returns the line numbers of the positions of a method's code.
+
+    This is what dexdump prints as the method's "positions", in order.
+
+    Args:
+      code_off: The code_off of an _EncodedMethod, may be 0 for methods without
+        code.
+    """
+    if not code_off:
+      return []
+    reader = self.reader
+    # debug_info_off follows the four ushort sizes of the code_item.
+    reader.Seek(code_off + 8)
+    debug_info_off = reader.ReadUInt()
+    if not debug_info_off:
+      return []
+    reader.Seek(debug_info_off)
+    line = reader.ReadULeb128()
+    parameters_size = reader.ReadULeb128()
+    for _ in range(parameters_size):
+      reader.ReadULeb128()
+    line_numbers = []
+    while True:
+      opcode = reader.ReadUByte()
+      if opcode >= _DBG_FIRST_SPECIAL:
+        line += _DBG_LINE_BASE + (opcode - _DBG_FIRST_SPECIAL) % _DBG_LINE_RANGE
+        line_numbers.append(line)
+      elif opcode == _DBG_ADVANCE_LINE:
+        line += reader.ReadSLeb128()
+      elif opcode == _DBG_END_SEQUENCE:
+        return line_numbers
+      else:
+        for _ in range(_DBG_OPCODE_OPERAND_COUNTS.get(opcode, 0)):
+          reader.ReadULeb128()
+
   def __repr__(self):
     items = [
         self.header,
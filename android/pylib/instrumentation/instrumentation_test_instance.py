@@ -130,43 +130,101 @@ def GenerateTestResults(result_code, result_bundle, statuses, duration_ms,
     A list containing an instance of InstrumentationTestResult for each test
     parsed.
   """
+  builder = TestResultsBuilder(device_abi, symbolizer)
+  for status_code, bundle in statuses:
+    builder.AddStatus(status_code, bundle)
+  return builder.Finish(result_code, result_bundle, duration_ms)
 
-  results = []
 
-  current_result = None
-  cumulative_duration = 0
+class TestResultsBuilder:
+  """Incrementally builds test results from instrumentation statuses.
+
+  Unlike |GenerateTestResults|, this does not need all statuses up front: a
+  result is handed to |on_result| as soon as the status for the next test
+  starts, which allows per-test reporting while a batch is still running.
+
+  Results passed to |on_result| may still be updated by |Finish|: the first
+  test is charged the instrumentation overhead, tests that never reported a
+  duration get the duration of the whole run, and the last test may be marked
+  as crashed.
+  """
+
+  def __init__(self, device_abi, symbolizer, on_result=None):
+    """Constructor.
+
+    Args:
+      device_abi: The device_abi, which is needed for symbolization.
+      symbolizer: The symbolizer used to symbolize stack.
+      on_result: An optional callable invoked with each
+        InstrumentationTestResult once all of its statuses have been seen.
+    """
+    self._device_abi = device_abi
+    self._symbolizer = symbolizer
+    self._on_result = on_result
+    self._results = []
+    self._results_with_duration = set()
+    self._current_result = None
+    self._cumulative_duration = 0
+    self._num_full_duration_results = 0
+
+  def _FinishCurrentResult(self):
+    if self._current_result:
+      self._results.append(self._current_result)
+      if self._on_result:
+        self._on_result(self._current_result)
+
+  def GetCurrentResult(self):
+    """Returns the result of the test that is running, or None.
+
+    Its type is updated as soon as the test fails, before it is handed to
+    |on_result|.
+    """
+    return self._current_result
+
+  def AddStatus(self, status_code, bundle):
+    """Processes a single instrumentation status.
+
+    Args:
+      status_code: The status code as an integer.
+      bundle: The bundle dump as a dict mapping string keys to string values.
+    """
+    current_result = self._current_result
 
-  for status_code, bundle in statuses:
     # If the last test was a failure already, don't override that failure with
     # post-test failures that could be caused by the original failure.
     if (status_code == instrumentation_parser.STATUS_CODE_BATCH_FAILURE
         and current_result.GetType() != base_test_result.ResultType.FAIL):
       current_result.SetType(base_test_result.ResultType.FAIL)
-      _MaybeSetLog(bundle, current_result, symbolizer, device_abi)
-      continue
+      _MaybeSetLog(bundle, current_result, self._symbolizer, self._device_abi)
+      return
 
     if status_code == instrumentation_parser.STATUS_CODE_TEST_DURATION:
-      # For the first result, duration will be set below to the difference
-      # between the reported and actual durations to account for overhead like
-      # starting instrumentation.
-      if results:
-        current_duration = int(bundle.get(_BUNDLE_DURATION_ID, duration_ms))
-        current_result.SetDuration(current_duration)
-        cumulative_duration += current_duration
-      continue
+      # For the first result, duration will be set in Finish() to the
+      # difference between the reported and actual durations to account for
+      # overhead like starting instrumentation.
+      if self._results:
+        if _BUNDLE_DURATION_ID in bundle:
+          current_duration = int(bundle[_BUNDLE_DURATION_ID])
+          current_result.SetDuration(current_duration)
+          self._results_with_duration.add(id(current_result))
+          self._cumulative_duration += current_duration
+        else:
+          # The duration of the whole run is only known in Finish().
+          self._num_full_duration_results += 1
+      return
 
     test_class = bundle.get(_BUNDLE_CLASS_ID, '')
     test_method = bundle.get(_BUNDLE_TEST_ID, '')
     if test_class and test_method:
       test_name = '%s#%s' % (test_class, test_method)
     else:
-      continue
+      return
 
     if status_code == instrumentation_parser.STATUS_CODE_START:
-      if current_result:
-        results.append(current_result)
+      self._FinishCurrentResult()
       current_result = test_result.InstrumentationTestResult(
-          test_name, base_test_result.ResultType.UNKNOWN, duration_ms)
+          test_name, base_test_result.ResultType.UNKNOWN, 0)
+      self._current_result = current_result
     else:
       if status_code == instrumentation_parser.STATUS_CODE_OK:
         if bundle.get(_BUNDLE_SKIPPED_ID, '').lower() in ('true', '1', 'yes'):
@@ -183,23 +241,43 @@ def GenerateTestResults(result_code, result_bundle, statuses, duration_ms,
           logging.error('Unrecognized status code %d. Handling as an error.',
                         status_code)
         current_result.SetType(base_test_result.ResultType.FAIL)
-    _MaybeSetLog(bundle, current_result, symbolizer, device_abi)
-
-  if current_result:
-    if current_result.GetType() == base_test_result.ResultType.UNKNOWN:
-      crashed = (result_code == _ACTIVITY_RESULT_CANCELED and any(
-          _NATIVE_CRASH_RE.search(l) for l in six.itervalues(result_bundle)))
-      if crashed:
-        current_result.SetType(base_test_result.ResultType.CRASH)
-
-    results.append(current_result)
+    _MaybeSetLog(bundle, current_result, self._symbolizer, self._device_abi)
 
-  if results:
-    logging.info('Adding cumulative overhead to test %s: %dms',
-                 results[0].GetName(), duration_ms - cumulative_duration)
-    results[0].SetDuration(duration_ms - cumulative_duration)
+  def Finish(self, result_code, result_bundle, duration_ms):
+    """Finalizes the results once the instrumentation has exited.
 
-  return results
+    Args:
+      result_code: The overall status code as an integer.
+      result_bundle: The summary bundle dump as a dict.
+      duration_ms: The duration of the test in milliseconds.
+
+    Returns:
+      A list containing an instance of InstrumentationTestResult for each test
+      parsed.
+    """
+    current_result = self._current_result
+    if current_result:
+      if current_result.GetType() == base_test_result.ResultType.UNKNOWN:
+        crashed = (result_code == _ACTIVITY_RESULT_CANCELED and any(
+            _NATIVE_CRASH_RE.search(l) for l in six.itervalues(result_bundle)))
+        if crashed:
+          current_result.SetType(base_test_result.ResultType.CRASH)
+      self._FinishCurrentResult()
+      self._current_result = None
+
+    results = self._results
+    for r in results:
+      if id(r) not in self._results_with_duration:
+        r.SetDuration(duration_ms)
+    cumulative_duration = (self._cumulative_duration +
+                           self._num_full_duration_results * duration_ms)
+
+    if results:
+      logging.info('Adding cumulative overhead to test %s: %dms',
+                   results[0].GetName(), duration_ms - cumulative_duration)
+      results[0].SetDuration(duration_ms - cumulative_duration)
+
+    return results
 
 
 def _MaybeSetLog(bundle, current_result, symbolizer, device_abi):
@@ -621,6 +699,7 @@ class InstrumentationTestInstance(test_instance.TestInstance):
     self._screenshot_dir = None
     self._timeout_scale = None
     self._wait_for_java_debugger = None
+    self._fail_fast = False
     self._initializeTestControlAttributes(args)
 
     self._coverage_directory = None
@@ -838,6 +917,7 @@ class InstrumentationTestInstance(test_instance.TestInstance):
     self._screenshot_dir = args.screenshot_dir
     self._timeout_scale = args.timeout_scale or 1
     self._wait_for_java_debugger = args.wait_for_java_debugger
+    self._fail_fast = args.fail_fast
 
   def _initializeTestCoverageAttributes(self, args):
     self._coverage_directory = args.coverage_dir
@@ -934,6 +1014,10 @@ class InstrumentationTestInstance(test_instance.TestInstance):
   def modules(self):
     return self._modules
 
+  @property
+  def fail_fast(self):
+    return self._fail_fast
+
   @property
   def fake_modules(self):
     return self._fake_modules
@@ -1095,7 +1179,7 @@ class InstrumentationTestInstance(test_instance.TestInstance):
     self._data_deps.extend(
         self._data_deps_delegate(self._runtime_deps_path))
     if self._proguard_mapping_path:
-      self._deobfuscator = deobfuscator.DeobfuscatorPool(
+      self._deobfuscator = deobfuscator.Deobfuscator(
           self._proguard_mapping_path)
 
   def GetDataDependencies(self):
@@ -1210,6 +1294,10 @@ class InstrumentationTestInstance(test_instance.TestInstance):
     return GenerateTestResults(result_code, result_bundle, statuses,
                                duration_ms, device_abi, symbolizer)
 
+  @staticmethod
+  def CreateTestResultsBuilder(device_abi, symbolizer, on_result=None):
+    return TestResultsBuilder(device_abi, symbolizer, on_result=on_result)
+
   #override
   def TearDown(self):
     self.symbolizer.CleanUp()
@@ -1012,6 +1012,50 @@ class InstrumentationTestInstanceTest(unittest.TestCase):
     self.assertEqual(1, len(results))
     self.assertEqual(base_test_result.ResultType.SKIP, results[0].GetType())
 
+  def testTestResultsBuilder_reportsResultsAsTheyFinish(self):
+    reported = []
+    builder = instrumentation_test_instance.TestResultsBuilder(
+        None, None, on_result=reported.append)
+    builder.AddStatus(1, {
+        'class': 'test.package.TestClass',
+        'test': 'testMethod1',
+    })
+    builder.AddStatus(-2, {
+        'class': 'test.package.TestClass',
+        'test': 'testMethod1',
+    })
+    self.assertEqual([], reported)
+    builder.AddStatus(1, {
+        'class': 'test.package.TestClass',
+        'test': 'testMethod2',
+    })
+    self.assertEqual(1, len(reported))
+    self.assertEqual('test.package.TestClass#testMethod1',
+                     reported[0].GetName())
+    self.assertEqual(base_test_result.ResultType.FAIL, reported[0].GetType())
+    builder.AddStatus(0, {
+        'class': 'test.package.TestClass',
+        'test': 'testMethod2',
+    })
+    builder.AddStatus(1337, {'duration_ms': '100'})
+    results = builder.Finish(None, None, 1000)
+    self.assertEqual(2, len(reported))
+    self.assertEqual(reported, results)
+    self.assertEqual(base_test_result.ResultType.PASS, results[1].GetType())
+    self.assertEqual(900, results[0].GetDuration())
+    self.assertEqual(100, results[1].GetDuration())
+
+  def testTestResultsBuilder_missingDurationUsesWholeRun(self):
+    builder = instrumentation_test_instance.TestResultsBuilder(None, None)
+    for method in ('testMethod1', 'testMethod2'):
+      for code in (1, 0):
+        builder.AddStatus(code, {
+            'class': 'test.package.TestClass',
+            'test': method,
+        })
+    results = builder.Finish(None, None, 1000)
+    self.assertEqual([1000, 1000], [r.GetDuration() for r in results])
+
   def testParameterizedCommandLineFlagsSwitches(self):
     o = self.createTestInstance()
     raw_tests = [{
@@ -8,6 +8,7 @@ from pylib.base import base_test_result
 
 class InstrumentationTestResult(base_test_result.BaseTestResult):
   """Result information for a single instrumentation test."""
+  __slots__ = ('_test_name', '_class_name')
 
   def __init__(self, full_name, test_type, dur, log=''):
     """Construct an InstrumentationTestResult object.
@@ -24,6 +24,7 @@ from pylib import constants
 from pylib.constants import host_paths
 from pylib.base import environment
 from pylib.utils import instrumentation_tracing
+from pylib.utils import test_data_manifest
 from py_trace_event import trace_event
 
 
@@ -40,6 +41,11 @@ def _DeviceCachePath(device):
   return os.path.join(constants.GetOutDirectory(), file_name)
 
 
+def _TestDataManifestPath(device):
+  file_name = 'test_data_manifest_%s.json' % device.adb.GetDeviceSerial()
+  return os.path.join(constants.GetOutDirectory(), file_name)
+
+
 def handle_shard_failures(f):
   """A decorator that handles device failures for per-device functions.
 
@@ -220,6 +226,10 @@ class LocalDeviceEnvironment(environment.Environment):
   def concurrent_adb(self):
     return self._concurrent_adb
 
+  @property
+  def enable_device_cache(self):
+    return self._enable_device_cache
+
   @property
   def devices(self):
     # Initialize lazily so that host-only tests do not fail when no devices are
@@ -312,6 +322,24 @@ class LocalDeviceEnvironment(environment.Environment):
            if os.path.exists(m.output_file)])
       shutil.rmtree(self._logcat_output_dir)
 
+  def PushChangedFiles(self, device, host_device_tuples, **kwargs):
+    """Pushes test data dependencies to |device|.
+
+    When the device cache is enabled, a host-side manifest of what was last
+    pushed to |device| is used to skip unchanged files without hashing them on
+    the device.
+
+    Args:
+      device: The device to push to.
+      host_device_tuples: A list of (host_path, device_path) tuples.
+      **kwargs: Passed to DeviceUtils.PushChangedFiles().
+    """
+    if not self._enable_device_cache:
+      device.PushChangedFiles(host_device_tuples, **kwargs)
+      return
+    test_data_manifest.PushChangedFiles(device, host_device_tuples,
+                                        _TestDataManifestPath(device), **kwargs)
+
   def DenylistDevice(self, device, reason='local_device_failure'):
     device_serial = device.adb.GetDeviceSerial()
     if self._denylist:
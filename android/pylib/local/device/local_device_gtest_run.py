@@ -503,7 +503,8 @@ class LocalDeviceGtestRun(local_device_test_run.LocalDeviceTestRun):
             (h, local_device_test_run.SubstituteDeviceRoot(d, device_root))
             for h, d in host_device_tuples]
         local_device_environment.place_nomedia_on_device(dev, device_root)
-        dev.PushChangedFiles(
+        self._env.PushChangedFiles(
+            dev,
             host_device_tuples_substituted,
             delete_device_stale=True,
             # Some gtest suites, e.g. unit_tests, have data dependencies that
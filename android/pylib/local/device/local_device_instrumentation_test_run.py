@@ -6,6 +6,7 @@
 import collections
 import contextlib
 import copy
+import functools
 import hashlib
 import json
 import logging
@@ -15,6 +16,7 @@ import re
 import shutil
 import sys
 import tempfile
+import threading
 import time
 
 from six.moves import range  # pylint: disable=redefined-builtin
@@ -30,6 +32,7 @@ from devil.android.sdk import version_codes
 from devil.android import logcat_monitor
 from devil.android.tools import system_app
 from devil.android.tools import webview_app
+from devil.utils import cmd_helper
 from devil.utils import reraiser_thread
 from incremental_install import installer
 from pylib import constants
@@ -37,11 +40,13 @@ from pylib import valgrind_tools
 from pylib.base import base_test_result
 from pylib.base import output_manager
 from pylib.constants import host_paths
+from pylib.instrumentation import instrumentation_parser
 from pylib.instrumentation import instrumentation_test_instance
 from pylib.local.device import local_device_environment
 from pylib.local.device import local_device_test_run
 from pylib.output import remote_output_manager
 from pylib.utils import chrome_proxy_utils
+from pylib.utils import file_digest
 from pylib.utils import gold_utils
 from pylib.utils import instrumentation_tracing
 from pylib.utils import shared_preference_utils
@@ -125,6 +130,15 @@ RENDER_TEST_MODEL_SDK_CONFIGS = {
 _BATCH_SUFFIX = '_batch'
 _TEST_BATCH_MAX_GROUP_SIZE = 256
 
+# Only the tail of the raw instrumentation output is kept around for logging
+# failures so that large batches do not need to be held in memory.
+_MAX_RAW_OUTPUT_LINES_TO_LOG = 10000
+
+_INSTRUMENTATION_STATUS_CODE_PREFIX = 'INSTRUMENTATION_STATUS_CODE:'
+
+# Same as DeviceUtils._MAX_ADB_COMMAND_LENGTH.
+_MAX_ADB_COMMAND_LENGTH = 512
+
 
 @contextlib.contextmanager
 def _LogTestEndpoints(device, test_name):
@@ -180,6 +194,179 @@ def _GetTargetPackageName(test_apk):
   return test_apk.GetAllInstrumentations()[0]['android:targetPackage']
 
 
+_LAST_UPDATE_TIME_RE = re.compile(r'^\s*lastUpdateTime=(.*)$')
+
+
+def _DeviceSetupStatePath(device):
+  file_name = 'device_setup_state_%s.json' % device.adb.GetDeviceSerial()
+  return os.path.join(constants.GetOutDirectory(), file_name)
+
+
+class _DeviceSetupState:
+  """Host-side record of the APKs that set up installed on a device.
+
+  Entries are keyed by package name and hold the APK's path, mtime, size and
+  digest and its install options, along with the package's lastUpdateTime on
+  the device. An install is skipped only if both still match, so installs done
+  by anything else than test_runner.py invalidate the entry. The APK is hashed
+  only when its mtime or size changed, e.g. when it was rebuilt.
+
+  Like the devil device cache, the file is deleted when loaded and only written
+  back once set up succeeded so that failures clear it.
+  """
+
+  def __init__(self, device, enabled):
+    self._device = device
+    self._enabled = enabled
+    self._entries = {}
+    self._lock = threading.Lock()
+    if not enabled:
+      return
+    path = _DeviceSetupStatePath(device)
+    if os.path.exists(path):
+      logging.info('Using device setup state: %s', path)
+      try:
+        with open(path) as f:
+          self._entries = json.load(f)
+      except ValueError:
+        logging.warning('Ignoring invalid device setup state: %s', path)
+      os.unlink(path)
+
+  def _GetLastUpdateTime(self, package):
+    output = self._device.RunShellCommand(['dumpsys', 'package', package],
+                                          check_return=True)
+    times = [
+        m.group(1) for m in (_LAST_UPDATE_TIME_RE.match(l) for l in output)
+        if m
+    ]
+    return ','.join(times) or None
+
+  @staticmethod
+  def GetInstallKey(apk, **install_kwargs):
+    """Returns a key identifying an install of |apk|, or None if uncacheable."""
+    path = getattr(apk, 'path', None)
+    if not path or not path.endswith(('.apk', '.apks')):
+      return None
+    if not os.path.isfile(path):
+      return None
+    st = os.stat(path)
+    return {
+        'apk': [path, st.st_mtime_ns, st.st_size],
+        'options': json.dumps(install_kwargs, sort_keys=True, default=str),
+    }
+
+  @staticmethod
+  def _GetDigest(key):
+    if 'digest' not in key:
+      key['digest'] = file_digest.GetFileMd5(key['apk'][0])
+    return key['digest']
+
+  def IsInstalled(self, package, key):
+    if not self._enabled or key is None:
+      return False
+    with self._lock:
+      entry = self._entries.get(package)
+    if (not entry or entry.get('options') != key['options']
+        or entry['last_update_time'] != self._GetLastUpdateTime(package)):
+      return False
+    if entry['apk'] == key['apk']:
+      return True
+    if entry['digest'] != self._GetDigest(key):
+      return False
+    # Same content with a new mtime, so there is no need to hash it next time.
+    with self._lock:
+      entry['apk'] = key['apk']
+    return True
+
+  def SetInstalled(self, package, key):
+    if not self._enabled or key is None:
+      return
+    last_update_time = self._GetLastUpdateTime(package)
+    with self._lock:
+      if last_update_time:
+        self._entries[package] = {
+            'apk': key['apk'],
+            'digest': self._GetDigest(key),
+            'options': key['options'],
+            'last_update_time': last_update_time,
+        }
+      else:
+        self._entries.pop(package, None)
+
+  def Invalidate(self, package):
+    with self._lock:
+      self._entries.pop(package, None)
+
+  def Save(self):
+    if not self._enabled:
+      return
+    path = _DeviceSetupStatePath(self._device)
+    if not os.path.exists(os.path.dirname(path)):
+      logging.warning('Unable to write device setup state as %s does not exist',
+                      os.path.dirname(path))
+      return
+    with self._lock:
+      with open(path, 'w') as f:
+        json.dump(self._entries, f)
+    logging.info('Wrote device setup state: %s', path)
+
+
+class _SetUpPipeline:
+  """Runs per-device set up steps while honoring the order they depend on.
+
+  Steps are run in the order they were added when running serially. When
+  running concurrently, each step starts as soon as the steps it depends on
+  have finished, e.g. pushing test data overlaps with installing APKs.
+  """
+
+  def __init__(self, wrap_step):
+    """Constructor.
+
+    Args:
+      wrap_step: A callable wrapping each step into a function that takes no
+        arguments.
+    """
+    self._wrap_step = wrap_step
+    self._steps = []
+
+  def Add(self, step, after=()):
+    """Adds |step|, to be run once all steps in |after| have finished.
+
+    Returns:
+      |step|, so that it can be used as a dependency of later steps.
+    """
+    added = set(s for s, _ in self._steps)
+    assert all(d in added for d in after), 'Dependencies must be added first.'
+    self._steps.append((step, tuple(after)))
+    return step
+
+  def Run(self, concurrent):
+    if not concurrent:
+      for step, _ in self._steps:
+        self._wrap_step(step)()
+      return
+
+    done = {step: threading.Event() for step, _ in self._steps}
+    failed = threading.Event()
+
+    def run_step(step, after):
+      try:
+        for d in after:
+          done[d].wait()
+        # Do not bother running the remaining steps when one failed since
+        # RunAsync() re-raises the first failure anyway.
+        if not failed.is_set():
+          self._wrap_step(step)()
+      except Exception:
+        failed.set()
+        raise
+      finally:
+        done[step].set()
+
+    reraiser_thread.RunAsync(
+        [functools.partial(run_step, s, a) for s, a in self._steps])
+
+
 class LocalDeviceInstrumentationTestRun(
     local_device_test_run.LocalDeviceTestRun):
   def __init__(self, env, test_instance):
@@ -212,7 +399,38 @@ class LocalDeviceInstrumentationTestRun(
         self._env.DenylistDevice)
     @trace_event.traced
     def individual_device_set_up(device, host_device_tuples):
-      steps = []
+      setup_state = _DeviceSetupState(device, self._env.enable_device_cache)
+
+      def bind_crash_handler(step):
+        return lambda: crash_handler.RetryOnSystemCrash(step, device)
+
+      pipeline = _SetUpPipeline(bind_crash_handler)
+      # Steps that change which packages are on the device. Everything else
+      # depends on these.
+      system_steps = []
+      # APK installs are kept in order relative to each other (e.g. the apk
+      # under test must be installed last), but other steps that do not need
+      # the installed packages run concurrently with them.
+      install_steps = []
+
+      def add_install_step(step):
+        install_steps.append(
+            pipeline.Add(step, after=system_steps + install_steps[-1:]))
+
+      if self._test_instance.system_packages_to_remove:
+
+        @trace_event.traced
+        def remove_packages(dev):
+          logging.info('Attempting to remove system packages %s',
+                       self._test_instance.system_packages_to_remove)
+          system_app.RemoveSystemApps(
+              dev, self._test_instance.system_packages_to_remove)
+          logging.info('Done removing system packages')
+
+        # This should be at the front in case we're removing the package to make
+        # room for another APK installation later on. Since we disallow
+        # concurrent adb with this option specified, this should be safe.
+        system_steps.append(pipeline.Add(remove_packages))
 
       if self._test_instance.replace_system_package:
         @trace_event.traced
@@ -234,22 +452,7 @@ class LocalDeviceInstrumentationTestRun(
           # pylint: enable=no-member
           self._context_managers[str(dev)].append(system_app_context)
 
-        steps.append(replace_package)
-
-      if self._test_instance.system_packages_to_remove:
-
-        @trace_event.traced
-        def remove_packages(dev):
-          logging.info('Attempting to remove system packages %s',
-                       self._test_instance.system_packages_to_remove)
-          system_app.RemoveSystemApps(
-              dev, self._test_instance.system_packages_to_remove)
-          logging.info('Done removing system packages')
-
-        # This should be at the front in case we're removing the package to make
-        # room for another APK installation later on. Since we disallow
-        # concurrent adb with this option specified, this should be safe.
-        steps.insert(0, remove_packages)
+        system_steps.append(pipeline.Add(replace_package, after=system_steps))
 
       def install_helper(apk,
                          modules=None,
@@ -258,29 +461,40 @@ class LocalDeviceInstrumentationTestRun(
                          additional_locales=None,
                          instant_app=False):
 
+        install_kwargs = dict(
+            modules=modules,
+            fake_modules=fake_modules,
+            permissions=permissions,
+            additional_locales=additional_locales,
+            instant_app=instant_app,
+            force_queryable=self._test_instance.IsApkForceQueryable(apk))
+
         @instrumentation_tracing.no_tracing
         @trace_event.traced
         def install_helper_internal(d, apk_path=None):
           # pylint: disable=unused-argument
-          d.Install(
-              apk,
-              modules=modules,
-              fake_modules=fake_modules,
-              permissions=permissions,
-              additional_locales=additional_locales,
-              instant_app=instant_app,
-              force_queryable=self._test_instance.IsApkForceQueryable(apk))
+          package = apk_helper.GetPackageName(apk)
+          key = _DeviceSetupState.GetInstallKey(apk, **install_kwargs)
+          # Fake modules are pushed by Install() and are cleared by installs of
+          # other APKs, so an APK that uses them is always installed.
+          if not fake_modules and setup_state.IsInstalled(package, key):
+            logging.info('Skipping install of %s: already up to date.',
+                         package)
+            return
+          setup_state.Invalidate(package)
+          d.Install(apk, **install_kwargs)
+          setup_state.SetInstalled(package, key)
 
         return install_helper_internal
 
       def install_apex_helper(apex):
         @instrumentation_tracing.no_tracing
         @trace_event.traced
-        def install_helper_internal(d, apk_path=None):
+        def install_apex_helper_internal(d, apk_path=None):
           # pylint: disable=unused-argument
           d.InstallApex(apex)
 
-        return install_helper_internal
+        return install_apex_helper_internal
 
       def incremental_install_helper(apk, json_path, permissions):
 
@@ -291,9 +505,10 @@ class LocalDeviceInstrumentationTestRun(
 
         return incremental_install_helper_internal
 
-      steps.extend(
-          install_apex_helper(apex)
-          for apex in self._test_instance.additional_apexs)
+      # Installing an apex reboots the device, so nothing can run alongside.
+      for apex in self._test_instance.additional_apexs:
+        system_steps.append(
+            pipeline.Add(install_apex_helper(apex), after=system_steps))
 
       permissions = self._test_instance.test_apk.GetPermissions()
       if self._test_instance.test_apk_incremental_install_json:
@@ -301,20 +516,21 @@ class LocalDeviceInstrumentationTestRun(
           raise Exception('Test APK cannot be installed as an instant '
                           'app if it is incremental')
 
-        steps.append(
+        add_install_step(
             incremental_install_helper(
                 self._test_instance.test_apk,
                 self._test_instance.test_apk_incremental_install_json,
                 permissions))
       else:
-        steps.append(
+        add_install_step(
             install_helper(self._test_instance.test_apk,
                            permissions=permissions,
                            instant_app=self._test_instance.test_apk_as_instant))
 
-      steps.extend(
-          install_helper(apk, instant_app=self._test_instance.IsApkInstant(apk))
-          for apk in self._test_instance.additional_apks)
+      for apk in self._test_instance.additional_apks:
+        add_install_step(
+            install_helper(apk,
+                           instant_app=self._test_instance.IsApkInstant(apk)))
 
       # We'll potentially need the package names later for setting app
       # compatibility workarounds.
@@ -346,7 +562,7 @@ class LocalDeviceInstrumentationTestRun(
           # pylint: enable=no-member
           self._context_managers[str(dev)].append(webview_context)
 
-        steps.append(use_webview_provider)
+        add_install_step(use_webview_provider)
 
       if self._test_instance.use_voice_interaction_service:
 
@@ -362,7 +578,7 @@ class LocalDeviceInstrumentationTestRun(
           self._context_managers[str(device)].append(
               voice_interaction_service_context)
 
-        steps.append(use_voice_interaction_service)
+        pipeline.Add(use_voice_interaction_service, after=system_steps)
 
       # The apk under test needs to be installed last since installing other
       # apks after will unintentionally clear the fake module directory.
@@ -372,13 +588,13 @@ class LocalDeviceInstrumentationTestRun(
             apk_helper.GetPackageName(self._test_instance.apk_under_test))
         permissions = self._test_instance.apk_under_test.GetPermissions()
         if self._test_instance.apk_under_test_incremental_install_json:
-          steps.append(
+          add_install_step(
               incremental_install_helper(
                   self._test_instance.apk_under_test,
                   self._test_instance.apk_under_test_incremental_install_json,
                   permissions))
         else:
-          steps.append(
+          add_install_step(
               install_helper(self._test_instance.apk_under_test,
                              self._test_instance.modules,
                              self._test_instance.fake_modules, permissions,
@@ -441,9 +657,10 @@ class LocalDeviceInstrumentationTestRun(
         local_device_environment.place_nomedia_on_device(dev,
                                                          test_data_root_dir,
                                                          as_root=as_root)
-        dev.PushChangedFiles(host_device_tuples_substituted,
-                             delete_device_stale=True,
-                             as_root=as_root)
+        self._env.PushChangedFiles(dev,
+                                   host_device_tuples_substituted,
+                                   delete_device_stale=True,
+                                   as_root=as_root)
 
         if not host_device_tuples_substituted:
           dev.RunShellCommand(['rm', '-rf', test_data_root_dir],
@@ -464,24 +681,26 @@ class LocalDeviceInstrumentationTestRun(
         valgrind_tools.SetChromeTimeoutScale(
             dev, self._test_instance.timeout_scale)
 
-      steps += [
-          set_debug_app, edit_shared_prefs, approve_app_links, push_test_data,
-          create_flag_changer, set_vega_permissions, DismissCrashDialogs
+      after_installs = system_steps + install_steps[-1:]
+      final_steps = [
+          pipeline.Add(set_debug_app, after=system_steps),
+          pipeline.Add(edit_shared_prefs, after=after_installs),
+          pipeline.Add(approve_app_links, after=after_installs),
+          # Test data stored in the app directory needs the app installed.
+          pipeline.Add(push_test_data,
+                       after=(after_installs
+                              if self._test_instance.store_data_in_app_directory
+                              else system_steps)),
+          pipeline.Add(create_flag_changer, after=system_steps),
+          pipeline.Add(set_vega_permissions, after=after_installs),
       ]
-
-      def bind_crash_handler(step, dev):
-        return lambda: crash_handler.RetryOnSystemCrash(step, dev)
-
-      steps = [bind_crash_handler(s, device) for s in steps]
+      pipeline.Add(DismissCrashDialogs, after=after_installs + final_steps)
 
       try:
-        if self._env.concurrent_adb:
-          reraiser_thread.RunAsync(steps)
-        else:
-          for step in steps:
-            step()
+        pipeline.Run(self._env.concurrent_adb)
         if self._test_instance.store_tombstones:
           tombstones.ClearAllTombstones(device)
+        setup_state.Save()
       except device_errors.CommandFailedError:
         if not device.IsOnline():
           raise
@@ -678,7 +897,11 @@ class LocalDeviceInstrumentationTestRun(
     return instrumentation_test_instance.GetUniqueTestName(test)
 
   #override
-  def _RunTest(self, device, test):
+  def _RunTestWithResults(self, device, test, results):
+    return self._RunTest(device, test, try_results=results)
+
+  #override
+  def _RunTest(self, device, test, try_results=None):
     extras = {}
 
     if self._test_instance.is_unit_test:
@@ -821,27 +1044,16 @@ class LocalDeviceInstrumentationTestRun(
     if self._test_instance.store_data_in_app_directory:
       extras.update({'fetchTestDataFromAppDataDir': 'true'})
 
-    time_ms = lambda: int(time.time() * 1e3)
-    start_ms = time_ms()
+    # Results of batched tests are reported to |try_results| as soon as each
+    # test finishes rather than once the whole batch is done.
+    on_result = None
+    if isinstance(test, list) and try_results is not None:
+      on_result = try_results.AddResult
 
     with ui_capture_dir:
       with self._ArchiveLogcat(device, test_name) as logcat_file:
-        output = device.StartInstrumentation(
-            target, raw=True, extras=extras, timeout=timeout, retries=0)
-
-      duration_ms = time_ms() - start_ms
-
-      with contextlib_ext.Optional(
-          trace_event.trace('ProcessResults'),
-          self._env.trace_output):
-        output = self._test_instance.MaybeDeobfuscateLines(output)
-        # TODO(jbudorick): Make instrumentation tests output a JSON so this
-        # doesn't have to parse the output.
-        result_code, result_bundle, statuses = (
-            self._test_instance.ParseAmInstrumentRawOutput(output))
-        results = self._test_instance.GenerateTestResults(
-            result_code, result_bundle, statuses, duration_ms,
-            device.product_cpu_abi, self._test_instance.symbolizer)
+        output, results, aborted = self._RunInstrumentation(
+            device, target, extras, timeout, test_display_name, on_result)
 
       if self._env.trace_output:
         self._SaveTraceData(trace_device_file, device, test['class'])
@@ -946,12 +1158,19 @@ class LocalDeviceInstrumentationTestRun(
         if r.GetName() == test_name:
           r.SetName(test_display_name)
 
-    # Add UNKNOWN results for any missing tests.
+    # Add UNKNOWN results for any missing tests. When the batch was stopped
+    # early because of --fail-fast, the missing tests never ran.
+    missing_type = (base_test_result.ResultType.NOTRUN
+                    if aborted else base_test_result.ResultType.UNKNOWN)
+    if aborted:
+      for r in results:
+        if r.GetType() == base_test_result.ResultType.UNKNOWN:
+          r.SetType(base_test_result.ResultType.NOTRUN)
     iterable_test = test if isinstance(test, list) else [test]
     test_names = set(self._GetUniqueTestName(t) for t in iterable_test)
     results_names = set(r.GetName() for r in results)
     results.extend(
-        base_test_result.BaseTestResult(u, base_test_result.ResultType.UNKNOWN)
+        base_test_result.BaseTestResult(u, missing_type)
         for u in test_names.difference(results_names))
 
     # Update the result type if we detect a crash.
@@ -999,7 +1218,8 @@ class LocalDeviceInstrumentationTestRun(
       self._SaveScreenshot(device, screenshot_device_file, test_display_name,
                            results, 'post_test_screenshot')
 
-      logging.info('detected failure in %s. raw output:', test_display_name)
+      logging.info('detected failure in %s. raw output (last %d lines):',
+                   test_display_name, len(output))
       for l in output:
         logging.info('  %s', l)
       if not self._env.skip_clear_data:
@@ -1086,6 +1306,123 @@ class LocalDeviceInstrumentationTestRun(
 
     return results, tests_to_rerun if tests_to_rerun else None
 
+  def _RunInstrumentation(self, device, target, extras, timeout, test_name,
+                          on_result):
+    """Runs the instrumentation and parses its output as it is produced.
+
+    Args:
+      device: The device to run the instrumentation on.
+      target: The instrumentation component to run.
+      extras: A dict of extras to pass to the instrumentation.
+      timeout: The timeout for the whole instrumentation, in seconds.
+      test_name: The name of the test, used for logging progress.
+      on_result: An optional callable invoked with each test result as soon as
+        the test has finished.
+
+    Returns:
+      A 3-tuple containing:
+        - the tail of the raw output as a sequence of lines
+        - a list of InstrumentationTestResult, one for each test parsed
+        - whether the instrumentation was stopped early due to --fail-fast
+    """
+    output = collections.deque(maxlen=_MAX_RAW_OUTPUT_LINES_TO_LOG)
+    finished = []
+    aborted = []
+
+    def handle_result(result):
+      finished.append(result)
+      logging.info('%s: %s (%d finished)', result.GetType(), result.GetName(),
+                   len(finished))
+      if on_result:
+        on_result(result)
+
+    builder = self._test_instance.CreateTestResultsBuilder(
+        device.product_cpu_abi,
+        self._test_instance.symbolizer,
+        on_result=handle_result)
+
+    cmd = ['am', 'instrument', '-w', '-r']
+    for k, v in extras.items():
+      cmd.extend(['-e', str(k), str(v)])
+    cmd.append(target)
+    # Store the package name in a shell variable to help the command stay under
+    # the adb command length limit, as DeviceUtils.StartInstrumentation does.
+    package = target.split('/')[0]
+    shell_snippet = 'p=%s;%s' % (package,
+                                 cmd_helper.ShrinkToSnippet(cmd, 'p', package))
+
+    time_ms = lambda: int(time.time() * 1e3)
+    start_ms = time_ms()
+    with contextlib.ExitStack() as stack:
+      if len(shell_snippet) > _MAX_ADB_COMMAND_LENGTH:
+        # Batches can list hundreds of tests. Like DeviceUtils.RunShellCommand,
+        # run commands that are too long for adb from a script on the device.
+        script = stack.enter_context(
+            device_temp_file.DeviceTempFile(device.adb, suffix='.sh'))
+        device.WriteFile(script.name, shell_snippet)
+        shell_snippet = 'sh %s' % script.name_quoted
+      lines = device.adb.IterShell(shell_snippet, timeout)
+      parser = instrumentation_parser.InstrumentationParser(
+          self._DeobfuscateByStatus(output.append, lines))
+      try:
+        # TODO(jbudorick): Make instrumentation tests output a JSON so this
+        # doesn't have to parse the output.
+        for status_code, bundle in parser.IterStatus():
+          builder.AddStatus(status_code, bundle)
+          # Checked on every status so that --fail-fast stops as soon as a
+          # test fails, rather than once the next test has started.
+          current_result = builder.GetCurrentResult()
+          if (self._test_instance.fail_fast and current_result
+              and current_result.GetType() in (
+                  base_test_result.ResultType.FAIL,
+                  base_test_result.ResultType.CRASH)):
+            logging.warning('Stopping %s after the first failure '
+                            '(--fail-fast).', test_name)
+            aborted.append(current_result)
+            break
+      except cmd_helper.TimeoutError as e:
+        raise device_errors.CommandTimeoutError(
+            'Timed out running %s: %s' % (test_name, e))
+      finally:
+        lines.close()
+
+    if aborted:
+      # Closing the stream only kills the local adb process.
+      device.ForceStop(package)
+      result_code, result_bundle = None, {}
+    else:
+      result_code, result_bundle = parser.GetResult()
+    duration_ms = time_ms() - start_ms
+
+    with contextlib_ext.Optional(
+        trace_event.trace('ProcessResults'),
+        self._env.trace_output):
+      results = builder.Finish(result_code, result_bundle, duration_ms)
+    return output, results, bool(aborted)
+
+  def _DeobfuscateByStatus(self, on_line, lines):
+    """Deobfuscates |lines| one instrumentation status at a time.
+
+    Args:
+      on_line: A callable invoked with each deobfuscated line.
+      lines: An iterable of raw instrumentation output lines.
+
+    Yields:
+      The deobfuscated lines, which are only produced once the status they
+      belong to is complete so that stacks are deobfuscated as a whole.
+    """
+    chunk = []
+    for line in lines:
+      chunk.append(line)
+      if line.lstrip().startswith(_INSTRUMENTATION_STATUS_CODE_PREFIX):
+        for l in self._test_instance.MaybeDeobfuscateLines(chunk):
+          on_line(l)
+          yield l
+        chunk = []
+    for l in self._test_instance.MaybeDeobfuscateLines(chunk):
+      on_line(l)
+      yield l
+
   def _GetTestsFromRunner(self):
     test_apk_path = self._test_instance.test_apk.path
     pickle_path = '%s-runner.pickle' % test_apk_path
@@ -8,13 +8,17 @@
 # pylint: disable=protected-access
 
 
+import os
+import tempfile
 import unittest
 import mock  # pylint: disable=import-error
 
 from pylib.base import base_test_result
 from pylib.base import mock_environment
 from pylib.base import mock_test_instance
+from pylib.instrumentation import instrumentation_test_instance
 from pylib.local.device import local_device_instrumentation_test_run
+from pylib.utils import file_digest
 
 
 class LocalDeviceInstrumentationTestRunTest(unittest.TestCase):
@@ -193,5 +197,189 @@ class LocalDeviceInstrumentationTestRunTest(unittest.TestCase):
                      'external_dir')
 
 
+def _InstrumentationOutput(tests, failing_test=None):
+  lines = []
+  for test in tests:
+    class_name, method_name = test.split('#')
+    status = ['INSTRUMENTATION_STATUS: class=' + class_name,
+              'INSTRUMENTATION_STATUS: test=' + method_name]
+    lines += status + ['INSTRUMENTATION_STATUS_CODE: 1']
+    lines += status + [
+        'INSTRUMENTATION_STATUS_CODE: %d' % (-2 if test == failing_test else 0)
+    ]
+  lines += ['INSTRUMENTATION_RESULT: shortMsg=done', 'INSTRUMENTATION_CODE: -1']
+  return lines
+
+
+class RunInstrumentationTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    env = mock_environment.MockEnvironment()
+    env.trace_output = None
+    self._ti = mock_test_instance.MockTestInstance()
+    self._ti.fail_fast = False
+    self._ti.MaybeDeobfuscateLines.side_effect = lambda lines: lines
+    self._ti.CreateTestResultsBuilder.side_effect = (
+        instrumentation_test_instance.TestResultsBuilder)
+    self._obj = (
+        local_device_instrumentation_test_run.LocalDeviceInstrumentationTestRun(
+            env, self._ti))
+    self._device = mock.MagicMock()
+    self._shell_commands = []
+
+  def _SetOutput(self, lines):
+    def iter_shell(command, _timeout):
+      self._shell_commands.append(command)
+      yield from lines
+
+    self._device.adb.IterShell.side_effect = iter_shell
+
+  def _Run(self, tests):
+    extras = {'class': ','.join(tests)}
+    on_result = mock.Mock()
+    with mock.patch.object(local_device_instrumentation_test_run,
+                           'device_temp_file') as device_temp_file:
+      script = device_temp_file.DeviceTempFile.return_value.__enter__()
+      script.name = '/data/local/tmp/temp_file.sh'
+      script.name_quoted = script.name
+      _, results, aborted = self._obj._RunInstrumentation(
+          self._device, 'org.chromium.test/Runner', extras, 60, 'batch',
+          on_result)
+    self.assertEqual(results, [c[0][0] for c in on_result.call_args_list])
+    return results, aborted
+
+  def testRunInstrumentation_shortCommand(self):
+    tests = ['org.chromium.FooTest#testA', 'org.chromium.FooTest#testB']
+    self._SetOutput(_InstrumentationOutput(tests))
+    results, aborted = self._Run(tests)
+    self.assertFalse(aborted)
+    self.assertEqual(tests, [r.GetName() for r in results])
+    self.assertTrue(
+        all(r.GetType() == base_test_result.ResultType.PASS for r in results))
+    self.assertIn(','.join(tests), self._shell_commands[0])
+    self._device.WriteFile.assert_not_called()
+
+  def testRunInstrumentation_longCommand(self):
+    tests = ['org.chromium.FooTest#testMethodNumber%d' % i for i in range(50)]
+    self._SetOutput(_InstrumentationOutput(tests))
+    results, aborted = self._Run(tests)
+    self.assertFalse(aborted)
+    self.assertEqual(tests, [r.GetName() for r in results])
+    # The command is run from a script, as adb truncates long commands.
+    self._device.WriteFile.assert_called_once()
+    script_path, script = self._device.WriteFile.call_args[0]
+    self.assertGreater(len(script), 512)
+    self.assertIn(','.join(tests), script)
+    self.assertEqual(['sh ' + script_path], self._shell_commands)
+
+  def testRunInstrumentation_failFast(self):
+    self._ti.fail_fast = True
+    tests = ['org.chromium.FooTest#testA', 'org.chromium.FooTest#testB']
+    self._SetOutput(_InstrumentationOutput(tests, failing_test=tests[0]))
+    results, aborted = self._Run(tests)
+    # Stops as soon as testA fails, without waiting for testB to start.
+    self.assertTrue(aborted)
+    self.assertEqual([tests[0]], [r.GetName() for r in results])
+    self.assertEqual(base_test_result.ResultType.FAIL, results[0].GetType())
+    self._device.ForceStop.assert_called_once_with('org.chromium.test')
+
+
+class DeviceSetupStateTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._tmp_dir = tempfile.TemporaryDirectory()
+    self.addCleanup(self._tmp_dir.cleanup)
+    self._apk = mock.Mock(path=os.path.join(self._tmp_dir.name, 'Foo.apk'))
+    self._WriteApk(b'apk')
+    self._device = mock.Mock()
+    self._device.RunShellCommand.return_value = [
+        '    lastUpdateTime=2022-01-01 00:00:00'
+    ]
+    mock.patch.object(
+        local_device_instrumentation_test_run,
+        '_DeviceSetupStatePath',
+        return_value=os.path.join(self._tmp_dir.name, 'state.json')).start()
+    self.addCleanup(mock.patch.stopall)
+
+  def _WriteApk(self, data, mtime_ns=1):
+    with open(self._apk.path, 'wb') as f:
+      f.write(data)
+    os.utime(self._apk.path, ns=(mtime_ns, mtime_ns))
+
+  def _IsInstalled(self):
+    state = local_device_instrumentation_test_run._DeviceSetupState(
+        self._device, True)
+    key = state.GetInstallKey(self._apk, permissions=None)
+    installed = state.IsInstalled('org.chromium.foo', key)
+    if not installed:
+      state.SetInstalled('org.chromium.foo', key)
+    state.Save()
+    return installed
+
+  def testIsInstalled(self):
+    self.assertFalse(self._IsInstalled())
+    self.assertTrue(self._IsInstalled())
+
+  def testIsInstalled_hashesOnlyWhenStatChanged(self):
+    self._IsInstalled()
+    with mock.patch.object(file_digest,
+                           'GetFileMd5',
+                           wraps=file_digest.GetFileMd5) as get_digest:
+      self.assertTrue(self._IsInstalled())
+      get_digest.assert_not_called()
+      # Rebuilt with the same content.
+      self._WriteApk(b'apk', mtime_ns=2)
+      self.assertTrue(self._IsInstalled())
+      self.assertEqual(1, get_digest.call_count)
+      self._WriteApk(b'new apk', mtime_ns=3)
+      self.assertFalse(self._IsInstalled())
+
+  def testIsInstalled_updatedOnDevice(self):
+    self._IsInstalled()
+    self._device.RunShellCommand.return_value = [
+        '    lastUpdateTime=2022-01-02 00:00:00'
+    ]
+    self.assertFalse(self._IsInstalled())
+
+
+class SetUpPipelineTest(unittest.TestCase):
+
+  def _CreatePipeline(self, calls):
+
+    def wrap_step(step):
+      return lambda: calls.append(step)
+
+    return local_device_instrumentation_test_run._SetUpPipeline(wrap_step)
+
+  def testRun_serialKeepsOrder(self):
+    calls = []
+    pipeline = self._CreatePipeline(calls)
+    a = pipeline.Add('a')
+    b = pipeline.Add('b', after=[a])
+    pipeline.Add('c')
+    pipeline.Add('d', after=[b])
+    pipeline.Run(False)
+    self.assertEqual(['a', 'b', 'c', 'd'], calls)
+
+  def testRun_concurrentHonorsDependencies(self):
+    calls = []
+    pipeline = self._CreatePipeline(calls)
+    a = pipeline.Add('a')
+    b = pipeline.Add('b', after=[a])
+    pipeline.Add('c', after=[a, b])
+    pipeline.Add('d')
+    pipeline.Run(True)
+    self.assertEqual(set('abcd'), set(calls))
+    self.assertLess(calls.index('a'), calls.index('b'))
+    self.assertLess(calls.index('b'), calls.index('c'))
+
+  def testAdd_unknownDependency(self):
+    pipeline = self._CreatePipeline([])
+    with self.assertRaises(AssertionError):
+      pipeline.Add('b', after=['a'])
+
+
 if __name__ == '__main__':
   unittest.main(verbosity=2)
@@ -84,31 +84,43 @@ class LocalDeviceTestRun(test_run.TestRun):
         rerun = None
         try:
           result, rerun = crash_handler.RetryOnSystemCrash(
-              lambda d, t=test: self._RunTest(d, t),
+              lambda d, t=test: self._RunTestWithResults(d, t, results),
               device=dev)
           consecutive_device_errors = 0
           if isinstance(result, base_test_result.BaseTestResult):
-            results.AddResult(result)
-          elif isinstance(result, list):
-            results.AddResults(result)
-          else:
+            result = [result]
+          elif not isinstance(result, list):
             raise Exception(
                 'Unexpected result type: %s' % type(result).__name__)
+          results.AddResults(result)
+          if self._on_results_finalized:
+            self._on_results_finalized(result)
         except device_errors.CommandTimeoutError:
           # Test timeouts don't count as device errors for the purpose
           # of bad device detection.
           consecutive_device_errors = 0
 
           if isinstance(test, list):
-            results.AddResults(
+            # Tests of the batch may have been reported as they finished, only
+            # the ones that did not get a result yet timed out.
+            finished = set(
+                r.GetName() for r in results.GetAll()
+                if r.GetType() != base_test_result.ResultType.NOTRUN)
+            timed_out = [
                 base_test_result.BaseTestResult(
-                    self._GetUniqueTestName(t),
-                    base_test_result.ResultType.TIMEOUT) for t in test)
+                    n, base_test_result.ResultType.TIMEOUT)
+                for n in (self._GetUniqueTestName(t) for t in test)
+                if n not in finished
+            ]
           else:
-            results.AddResult(
+            timed_out = [
                 base_test_result.BaseTestResult(
                     self._GetUniqueTestName(test),
-                    base_test_result.ResultType.TIMEOUT))
+                    base_test_result.ResultType.TIMEOUT)
+            ]
+          results.AddResults(timed_out)
+          if self._on_results_finalized:
+            self._on_results_finalized(timed_out)
         except Exception as e:  # pylint: disable=broad-except
           if isinstance(tests, test_collection.TestCollection):
             rerun = test
@@ -378,6 +390,16 @@ class LocalDeviceTestRun(test_run.TestRun):
   def _RunTest(self, device, test):
     raise NotImplementedError
 
+  def _RunTestWithResults(self, device, test, results):
+    """Runs |test| on |device|.
+
+    Test runs that know individual results before all of |test| has finished
+    (e.g. for batched tests) can override this to add them to |results| as they
+    arrive. The returned results are added to |results| either way.
+    """
+    del results
+    return self._RunTest(device, test)
+
   def _ShouldShard(self):
     raise NotImplementedError
 
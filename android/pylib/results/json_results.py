@@ -76,12 +76,54 @@ def GenerateResultsDict(test_run_results, global_tags=None):
   #   ],
   # }
 
-  all_tests = set()
+  all_tests, iterations, test_run_links = _GroupResultsByName(test_run_results)
   per_iteration_data = []
+  for iteration in iterations:
+    iteration_data = collections.defaultdict(list)
+    for name, results in six.iteritems(iteration):
+      iteration_data[name] = [_ResultDict(r) for r in results]
+    per_iteration_data.append(iteration_data)
+
+  return {
+    'global_tags': global_tags or [],
+    'all_tests': all_tests,
+    # TODO(jbudorick): Add support for disabled tests within base_test_result.
+    'disabled_tests': [],
+    'per_iteration_data': per_iteration_data,
+    'links': test_run_links,
+  }
+
+
+def _ResultDict(r):
+  return {
+      'status': r.GetType(),
+      'elapsed_time_ms': r.GetDuration(),
+      'output_snippet': six.ensure_text(r.GetLog(), errors='replace'),
+      'losless_snippet': True,
+      'output_snippet_base64': '',
+      'links': r.GetLinks(),
+  }
+
+
+def _GroupResultsByName(test_run_results):
+  """Groups the results of each iteration by test name.
+
+  Only references to the results are kept, so that the potentially large
+  per-result dicts can be created one at a time.
+
+  Returns:
+    A 3-tuple containing:
+      - the sorted list of all test names
+      - a list with an ordered dict per iteration mapping test names to
+        lists of BaseTestResult
+      - a dict with the links of all test runs
+  """
+  all_tests = set()
+  iterations = []
   test_run_links = {}
 
   for test_run_result in test_run_results:
-    iteration_data = collections.defaultdict(list)
+    iteration = collections.OrderedDict()
     if isinstance(test_run_result, list):
       results_iterable = itertools.chain(*(t.GetAll() for t in test_run_result))
       for tr in test_run_result:
@@ -92,27 +134,12 @@ def GenerateResultsDict(test_run_results, global_tags=None):
       test_run_links.update(test_run_result.GetLinks())
 
     for r in results_iterable:
-      result_dict = {
-          'status': r.GetType(),
-          'elapsed_time_ms': r.GetDuration(),
-          'output_snippet': six.ensure_text(r.GetLog(), errors='replace'),
-          'losless_snippet': True,
-          'output_snippet_base64': '',
-          'links': r.GetLinks(),
-      }
-      iteration_data[r.GetName()].append(result_dict)
-
-    all_tests = all_tests.union(set(six.iterkeys(iteration_data)))
-    per_iteration_data.append(iteration_data)
+      iteration.setdefault(r.GetName(), []).append(r)
 
-  return {
-    'global_tags': global_tags or [],
-    'all_tests': sorted(list(all_tests)),
-    # TODO(jbudorick): Add support for disabled tests within base_test_result.
-    'disabled_tests': [],
-    'per_iteration_data': per_iteration_data,
-    'links': test_run_links,
-  }
+    all_tests.update(iteration)
+    iterations.append(iteration)
+
+  return sorted(all_tests), iterations, test_run_links
 
 
 def GenerateJsonTestResultFormatDict(test_run_results, interrupted):
@@ -176,6 +203,58 @@ def GenerateJsonTestResultFormatDict(test_run_results, interrupted):
   }
 
 
+class _JsonObjectStream:
+  """A JSON object whose items are only produced while it is written."""
+
+  def __init__(self, items):
+    self.items = items
+
+
+class _JsonArrayStream:
+  """A JSON array whose values are only produced while it is written."""
+
+  def __init__(self, values):
+    self.values = values
+
+
+def _IterEncodeJson(value, level, indent=None, separators=None, **kwargs):
+  """Encodes |value| to JSON, streaming _JsonObjectStream/_JsonArrayStream.
+
+  The output is the same as that of json.dumps() with the same arguments.
+  """
+  if isinstance(indent, int):
+    indent = ' ' * indent
+  if separators is None:
+    separators = (',', ': ') if indent is not None else (', ', ': ')
+  if not isinstance(value, (_JsonObjectStream, _JsonArrayStream)):
+    encoded = json.dumps(value, indent=indent, separators=separators, **kwargs)
+    if indent is not None:
+      # JSON strings cannot contain newlines, so this only re-indents.
+      encoded = encoded.replace('\n', '\n' + indent * level)
+    yield encoded
+    return
+
+  is_object = isinstance(value, _JsonObjectStream)
+  start, end = '{}' if is_object else '[]'
+  item_separator, key_separator = separators
+  if indent is not None:
+    item_separator += '\n' + indent * (level + 1)
+    start += '\n' + indent * (level + 1)
+    end = '\n' + indent * level + end
+
+  empty = True
+  for item in (value.items if is_object else value.values):
+    yield start if empty else item_separator
+    empty = False
+    if is_object:
+      key, item = item
+      yield json.dumps(key, **kwargs) + key_separator
+    for chunk in _IterEncodeJson(item, level + 1, indent, separators,
+                                 **kwargs):
+      yield chunk
+  yield start[0] + end[-1] if empty else end
+
+
 def GenerateJsonResultsFile(test_run_result, file_path, global_tags=None,
                             **kwargs):
   """Write |test_run_result| to JSON.
@@ -183,17 +262,147 @@ def GenerateJsonResultsFile(test_run_result, file_path, global_tags=None,
   This emulates the format of the JSON emitted by
   base/test/launcher/test_results_tracker.cc:SaveSummaryAsJSON.
 
+  The JSON is written as it is generated so that the full results dict (which
+  includes every test log) is never held in memory.
+
   Args:
     test_run_result: a base_test_result.TestRunResults object.
     file_path: The path to the JSON file to write.
   """
+  if kwargs.get('sort_keys'):
+    with open(file_path, 'w') as json_result_file:
+      json_result_file.write(json.dumps(
+          GenerateResultsDict(test_run_result, global_tags=global_tags),
+          **kwargs))
+      logging.info('Generated json results file at %s', file_path)
+    return
+
+  all_tests, iterations, test_run_links = _GroupResultsByName(test_run_result)
+
+  def iter_iteration_items(iteration):
+    for name, results in six.iteritems(iteration):
+      yield name, [_ResultDict(r) for r in results]
+
+  _WriteResultsJson(file_path, global_tags, all_tests, (
+      _JsonObjectStream(iter_iteration_items(i)) for i in iterations),
+                    test_run_links, **kwargs)
+
+
+def _WriteResultsJson(file_path, global_tags, all_tests, per_iteration_data,
+                      test_run_links, **kwargs):
+  results = _JsonObjectStream([
+      ('global_tags', global_tags or []),
+      ('all_tests', all_tests),
+      ('disabled_tests', []),
+      ('per_iteration_data', _JsonArrayStream(per_iteration_data)),
+      ('links', test_run_links),
+  ])
   with open(file_path, 'w') as json_result_file:
-    json_result_file.write(json.dumps(
-        GenerateResultsDict(test_run_result, global_tags=global_tags),
-        **kwargs))
+    for chunk in _IterEncodeJson(results, 0, **kwargs):
+      json_result_file.write(chunk)
     logging.info('Generated json results file at %s', file_path)
 
 
+class ResultsJournal:
+  """An append-only journal of test results, stored as JSON lines.
+
+  Each iteration is appended once it is done, which costs O(new results)
+  rather than re-serializing all results written so far. The journal is
+  consolidated into the format of GenerateJsonResultsFile() by
+  GenerateJsonResultsFileFromJournal().
+  """
+
+  def __init__(self, path):
+    self._path = path
+    self._num_iterations = 0
+    # Truncate any previous journal.
+    with open(self._path, 'w'):
+      pass
+
+  @property
+  def path(self):
+    return self._path
+
+  def AddIteration(self, test_run_results):
+    """Appends the results of an iteration.
+
+    Args:
+      test_run_results: a TestRunResults object, or a list of them (one per
+        try), as in the list passed to GenerateJsonResultsFile().
+    """
+    if not isinstance(test_run_results, list):
+      test_run_results = [test_run_results]
+    iteration = self._num_iterations
+    self._num_iterations += 1
+    with open(self._path, 'a') as journal_file:
+      journal_file.write(json.dumps({'iteration': iteration}) + '\n')
+      for tr in test_run_results:
+        if tr.GetLinks():
+          journal_file.write(
+              json.dumps({
+                  'iteration': iteration,
+                  'run_links': tr.GetLinks(),
+              }) + '\n')
+        for r in tr.GetAll():
+          entry = _ResultDict(r)
+          entry['iteration'] = iteration
+          entry['name'] = r.GetName()
+          journal_file.write(json.dumps(entry) + '\n')
+
+
+def _IndexJournal(journal_file):
+  """Returns the same as _GroupResultsByName(), but with file offsets."""
+  all_tests = set()
+  iterations = []
+  test_run_links = {}
+  while True:
+    offset = journal_file.tell()
+    line = journal_file.readline()
+    if not line:
+      break
+    entry = json.loads(line)
+    if 'name' in entry:
+      iterations[entry['iteration']].setdefault(entry['name'],
+                                                []).append(offset)
+      all_tests.add(entry['name'])
+    elif 'run_links' in entry:
+      test_run_links.update(entry['run_links'])
+    else:
+      iterations.append(collections.OrderedDict())
+  return sorted(all_tests), iterations, test_run_links
+
+
+def GenerateJsonResultsFileFromJournal(journal, file_path, global_tags=None,
+                                       **kwargs):
+  """Consolidates |journal| into a JSON results file.
+
+  The output is the same as GenerateJsonResultsFile() for the results that
+  were added to |journal|, but only the test names and file offsets of the
+  results are held in memory.
+
+  Args:
+    journal: a ResultsJournal.
+    file_path: The path to the JSON file to write.
+  """
+  with open(journal.path, 'rb') as journal_file:
+    all_tests, iterations, test_run_links = _IndexJournal(journal_file)
+
+    def read_result_dict(offset):
+      journal_file.seek(offset)
+      entry = json.loads(journal_file.readline())
+      del entry['iteration']
+      del entry['name']
+      return entry
+
+    def iter_iteration_items(iteration):
+      for name, offsets in six.iteritems(iteration):
+        yield name, [read_result_dict(o) for o in offsets]
+
+    _WriteResultsJson(file_path, global_tags, all_tests, (
+        _JsonObjectStream(iter_iteration_items(i)) for i in iterations),
+                      test_run_links, **kwargs)
+
+
 def GenerateJsonTestResultFormatFile(test_run_result, interrupted, file_path,
                                      **kwargs):
   """Write |test_run_result| to JSON.
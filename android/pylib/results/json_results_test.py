@@ -4,6 +4,8 @@
 # found in the LICENSE file.
 
 
+import json
+import tempfile
 import unittest
 
 import six
@@ -193,6 +195,70 @@ class JsonResultsTest(unittest.TestCase):
     self.assertTrue('output_snippet_base64' in test_iteration_result)
     self.assertEqual('', test_iteration_result['output_snippet_base64'])
 
+  def testGenerateJsonResultsFile_matchesResultsDict(self):
+    pass_result = base_test_result.BaseTestResult(
+        'test.package.TestName1', base_test_result.ResultType.PASS)
+    fail_result = base_test_result.BaseTestResult(
+        'test.package.TestName2', base_test_result.ResultType.FAIL,
+        log='line\n' * 10000)
+    fail_result.SetLink('logcat', 'https://example.com/logcat')
+    retry_result = base_test_result.BaseTestResult(
+        'test.package.TestName2', base_test_result.ResultType.PASS)
+
+    all_results = base_test_result.TestRunResults()
+    all_results.AddResults([pass_result, fail_result])
+    all_results.SetLink('run', 'https://example.com/run')
+    retry_results = base_test_result.TestRunResults()
+    retry_results.AddResult(retry_result)
+    empty_results = base_test_result.TestRunResults()
+    test_run_results = [[all_results, retry_results], empty_results]
+
+    for kwargs in ({}, {'indent': 2}):
+      expected = json.dumps(
+          json_results.GenerateResultsDict(test_run_results,
+                                           global_tags=['TAG']), **kwargs)
+      with tempfile.NamedTemporaryFile(mode='r') as f:
+        json_results.GenerateJsonResultsFile(test_run_results,
+                                             f.name,
+                                             global_tags=['TAG'],
+                                             **kwargs)
+        self.assertEqual(expected, f.read())
+
+  def testGenerateJsonResultsFileFromJournal_matchesResultsFile(self):
+    fail_result = base_test_result.BaseTestResult(
+        'test.package.TestName2', base_test_result.ResultType.FAIL,
+        log=u'line ✓\n' * 100)
+    fail_result.SetLink('logcat', 'https://example.com/logcat')
+    all_results = base_test_result.TestRunResults()
+    all_results.AddResults([
+        base_test_result.BaseTestResult('test.package.TestName1',
+                                        base_test_result.ResultType.PASS),
+        fail_result,
+    ])
+    all_results.SetLink('run', 'https://example.com/run')
+    retry_results = base_test_result.TestRunResults()
+    retry_results.AddResult(
+        base_test_result.BaseTestResult('test.package.TestName2',
+                                        base_test_result.ResultType.PASS))
+    test_run_results = [[all_results, retry_results],
+                        base_test_result.TestRunResults()]
+
+    with tempfile.NamedTemporaryFile(mode='r') as journal_file, \
+        tempfile.NamedTemporaryFile(mode='r') as expected_file, \
+        tempfile.NamedTemporaryFile(mode='r') as actual_file:
+      journal = json_results.ResultsJournal(journal_file.name)
+      for iteration_results in test_run_results:
+        journal.AddIteration(iteration_results)
+      json_results.GenerateJsonResultsFile(test_run_results,
+                                           expected_file.name,
+                                           global_tags=['TAG'],
+                                           indent=2)
+      json_results.GenerateJsonResultsFileFromJournal(journal,
+                                                      actual_file.name,
+                                                      global_tags=['TAG'],
+                                                      indent=2)
+      self.assertEqual(expected_file.read(), actual_file.read())
+
   def testGenerateJsonTestResultFormatDict_passedResult(self):
     result = base_test_result.BaseTestResult('test.package.TestName',
                                              base_test_result.ResultType.PASS)
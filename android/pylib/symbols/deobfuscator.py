@@ -2,177 +2,471 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+"""Deobfuscates Java names in log lines using a ProGuard / R8 mapping file.
+
+The mapping file is indexed once into a table of obfuscated class names that
+is sorted for binary search, written next to the mapping file and
+memory-mapped. The section of the mapping file for a class (its fields,
+methods and inline frame ranges) is parsed the first time the class is looked
+up.
+
+Lines are matched using the same regular expression as
+//build/android/stacktrace/java/org/chromium/build/FlushingReTrace.java.
+"""
+
+import collections
+import functools
 import logging
+import mmap
 import os
-import subprocess
+import re
+import struct
+import tempfile
 import threading
-import time
-import uuid
 
-from devil.utils import reraiser_thread
-from pylib import constants
+_INDEX_MAGIC = b'DEOBIDX1'
+# magic, mapping size, mapping mtime_ns, number of classes.
+_INDEX_HEADER = struct.Struct('<8sQQI')
+# name offset, name length, section offset, section length.
+_INDEX_RECORD = struct.Struct('<IIQI')
+_CLASS_CACHE_SIZE = 8192
+_LOOKUP_CACHE_SIZE = 65536
+
+# E.g.: this.was.Deobfuscated -> FOO:
+_CLASS_LINE_RE = re.compile(rb'^([^\s#][^\n]*?) -> ([^\n]+?):[ \t]*\r?$',
+                            re.MULTILINE)
+# E.g.: 1:3:void someMethod(int,android.os.Bundle):65:67 -> bar
+_METHOD_LINE_RE = re.compile(r'^\s+(?:(\d+):(\d+):)?(\S+) ([^\s(]+)\(([^)]*)\)'
+                             r'(?::(\d+)(?::(\d+))?)? -> (\S+)$')
+# E.g.: int[] mFontFamily -> a
+_FIELD_LINE_RE = re.compile(r'^\s+(\S+) ([^\s(]+) -> (\S+)$')
+# E.g.: # {"id":"sourceFile","fileName":"Deobfuscated.java"}
+_SOURCE_FILE_RE = re.compile(r'^\s*#.*"id"\s*:\s*"sourceFile".*'
+                             r'"fileName"\s*:\s*"([^"]*)"')
+# Anything that could be an (obfuscated) class name.
+_TOKEN_RE = re.compile(r'[\w$-]+(?:[./][\w$-]+)*')
+
+_CLASS = r'(?:[\w$][\w$-]*\.)*[\w$][\w$-]*'
+_SLASH_CLASS = r'(?:[\w$][\w$-]*/)*[\w$][\w$-]*'
+_PLACEHOLDERS = {
+    'c': _CLASS,
+    'C': _SLASH_CLASS,
+    'm': r'[\w$<>-]+',
+    's': r'[^:()]*?',
+    'l': r'\d+',
+    'f': r'[\w$-]+',
+    't': r'[\w$.\[\]-]+',
+    'a': r'[\w$.\[\],\s-]*',
+}
+
+# E.g.: D/ConnectivityService(18029): Message
+# E.g.: 09-08 14:22:59.995 18029 18055 I ProcessStatsService: Message
+_LOGCAT_PREFIX = (r'(?:[VDIWEF]/.*?\( *\d+\): |'
+                  r'\d\d-\d\d [0-9:. ]+[VDIWEF] .*?: )?')
+
+# Order defines precedence. The first two are stack frames, which are expanded
+# into one line per inlined frame.
+_LINE_PATTERNS = [
+    # E.g.: \tat org.chromium.chrome.browser.tab.Tab.handleJavaCrash(Tab.java:1)
+    r'.*?(?::|\bat)\s+%c\.%m\s*\(\s*%s(?:\s*:\s*%l\s*)?\)',
+    # E.g.: 0xffffffff (chromium-TrichromeChromeGoogle.aab-canary: 70) ii2.p
+    r'.*?\(\s*%s(?:\s*:\s*%l\s*)?\)\s*%c\.%m',
+    # E.g.: java.lang.NullPointerException: Attempt to read from field 'int bLA'
+    r'.*java\.lang\.NullPointerException.*["\']%t\s*%c\.(?:%f|%m\(%a\))["\'].*',
+    r'java\.lang\.VerifyError: %c',
+    r'java\.lang\.NoSuchFieldError: No instance field %f of type .*? in class '
+    r'L%C;',
+    r'.*?Object of type %c .*',
+    r'.*L%C;.*',
+    r'.*?%c#%m.*?',
+    r'.* isTestClass for %c',
+    r'Caused by: %c:.*',
+    r'.*?%c\.%m',
+    r'.*?"%c\.%m".*',
+    r'.*\b(?:[Cc]lass|[Tt]ype)\b.*?"%c".*',
+    r'.*\b(?:[Cc]lass|[Tt]ype)\b.*?%c',
+    r'%c:.*',
+    r'%c',
+]
+_NUM_FRAME_PATTERNS = 2
+
+
+def _CompileLineRegex():
+  alternatives = []
+  for i, pattern in enumerate(_LINE_PATTERNS):
+    # Python does not allow duplicate group names, so suffix each placeholder
+    # with the index of its alternative.
+    pattern = re.sub(
+        r'%([a-zA-Z])', lambda m, i=i: '(?P<%s_%d>%s)' %
+        (m.group(1), i, _PLACEHOLDERS[m.group(1)]), pattern)
+    alternatives.append('(?P<alt_%d>%s)' % (i, pattern))
+  return re.compile(_LOGCAT_PREFIX + '(?:' + '|'.join(alternatives) + ')')
+
+
+_LINE_RE = _CompileLineRegex()
+
+_Class = collections.namedtuple('_Class',
+                                ['name', 'source_file', 'fields', 'methods'])
+# A line of the mapping file for a method. class_name is None unless the
+# original method is qualified with its class (inlined from another class).
+_MethodMapping = collections.namedtuple('_MethodMapping', [
+    'obf_start', 'obf_end', 'class_name', 'name', 'orig_start', 'orig_end'
+])
+_Frame = collections.namedtuple('_Frame',
+                                ['class_name', 'method_name', 'line'])
+
 
+def _SourceFileForClass(class_name):
+  outer_class = class_name.rsplit('.', 1)[-1].split('$', 1)[0]
+  return outer_class + '.java'
 
-_MINIUMUM_TIMEOUT = 3.0
-_PER_LINE_TIMEOUT = .002  # Should be able to process 500 lines per second.
-_PROCESS_START_TIMEOUT = 10.0
-_MAX_RESTARTS = 10  # Should be plenty unless tool is crashing on start-up.
+
+def _IndexPath(mapping_path):
+  return mapping_path + '.deobfuscator_index'
+
+
+def _WriteIndex(mapping_path, index_file):
+  """Writes the sorted table of obfuscated class names of a mapping file."""
+  st = os.stat(mapping_path)
+  records = []
+  with open(mapping_path, 'rb') as f:
+    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if (
+        st.st_size) else b''
+    try:
+      prev = None
+      for m in _CLASS_LINE_RE.finditer(mapping):
+        if prev:
+          records.append(
+              (prev.group(2), prev.start(), m.start() - prev.start()))
+        prev = m
+      if prev:
+        records.append(
+            (prev.group(2), prev.start(), len(mapping) - prev.start()))
+    finally:
+      if st.st_size:
+        mapping.close()
+
+  records.sort()
+  index_file.write(
+      _INDEX_HEADER.pack(_INDEX_MAGIC, st.st_size, st.st_mtime_ns,
+                         len(records)))
+  name_offset = 0
+  for obf_name, section_offset, section_len in records:
+    index_file.write(
+        _INDEX_RECORD.pack(name_offset, len(obf_name), section_offset,
+                           section_len))
+    name_offset += len(obf_name)
+  for obf_name, _, _ in records:
+    index_file.write(obf_name)
+  index_file.flush()
+
+
+def _IsIndexValid(index, mapping_path):
+  if len(index) < _INDEX_HEADER.size:
+    return False
+  magic, size, mtime_ns, _ = _INDEX_HEADER.unpack_from(index)
+  st = os.stat(mapping_path)
+  return (magic == _INDEX_MAGIC and size == st.st_size
+          and mtime_ns == st.st_mtime_ns)
+
+
+def _MapLine(mapping, line):
+  if line is None or mapping.orig_start is None:
+    return line
+  if (mapping.obf_start is not None and mapping.orig_end is not None
+      and mapping.orig_end - mapping.orig_start == mapping.obf_end -
+      mapping.obf_start):
+    return mapping.orig_start + line - mapping.obf_start
+  return mapping.orig_start
 
 
 class Deobfuscator:
+  """Deobfuscates lines using a ProGuard / R8 mapping file.
+
+  Can be used from multiple threads at once. Close() waits for ongoing
+  TransformLines() calls to finish.
+  """
+
   def __init__(self, mapping_path):
-    script_path = os.path.join(constants.DIR_SOURCE_ROOT, 'build', 'android',
-                               'stacktrace', 'java_deobfuscate.py')
-    cmd = [script_path, mapping_path]
-    # Allow only one thread to call TransformLines() at a time.
-    self._lock = threading.Lock()
-    # Ensure that only one thread attempts to kill self._proc in Close().
-    self._close_lock = threading.Lock()
-    self._closed_called = False
-    # Assign to None so that attribute exists if Popen() throws.
-    self._proc = None
-    # Start process eagerly to hide start-up latency.
-    self._proc_start_time = time.time()
-    self._proc = subprocess.Popen(cmd,
-                                  bufsize=1,
-                                  stdin=subprocess.PIPE,
-                                  stdout=subprocess.PIPE,
-                                  universal_newlines=True,
-                                  close_fds=True)
+    self._mapping_path = mapping_path
+    self._mapping_file = open(mapping_path, 'rb')
+    self._mapping = b''
+    if os.fstat(self._mapping_file.fileno()).st_size:
+      self._mapping = mmap.mmap(self._mapping_file.fileno(), 0,
+                                access=mmap.ACCESS_READ)
+    self._index_file = self._OpenIndex()
+    self._index = mmap.mmap(self._index_file.fileno(), 0,
+                            access=mmap.ACCESS_READ)
+    self._num_classes = _INDEX_HEADER.unpack_from(self._index)[3]
+    self._names_offset = (_INDEX_HEADER.size +
+                          self._num_classes * _INDEX_RECORD.size)
+    self._closed = False
+    # Guards |_closed| and |_active_calls|, the number of ongoing
+    # TransformLines() calls.
+    self._lock = threading.Condition()
+    self._active_calls = 0
+    self._GetClass = functools.lru_cache(maxsize=_CLASS_CACHE_SIZE)(
+        self._LoadClass)
+    # Most tokens of most lines are not obfuscated class names, so cache
+    # lookups separately from (larger) parsed classes.
+    self._IsObfuscatedClass = functools.lru_cache(maxsize=_LOOKUP_CACHE_SIZE)(
+        lambda name: self._FindSection(name) is not None)
 
-  def IsClosed(self):
-    return self._closed_called or self._proc.returncode is not None
+  def _OpenIndex(self):
+    index_path = _IndexPath(self._mapping_path)
+    if os.path.exists(index_path):
+      index_file = open(index_path, 'rb')
+      with mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index:
+        if _IsIndexValid(index, self._mapping_path):
+          return index_file
+      index_file.close()
 
-  def IsBusy(self):
-    return self._lock.locked()
+    logging.info('deobfuscator: Indexing %s', self._mapping_path)
+    try:
+      with tempfile.NamedTemporaryFile(dir=os.path.dirname(index_path),
+                                       delete=False) as index_file:
+        _WriteIndex(self._mapping_path, index_file)
+      # Replace atomically in case other processes are using the index.
+      os.replace(index_file.name, index_path)
+      return open(index_path, 'rb')
+    except OSError:
+      logging.warning('deobfuscator: Could not write %s', index_path)
+    # Fall back to an index that is deleted when closed.
+    index_file = tempfile.TemporaryFile()
+    _WriteIndex(self._mapping_path, index_file)
+    return index_file
 
-  def IsReady(self):
-    return not self.IsClosed() and not self.IsBusy()
+  def _FindSection(self, obf_name):
+    """Returns the slice of the mapping file for |obf_name|, or None."""
+    obf_name = obf_name.encode('utf-8')
+    lo = 0
+    hi = self._num_classes
+    while lo < hi:
+      mid = (lo + hi) // 2
+      name_offset, name_len, _, _ = _INDEX_RECORD.unpack_from(
+          self._index, _INDEX_HEADER.size + mid * _INDEX_RECORD.size)
+      start = self._names_offset + name_offset
+      if self._index[start:start + name_len] < obf_name:
+        lo = mid + 1
+      else:
+        hi = mid
+    if lo == self._num_classes:
+      return None
+    name_offset, name_len, section_offset, section_len = (
+        _INDEX_RECORD.unpack_from(self._index,
+                                  _INDEX_HEADER.size + lo * _INDEX_RECORD.size))
+    start = self._names_offset + name_offset
+    if self._index[start:start + name_len] != obf_name:
+      return None
+    return self._mapping[section_offset:section_offset + section_len]
 
-  def TransformLines(self, lines):
-    """Deobfuscates obfuscated names found in the given lines.
+  def _LoadClass(self, obf_name):
+    """Returns the parsed _Class for |obf_name|, or None if not obfuscated."""
+    section = self._FindSection(obf_name)
+    if section is None:
+      return None
+    lines = section.decode('utf-8', 'replace').splitlines()
+    name = lines[0].split(' -> ', 1)[0].strip()
+    source_file = None
+    fields = {}
+    methods = collections.defaultdict(list)
+    prev = None
+    for line in lines[1:]:
+      m = _METHOD_LINE_RE.match(line)
+      if m:
+        (obf_start, obf_end, _, orig_name, _, orig_start, orig_end,
+         obf_method) = m.groups()
+        class_name = None
+        if '.' in orig_name:
+          class_name, orig_name = orig_name.rsplit('.', 1)
+        mapping = _MethodMapping(
+            int(obf_start) if obf_start else None,
+            int(obf_end) if obf_end else None, class_name, orig_name,
+            int(orig_start) if orig_start else None,
+            int(orig_end) if orig_end else None)
+        # Consecutive lines for the same obfuscated range are inlined frames,
+        # innermost first.
+        if (prev and prev[0] == obf_method and mapping.obf_start is not None
+            and prev[1][-1][:2] == mapping[:2]):
+          prev[1].append(mapping)
+        else:
+          prev = (obf_method, [mapping])
+          methods[obf_method].append(prev[1])
+        continue
+      m = _FIELD_LINE_RE.match(line)
+      if m:
+        fields[m.group(3)] = m.group(2)
+        continue
+      m = _SOURCE_FILE_RE.match(line)
+      if m:
+        source_file = m.group(1)
+    return _Class(name, source_file or _SourceFileForClass(name), fields,
+                  dict(methods))
 
-    If anything goes wrong (process crashes, timeout, etc), returns |lines|.
+  def _MayContainObfuscatedName(self, line):
+    for m in _TOKEN_RE.finditer(line):
+      token = m.group(0)
+      names = [token.replace('/', '.')]
+      if token.startswith('L'):
+        names.append(names[0][1:])
+      for name in names:
+        parts = name.split('.')
+        for i in range(len(parts), 0, -1):
+          if self._IsObfuscatedClass('.'.join(parts[:i])):
+            return True
+    return False
 
-    Args:
-      lines: A list of strings without trailing newlines.
+  def _DeobfuscateClass(self, obf_name):
+    clazz = self._GetClass(obf_name)
+    return clazz.name if clazz else obf_name
 
-    Returns:
-      A list of strings without trailing newlines.
-    """
-    if not lines:
-      return []
-
-    # Deobfuscated stacks contain more frames than obfuscated ones when method
-    # inlining occurs. To account for the extra output lines, keep reading until
-    # this eof_line token is reached.
-    eof_line = uuid.uuid4().hex
-    out_lines = []
-
-    def deobfuscate_reader():
-      while True:
-        line = self._proc.stdout.readline()
-        # Return an empty string at EOF (when stdin is closed).
-        if not line:
-          break
-        line = line[:-1]
-        if line == eof_line:
-          break
-        out_lines.append(line)
-
-    if self.IsBusy():
-      logging.warning('deobfuscator: Having to wait for Java deobfuscation.')
-
-    # Allow only one thread to operate at a time.
-    with self._lock:
-      if self.IsClosed():
-        if not self._closed_called:
-          logging.warning('deobfuscator: Process exited with code=%d.',
-                          self._proc.returncode)
-          self.Close()
-        return lines
+  def _DeobfuscateType(self, obf_type):
+    base_type = obf_type.rstrip('[]')
+    return self._DeobfuscateClass(base_type) + obf_type[len(base_type):]
 
-      # TODO(agrieve): Can probably speed this up by only sending lines through
-      #     that might contain an obfuscated name.
-      reader_thread = reraiser_thread.ReraiserThread(deobfuscate_reader)
-      reader_thread.start()
-
-      try:
-        self._proc.stdin.write('\n'.join(lines))
-        self._proc.stdin.write('\n{}\n'.format(eof_line))
-        self._proc.stdin.flush()
-        time_since_proc_start = time.time() - self._proc_start_time
-        timeout = (max(0, _PROCESS_START_TIMEOUT - time_since_proc_start) +
-                   max(_MINIUMUM_TIMEOUT, len(lines) * _PER_LINE_TIMEOUT))
-        reader_thread.join(timeout)
-        if self.IsClosed():
-          logging.warning(
-              'deobfuscator: Close() called by another thread during join().')
-          return lines
-        if reader_thread.is_alive():
-          logging.error('deobfuscator: Timed out.')
-          self.Close()
-          return lines
-        return out_lines
-      except IOError:
-        logging.exception('deobfuscator: Exception during java_deobfuscate')
-        self.Close()
-        return lines
+  def _DeobfuscateMethodName(self, obf_class, obf_method):
+    clazz = self._GetClass(obf_class)
+    if not clazz:
+      return obf_method
+    # The last frame of each group is the method that was not inlined.
+    names = {g[-1].name for g in clazz.methods.get(obf_method, ())}
+    return names.pop() if len(names) == 1 else obf_method
 
-  def Close(self):
-    with self._close_lock:
-      needs_closing = not self.IsClosed()
-      self._closed_called = True
-
-    if needs_closing:
-      self._proc.stdin.close()
-      self._proc.kill()
-      self._proc.wait()
-
-  def __del__(self):
-    # self._proc is None when Popen() fails.
-    if not self._closed_called and self._proc:
-      logging.error('deobfuscator: Forgot to Close()')
-      self.Close()
-
-
-class DeobfuscatorPool:
-  # As of Sep 2017, each instance requires about 500MB of RAM, as measured by:
-  # /usr/bin/time -v build/android/stacktrace/java_deobfuscate.py \
-  #     out/Release/apks/ChromePublic.apk.mapping
-  def __init__(self, mapping_path, pool_size=4):
-    self._mapping_path = mapping_path
-    self._pool = [Deobfuscator(mapping_path) for _ in range(pool_size)]
-    # Allow only one thread to select from the pool at a time.
-    self._lock = threading.Lock()
-    self._num_restarts = 0
+  def _DeobfuscateFrames(self, clazz, obf_method, line):
+    """Returns the list of _Frame for a stack frame, innermost first."""
+    groups = clazz.methods.get(obf_method, [])
+    candidates = []
+    if line is not None:
+      candidates = [
+          g for g in groups if g[0].obf_start is not None
+          and g[0].obf_start <= line <= g[0].obf_end
+      ]
+      if not candidates:
+        candidates = [g for g in groups if g[0].obf_start is None]
+    if len(candidates) != 1:
+      # The line is unknown or ambiguous, so only map the method name.
+      names = {g[-1].name for g in groups}
+      return [
+          _Frame(clazz.name,
+                 names.pop() if len(names) == 1 else obf_method, line)
+      ]
+    return [
+        _Frame(m.class_name or clazz.name, m.name, _MapLine(m, line))
+        for m in candidates[0]
+    ]
 
-  def TransformLines(self, lines):
-    with self._lock:
-      assert self._pool, 'TransformLines() called on a closed DeobfuscatorPool.'
+  def _TransformLine(self, line):
+    if not self._MayContainObfuscatedName(line):
+      return [line]
+    m = _LINE_RE.fullmatch(line)
+    if not m:
+      return [line]
+    alt = int(m.lastgroup.split('_')[1])
+    suffix = '_%d' % alt
+
+    def span(kind):
+      name = kind + suffix
+      if name not in m.re.groupindex or m.group(name) is None:
+        return None
+      return m.span(name)
 
-      # De-obfuscation is broken.
-      if self._num_restarts == _MAX_RESTARTS:
-        raise Exception('Deobfuscation seems broken.')
+    def substitute(replacements):
+      ret = line
+      for s, value in sorted(replacements, reverse=True):
+        if s and value is not None:
+          ret = ret[:s[0]] + value + ret[s[1]:]
+      return ret
 
-      # Restart any closed Deobfuscators.
-      for i, d in enumerate(self._pool):
-        if d.IsClosed():
-          logging.warning('deobfuscator: Restarting closed instance.')
-          self._pool[i] = Deobfuscator(self._mapping_path)
-          self._num_restarts += 1
-          if self._num_restarts == _MAX_RESTARTS:
-            logging.warning('deobfuscator: MAX_RESTARTS reached.')
+    if alt < _NUM_FRAME_PATTERNS:
+      clazz = self._GetClass(m.group('c' + suffix))
+      if not clazz:
+        return [line]
+      obf_line = m.group('l' + suffix)
+      frames = self._DeobfuscateFrames(
+          clazz, m.group('m' + suffix),
+          int(obf_line) if obf_line is not None else None)
+      ret = []
+      for f in frames:
+        if f.class_name == clazz.name:
+          source_file = clazz.source_file
+        else:
+          source_file = _SourceFileForClass(f.class_name)
+        ret.append(
+            substitute([
+                (span('c'), f.class_name),
+                (span('m'), f.method_name),
+                (span('s'), source_file),
+                (span('l'), str(f.line) if f.line is not None else None),
+            ]))
+      return ret
 
-      selected = next((x for x in self._pool if x.IsReady()), self._pool[0])
-      # Rotate the order so that next caller will not choose the same one.
-      self._pool.remove(selected)
-      self._pool.append(selected)
+    replacements = []
+    obf_class = None
+    if span('c'):
+      obf_class = m.group('c' + suffix)
+      replacements.append((span('c'), self._DeobfuscateClass(obf_class)))
+    if span('C'):
+      obf_class = m.group('C' + suffix).replace('/', '.')
+      replacements.append(
+          (span('C'), self._DeobfuscateClass(obf_class).replace('.', '/')))
+    if span('m'):
+      obf_method = m.group('m' + suffix)
+      replacements.append(
+          (span('m'), self._DeobfuscateMethodName(obf_class, obf_method)))
+    if span('f'):
+      clazz = self._GetClass(obf_class)
+      obf_field = m.group('f' + suffix)
+      if clazz:
+        replacements.append((span('f'), clazz.fields.get(obf_field, obf_field)))
+    if span('t'):
+      replacements.append((span('t'),
+                           self._DeobfuscateType(m.group('t' + suffix))))
+    if span('a') and m.group('a' + suffix):
+      obf_args = m.group('a' + suffix).split(',')
+      replacements.append(
+          (span('a'),
+           ','.join(self._DeobfuscateType(a.strip()) for a in obf_args)))
+    return [substitute(replacements)]
 
-    return selected.TransformLines(lines)
+  def IsClosed(self):
+    return self._closed
+
+  def TransformLines(self, lines):
+    """Deobfuscates obfuscated names found in the given lines.
+
+    Args:
+      lines: A list of strings without trailing newlines.
+
+    Returns:
+      A list of strings without trailing newlines. Stack frames of inlined
+      methods are expanded into multiple lines.
+    """
+    with self._lock:
+      if self._closed:
+        return lines
+      self._active_calls += 1
+    try:
+      ret = []
+      for line in lines:
+        ret.extend(self._TransformLine(line))
+      return ret
+    finally:
+      with self._lock:
+        self._active_calls -= 1
+        if not self._active_calls:
+          self._lock.notify_all()
 
   def Close(self):
     with self._lock:
-      for d in self._pool:
-        d.Close()
-      self._pool = None
+      if self._closed:
+        return
+      self._closed = True
+      # The index and mapping must stay open while they are read.
+      self._lock.wait_for(lambda: not self._active_calls)
+    self._GetClass.cache_clear()
+    self._IsObfuscatedClass.cache_clear()
+    self._index.close()
+    self._index_file.close()
+    if self._mapping:
+      self._mapping.close()
+    self._mapping_file.close()
@@ -0,0 +1,176 @@
+#!/usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from pylib.symbols import deobfuscator
+
+LINE_PREFIXES = [
+    '',
+    # logcat -v threadtime
+    '09-08 14:38:35.535 18029 18084 E qcom_sensors_hal: ',
+    # logcat
+    'W/GCM     (15158): ',
+    'W/GCM     (  158): ',
+]
+
+# Same as //build/android/stacktrace/java_deobfuscate_test.py.
+TEST_MAP = """\
+this.was.Deobfuscated -> FOO:
+    int[] mFontFamily -> a
+    1:3:void someMethod(int,android.os.Bundle):65:67 -> bar
+never.Deobfuscated -> NOTFOO:
+    int[] mFontFamily -> a
+    1:3:void someMethod(int,android.os.Bundle):65:67 -> bar
+"""
+
+TEST_DATA = [
+    ('', ''),
+    ('FOO', 'this.was.Deobfuscated'),
+    ('FOO.bar', 'this.was.Deobfuscated.someMethod'),
+    ('Here is a FOO', 'Here is a FOO'),
+    ('Here is a class FOO', 'Here is a class this.was.Deobfuscated'),
+    ('Here is a class FOO baz', 'Here is a class FOO baz'),
+    ('Here is a "FOO" baz', 'Here is a "FOO" baz'),
+    ('Here is a type "FOO" baz',
+     'Here is a type "this.was.Deobfuscated" baz'),
+    ('Here is a "FOO.bar" baz',
+     'Here is a "this.was.Deobfuscated.someMethod" baz'),
+    ('SomeError: SomeFrameworkClass in isTestClass for FOO',
+     'SomeError: SomeFrameworkClass in isTestClass for this.was.Deobfuscated'),
+    ('Here is a FOO.bar', 'Here is a this.was.Deobfuscated.someMethod'),
+    ('Here is a FOO.bar baz', 'Here is a FOO.bar baz'),
+    ('END FOO#bar', 'END this.was.Deobfuscated#someMethod'),
+    ('new-instance 3810 (LSome/Framework/Class;) in LFOO;',
+     'new-instance 3810 (LSome/Framework/Class;) in Lthis/was/Deobfuscated;'),
+    ('FOO: Error message', 'this.was.Deobfuscated: Error message'),
+    ('Caused by: FOO: Error message',
+     'Caused by: this.was.Deobfuscated: Error message'),
+    ('\tat FOO.bar(PG:1)',
+     '\tat this.was.Deobfuscated.someMethod(Deobfuscated.java:65)'),
+    ('\t at\t FOO.bar\t (\t PG:\t 1\t )',
+     '\t at\t this.was.Deobfuscated.someMethod\t (\t Deobfuscated.java:\t 65'
+     '\t )'),
+    ('0xfff \t( \tPG:\t 1 \t)\tFOO.bar',
+     '0xfff \t( \tDeobfuscated.java:\t 65 \t)\t'
+     'this.was.Deobfuscated.someMethod'),
+    ('Unable to start activity ComponentInfo{garbage.in/here.test}:'
+     ' java.lang.NullPointerException: Attempt to invoke interface method'
+     ' \'void FOO.bar(int,android.os.Bundle)\' on a null object reference',
+     'Unable to start activity ComponentInfo{garbage.in/here.test}:'
+     ' java.lang.NullPointerException: Attempt to invoke interface method'
+     ' \'void this.was.Deobfuscated.someMethod(int,android.os.Bundle)\' on a'
+     ' null object reference'),
+    ('Caused by: java.lang.NullPointerException: Attempt to read from field'
+     ' \'int[] FOO.a\' on a null object reference',
+     'Caused by: java.lang.NullPointerException: Attempt to read from field'
+     ' \'int[] this.was.Deobfuscated.mFontFamily\' on a null object reference'),
+    ('java.lang.VerifyError: FOO',
+     'java.lang.VerifyError: this.was.Deobfuscated'),
+    ('java.lang.NoSuchFieldError: No instance field a of type '
+     'Ljava/lang/Class; in class LFOO;',
+     'java.lang.NoSuchFieldError: No instance field mFontFamily of type '
+     'Ljava/lang/Class; in class Lthis/was/Deobfuscated;'),
+    ('NOTFOO: Object of type FOO was not destroyed...',
+     'NOTFOO: Object of type this.was.Deobfuscated was not destroyed...'),
+]
+
+INLINE_MAP = """\
+# compiler: R8
+org.chromium.Outer -> a.b:
+# {"id":"sourceFile","fileName":"OuterSource.java"}
+    1:1:void org.chromium.Inner.inlined():10:10 -> c
+    1:1:void caller():20 -> c
+    2:4:void other():30:32 -> c
+"""
+
+
+class DeobfuscatorTest(unittest.TestCase):
+
+  def setUp(self):
+    self._tmp_dir = tempfile.mkdtemp()
+    self._deobfuscators = []
+
+  def tearDown(self):
+    for d in self._deobfuscators:
+      d.Close()
+    shutil.rmtree(self._tmp_dir)
+
+  def _CreateDeobfuscator(self, mapping):
+    mapping_path = os.path.join(self._tmp_dir, 'test.mapping')
+    with open(mapping_path, 'w') as f:
+      f.write(mapping)
+    ret = deobfuscator.Deobfuscator(mapping_path)
+    self._deobfuscators.append(ret)
+    return ret
+
+  def testTransformLines(self):
+    d = self._CreateDeobfuscator(TEST_MAP)
+    for prefix in LINE_PREFIXES:
+      for line, expected in TEST_DATA:
+        self.assertEqual([prefix + expected], d.TransformLines([prefix + line]))
+
+  def testTransformLines_inlinedFrames(self):
+    d = self._CreateDeobfuscator(INLINE_MAP)
+    self.assertEqual([
+        '\tat org.chromium.Inner.inlined(Inner.java:10)',
+        '\tat org.chromium.Outer.caller(OuterSource.java:20)',
+    ], d.TransformLines(['\tat a.b.c(SourceFile:1)']))
+    self.assertEqual(['\tat org.chromium.Outer.other(OuterSource.java:31)'],
+                     d.TransformLines(['\tat a.b.c(SourceFile:3)']))
+
+  def testClose_waitsForTransformLines(self):
+    # pylint: disable=protected-access
+    d = self._CreateDeobfuscator(TEST_MAP)
+    transform_line = d._TransformLine
+    started = threading.Event()
+    resume = threading.Event()
+
+    def blocking_transform_line(line):
+      started.set()
+      resume.wait()
+      return transform_line(line)
+
+    d._TransformLine = blocking_transform_line
+    results = []
+    transform_thread = threading.Thread(
+        target=lambda: results.append(d.TransformLines(['FOO'])))
+    transform_thread.start()
+    started.wait()
+    close_thread = threading.Thread(target=d.Close)
+    close_thread.start()
+    close_thread.join(timeout=0.1)
+    self.assertTrue(close_thread.is_alive())
+    # Lines are left as-is once closing started.
+    self.assertEqual(['FOO'], d.TransformLines(['FOO']))
+
+    resume.set()
+    transform_thread.join()
+    close_thread.join()
+    self.assertEqual([['this.was.Deobfuscated']], results)
+    self.assertTrue(d.IsClosed())
+
+  def testIndex(self):
+    self._CreateDeobfuscator(TEST_MAP).Close()
+    mapping_path = os.path.join(self._tmp_dir, 'test.mapping')
+    index_path = mapping_path + '.deobfuscator_index'
+    index_mtime = os.stat(index_path).st_mtime_ns
+    d = deobfuscator.Deobfuscator(mapping_path)
+    self._deobfuscators.append(d)
+    self.assertEqual(index_mtime, os.stat(index_path).st_mtime_ns)
+    self.assertEqual(['this.was.Deobfuscated'], d.TransformLines(['FOO']))
+
+    # Changing the mapping file invalidates the index.
+    d = self._CreateDeobfuscator(TEST_MAP.replace('FOO', 'BAZZ'))
+    self.assertEqual(['FOO'], d.TransformLines(['FOO']))
+    self.assertEqual(['this.was.Deobfuscated'], d.TransformLines(['BAZZ']))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,229 @@
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""A long-lived llvm-symbolizer service shared by all symbolizers.
+
+Loading the debug information of a large library (e.g. libchrome.so) takes
+llvm-symbolizer a long time, and it is loaded again by every new process. This
+keeps llvm-symbolizer processes running for the lifetime of the host process,
+always sends a given library to the same process so that its debug information
+is only loaded once, and caches resolved addresses keyed by the build ID of
+the library.
+"""
+
+import atexit
+import collections
+import logging
+import os
+import struct
+import subprocess
+import sys
+import threading
+
+from devil.utils import reraiser_thread
+from pylib.constants import host_paths
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'gyp'))
+from util import elf_reader
+
+_LLVM_SYMBOLIZER_PATH = os.path.join(host_paths.DIR_SOURCE_ROOT, 'third_party',
+                                     'llvm-build', 'Release+Asserts', 'bin',
+                                     'llvm-symbolizer')
+_DEFAULT_NUM_WORKERS = 4
+_DEFAULT_CACHE_SIZE = 200000
+# Number of addresses to write before reading their results, small enough that
+# the results fit into the pipe buffer.
+_REQUESTS_PER_CHUNK = 32
+
+# A symbolized frame. Inlined functions result in multiple frames per address,
+# innermost first.
+SymbolFrame = collections.namedtuple('SymbolFrame', ['function', 'location'])
+
+
+def IsAvailable():
+  return os.path.exists(_LLVM_SYMBOLIZER_PATH)
+
+
+def _ReadBuildId(lib_path):
+  """Returns the GNU build ID of an ELF file as a hex string, or None."""
+  try:
+    with elf_reader.ElfFile(lib_path) as elf:
+      return elf.GetBuildId()
+  except (ValueError, struct.error):
+    # Not an ELF file, or a truncated one.
+    return None
+
+
+class _Worker:
+  """A single llvm-symbolizer process."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._proc = None
+    # Number of libraries assigned to this worker.
+    self.num_libraries = 0
+
+  def _Start(self):
+    cmd = [
+        _LLVM_SYMBOLIZER_PATH, '--functions=linkage', '--demangle', '--inlines'
+    ]
+    self._proc = subprocess.Popen(cmd,
+                                  stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE,
+                                  universal_newlines=True,
+                                  close_fds=True)
+
+  def _ReadFrames(self):
+    frames = []
+    while True:
+      function = self._proc.stdout.readline()
+      if not function:
+        raise IOError('llvm-symbolizer exited unexpectedly.')
+      function = function.rstrip('\n')
+      # Results for an address are terminated by an empty line.
+      if not function:
+        return frames
+      location = self._proc.stdout.readline().rstrip('\n')
+      if function != '??' or not location.startswith('??'):
+        frames.append(SymbolFrame(function, location))
+
+  def Symbolize(self, lib_addrs):
+    """Returns a list of lists of SymbolFrame, one for each (lib, addr)."""
+    ret = []
+    with self._lock:
+      for i in range(0, len(lib_addrs), _REQUESTS_PER_CHUNK):
+        chunk = lib_addrs[i:i + _REQUESTS_PER_CHUNK]
+        for attempt in range(2):
+          try:
+            if not self._proc or self._proc.poll() is not None:
+              self._Start()
+            self._proc.stdin.write(''.join('"%s" 0x%x\n' % (lib, addr)
+                                           for lib, addr in chunk))
+            self._proc.stdin.flush()
+            ret.extend(self._ReadFrames() for _ in chunk)
+            break
+          except (IOError, OSError):
+            self._Kill()
+            if attempt:
+              logging.exception('llvm-symbolizer failed.')
+              ret.extend([] for _ in chunk)
+    return ret
+
+  def _Kill(self):
+    if self._proc:
+      self._proc.kill()
+      self._proc.wait()
+      self._proc.stdout.close()
+      try:
+        self._proc.stdin.close()
+      except (IOError, OSError):
+        pass  # Unflushed requests.
+      self._proc = None
+
+  def Close(self):
+    with self._lock:
+      self._Kill()
+
+
+class LLVMSymbolizer:
+  """Symbolizes (library, address) pairs using warm llvm-symbolizer processes.
+
+  Can be used from multiple threads at once.
+  """
+
+  def __init__(self, num_workers=_DEFAULT_NUM_WORKERS,
+               cache_size=_DEFAULT_CACHE_SIZE):
+    self._workers = [_Worker() for _ in range(num_workers)]
+    self._cache_size = cache_size
+    # Maps (build ID, address) -> [SymbolFrame], in least recently used order.
+    self._cache = collections.OrderedDict()
+    # Maps library path -> ((size, mtime), build ID, worker).
+    self._libraries = {}
+    self._lock = threading.Lock()
+
+  def _GetLibraryInfo(self, lib_path):
+    """Returns the cache key and worker for a library."""
+    st = os.stat(lib_path)
+    with self._lock:
+      info = self._libraries.get(lib_path)
+      if info and info[0] == (st.st_size, st.st_mtime_ns):
+        return info[1:]
+    build_id = _ReadBuildId(lib_path) or lib_path
+    with self._lock:
+      # Copies of a library with the same build ID share a worker.
+      worker = next((i[2] for i in self._libraries.values()
+                     if i[1] == build_id), None)
+      if not worker:
+        worker = min(self._workers, key=lambda w: w.num_libraries)
+        worker.num_libraries += 1
+      self._libraries[lib_path] = ((st.st_size, st.st_mtime_ns), build_id,
+                                   worker)
+      return build_id, worker
+
+  def GetBuildId(self, lib_path):
+    """Returns the build ID of |lib_path|, or None if it has none."""
+    build_id = self._GetLibraryInfo(lib_path)[0]
+    return build_id if build_id != lib_path else None
+
+  def SymbolizeBatch(self, lib_addrs):
+    """Symbolizes (library path, address) pairs.
+
+    Duplicate pairs are symbolized once, and libraries are symbolized in
+    parallel.
+
+    Args:
+      lib_addrs: An iterable of (host library path, address) tuples.
+
+    Returns:
+      A dict mapping each (library path, address) to a (possibly empty) list of
+      SymbolFrame, innermost frame first.
+    """
+    ret = {}
+    addrs_by_lib = collections.defaultdict(set)
+    for lib, addr in lib_addrs:
+      addrs_by_lib[lib].add(addr)
+    misses = collections.defaultdict(list)
+    for lib, addrs in addrs_by_lib.items():
+      build_id, worker = self._GetLibraryInfo(lib)
+      with self._lock:
+        for addr in sorted(addrs):
+          frames = self._cache.get((build_id, addr))
+          if frames is None:
+            misses[worker].append((lib, addr))
+          else:
+            self._cache.move_to_end((build_id, addr))
+            ret[(lib, addr)] = frames
+
+    def symbolize(worker, worker_lib_addrs):
+      results = worker.Symbolize(worker_lib_addrs)
+      with self._lock:
+        for lib_addr, frames in zip(worker_lib_addrs, results):
+          ret[lib_addr] = frames
+          self._cache[(self._libraries[lib_addr[0]][1], lib_addr[1])] = frames
+        while len(self._cache) > self._cache_size:
+          self._cache.popitem(last=False)
+
+    if misses:
+      reraiser_thread.RunAsync([
+          lambda item=item: symbolize(*item) for item in misses.items()
+      ])
+    return ret
+
+  def Close(self):
+    for worker in self._workers:
+      worker.Close()
+
+
+_shared_symbolizer = None
+_shared_symbolizer_lock = threading.Lock()
+
+
+def GetSharedSymbolizer():
+  """Returns the LLVMSymbolizer shared by the whole process."""
+  global _shared_symbolizer
+  with _shared_symbolizer_lock:
+    if not _shared_symbolizer:
+      _shared_symbolizer = LLVMSymbolizer()
+      atexit.register(_shared_symbolizer.Close)
+    return _shared_symbolizer
@@ -0,0 +1,97 @@
+#!/usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from pylib.symbols import llvm_symbolizer
+
+import mock  # pylint: disable=import-error
+
+# Resolves addresses to mock functions, with an inlined frame for addresses
+# >= 0x1000, and records every request to REQUESTS_LOG.
+_FAKE_LLVM_SYMBOLIZER = """\
+import os
+import sys
+
+for line in sys.stdin:
+  lib, addr = line.split()
+  lib = os.path.basename(lib.strip('"'))
+  addr = int(addr, 16)
+  with open(os.environ['REQUESTS_LOG'], 'a') as f:
+    f.write('%s %x\\n' % (lib, addr))
+  if addr >= 0x1000:
+    print('inlined_%x' % addr)
+    print('%s.cc:%d:0' % (lib, addr + 1))
+  print('func_%x' % addr)
+  print('%s.cc:%d:0' % (lib, addr))
+  print()
+  sys.stdout.flush()
+"""
+
+
+class LLVMSymbolizerTest(unittest.TestCase):
+
+  def setUp(self):
+    self._tmp_dir = tempfile.mkdtemp()
+    fake_path = os.path.join(self._tmp_dir, 'llvm-symbolizer')
+    with open(fake_path, 'w') as f:
+      f.write('#!%s\n%s' % (sys.executable, _FAKE_LLVM_SYMBOLIZER))
+    os.chmod(fake_path, 0o755)
+    self._requests_log = os.path.join(self._tmp_dir, 'requests.log')
+    self._patchers = [
+        mock.patch.object(llvm_symbolizer, '_LLVM_SYMBOLIZER_PATH', fake_path),
+        mock.patch.dict(os.environ, {'REQUESTS_LOG': self._requests_log}),
+    ]
+    for patcher in self._patchers:
+      patcher.start()
+    self._libs = []
+    for name in ('liba.so', 'libb.so'):
+      self._libs.append(os.path.join(self._tmp_dir, name))
+      with open(self._libs[-1], 'w') as f:
+        f.write(name)
+    self._symbolizer = llvm_symbolizer.LLVMSymbolizer(num_workers=2)
+
+  def tearDown(self):
+    self._symbolizer.Close()
+    for patcher in self._patchers:
+      patcher.stop()
+    shutil.rmtree(self._tmp_dir)
+
+  def _ReadRequests(self):
+    with open(self._requests_log) as f:
+      return sorted(f.read().splitlines())
+
+  def testSymbolizeBatch(self):
+    liba, libb = self._libs
+    results = self._symbolizer.SymbolizeBatch([(liba, 0x10), (libb, 0x1000),
+                                               (liba, 0x10)])
+    SymbolFrame = llvm_symbolizer.SymbolFrame
+    self.assertEqual({
+        (liba, 0x10): [SymbolFrame('func_10', 'liba.so.cc:16:0')],
+        (libb, 0x1000): [
+            SymbolFrame('inlined_1000', 'libb.so.cc:4097:0'),
+            SymbolFrame('func_1000', 'libb.so.cc:4096:0'),
+        ],
+    }, results)
+    self.assertEqual(['liba.so 10', 'libb.so 1000'], self._ReadRequests())
+
+  def testSymbolizeBatch_cached(self):
+    liba, _ = self._libs
+    self._symbolizer.SymbolizeBatch([(liba, 0x10)])
+    results = self._symbolizer.SymbolizeBatch([(liba, 0x10), (liba, 0x20)])
+    self.assertEqual('func_10', results[(liba, 0x10)][0].function)
+    self.assertEqual('func_20', results[(liba, 0x20)][0].function)
+    self.assertEqual(['liba.so 10', 'liba.so 20'], self._ReadRequests())
+
+  def testGetBuildId_notElf(self):
+    self.assertIsNone(self._symbolizer.GetBuildId(self._libs[0]))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -2,19 +2,39 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import glob
 import logging
 import os
 import re
+import struct
+import sys
 import tempfile
 import time
 
 from devil.utils import cmd_helper
 from pylib import constants
+from pylib.symbols import llvm_symbolizer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'gyp'))
+from util import elf_reader
 
 _STACK_TOOL = os.path.join(os.path.dirname(__file__), '..', '..', '..', '..',
                           'third_party', 'android_platform', 'development',
                           'scripts', 'stack')
 ABI_REG = re.compile('ABI: \'(.+?)\'')
+# E.g.: #00 pc 0006b6a4  /data/app/org.chromium.foo/lib/arm/libfoo.so (Bar+12)
+_FRAME_RE = re.compile(r'#\d+\s+pc\s+(?P<addr>[0-9a-fA-F]+)\s+(?P<lib>\S+)'
+                       r'(?P<suffix>.*)$')
+_BUILD_ID_RE = re.compile(r'\(BuildId: ([0-9a-fA-F]+)\)')
+
+# Maps ELF e_machine values to the arch names of _DeviceAbiToArch().
+_ELF_MACHINE_TO_ARCH = {
+    3: 'x86',
+    8: 'mips',
+    40: 'arm',
+    62: 'x86_64',
+    183: 'arm64',
+}
 
 
 def _DeviceAbiToArch(device_abi):
@@ -27,12 +47,21 @@ def _DeviceAbiToArch(device_abi):
   raise RuntimeError('Unknown device ABI: %s' % device_abi)
 
 
+def _GetArchOrNone(abi):
+  try:
+    return _DeviceAbiToArch(abi) if abi else None
+  except RuntimeError:
+    return None
+
+
 class Symbolizer:
   """A helper class to symbolize stack."""
 
   def __init__(self, apk_under_test=None):
     self._apk_under_test = apk_under_test
     self._time_spent_symbolizing = 0
+    self._lib_dirs = None
+    self._lib_arches = {}
 
 
   def __del__(self):
@@ -58,6 +87,16 @@ class Symbolizer:
     Yields:
       A string for each line of resolved stack output.
     """
+    if llvm_symbolizer.IsAvailable():
+      start = time.time()
+      try:
+        for line in self._ResolveWithLLVMSymbolizer(data_to_symbolize,
+                                                    device_abi, include_stack):
+          yield line
+      finally:
+        self._time_spent_symbolizing += time.time() - start
+      return
+
     if not os.path.exists(_STACK_TOOL):
       logging.warning('%s missing. Unable to resolve native stack traces.',
                       _STACK_TOOL)
@@ -84,3 +123,99 @@ class Symbolizer:
       if not include_stack and 'Stack Data:' in line:
         break
       yield line
+
+  def _GetLibArch(self, host_path):
+    arch = self._lib_arches.get(host_path, False)
+    if arch is False:
+      try:
+        with elf_reader.ElfFile(host_path) as elf:
+          arch = _ELF_MACHINE_TO_ARCH.get(elf.machine)
+      except (ValueError, struct.error):
+        arch = None
+      self._lib_arches[host_path] = arch
+    return arch
+
+  def _FindHostLibrary(self, device_lib_path, arch):
+    """Returns the unstripped host library for a device library, or None.
+
+    Args:
+      device_lib_path: The path of the library on the device.
+      arch: The arch of the process that loaded the library, as returned by
+        _DeviceAbiToArch(), or None to accept a library of any arch.
+    """
+    if self._lib_dirs is None:
+      out_dir = constants.GetOutDirectory()
+      self._lib_dirs = [os.path.join(out_dir, 'lib.unstripped')]
+      # Libraries of secondary toolchains (e.g. 32-bit libraries of 64-bit
+      # builds).
+      self._lib_dirs += sorted(
+          glob.glob(os.path.join(out_dir, '*', 'lib.unstripped')))
+    # E.g.: /data/app/org.chromium.foo/base.apk!libfoo.so
+    lib_name = os.path.basename(device_lib_path.split('!')[-1])
+    for lib_dir in self._lib_dirs:
+      host_path = os.path.join(lib_dir, lib_name)
+      if os.path.exists(host_path) and (arch is None
+                                        or self._GetLibArch(host_path) == arch):
+        return host_path
+    return None
+
+  def PrefetchNativeStackTraces(self, data_to_symbolize, device_abi):
+    """Symbolizes all frames in |data_to_symbolize| in a single batch.
+
+    Frames shared by many crashes are then only symbolized once, and later
+    calls to ExtractAndResolveNativeStackTraces() for the same frames are
+    answered from the cache of the shared llvm-symbolizer service.
+
+    Args:
+      data_to_symbolize: a list of strings to symbolize.
+      device_abi: the default ABI of the device which generated the data.
+    """
+    if llvm_symbolizer.IsAvailable():
+      self._SymbolizeFrames(data_to_symbolize, device_abi)
+
+  def _SymbolizeFrames(self, lines, device_abi):
+    """Symbolizes the frames of |lines|.
+
+    Libraries are looked up for the ABI of the last "ABI: '...'" line of a
+    tombstone, or |device_abi| before the first one.
+
+    Returns:
+      A tuple of:
+        - a list with a (host library, address) tuple, or None, for each line.
+        - a dict mapping (host library, address) tuples to SymbolFrames.
+    """
+    symbolizer = llvm_symbolizer.GetSharedSymbolizer()
+    arch = _GetArchOrNone(device_abi)
+    lib_addrs = []
+    for line in lines:
+      abi = ABI_REG.search(line)
+      if abi:
+        arch = _GetArchOrNone(abi.group(1))
+      m = _FRAME_RE.search(line)
+      host_lib = m and self._FindHostLibrary(m.group('lib'), arch)
+      if host_lib:
+        build_id = _BUILD_ID_RE.search(m.group('suffix'))
+        host_build_id = symbolizer.GetBuildId(host_lib)
+        # Do not symbolize using a different build of the library.
+        if build_id and host_build_id and (build_id.group(1).lower() !=
+                                           host_build_id):
+          host_lib = None
+      lib_addrs.append((host_lib,
+                        int(m.group('addr'), 16)) if host_lib else None)
+    return lib_addrs, symbolizer.SymbolizeBatch(a for a in lib_addrs if a)
+
+  def _ResolveWithLLVMSymbolizer(self, data_to_symbolize, device_abi,
+                                 include_stack):
+    lib_addrs, frames_by_lib_addr = self._SymbolizeFrames(
+        data_to_symbolize, device_abi)
+    for line, lib_addr in zip(data_to_symbolize, lib_addrs):
+      if not include_stack and line.strip() == 'stack:':
+        break
+      frames = frames_by_lib_addr.get(lib_addr) if lib_addr else None
+      if not frames:
+        yield line
+        continue
+      indent = ' ' * (len(line) - len(line.lstrip()) + 4)
+      yield '%s  %s %s' % (line, frames[0].function, frames[0].location)
+      for frame in frames[1:]:
+        yield '%s(inlined by) %s %s' % (indent, frame.function, frame.location)
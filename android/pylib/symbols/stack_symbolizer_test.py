@@ -0,0 +1,62 @@
+#!/usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from pylib.symbols import stack_symbolizer
+
+import mock  # pylint: disable=import-error
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'gyp'))
+from util import elf_test_utils
+
+
+def _WriteElf(path, is_64_bit):
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'wb') as f:
+    f.write(elf_test_utils.CreateElf([], is_64_bit))
+
+
+class SymbolizerTest(unittest.TestCase):
+
+  def setUp(self):
+    self._out_dir = tempfile.mkdtemp()
+    # A 64-bit build, with 32-bit libraries in a secondary toolchain.
+    self._lib64 = os.path.join(self._out_dir, 'lib.unstripped', 'libfoo.so')
+    self._lib32 = os.path.join(self._out_dir, 'android_clang_arm',
+                               'lib.unstripped', 'libfoo.so')
+    _WriteElf(self._lib64, is_64_bit=True)
+    _WriteElf(self._lib32, is_64_bit=False)
+    self._patcher = mock.patch.object(stack_symbolizer.constants,
+                                      'GetOutDirectory',
+                                      return_value=self._out_dir)
+    self._patcher.start()
+    self._symbolizer = stack_symbolizer.Symbolizer()
+
+  def tearDown(self):
+    self._patcher.stop()
+    shutil.rmtree(self._out_dir)
+
+  def testFindHostLibrary(self):
+    device_path = '/data/app/org.chromium.foo/base.apk!libfoo.so'
+    # pylint: disable=protected-access
+    self.assertEqual(self._lib64,
+                     self._symbolizer._FindHostLibrary(device_path, 'arm64'))
+    self.assertEqual(self._lib32,
+                     self._symbolizer._FindHostLibrary(device_path, 'arm'))
+    self.assertEqual(self._lib64,
+                     self._symbolizer._FindHostLibrary(device_path, None))
+    self.assertIsNone(
+        self._symbolizer._FindHostLibrary(device_path, 'x86'))
+    self.assertIsNone(
+        self._symbolizer._FindHostLibrary('/system/lib/libc.so', 'arm'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -2,6 +2,7 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import hashlib
 import json
 import logging
 import os
@@ -17,6 +18,7 @@ from util import build_utils
 from util import md5_check
 from util import resource_utils
 import bundletool
+from pylib.utils import file_digest
 
 # "system_apks" is "default", but with locale list and compressed dex.
 _SYSTEM_MODES = ('system', 'system_apks')
@@ -26,6 +28,9 @@ OPTIMIZE_FOR_OPTIONS = ('ABI', 'SCREEN_DENSITY', 'LANGUAGE',
 
 _ALL_ABIS = ['armeabi-v7a', 'arm64-v8a', 'x86', 'x86_64']
 
+# Number of device spec specific sets of splits kept by ExtractSplitApks().
+_MAX_SPLIT_CACHE_ENTRIES = 4
+
 
 def _BundleMinSdkVersion(bundle_path):
   manifest_data = bundletool.RunBundleTool(
@@ -193,3 +198,68 @@ def GenerateBundleApks(bundle_path,
         output_paths=[bundle_apks_path])
   else:
     rebuild()
+
+
+def ExtractSplitApks(bundle_apks_path, device_spec, modules=None):
+  """Returns the .apk files of an .apks archive to install on a device.
+
+  Extracted .apk files are cached beside the .apks archive, keyed by the
+  contents of the archive, the device spec and the modules, so that devices
+  with the same spec (and later invocations) share a single extraction.
+
+  Args:
+    bundle_apks_path: Path to an .apks archive created by GenerateBundleApks().
+    device_spec: A bundletool device spec dict, e.g. as returned by
+      bundletool get-device-spec.
+    modules: Optional list of modules to extract. Defaults to the base module
+      and install-time modules.
+
+  Returns:
+    A list of paths to the extracted .apk files.
+  """
+  key = hashlib.md5(
+      json.dumps([
+          file_digest.GetFileMd5(bundle_apks_path), device_spec,
+          sorted(modules or [])
+      ],
+                 sort_keys=True).encode('utf-8')).hexdigest()
+  cache_dir = bundle_apks_path + '.splits'
+  output_dir = os.path.join(cache_dir, key)
+  if os.path.isdir(output_dir):
+    # Mark as recently used.
+    os.utime(output_dir)
+  else:
+    logging.info('Extracting splits from %s', bundle_apks_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    with build_utils.TempDir(dir=cache_dir) as tmp_dir:
+      spec_path = os.path.join(tmp_dir, 'device.json')
+      with open(spec_path, 'w') as f:
+        json.dump(device_spec, f)
+      tmp_output_dir = os.path.join(tmp_dir, 'splits')
+      cmd_args = [
+          'extract-apks',
+          '--apks=%s' % bundle_apks_path,
+          '--device-spec=%s' % spec_path,
+          '--output-dir=%s' % tmp_output_dir,
+      ]
+      if modules:
+        cmd_args += ['--modules=%s' % ','.join(modules)]
+      bundletool.RunBundleTool(cmd_args)
+      # Another process may have extracted the same splits meanwhile.
+      try:
+        os.rename(tmp_output_dir, output_dir)
+      except OSError:
+        if not os.path.isdir(output_dir):
+          raise
+
+    # Remove the least recently used entries (but not temporary directories).
+    entries = sorted((os.path.join(cache_dir, n) for n in os.listdir(cache_dir)
+                      if n != key and len(n) == len(key)),
+                     key=os.path.getmtime)
+    num_stale = len(entries) - (_MAX_SPLIT_CACHE_ENTRIES - 1)
+    for entry in entries[:max(0, num_stale)]:
+      shutil.rmtree(entry, ignore_errors=True)
+
+  return sorted(
+      os.path.join(output_dir, n) for n in os.listdir(output_dir)
+      if n.endswith('.apk'))
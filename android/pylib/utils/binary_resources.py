@@ -0,0 +1,251 @@
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Optimistically parses compiled Android resources.
+
+Reads the binary XML of AndroidManifest.xml and the string entries of
+resources.arsc without shelling out to aapt. As with dex_parser, there is only
+as much validation as needed to not misread well-formed files.
+
+Refer to frameworks/base/libs/androidfw/include/androidfw/ResourceTypes.h.
+"""
+
+import collections
+import struct
+
+_RES_STRING_POOL_TYPE = 0x0001
+_RES_TABLE_TYPE = 0x0002
+_RES_XML_TYPE = 0x0003
+_RES_XML_START_NAMESPACE_TYPE = 0x0100
+_RES_XML_START_ELEMENT_TYPE = 0x0102
+_RES_TABLE_PACKAGE_TYPE = 0x0200
+_RES_TABLE_TYPE_TYPE = 0x0201
+
+_UTF8_FLAG = 1 << 8
+
+# ResTable_type flags.
+_FLAG_SPARSE = 0x01
+_FLAG_OFFSET16 = 0x02
+_NO_ENTRY = 0xffffffff
+_NO_ENTRY16 = 0xffff
+
+# ResTable_entry flags.
+_FLAG_COMPLEX = 0x0001
+_FLAG_COMPACT = 0x0008
+
+TYPE_STRING = 0x03
+
+# Offsets of |language| and the end of |country| within ResTable_config.
+_CONFIG_LOCALE_START = 8
+_CONFIG_LOCALE_END = 12
+
+# A single attribute of an element in binary XML. |data| is the typed value,
+# and |raw_value| is the string value, if any.
+XmlAttribute = collections.namedtuple('XmlAttribute',
+                                      ['value_type', 'data', 'raw_value'])
+
+# |name| and the keys of |attributes| use the prefix of their namespace. E.g.
+# "android:minSdkVersion".
+XmlElement = collections.namedtuple('XmlElement', ['name', 'attributes'])
+
+
+def _IterChunks(data, start, end):
+  """Yields (type, header_size, offset, size) of each chunk in [start, end)."""
+  pos = start
+  while pos + 8 <= end:
+    chunk_type, header_size, size = struct.unpack_from('<HHI', data, pos)
+    if size < 8:
+      raise ValueError('Invalid chunk size at offset %d' % pos)
+    yield chunk_type, header_size, pos, size
+    pos += size
+
+
+class _StringPool:
+  """Decodes strings of a ResStringPool chunk when they are first needed."""
+
+  def __init__(self, data, offset):
+    (header_size, self._count, _, flags, strings_start,
+     _) = struct.unpack_from('<2xHxxxxIIIII', data, offset)
+    self._data = data
+    self._is_utf8 = bool(flags & _UTF8_FLAG)
+    self._offsets = struct.unpack_from('<%dI' % self._count, data,
+                                       offset + header_size)
+    self._strings_start = offset + strings_start
+    self._cache = {}
+
+  def __len__(self):
+    return self._count
+
+  def _DecodeUtf8(self, pos):
+    data = self._data
+    # Skips the length in UTF-16 code units.
+    pos += 2 if data[pos] & 0x80 else 1
+    length = data[pos]
+    if length & 0x80:
+      length = ((length & 0x7f) << 8) | data[pos + 1]
+      pos += 1
+    pos += 1
+    return bytes(data[pos:pos + length]).decode('utf-8', 'replace')
+
+  def _DecodeUtf16(self, pos):
+    length, = struct.unpack_from('<H', self._data, pos)
+    pos += 2
+    if length & 0x8000:
+      low, = struct.unpack_from('<H', self._data, pos)
+      length = ((length & 0x7fff) << 16) | low
+      pos += 2
+    return bytes(self._data[pos:pos + length * 2]).decode(
+        'utf-16-le', 'replace')
+
+  def Get(self, index):
+    """Returns the string at |index|, or None for an invalid index."""
+    if not 0 <= index < self._count:
+      return None
+    ret = self._cache.get(index)
+    if ret is None:
+      pos = self._strings_start + self._offsets[index]
+      if self._is_utf8:
+        ret = self._DecodeUtf8(pos)
+      else:
+        ret = self._DecodeUtf16(pos)
+      self._cache[index] = ret
+    return ret
+
+
+def ParseXml(data):
+  """Returns the elements of a binary XML file, as a list of XmlElement.
+
+  Args:
+    data: Contents of a compiled XML file, e.g. AndroidManifest.xml from an APK.
+  """
+  chunk_type, header_size, _, size = next(_IterChunks(data, 0, len(data)))
+  if chunk_type != _RES_XML_TYPE:
+    raise ValueError('Not a binary XML file.')
+
+  pool = None
+  prefixes_by_uri = {}
+  ret = []
+
+  def qualified_name(ns_index, name_index):
+    name = pool.Get(name_index)
+    prefix = prefixes_by_uri.get(pool.Get(ns_index))
+    return '%s:%s' % (prefix, name) if prefix else name
+
+  for chunk_type, header_size, pos, _ in _IterChunks(data, header_size,
+                                                     min(size, len(data))):
+    if chunk_type == _RES_STRING_POOL_TYPE:
+      pool = _StringPool(data, pos)
+    elif chunk_type == _RES_XML_START_NAMESPACE_TYPE:
+      prefix, uri = struct.unpack_from('<II', data, pos + header_size)
+      prefixes_by_uri[pool.Get(uri)] = pool.Get(prefix)
+    elif chunk_type == _RES_XML_START_ELEMENT_TYPE:
+      ext = pos + header_size
+      (ns, name, attribute_start, attribute_size,
+       attribute_count) = struct.unpack_from('<IIHHH', data, ext)
+      attributes = collections.OrderedDict()
+      for i in range(attribute_count):
+        attr_pos = ext + attribute_start + i * attribute_size
+        (attr_ns, attr_name, raw_value, value_type,
+         value_data) = struct.unpack_from('<IIIxxxBI', data, attr_pos)
+        attributes[qualified_name(attr_ns, attr_name)] = XmlAttribute(
+            value_type, value_data, pool.Get(raw_value))
+      ret.append(XmlElement(qualified_name(ns, name), attributes))
+  return ret
+
+
+def _ParseLocale(locale):
+  """Converts an aapt config name (e.g. "en-rGB") to ResTable_config bytes."""
+  parts = locale.split('-')
+  language = parts[0].encode('ascii')
+  region = b''
+  if len(parts) > 1:
+    assert len(parts) == 2 and parts[1].startswith('r'), locale
+    region = parts[1][1:].encode('ascii')
+  assert len(language) == 2 and len(region) in (0, 2), locale
+  return language + region.ljust(2, b'\0')
+
+
+def _IterTypeEntries(data, pos, header_size):
+  """Yields (entry index, entry offset) of each entry of a ResTable_type."""
+  flags, entry_count, entries_start = struct.unpack_from('<xBxxII', data,
+                                                         pos + 8)
+  offsets_pos = pos + header_size
+  entries_pos = pos + entries_start
+  if flags & _FLAG_SPARSE:
+    for i in range(entry_count):
+      index, offset = struct.unpack_from('<HH', data, offsets_pos + i * 4)
+      yield index, entries_pos + offset * 4
+  elif flags & _FLAG_OFFSET16:
+    offsets = struct.unpack_from('<%dH' % entry_count, data, offsets_pos)
+    for index, offset in enumerate(offsets):
+      if offset != _NO_ENTRY16:
+        yield index, entries_pos + offset * 4
+  else:
+    offsets = struct.unpack_from('<%dI' % entry_count, data, offsets_pos)
+    for index, offset in enumerate(offsets):
+      if offset != _NO_ENTRY:
+        yield index, entries_pos + offset
+
+
+def _ReadEntryValue(data, pos):
+  """Returns (value type, data) of a simple entry, or None for a map entry."""
+  size, flags = struct.unpack_from('<HH', data, pos)
+  if flags & _FLAG_COMPACT:
+    return flags >> 8, struct.unpack_from('<I', data, pos + 4)[0]
+  if flags & _FLAG_COMPLEX:
+    return None
+  return struct.unpack_from('<xxxBI', data, pos + size)
+
+
+def ReadStringResources(data, locales):
+  """Returns the string resources of resources.arsc for the given locales.
+
+  Only configurations that specify nothing but the locale are considered, to
+  match the "config en-rGB:" sections of "aapt dump --values resources".
+
+  Args:
+    data: Contents of a resources.arsc file.
+    locales: Locales as named by aapt. E.g. "fr" or "en-rGB".
+
+  Returns:
+    A dict of locale -> {resource ID -> string value}.
+  """
+  configs = {_ParseLocale(l): l for l in locales}
+  ret = {l: {} for l in locales}
+  chunk_type, header_size, _, size = next(_IterChunks(data, 0, len(data)))
+  if chunk_type != _RES_TABLE_TYPE:
+    raise ValueError('Not a resource table.')
+
+  global_pool = None
+  for chunk_type, header_size, pos, size in _IterChunks(data, header_size,
+                                                        min(size, len(data))):
+    if chunk_type == _RES_STRING_POOL_TYPE:
+      global_pool = _StringPool(data, pos)
+      continue
+    if chunk_type != _RES_TABLE_PACKAGE_TYPE:
+      continue
+    package_id, = struct.unpack_from('<I', data, pos + 8)
+    type_strings_offset, = struct.unpack_from('<I', data, pos + 268)
+    type_strings = _StringPool(data, pos + type_strings_offset)
+    for sub_type, sub_header_size, sub_pos, _ in _IterChunks(
+        data, pos + header_size, pos + size):
+      if sub_type != _RES_TABLE_TYPE_TYPE:
+        continue
+      type_id = data[sub_pos + 8]
+      if type_strings.Get(type_id - 1) != 'string':
+        continue
+      config_pos = sub_pos + 20
+      config_size, = struct.unpack_from('<I', data, config_pos)
+      config = bytes(data[config_pos:config_pos + config_size])
+      locale = configs.get(config[_CONFIG_LOCALE_START:_CONFIG_LOCALE_END])
+      if (not locale or any(config[4:_CONFIG_LOCALE_START])
+          or any(config[_CONFIG_LOCALE_END:])):
+        continue
+      strings = ret[locale]
+      id_prefix = (package_id << 24) | (type_id << 16)
+      for index, entry_pos in _IterTypeEntries(data, sub_pos, sub_header_size):
+        value = _ReadEntryValue(data, entry_pos)
+        if value and value[0] == TYPE_STRING:
+          strings[id_prefix | index] = global_pool.Get(value[1])
+  return ret
@@ -0,0 +1,168 @@
+#!/usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import struct
+import unittest
+
+from pylib.utils import binary_resources
+
+_ANDROID_NS = 'http://schemas.android.com/apk/res/android'
+_DIST_NS = 'http://schemas.android.com/apk/distribution'
+
+
+def _Chunk(chunk_type, header, body):
+  header_size = 8 + len(header)
+  return struct.pack('<HHI', chunk_type, header_size,
+                     header_size + len(body)) + header + body
+
+
+def _StringPool(strings, utf8=True):
+  data = b''
+  offsets = []
+  for s in strings:
+    offsets.append(len(data))
+    if utf8:
+      encoded = s.encode('utf-8')
+      data += bytes([len(s), len(encoded)]) + encoded + b'\0'
+    else:
+      data += struct.pack('<H', len(s)) + s.encode('utf-16-le') + b'\0\0'
+  data += b'\0' * (-len(data) % 4)
+  strings_start = 28 + 4 * len(strings)
+  header = struct.pack('<IIIII', len(strings), 0, 0x100 if utf8 else 0,
+                       strings_start, 0)
+  body = struct.pack('<%dI' % len(strings), *offsets) + data
+  return _Chunk(0x0001, header, body)
+
+
+def _Manifest(utf8):
+  strings = [
+      'android', _ANDROID_NS, 'dist', _DIST_NS, 'manifest', 'minSdkVersion',
+      'uses-sdk', 'on-demand', 'package', 'org.chromium.foo'
+  ]
+  idx = strings.index
+  node = struct.pack('<II', 1, 0xffffffff)
+
+  def element(ns, name, attrs):
+    ext = struct.pack('<IIHHHHHH', ns, idx(name), 20, 20, len(attrs), 0, 0, 0)
+    for attr_ns, attr_name, raw, value_type, value in attrs:
+      ext += struct.pack('<IIIHBBI', attr_ns, idx(attr_name), raw, 8, 0,
+                         value_type, value)
+    return _Chunk(0x0102, node, ext)
+
+  no_ns = 0xffffffff
+  body = _StringPool(strings, utf8)
+  body += _Chunk(0x0100, node, struct.pack('<II', idx('android'),
+                                           idx(_ANDROID_NS)))
+  body += _Chunk(0x0100, node, struct.pack('<II', idx('dist'), idx(_DIST_NS)))
+  body += element(no_ns, 'manifest', [
+      (no_ns, 'package', idx('org.chromium.foo'), 0x03,
+       idx('org.chromium.foo'))
+  ])
+  body += element(no_ns, 'uses-sdk', [
+      (idx(_ANDROID_NS), 'minSdkVersion', no_ns, 0x10, 24),
+  ])
+  body += element(idx(_DIST_NS), 'on-demand', [])
+  return _Chunk(0x0003, b'', body)
+
+
+def _TypeChunk(type_id, config, entries, flags=0):
+  """|entries| is a list of (value type, data), or None for missing entries."""
+  offsets = []
+  data = b''
+  for i, entry in enumerate(entries):
+    if entry is None:
+      continue
+    offsets.append((i, len(data)))
+    data += struct.pack('<HHI', 8, 0, i)
+    data += struct.pack('<HBBI', 8, 0, *entry)
+  if flags & 0x01:
+    offset_table = b''.join(struct.pack('<HH', i, o // 4) for i, o in offsets)
+    entry_count = len(offsets)
+  else:
+    offset_map = dict(offsets)
+    offset_table = b''.join(
+        struct.pack('<I', offset_map.get(i, 0xffffffff))
+        for i in range(len(entries)))
+    entry_count = len(entries)
+  config = struct.pack('<I', 4 + len(config)) + config
+  header_size = 8 + 12 + len(config)
+  header = struct.pack('<BBHII', type_id, flags, 0, entry_count,
+                       header_size + len(offset_table)) + config
+  return _Chunk(0x0201, header, offset_table + data)
+
+
+def _Config(locale=b'', density=0):
+  locale = locale.ljust(4, b'\0')
+  return b'\0' * 4 + locale + struct.pack('<BBH', 0, 0, density) + b'\0' * 36
+
+
+def _ResourceTable(type_flags=0):
+  global_strings = ['Hello', 'Bonjour', 'Cheerio', 'Bonjour-xhdpi']
+  type_strings = _StringPool(['attr', 'string'], utf8=False)
+  key_strings = _StringPool(['hello', 'bye'])
+  body = type_strings + key_strings
+  body += _TypeChunk(2, _Config(b'en'), [(0x03, 0), (0x03, 2)], type_flags)
+  body += _TypeChunk(2, _Config(b'enGB'), [(0x03, 0), (0x03, 2)], type_flags)
+  body += _TypeChunk(2, _Config(b'fr'), [(0x03, 1), None], type_flags)
+  body += _TypeChunk(2, _Config(b'fr', density=320), [(0x03, 3), (0x10, 5)],
+                     type_flags)
+  # Not a string type.
+  body += _TypeChunk(1, _Config(b'fr'), [(0x03, 0)], type_flags)
+  package_header = struct.pack('<I', 0x7f) + 'org.chromium.foo'.encode(
+      'utf-16-le').ljust(256, b'\0')
+  header_size = 8 + len(package_header) + 20
+  package_header += struct.pack('<IIIII', header_size, 0,
+                                header_size + len(type_strings), 0, 0)
+  package = _Chunk(0x0200, package_header, body)
+  return _Chunk(0x0002, struct.pack('<I', 1),
+                _StringPool(global_strings) + package)
+
+
+class BinaryResourcesTest(unittest.TestCase):
+
+  def _CheckManifest(self, utf8):
+    elements = binary_resources.ParseXml(_Manifest(utf8))
+    self.assertEqual(['manifest', 'uses-sdk', 'dist:on-demand'],
+                     [e.name for e in elements])
+    package = elements[0].attributes['package']
+    self.assertEqual('org.chromium.foo', package.raw_value)
+    self.assertEqual(binary_resources.TYPE_STRING, package.value_type)
+    min_sdk = elements[1].attributes['android:minSdkVersion']
+    self.assertEqual((0x10, 24, None), min_sdk)
+
+  def testParseXml_utf8(self):
+    self._CheckManifest(utf8=True)
+
+  def testParseXml_utf16(self):
+    self._CheckManifest(utf8=False)
+
+  def testParseXml_notXml(self):
+    with self.assertRaises(ValueError):
+      binary_resources.ParseXml(_ResourceTable())
+
+  def _CheckResourceTable(self, type_flags):
+    strings = binary_resources.ReadStringResources(
+        _ResourceTable(type_flags), ['en-rGB', 'fr', 'de'])
+    self.assertEqual(
+        {
+            'en-rGB': {
+                0x7f020000: 'Hello',
+                0x7f020001: 'Cheerio'
+            },
+            'fr': {
+                0x7f020000: 'Bonjour'
+            },
+            'de': {},
+        }, strings)
+
+  def testReadStringResources(self):
+    self._CheckResourceTable(type_flags=0)
+
+  def testReadStringResources_sparse(self):
+    self._CheckResourceTable(type_flags=0x01)
+
+
+if __name__ == '__main__':
+  unittest.main()
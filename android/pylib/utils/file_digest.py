@@ -0,0 +1,23 @@
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Helpers to hash host files without reading them into memory at once."""
+
+import hashlib
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def UpdateHash(hash_obj, path):
+  """Feeds the contents of |path| to |hash_obj|, e.g. a hashlib.md5()."""
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+      hash_obj.update(chunk)
+
+
+def GetFileMd5(path):
+  """Returns the md5 hex digest of the contents of |path|."""
+  md5 = hashlib.md5()
+  UpdateHash(md5, path)
+  return md5.hexdigest()
@@ -0,0 +1,31 @@
+#! /usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import hashlib
+import tempfile
+import unittest
+
+from pylib.utils import file_digest
+
+
+class FileDigestTest(unittest.TestCase):
+
+  def testGetFileMd5(self):
+    # pylint: disable=protected-access
+    # Spans several chunks.
+    data = b'0123456789' * (file_digest._CHUNK_SIZE // 4)
+    with tempfile.NamedTemporaryFile() as f:
+      f.write(data)
+      f.flush()
+      self.assertEqual(hashlib.md5(data).hexdigest(),
+                       file_digest.GetFileMd5(f.name))
+      sha1 = hashlib.sha1(b'prefix')
+      file_digest.UpdateHash(sha1, f.name)
+      self.assertEqual(hashlib.sha1(b'prefix' + data).hexdigest(),
+                       sha1.hexdigest())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -8,6 +8,7 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import time
 
 from devil import devil_env
 from devil.android import device_signal
@@ -155,16 +156,26 @@ def InstallSimpleperf(device, package_name):
   return device_simpleperf_path
 
 
-@contextlib.contextmanager
-def RunSimpleperf(device, device_simpleperf_path, package_name,
-                  process_specifier, thread_specifier, profiler_args,
-                  host_out_path):
-  pid = _GetSpecifiedPID(device, package_name, process_specifier)
-  tid = _GetSpecifiedTID(device, pid, thread_specifier)
-  if pid is None and tid is None:
-    raise RuntimeError('Could not find specified process/thread running on '
-                       'device. Make sure the apk is already running before '
-                       'attempting to profile.')
+# How long to wait for simpleperf to start before launching an app.
+_SIMPLEPERF_START_TIMEOUT = 10
+# simpleperf --app looks for new processes of the app by polling, so it is
+# given time to start doing so after its process appears.
+_SIMPLEPERF_SETTLE_TIME = 0.5
+
+
+def _WaitForSimpleperf(device):
+  """Waits until simpleperf is running on |device|."""
+  deadline = time.time() + _SIMPLEPERF_START_TIMEOUT
+  while not device.GetPids('simpleperf'):
+    if time.time() > deadline:
+      raise RuntimeError('simpleperf did not start within %d seconds.' %
+                         _SIMPLEPERF_START_TIMEOUT)
+    time.sleep(0.1)
+  time.sleep(_SIMPLEPERF_SETTLE_TIME)
+
+
+def _PrepareProfilerArgs(profiler_args):
+  """Returns the record args with defaults applied, and the device out path."""
   profiler_args = list(profiler_args)
   if profiler_args and profiler_args[0] == 'record':
     profiler_args.pop(0)
@@ -177,12 +188,12 @@ def RunSimpleperf(device, device_simpleperf_path, package_name,
     device_out_path = profiler_args[profiler_args.index('-o') + 1]
   else:
     profiler_args.extend(('-o', device_out_path))
+  return profiler_args, device_out_path
 
-  if tid:
-    profiler_args.extend(('-t', str(tid)))
-  else:
-    profiler_args.extend(('-p', str(pid)))
 
+@contextlib.contextmanager
+def _RecordSimpleperf(device, device_simpleperf_path, profiler_args,
+                      device_out_path, host_out_path):
   adb_shell_simpleperf_process = device.adb.StartShell(
       [device_simpleperf_path, 'record'] + profiler_args)
 
@@ -199,6 +210,50 @@ def RunSimpleperf(device, device_simpleperf_path, package_name,
       device.PullFile(device_out_path, host_out_path)
 
 
+@contextlib.contextmanager
+def RunSimpleperf(device, device_simpleperf_path, package_name,
+                  process_specifier, thread_specifier, profiler_args,
+                  host_out_path):
+  pid = _GetSpecifiedPID(device, package_name, process_specifier)
+  tid = _GetSpecifiedTID(device, pid, thread_specifier)
+  if pid is None and tid is None:
+    raise RuntimeError('Could not find specified process/thread running on '
+                       'device. Make sure the apk is already running before '
+                       'attempting to profile.')
+  profiler_args, device_out_path = _PrepareProfilerArgs(profiler_args)
+
+  if tid:
+    profiler_args.extend(('-t', str(tid)))
+  else:
+    profiler_args.extend(('-p', str(pid)))
+
+  with _RecordSimpleperf(device, device_simpleperf_path, profiler_args,
+                         device_out_path, host_out_path):
+    yield
+
+
+@contextlib.contextmanager
+def RunSimpleperfForAppStart(device, device_simpleperf_path, package_name,
+                             profiler_args, host_out_path):
+  """Profiles |package_name| from the moment its next process starts.
+
+  Unlike RunSimpleperf(), the app must not be running yet: simpleperf waits for
+  it to start, so that startup is profiled from the beginning. Requires the app
+  to be debuggable or profileable, or a rooted device.
+
+  Only returns once simpleperf is running and has had some time to start
+  looking for the app, so the app can be launched right away. Still, the first
+  milliseconds of the app's process may not be profiled, since simpleperf only
+  notices it when it next polls for it.
+  """
+  profiler_args, device_out_path = _PrepareProfilerArgs(profiler_args)
+  profiler_args.extend(('--app', package_name))
+  with _RecordSimpleperf(device, device_simpleperf_path, profiler_args,
+                         device_out_path, host_out_path):
+    _WaitForSimpleperf(device)
+    yield
+
+
 def ConvertSimpleperfToPprof(simpleperf_out_path, build_directory,
                              pprof_out_path):
   # The simpleperf scripts require the unstripped libs to be installed in the
@@ -0,0 +1,201 @@
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Pushes test data to devices based on a host-side manifest of past pushes.
+
+DeviceUtils.PushChangedFiles() computes md5 sums of every file on the device
+to find out what changed. For suites with large data dependencies this is slow
+even when nothing changed. Instead, this records what was last pushed to each
+device (path, size and digest) on the host, so that unchanged trees are skipped
+without touching the device, and only files whose digest changed are pushed.
+
+A token file written in the directory that holds the pushed data guards against
+the device having been wiped or reset since the manifest was written. It is
+deleted along with that directory.
+"""
+
+import json
+import logging
+import os
+import posixpath
+import uuid
+
+from devil.android import device_errors
+from pylib.utils import file_digest
+
+_MANIFEST_VERSION = 1
+
+_TOKEN_FILE_NAME = '.test_data_manifest_token'
+
+
+def _IterHostFiles(host_device_tuples):
+  """Yields (host_path, device_path) for every file in |host_device_tuples|."""
+  for host_path, device_path in host_device_tuples:
+    if not os.path.isdir(host_path):
+      yield host_path, device_path
+      continue
+    for root, _, files in os.walk(host_path, followlinks=True):
+      rel_root = os.path.relpath(root, host_path)
+      device_root = device_path
+      if rel_root != os.curdir:
+        device_root = posixpath.join(device_path, *rel_root.split(os.sep))
+      for f in files:
+        yield os.path.join(root, f), posixpath.join(device_root, f)
+
+
+def ComputeManifest(host_device_tuples, previous_files=None):
+  """Computes the manifest entries for |host_device_tuples|.
+
+  Digests are only computed for files whose size or mtime changed since
+  |previous_files| was computed.
+
+  Args:
+    host_device_tuples: A list of (host_path, device_path) tuples, as passed to
+      DeviceUtils.PushChangedFiles().
+    previous_files: An optional dict as returned by a previous call.
+
+  Returns:
+    A dict mapping device paths to [host_path, size, mtime_ns, digest].
+  """
+  previous_files = previous_files or {}
+  files = {}
+  for host_path, device_path in _IterHostFiles(host_device_tuples):
+    st = os.stat(host_path)
+    previous = previous_files.get(device_path)
+    if previous and previous[:3] == [host_path, st.st_size, st.st_mtime_ns]:
+      digest = previous[3]
+    else:
+      digest = file_digest.GetFileMd5(host_path)
+    files[device_path] = [host_path, st.st_size, st.st_mtime_ns, digest]
+  return files
+
+
+def DiffManifests(old_files, new_files):
+  """Returns the files to push and the device paths to delete.
+
+  Args:
+    old_files: The manifest files of what is on the device.
+    new_files: The manifest files of what should be on the device.
+
+  Returns:
+    A tuple of:
+      - a sorted list of (host_path, device_path) tuples of files to push.
+      - a sorted list of device paths that are no longer needed.
+  """
+  changed = sorted(
+      (entry[0], device_path) for device_path, entry in new_files.items()
+      if device_path not in old_files
+      or old_files[device_path][3] != entry[3])
+  stale = sorted(set(old_files).difference(new_files))
+  return changed, stale
+
+
+def _GetTokenPath(host_device_tuples):
+  """Returns the device path of the token, or None if there is no data root.
+
+  The token is put in the deepest directory that holds all of the data, so that
+  removing the data removes the token as well.
+  """
+  device_dirs = [
+      d if os.path.isdir(h) else posixpath.dirname(d)
+      for h, d in host_device_tuples
+  ]
+  root = posixpath.commonpath(device_dirs)
+  if root == '/':
+    return None
+  return posixpath.join(root, _TOKEN_FILE_NAME)
+
+
+def _ReadDeviceToken(device, token_path, as_root):
+  try:
+    return device.ReadFile(token_path, as_root=as_root).strip()
+  except device_errors.CommandFailedError:
+    return None
+
+
+def _LoadManifest(manifest_path):
+  if not os.path.exists(manifest_path):
+    return None
+  try:
+    with open(manifest_path) as f:
+      manifest = json.load(f)
+  except ValueError:
+    logging.warning('Ignoring invalid test data manifest: %s', manifest_path)
+    return None
+  finally:
+    # Delete the manifest so that any exceptions while pushing clear it.
+    os.unlink(manifest_path)
+  if manifest.get('version') != _MANIFEST_VERSION:
+    return None
+  return manifest
+
+
+def PushChangedFiles(device,
+                     host_device_tuples,
+                     manifest_path,
+                     delete_device_stale=False,
+                     as_root=False,
+                     timeout=None):
+  """Pushes |host_device_tuples| to |device| using a host-side manifest.
+
+  Falls back to DeviceUtils.PushChangedFiles() when there is no valid manifest
+  for the device, and writes one once the push succeeded.
+
+  Args:
+    device: A DeviceUtils instance.
+    host_device_tuples: A list of (host_path, device_path) tuples.
+    manifest_path: Path of the host-side manifest file for |device|.
+    delete_device_stale: Whether to delete files on the device that are no
+      longer part of |host_device_tuples|.
+    as_root: Whether to push and delete files as root.
+    timeout: Timeout for pushes, as for DeviceUtils.PushChangedFiles().
+  """
+  token_path = host_device_tuples and _GetTokenPath(host_device_tuples)
+  if not token_path:
+    device.PushChangedFiles(host_device_tuples,
+                            delete_device_stale=delete_device_stale,
+                            as_root=as_root,
+                            timeout=timeout)
+    return
+
+  manifest = _LoadManifest(manifest_path)
+  old_files = None
+  if (manifest and manifest['token_path'] == token_path
+      and manifest['token'] == _ReadDeviceToken(device, token_path, as_root)):
+    old_files = manifest['files']
+  new_files = ComputeManifest(host_device_tuples,
+                              old_files or (manifest or {}).get('files'))
+
+  if old_files is None:
+    logging.info('No valid test data manifest for %s. Pushing all files.',
+                 device)
+    device.PushChangedFiles(host_device_tuples,
+                            delete_device_stale=delete_device_stale,
+                            as_root=as_root,
+                            timeout=timeout)
+  else:
+    changed, stale = DiffManifests(old_files, new_files)
+    logging.info('Test data manifest for %s: %d changed, %d stale of %d files.',
+                 device, len(changed), len(stale), len(new_files))
+    if changed:
+      # PushChangedFiles() zips and pushes the files as a single batch when
+      # there are many of them.
+      device.PushChangedFiles(changed, as_root=as_root, timeout=timeout)
+    if stale and delete_device_stale:
+      device.RemovePath(stale, force=True, as_root=as_root)
+    elif stale:
+      # Files that were left on the device are still on it.
+      for device_path in stale:
+        new_files[device_path] = old_files[device_path]
+
+  token = uuid.uuid4().hex
+  device.WriteFile(token_path, token, as_root=as_root)
+  with open(manifest_path, 'w') as f:
+    json.dump(
+        {
+            'version': _MANIFEST_VERSION,
+            'token_path': token_path,
+            'token': token,
+            'files': new_files,
+        }, f)
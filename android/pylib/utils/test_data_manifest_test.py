@@ -0,0 +1,92 @@
+#! /usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pylib.utils import test_data_manifest
+
+
+class TestDataManifestTest(unittest.TestCase):
+
+  def setUp(self):
+    self._tmp_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(self._tmp_dir, 'data', 'sub'))
+    self._WriteFile(os.path.join('data', 'a.txt'), 'a')
+    self._WriteFile(os.path.join('data', 'sub', 'b.txt'), 'b')
+    self._WriteFile('c.txt', 'c')
+    self._tuples = [
+        (os.path.join(self._tmp_dir, 'data'), '/sdcard/root/data'),
+        (os.path.join(self._tmp_dir, 'c.txt'), '/sdcard/root/c.txt'),
+    ]
+
+  def tearDown(self):
+    shutil.rmtree(self._tmp_dir)
+
+  def _WriteFile(self, rel_path, contents):
+    with open(os.path.join(self._tmp_dir, rel_path), 'w') as f:
+      f.write(contents)
+
+  def testComputeManifest(self):
+    files = test_data_manifest.ComputeManifest(self._tuples)
+    self.assertEqual([
+        '/sdcard/root/c.txt',
+        '/sdcard/root/data/a.txt',
+        '/sdcard/root/data/sub/b.txt',
+    ], sorted(files))
+    self.assertEqual(os.path.join(self._tmp_dir, 'data', 'sub', 'b.txt'),
+                     files['/sdcard/root/data/sub/b.txt'][0])
+    self.assertEqual(1, files['/sdcard/root/c.txt'][1])
+
+  def testComputeManifest_reusesDigestOfUnchangedFiles(self):
+    files = test_data_manifest.ComputeManifest(self._tuples)
+    files['/sdcard/root/c.txt'][3] = 'cached'
+    files = test_data_manifest.ComputeManifest(self._tuples, files)
+    self.assertEqual('cached', files['/sdcard/root/c.txt'][3])
+
+  def testDiffManifests(self):
+    old_files = test_data_manifest.ComputeManifest(self._tuples)
+    self._WriteFile(os.path.join('data', 'a.txt'), 'changed')
+    os.remove(os.path.join(self._tmp_dir, 'data', 'sub', 'b.txt'))
+    self._WriteFile(os.path.join('data', 'd.txt'), 'd')
+    new_files = test_data_manifest.ComputeManifest(self._tuples, old_files)
+    changed, stale = test_data_manifest.DiffManifests(old_files, new_files)
+    self.assertEqual([
+        (os.path.join(self._tmp_dir, 'data', 'a.txt'),
+         '/sdcard/root/data/a.txt'),
+        (os.path.join(self._tmp_dir, 'data', 'd.txt'),
+         '/sdcard/root/data/d.txt'),
+    ], changed)
+    self.assertEqual(['/sdcard/root/data/sub/b.txt'], stale)
+
+  def testDiffManifests_unchanged(self):
+    old_files = test_data_manifest.ComputeManifest(self._tuples)
+    new_files = test_data_manifest.ComputeManifest(self._tuples, old_files)
+    self.assertEqual(([], []),
+                     test_data_manifest.DiffManifests(old_files, new_files))
+
+  def testGetTokenPath(self):
+    # pylint: disable=protected-access
+    self.assertEqual('/sdcard/root/.test_data_manifest_token',
+                     test_data_manifest._GetTokenPath(self._tuples))
+    self.assertEqual(
+        '/sdcard/root/data/.test_data_manifest_token',
+        test_data_manifest._GetTokenPath([self._tuples[0]]))
+    self.assertEqual('/sdcard/root/.test_data_manifest_token',
+                     test_data_manifest._GetTokenPath([self._tuples[1]]))
+
+  def testGetTokenPath_noDataRoot(self):
+    # pylint: disable=protected-access
+    self.assertIsNone(
+        test_data_manifest._GetTokenPath([
+            (os.path.join(self._tmp_dir, 'c.txt'), '/c.txt'),
+            (os.path.join(self._tmp_dir, 'data'), '/sdcard/data'),
+        ]))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -12,32 +12,33 @@ from __future__ import print_function
 
 import argparse
 import collections
+import concurrent.futures
 from contextlib import contextmanager
+import gzip
+import hashlib
 import json
 import logging
 import os
 import posixpath
 import re
+import shutil
 import struct
 import sys
 import tempfile
+import time
 import zipfile
 import zlib
 
 import devil_chromium
-from devil.android.sdk import build_tools
-from devil.utils import cmd_helper
-from devil.utils import lazy
 import method_count
 from pylib import constants
 from pylib.constants import host_paths
+from pylib.utils import binary_resources
+from pylib.utils import file_digest
 
-_AAPT_PATH = lazy.WeakConstant(lambda: build_tools.GetPath('aapt'))
 _ANDROID_UTILS_PATH = os.path.join(host_paths.DIR_SOURCE_ROOT, 'build',
                                    'android', 'gyp')
 _BUILD_UTILS_PATH = os.path.join(host_paths.DIR_SOURCE_ROOT, 'build', 'util')
-_READOBJ_PATH = os.path.join(constants.ANDROID_NDK_ROOT, 'toolchains', 'llvm',
-                             'prebuilt', 'linux-x86_64', 'bin', 'llvm-readobj')
 
 with host_paths.SysPath(host_paths.BUILD_COMMON_PATH):
   import perf_tests_results_helper  # pylint: disable=import-error
@@ -47,6 +48,8 @@ with host_paths.SysPath(host_paths.TRACING_PATH):
 
 with host_paths.SysPath(_ANDROID_UTILS_PATH, 0):
   from util import build_utils  # pylint: disable=import-error
+  from util import elf_reader  # pylint: disable=import-error
+  from util import parallel  # pylint: disable=import-error
   from util import zipalign  # pylint: disable=import-error
 
 with host_paths.SysPath(_BUILD_UTILS_PATH, 0):
@@ -55,11 +58,11 @@ with host_paths.SysPath(_BUILD_UTILS_PATH, 0):
 
 zipalign.ApplyZipFileZipAlignFix()
 
-# Captures an entire config from aapt output.
-_AAPT_CONFIG_PATTERN = r'config %s:(.*?)config [a-zA-Z-]+:'
-# Matches string resource entries from aapt output.
-_AAPT_ENTRY_RE = re.compile(
-    r'resource (?P<id>\w{10}) [\w\.]+:string/.*?"(?P<val>.+?)"', re.DOTALL)
+# Increment when the measurements of an artifact change, to invalidate the
+# results cached by --cache-dir.
+_ANALYSIS_VERSION = 2
+# Results cached by --cache-dir that were not used for this long are deleted.
+_CACHE_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
 _BASE_CHART = {
     'format_version': '0.1',
     'benchmark_name': 'resource_sizes',
@@ -169,62 +172,66 @@ def _MeasureApkSignatureBlock(zip_file):
   return start_of_central_directory - end_of_last_file
 
 
-def _RunReadobj(so_path, options):
-  return cmd_helper.GetCmdOutput([_READOBJ_PATH, '--elf-output-style=GNU'] +
-                                 options + [so_path])
+def _GetLibSectionSizes(apk, lib_info):
+  """Returns the grouped section sizes of a library within an open APK.
 
+  Safe to call from multiple threads at once for the same |apk|.
+  """
+  with elf_reader.OpenZipEntry(apk, lib_info) as elf:
+    no_bits_section_sizes, section_sizes = _CreateSectionNameSizeMap(elf)
 
-def _ExtractLibSectionSizesFromApk(apk_path, lib_path):
-  with Unzip(apk_path, filename=lib_path) as extracted_lib_path:
-    grouped_section_sizes = collections.defaultdict(int)
-    no_bits_section_sizes, section_sizes = _CreateSectionNameSizeMap(
-        extracted_lib_path)
-    for group_name, section_names in _READELF_SIZES_METRICS.items():
-      for section_name in section_names:
-        if section_name in section_sizes:
-          grouped_section_sizes[group_name] += section_sizes.pop(section_name)
+  grouped_section_sizes = collections.defaultdict(int)
+  for group_name, section_names in _READELF_SIZES_METRICS.items():
+    for section_name in section_names:
+      if section_name in section_sizes:
+        grouped_section_sizes[group_name] += section_sizes.pop(section_name)
 
-    # Consider all NOBITS sections as .bss.
-    grouped_section_sizes['bss'] = sum(no_bits_section_sizes.values())
+  # Consider all NOBITS sections as .bss.
+  grouped_section_sizes['bss'] = sum(no_bits_section_sizes.values())
 
-    # Group any unknown section headers into the "other" group.
-    for section_header, section_size in section_sizes.items():
-      sys.stderr.write('Unknown elf section header: %s\n' % section_header)
-      grouped_section_sizes['other'] += section_size
+  # Group any unknown section headers into the "other" group.
+  for section_header, section_size in section_sizes.items():
+    sys.stderr.write('Unknown elf section header: %s\n' % section_header)
+    grouped_section_sizes['other'] += section_size
 
-    return grouped_section_sizes
+  return grouped_section_sizes
 
 
-def _CreateSectionNameSizeMap(so_path):
-  stdout = _RunReadobj(so_path, ['-S', '--wide'])
+def _CreateSectionNameSizeMap(elf):
   section_sizes = {}
   no_bits_section_sizes = {}
-  # Matches  [ 2] .hash HASH 00000000006681f0 0001f0 003154 04   A  3   0  8
-  for match in re.finditer(r'\[[\s\d]+\] (\..*)$', stdout, re.MULTILINE):
-    items = match.group(1).split()
-    target = no_bits_section_sizes if items[1] == 'NOBITS' else section_sizes
-    target[items[0]] = int(items[4], 16)
+  for section in elf.sections.values():
+    # Skips the null section header.
+    if not section.name.startswith('.'):
+      continue
+    if section.type == elf_reader.SHT_NOBITS:
+      no_bits_section_sizes[section.name] = section.size
+    else:
+      section_sizes[section.name] = section.size
 
   return no_bits_section_sizes, section_sizes
 
 
-def _ParseManifestAttributes(apk_path):
-  # Check if the manifest specifies whether or not to extract native libs.
-  output = cmd_helper.GetCmdOutput([
-      _AAPT_PATH.read(), 'd', 'xmltree', apk_path, 'AndroidManifest.xml'])
+def _ParseManifestAttributes(apk):
+  """Returns (sdk_version, skip_extract_lib, on_demand) of an open APK."""
+  elements = binary_resources.ParseXml(apk.read('AndroidManifest.xml'))
 
   def parse_attr(name):
-    # android:extractNativeLibs(0x010104ea)=(type 0x12)0x0
-    # android:extractNativeLibs(0x010104ea)=(type 0x12)0xffffffff
-    # dist:onDemand=(type 0x12)0xffffffff
-    m = re.search(name + r'(?:\(.*?\))?=\(type .*?\)(\w+)', output)
-    return m and int(m.group(1), 16)
+    # Returns the first typed (non-string) value, like "aapt d xmltree" would
+    # show as: android:extractNativeLibs(0x010104ea)=(type 0x12)0xffffffff
+    for element in elements:
+      attr = element.attributes.get(name)
+      if attr and attr.value_type != binary_resources.TYPE_STRING:
+        return attr.data
+    return None
 
+  # Check if the manifest specifies whether or not to extract native libs.
   skip_extract_lib = bool(parse_attr('android:extractNativeLibs'))
   sdk_version = parse_attr('android:minSdkVersion')
   is_feature_split = parse_attr('android:isFeatureSplit')
   # Can use <dist:on-demand>, or <module dist:onDemand="true">.
-  on_demand = parse_attr('dist:onDemand') or 'dist:on-demand' in output
+  on_demand = parse_attr('dist:onDemand') or any(e.name == 'dist:on-demand'
+                                                  for e in elements)
   on_demand = bool(on_demand and is_feature_split)
 
   return sdk_version, skip_extract_lib, on_demand
@@ -240,8 +247,12 @@ def _NormalizeLanguagePaks(translations, factor):
   return ret
 
 
-def _NormalizeResourcesArsc(apk_path, num_arsc_files, num_translations,
-                            out_dir):
+def _ResourcePackagedApkPath(apk_path, out_dir):
+  ap_name = os.path.basename(apk_path).replace('.apk', '.ap_')
+  return os.path.join(out_dir, 'arsc/apks', ap_name)
+
+
+def _NormalizeResourcesArsc(apk, num_arsc_files, num_translations, out_dir):
   """Estimates the expected overhead of untranslated strings in resources.arsc.
 
   See http://crbug.com/677966 for why this is necessary.
@@ -250,24 +261,26 @@ def _NormalizeResourcesArsc(apk_path, num_arsc_files, num_translations,
   if num_arsc_files > 1:
     if not out_dir:
       return -float('inf')
-    ap_name = os.path.basename(apk_path).replace('.apk', '.ap_')
-    ap_path = os.path.join(out_dir, 'arsc/apks', ap_name)
+    ap_path = _ResourcePackagedApkPath(apk.filename, out_dir)
     if not os.path.exists(ap_path):
       raise Exception('Missing expected file: %s, try rebuilding.' % ap_path)
-    apk_path = ap_path
+    with zipfile.ZipFile(ap_path) as ap:
+      arsc_data = ap.read('resources.arsc')
+  else:
+    arsc_data = apk.read('resources.arsc')
 
-  aapt_output = _RunAaptDumpResources(apk_path)
   # en-rUS is in the default config and may be cluttered with non-translatable
   # strings, so en-rGB is a better baseline for finding missing translations.
-  en_strings = _CreateResourceIdValueMap(aapt_output, 'en-rGB')
-  fr_strings = _CreateResourceIdValueMap(aapt_output, 'fr')
+  strings = binary_resources.ReadStringResources(arsc_data, ['en-rGB', 'fr'])
+  en_strings = strings['en-rGB']
+  fr_strings = strings['fr']
 
   # en-US and en-GB will never be translated.
   config_count = num_translations - 2
 
   size = 0
   for res_id, string_val in en_strings.items():
-    if string_val == fr_strings[res_id]:
+    if string_val and string_val == fr_strings.get(res_id):
       string_size = len(string_val)
       # 7 bytes is the per-entry overhead (not specific to any string). See
       # https://android.googlesource.com/platform/frameworks/base.git/+/android-4.2.2_r1/tools/aapt/StringPool.cpp#414.
@@ -278,23 +291,6 @@ def _NormalizeResourcesArsc(apk_path, num_arsc_files, num_translations,
   return int(size)
 
 
-def _CreateResourceIdValueMap(aapt_output, lang):
-  """Return a map of resource ids to string values for the given |lang|."""
-  config_re = _AAPT_CONFIG_PATTERN % lang
-  return {entry.group('id'): entry.group('val')
-          for config_section in re.finditer(config_re, aapt_output, re.DOTALL)
-          for entry in re.finditer(_AAPT_ENTRY_RE, config_section.group(0))}
-
-
-def _RunAaptDumpResources(apk_path):
-  cmd = [_AAPT_PATH.read(), 'dump', '--values', 'resources', apk_path]
-  status, output = cmd_helper.GetCmdStatusAndOutput(cmd)
-  if status != 0:
-    raise Exception('Failed running aapt command: "%s" with output "%s".' %
-                    (' '.join(cmd), output))
-  return output
-
-
 class _FileGroup:
   """Represents a category that apk files can fall into."""
 
@@ -338,18 +334,34 @@ class _FileGroup:
     return self.ComputeExtractedSize() + self.ComputeZippedSize()
 
 
-def _AnalyzeInternal(apk_path,
+def _AnalyzeInternal(apk,
+                     executor,
                      sdk_version,
                      report_func,
                      dex_stats_collector,
                      out_dir,
                      apks_path=None,
-                     split_name=None):
+                     split_name=None,
+                     locale_split_size=0,
+                     entry_sizes=None):
   """Analyse APK to determine size contributions of different file classes.
 
+  The central directory of the APK is read only once, and the slowest
+  measurements run concurrently.
+
+  Args:
+    apk: The APK, as an open zipfile.ZipFile.
+    executor: A concurrent.futures.Executor to run measurements on.
+    locale_split_size: Size of the locale split that is assumed to be installed
+      along with |apk| (when measuring .apks).
+    entry_sizes: Optional dict to fill with path -> (group name, zipped size,
+      uncompressed size) for each file in the APK.
+
   Returns: Normalized APK size.
   """
-  dex_stats_collector.CollectFromZip(split_name or '', apk_path)
+  apk_path = apk.filename
+  # Compressing the whole APK takes the longest, so start it first.
+  transfer_size_future = executor.submit(_CalculateCompressedSize, apk_path)
   file_groups = []
 
   def make_group(name):
@@ -375,18 +387,18 @@ def _AnalyzeInternal(apk_path,
   notices = make_group('licenses.notice file')
   unwind_cfi = make_group('unwind_cfi (dev and canary only)')
 
-  with zipfile.ZipFile(apk_path, 'r') as apk:
-    apk_contents = apk.infolist()
-    # Account for zipalign overhead that exists in local file header.
-    zipalign_overhead = sum(
-        _ReadZipInfoExtraFieldLength(apk, i) for i in apk_contents)
-    # Account for zipalign overhead that exists in central directory header.
-    # Happens when python aligns entries in apkbuilder.py, but does not
-    # exist when using Android's zipalign. E.g. for bundle .apks files.
-    zipalign_overhead += sum(len(i.extra) for i in apk_contents)
-    signing_block_size = _MeasureApkSignatureBlock(apk)
+  dex_stats_collector.CollectFromZipFile(split_name or '', apk)
+  apk_contents = apk.infolist()
+  # Account for zipalign overhead that exists in local file header.
+  zipalign_overhead = sum(
+      _ReadZipInfoExtraFieldLength(apk, i) for i in apk_contents)
+  # Account for zipalign overhead that exists in central directory header.
+  # Happens when python aligns entries in apkbuilder.py, but does not
+  # exist when using Android's zipalign. E.g. for bundle .apks files.
+  zipalign_overhead += sum(len(i.extra) for i in apk_contents)
+  signing_block_size = _MeasureApkSignatureBlock(apk)
 
-  _, skip_extract_lib, _ = _ParseManifestAttributes(apk_path)
+  _, skip_extract_lib, _ = _ParseManifestAttributes(apk)
 
   # Pre-L: Dalvik - .odex file is simply decompressed/optimized dex file (~1x).
   # L, M: ART - .odex file is compiled version of the dex file (~4x).
@@ -470,16 +482,18 @@ def _AnalyzeInternal(apk_path,
     else:
       unknown.AddZipInfo(member)
 
-  if apks_path:
-    # We're mostly focused on size of Chrome for non-English locales, so assume
-    # Hindi (arbitrarily chosen) locale split is installed.
-    with zipfile.ZipFile(apks_path) as z:
-      subpath = 'splits/{}-hi.apk'.format(split_name)
-      if subpath in z.namelist():
-        hindi_apk_info = z.getinfo(subpath)
-        total_apk_size += hindi_apk_info.file_size
-      else:
-        assert split_name != 'base', 'splits/base-hi.apk should always exist'
+  if entry_sizes is not None:
+    for group in file_groups:
+      for info in group.AllEntries():
+        entry_sizes[info.filename] = (group.name, info.compress_size,
+                                      info.file_size)
+
+  # Libraries are read in parallel while the rest is measured.
+  lib_section_sizes_futures = [
+      executor.submit(_GetLibSectionSizes, apk, lib_info)
+      for lib_info in native_code.AllEntries()
+  ]
+  total_apk_size += locale_split_size
 
   total_install_size = total_apk_size
   total_install_size_android_go = total_apk_size
@@ -531,7 +545,7 @@ def _AnalyzeInternal(apk_path,
               int(total_install_size), 'bytes')
   report_func('InstallSize', 'Estimated installed size (Android Go)',
               int(total_install_size_android_go), 'bytes')
-  transfer_size = _CalculateCompressedSize(apk_path)
+  transfer_size = transfer_size_future.result()
   report_func('TransferSize', 'Transfer size (deflate)', transfer_size, 'bytes')
 
   # Size of main dex vs remaining.
@@ -544,8 +558,9 @@ def _AnalyzeInternal(apk_path,
 
   main_lib_info = native_code.FindLargest()
   native_code_unaligned_size = 0
-  for lib_info in native_code.AllEntries():
-    section_sizes = _ExtractLibSectionSizesFromApk(apk_path, lib_info.filename)
+  for lib_info, section_sizes_future in zip(native_code.AllEntries(),
+                                            lib_section_sizes_futures):
+    section_sizes = section_sizes_future.result()
     native_code_unaligned_size += sum(v for k, v in section_sizes.items()
                                       if k != 'bss')
     # Size of main .so vs remaining.
@@ -619,7 +634,7 @@ def _AnalyzeInternal(apk_path,
         # WebView (which supports more locales), but these should mostly be
         # empty so ignore them here.
         num_arsc_translations = num_translations
-      normalized_apk_size += _NormalizeResourcesArsc(apk_path,
+      normalized_apk_size += _NormalizeResourcesArsc(apk,
                                                      arsc.GetNumEntries(),
                                                      num_arsc_translations,
                                                      out_dir)
@@ -692,67 +707,122 @@ def _IterSplits(namelist):
           yield subpath, split_name
 
 
-def _ExtractToTempFile(zip_obj, subpath, temp_file):
-  temp_file.seek(0)
-  temp_file.truncate()
-  temp_file.write(zip_obj.read(subpath))
-  temp_file.flush()
+def _AnalyzeSplit(subpath, split_name, apks_path, sdk_version, out_dir,
+                  locale_split_sizes):
+  """Measures a single split of an .apks file. Runs in a forked process.
 
-
-def _AnalyzeApkOrApks(report_func, apk_path, out_dir):
+  Returns:
+    A tuple of (on_demand, reporter, dex_stats_collector, normalized_size,
+    entry_sizes). |reporter| and |dex_stats_collector| are None for on-demand
+    splits, since they are measured only for their normalized size.
+  """
+  with tempfile.NamedTemporaryFile(suffix='.apk') as f:
+    with zipfile.ZipFile(apks_path) as z:
+      with z.open(subpath) as src:
+        shutil.copyfileobj(src, f)
+    f.flush()
+    with zipfile.ZipFile(f.name) as split_apk, \
+        concurrent.futures.ThreadPoolExecutor() as executor:
+      _, _, on_demand = _ParseManifestAttributes(split_apk)
+      # The base split is never on-demand, whatever its manifest says.
+      on_demand = on_demand and split_name != 'base'
+      logging.info('Measuring %s on_demand=%s', split_name, on_demand)
+      reporter = _AccumulatingReporter()
+      dex_stats_collector = method_count.DexStatsCollector()
+      entry_sizes = {}
+      size = _AnalyzeInternal(split_apk,
+                              executor,
+                              sdk_version,
+                              reporter,
+                              dex_stats_collector,
+                              out_dir,
+                              apks_path=apks_path,
+                              split_name=split_name,
+                              locale_split_size=locale_split_sizes.get(
+                                  split_name, 0),
+                              entry_sizes=entry_sizes)
+  if on_demand:
+    return True, None, None, size, entry_sizes
+  return False, reporter, dex_stats_collector, size, entry_sizes
+
+
+def _AnalyzeApkOrApks(report_func, apk_path, out_dir, entry_sizes=None):
+  """Reports the size metrics of an .apk or .apks.
+
+  Args:
+    entry_sizes: Optional dict to fill with the sizes of each file, as for
+      _AnalyzeInternal(). Paths within splits are prefixed with "split path!".
+
+  Returns:
+    The DexStatsCollector of all dex files that are installed up front.
+  """
   # Create DexStatsCollector here to track unique methods across base & chrome
   # modules.
   dex_stats_collector = method_count.DexStatsCollector()
 
   if apk_path.endswith('.apk'):
-    sdk_version, _, _ = _ParseManifestAttributes(apk_path)
-    _AnalyzeInternal(apk_path, sdk_version, report_func, dex_stats_collector,
-                     out_dir)
+    with zipfile.ZipFile(apk_path) as apk, \
+        concurrent.futures.ThreadPoolExecutor() as executor:
+      sdk_version, _, _ = _ParseManifestAttributes(apk)
+      _AnalyzeInternal(apk,
+                       executor,
+                       sdk_version,
+                       report_func,
+                       dex_stats_collector,
+                       out_dir,
+                       entry_sizes=entry_sizes)
   elif apk_path.endswith('.apks'):
-    with tempfile.NamedTemporaryFile(suffix='.apk') as f:
-      with zipfile.ZipFile(apk_path) as z:
-        # Currently bundletool is creating two apks when .apks is created
-        # without specifying an sdkVersion. Always measure the one with an
-        # uncompressed shared library.
-        try:
-          info = z.getinfo('splits/base-master_2.apk')
-        except KeyError:
-          info = z.getinfo('splits/base-master.apk')
-        _ExtractToTempFile(z, info.filename, f)
-        sdk_version, _, _ = _ParseManifestAttributes(f.name)
-
-        orig_report_func = report_func
-        report_func = _AccumulatingReporter()
-
-        def do_measure(split_name, on_demand):
-          logging.info('Measuring %s on_demand=%s', split_name, on_demand)
-          # Use no-op reporting functions to get normalized size for DFMs.
-          inner_report_func = report_func
-          inner_dex_stats_collector = dex_stats_collector
-          if on_demand:
-            inner_report_func = lambda *_: None
-            inner_dex_stats_collector = method_count.DexStatsCollector()
-
-          size = _AnalyzeInternal(f.name,
-                                  sdk_version,
-                                  inner_report_func,
-                                  inner_dex_stats_collector,
-                                  out_dir,
-                                  apks_path=apk_path,
-                                  split_name=split_name)
-          report_func('DFM_' + split_name, 'Size with hindi', size, 'bytes')
-
-        # Measure base outside of the loop since we've already extracted it.
-        do_measure('base', on_demand=False)
-
-        for subpath, split_name in _IterSplits(z.namelist()):
-          if split_name != 'base':
-            _ExtractToTempFile(z, subpath, f)
-            _, _, on_demand = _ParseManifestAttributes(f.name)
-            do_measure(split_name, on_demand=on_demand)
-
-        report_func.DumpReports(orig_report_func)
-        report_func = orig_report_func
+    with zipfile.ZipFile(apk_path) as z:
+      # Currently bundletool is creating two apks when .apks is created
+      # without specifying an sdkVersion. Always measure the one with an
+      # uncompressed shared library.
+      try:
+        base_info = z.getinfo('splits/base-master_2.apk')
+      except KeyError:
+        base_info = z.getinfo('splits/base-master.apk')
+      # Reads the manifest without extracting the whole base split.
+      with z.open(base_info) as base_file, \
+          zipfile.ZipFile(base_file) as base_apk:
+        sdk_version, _, _ = _ParseManifestAttributes(base_apk)
+
+      # We're mostly focused on size of Chrome for non-English locales, so
+      # assume Hindi (arbitrarily chosen) locale split is installed.
+      infos_by_path = {i.filename: i for i in z.infolist()}
+      splits = [(base_info.filename, 'base')]
+      splits += [(subpath, split_name)
+                 for subpath, split_name in _IterSplits(infos_by_path)
+                 if split_name != 'base']
+      locale_split_sizes = {}
+      for _, split_name in splits:
+        hindi_info = infos_by_path.get('splits/{}-hi.apk'.format(split_name))
+        if hindi_info:
+          locale_split_sizes[split_name] = hindi_info.file_size
+        else:
+          assert split_name != 'base', 'splits/base-hi.apk should always exist'
+
+    orig_report_func = report_func
+    report_func = _AccumulatingReporter()
+    # Splits are measured in parallel, each in its own process.
+    results = parallel.BulkForkAndCall(_AnalyzeSplit,
+                                       splits,
+                                       apks_path=apk_path,
+                                       sdk_version=sdk_version,
+                                       out_dir=out_dir,
+                                       locale_split_sizes=locale_split_sizes)
+    for (subpath, split_name), result in zip(splits, results):
+      (on_demand, split_reporter, split_dex_stats_collector, size,
+       split_entry_sizes) = result
+      if entry_sizes is not None:
+        for path, value in split_entry_sizes.items():
+          entry_sizes['{}!{}'.format(subpath, path)] = value
+      # On-demand splits contribute only their normalized size.
+      if not on_demand:
+        split_reporter.DumpReports(report_func)
+        dex_stats_collector.MergeFrom(None, split_dex_stats_collector)
+      report_func('DFM_' + split_name, 'Size with hindi', size, 'bytes')
+
+    report_func.DumpReports(orig_report_func)
+    report_func = orig_report_func
   else:
     raise Exception('Unknown file type: ' + apk_path)
 
@@ -769,6 +839,76 @@ def _AnalyzeApkOrApks(report_func, apk_path, out_dir):
   return dex_stats_collector
 
 
+def _ComputeCacheKey(apk_path, out_dir):
+  """Returns a digest of everything that the analysis of |apk_path| reads."""
+  md5 = hashlib.md5()
+  md5.update(str(_ANALYSIS_VERSION).encode('ascii'))
+  file_digest.UpdateHash(md5, apk_path)
+  # The resource packaged APK is read only for .apk files, and its absence is
+  # part of the result.
+  md5.update(str(bool(out_dir)).encode('ascii'))
+  if out_dir and apk_path.endswith('.apk'):
+    ap_path = _ResourcePackagedApkPath(apk_path, out_dir)
+    if os.path.exists(ap_path):
+      file_digest.UpdateHash(md5, ap_path)
+  return md5.hexdigest()
+
+
+def _PruneCache(cache_dir):
+  """Deletes the entries of |cache_dir| that were not used recently."""
+  min_mtime = time.time() - _CACHE_MAX_AGE_SECONDS
+  for name in os.listdir(cache_dir):
+    path = os.path.join(cache_dir, name)
+    if name.endswith('.json.gz') and os.path.getmtime(path) < min_mtime:
+      logging.info('Deleting stale cached results %s', path)
+      os.unlink(path)
+
+
+def _AnalyzeWithCache(apk_path, out_dir, cache_dir):
+  """Measures an .apk or .apks, reusing earlier results from |cache_dir|.
+
+  Cache entries are gzipped JSON files named after the digest of the measured
+  artifact and the version of this analysis. Entries are touched when used, and
+  ones that were not used for _CACHE_MAX_AGE_SECONDS are deleted when a new
+  entry is written.
+
+  Returns:
+    A tuple of (reports, entry_sizes, dex_stats_collector), where |reports| is
+    the list of arguments to report_func() calls, and |entry_sizes| is as
+    filled by _AnalyzeApkOrApks().
+  """
+  cache_path = None
+  if cache_dir:
+    cache_path = os.path.join(cache_dir,
+                              _ComputeCacheKey(apk_path, out_dir) + '.json.gz')
+    if os.path.exists(cache_path):
+      logging.info('Using cached results for %s', apk_path)
+      with gzip.open(cache_path, 'rt') as f:
+        cached = json.load(f)
+      os.utime(cache_path)
+      return (cached['reports'], cached['entry_sizes'],
+              method_count.DexStatsCollector.FromJsonDict(cached['dex_stats']))
+
+  reports = []
+  entry_sizes = {}
+  dex_stats_collector = _AnalyzeApkOrApks(lambda *args: reports.append(args),
+                                          apk_path,
+                                          out_dir,
+                                          entry_sizes=entry_sizes)
+  if cache_path:
+    build_utils.MakeDirectory(cache_dir)
+    with build_utils.AtomicOutput(cache_path, only_if_changed=False) as f:
+      with gzip.GzipFile(fileobj=f, mode='wb') as gzip_file:
+        gzip_file.write(
+            json.dumps({
+                'reports': reports,
+                'entry_sizes': entry_sizes,
+                'dex_stats': dex_stats_collector.ToJsonDict(),
+            }).encode('utf-8'))
+    _PruneCache(cache_dir)
+  return reports, entry_sizes, dex_stats_collector
+
+
 def _ResourceSizes(args):
   chartjson = _BASE_CHART.copy() if args.output_format else None
   reporter = _ChartJsonReporter(chartjson)
@@ -780,21 +920,34 @@ def _ResourceSizes(args):
       ('WebView_', args.trichrome_webview),
       ('Library_', args.trichrome_library),
   ]
+  # Map of trace title prefix -> {path -> (group, zipped size, size)}.
+  entry_sizes_by_prefix = {}
   for prefix, path in specs:
     if path:
+      reports, entry_sizes, child_dex_stats_collector = _AnalyzeWithCache(
+          path, args.out_dir, args.cache_dir)
       reporter.trace_title_prefix = prefix
-      child_dex_stats_collector = _AnalyzeApkOrApks(reporter, path,
-                                                    args.out_dir)
+      for report in reports:
+        reporter(*report)
       dex_stats_collector.MergeFrom(prefix, child_dex_stats_collector)
+      entry_sizes_by_prefix[prefix] = entry_sizes
 
   if any(path for _, path in specs):
     reporter.SynthesizeTotals(dex_stats_collector.GetUniqueMethodCount())
   else:
-    _AnalyzeApkOrApks(reporter, args.input, args.out_dir)
+    reports, entry_sizes, _ = _AnalyzeWithCache(args.input, args.out_dir,
+                                                args.cache_dir)
+    for report in reports:
+      reporter(*report)
+    entry_sizes_by_prefix[''] = entry_sizes
 
   if chartjson:
     _DumpChartJson(args, chartjson)
 
+  if args.entry_sizes_output_file:
+    with open(args.entry_sizes_output_file, 'w') as f:
+      json.dump(entry_sizes_by_prefix, f, indent=2, sort_keys=True)
+
 
 def _DumpChartJson(args, chartjson):
   if args.output_file == '-':
@@ -853,6 +1006,15 @@ def main():
       help='Output the results to a file in the given '
       'format instead of printing the results.')
   argparser.add_argument('--loadable_module', help='Obsolete (ignored).')
+  argparser.add_argument(
+      '--cache-dir',
+      help='Directory in which to cache the results of each measured .apk / '
+      '.apks, keyed on its contents. Useful when repeatedly measuring against '
+      'the same baseline. Results not used for 30 days are deleted.')
+  argparser.add_argument(
+      '--entry-sizes-output-file',
+      help='Path to write the sizes of every file within the measured '
+      'artifacts to, as JSON.')
 
   # Accepted to conform to the isolated script interface, but ignored.
   argparser.add_argument(
@@ -0,0 +1,105 @@
+#!/usr/bin/env vpython3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import method_count
+import resource_sizes
+
+# pylint: disable=protected-access
+
+
+def _FakeAnalyzeApkOrApks(report_func, apk_path, out_dir, entry_sizes):
+  del out_dir
+  report_func('Specifics', 'size', os.path.getsize(apk_path), 'bytes')
+  entry_sizes['classes.dex'] = ['Dex', 10, 20]
+  return method_count.DexStatsCollector()
+
+
+class AnalyzeWithCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self._tmp_dir = tempfile.mkdtemp()
+    self._cache_dir = os.path.join(self._tmp_dir, 'cache')
+    self._out_dir = os.path.join(self._tmp_dir, 'out')
+    self._apk_path = os.path.join(self._tmp_dir, 'Foo.apk')
+    self._WriteFile(self._apk_path, 'apk')
+    patcher = mock.patch.object(resource_sizes,
+                                '_AnalyzeApkOrApks',
+                                side_effect=_FakeAnalyzeApkOrApks)
+    self._analyze = patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def tearDown(self):
+    shutil.rmtree(self._tmp_dir)
+
+  def _WriteFile(self, path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+      f.write(data)
+
+  def _Analyze(self, out_dir=None):
+    return resource_sizes._AnalyzeWithCache(self._apk_path, out_dir,
+                                            self._cache_dir)
+
+  def testCacheHit(self):
+    reports, entry_sizes, dex_stats_collector = self._Analyze()
+    self.assertEqual(1, self._analyze.call_count)
+    cached_reports, cached_entry_sizes, cached_dex_stats_collector = (
+        self._Analyze())
+    self.assertEqual(1, self._analyze.call_count)
+    self.assertEqual([list(r) for r in reports], cached_reports)
+    self.assertEqual({'classes.dex': ['Dex', 10, 20]}, entry_sizes)
+    self.assertEqual(entry_sizes, cached_entry_sizes)
+    self.assertEqual(dex_stats_collector.ToJsonDict(),
+                     cached_dex_stats_collector.ToJsonDict())
+
+  def testCacheMiss_inputChanged(self):
+    self._Analyze()
+    self._WriteFile(self._apk_path, 'new apk')
+    reports, _, _ = self._Analyze()
+    self.assertEqual(2, self._analyze.call_count)
+    self.assertEqual(7, reports[0][2])
+
+  def testCacheMiss_optionsChanged(self):
+    self._Analyze()
+    # The output directory provides the resource packaged APK.
+    self._Analyze(out_dir=self._out_dir)
+    self.assertEqual(2, self._analyze.call_count)
+    ap_path = resource_sizes._ResourcePackagedApkPath(self._apk_path,
+                                                      self._out_dir)
+    self._WriteFile(ap_path, 'ap_')
+    self._Analyze(out_dir=self._out_dir)
+    self.assertEqual(3, self._analyze.call_count)
+    self._Analyze(out_dir=self._out_dir)
+    self.assertEqual(3, self._analyze.call_count)
+    with mock.patch.object(resource_sizes, '_ANALYSIS_VERSION', -1):
+      self._Analyze(out_dir=self._out_dir)
+    self.assertEqual(4, self._analyze.call_count)
+
+  def testPrunesStaleEntries(self):
+    self._Analyze()
+    used_entry, = os.listdir(self._cache_dir)
+    stale_path = os.path.join(self._cache_dir, 'stale.json.gz')
+    self._WriteFile(stale_path, '')
+    old_time = time.time() - resource_sizes._CACHE_MAX_AGE_SECONDS - 60
+    for name in (used_entry, 'stale.json.gz'):
+      os.utime(os.path.join(self._cache_dir, name), (old_time, old_time))
+    # Using an entry keeps it from being deleted.
+    self._Analyze()
+    self._WriteFile(self._apk_path, 'new apk')
+    self._Analyze()
+    self.assertEqual(2, len(os.listdir(self._cache_dir)))
+    self.assertIn(used_entry, os.listdir(self._cache_dir))
+    self.assertFalse(os.path.exists(stale_path))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -606,6 +606,11 @@ def AddInstrumentationTestOptions(parser):
       '-w', '--wait-for-java-debugger', action='store_true',
       help='Wait for java debugger to attach before running any application '
            'code. Also disables test timeouts and sets retries=0.')
+  parser.add_argument(
+      '--fail-fast',
+      action='store_true',
+      help='Stop a batch of tests as soon as one of its tests fails. The '
+      'remaining tests of the batch are reported as not run.')
 
   # WPR record mode.
   parser.add_argument('--wpr-enable-record',
@@ -950,19 +955,68 @@ def RunTestsInPlatformMode(args, result_sink_client=None):
   # base_test_result.TestRunResults objects. Each instance of
   # TestRunResults contains all test results produced by a single try,
   # while each list of TestRunResults contains all tries in a single
-  # iteration.
+  # iteration. Iterations are removed once they have been added to
+  # |results_journal|.
   all_raw_results = []
 
-  # all_iteration_results is a list of base_test_result.TestRunResults
-  # objects. Each instance of TestRunResults contains the last test
-  # result for each test run in that iteration.
-  all_iteration_results = []
+  # Whether each iteration passed, based on the last test result for each
+  # test run in that iteration.
+  all_iterations_passed = []
 
   global_results_tags = set()
 
   json_file = tempfile.NamedTemporaryFile(delete=False)
   json_file.close()
 
+  # Results are appended to the journal as each iteration completes, so
+  # that writing the JSON results file at the end only needs to stream the
+  # journal. The isolated script test output format needs all results in
+  # memory, so it does not use the journal.
+  results_journal = None
+
+  test_class_to_file_name_dict = None
+
+  # Results that were sunk while their iteration was still running, by id().
+  # Holding on to them keeps their ids unique until the iteration is sunk.
+  sunk_results = {}
+  sink_lock = threading.Lock()
+
+  def sink_test_results(test_results):
+    nonlocal test_class_to_file_name_dict
+    with sink_lock:
+      if test_class_to_file_name_dict is None:
+        test_class_to_file_name_dict = {}
+        # Test Location is only supported for instrumentation tests as it
+        # requires the size-info file.
+        if test_instance.TestType() == 'instrumentation':
+          test_class_to_file_name_dict = _CreateClassToFileNameDict(
+              args.test_apk)
+    for r in test_results:
+      # Matches chrome.page_info.PageInfoViewTest#testChromePage
+      match = re.search(r'^(.+\..+)#', r.GetName())
+      test_file_name = test_class_to_file_name_dict.get(
+          match.group(1)) if match else None
+      _SinkTestResult(r, test_file_name, result_sink_client)
+
+  def sink_finalized_results(test_results):
+    with sink_lock:
+      sunk_results.update((id(r), r) for r in test_results)
+    sink_test_results(test_results)
+
+  def sink_results(iteration_results):
+    if not result_sink_client:
+      return
+    for results in iteration_results:
+      sink_test_results(
+          r for r in results.GetAll() if id(r) not in sunk_results)
+
+  def journal_last_iteration():
+    if results_journal:
+      iteration_results = all_raw_results.pop()
+      results_journal.AddIteration(iteration_results)
+      sink_results(iteration_results)
+      sunk_results.clear()
+
   @contextlib.contextmanager
   def json_finalizer():
     try:
@@ -977,6 +1031,11 @@ def RunTestsInPlatformMode(args, result_sink_client=None):
 
   @contextlib.contextmanager
   def json_writer():
+    nonlocal results_journal
+    if not args.isolated_script_test_output:
+      journal_file = tempfile.NamedTemporaryFile(delete=False)
+      journal_file.close()
+      results_journal = json_results.ResultsJournal(journal_file.name)
     try:
       yield
     except Exception:
@@ -990,27 +1049,19 @@ def RunTestsInPlatformMode(args, result_sink_client=None):
                                                       json_file.name,
                                                       indent=2)
       else:
-        json_results.GenerateJsonResultsFile(
-            all_raw_results,
+        # Journal the results of an interrupted iteration.
+        for iteration_results in all_raw_results:
+          results_journal.AddIteration(iteration_results)
+        json_results.GenerateJsonResultsFileFromJournal(
+            results_journal,
             json_file.name,
             global_tags=list(global_results_tags),
             indent=2)
+        os.remove(results_journal.path)
 
-      test_class_to_file_name_dict = {}
-      # Test Location is only supported for instrumentation tests as it
-      # requires the size-info file.
-      if test_instance.TestType() == 'instrumentation':
-        test_class_to_file_name_dict = _CreateClassToFileNameDict(args.test_apk)
-
-      if result_sink_client:
-        for run in all_raw_results:
-          for results in run:
-            for r in results.GetAll():
-              # Matches chrome.page_info.PageInfoViewTest#testChromePage
-              match = re.search(r'^(.+\..+)#', r.GetName())
-              test_file_name = test_class_to_file_name_dict.get(
-                  match.group(1)) if match else None
-              _SinkTestResult(r, test_file_name, result_sink_client)
+      # Results of journaled iterations have already been sunk.
+      for iteration_results in all_raw_results:
+        sink_results(iteration_results)
 
   @contextlib.contextmanager
   def upload_logcats_file():
@@ -1049,6 +1100,11 @@ def RunTestsInPlatformMode(args, result_sink_client=None):
   contexts_to_notify_on_sigterm.append(env)
   contexts_to_notify_on_sigterm.append(test_run)
 
+  if result_sink_client:
+    # Sinks results as tests finish instead of once the whole iteration is
+    # done, for test runs that support it.
+    test_run.SetOnResultsFinalized(sink_finalized_results)
+
   if args.list_tests:
     try:
       with out_manager, env, test_instance, test_run:
@@ -1090,8 +1146,9 @@ def RunTestsInPlatformMode(args, result_sink_client=None):
         iteration_results = base_test_result.TestRunResults()
         for r in reversed(raw_results):
           iteration_results.AddTestRunResults(r)
-        all_iteration_results.append(iteration_results)
+        all_iterations_passed.append(iteration_results.DidRunPass())
         iteration_count += 1
+        journal_last_iteration()
 
         for r in iteration_results.GetAll():
           result_counts[r.GetName()][r.GetType()] += 1
@@ -1170,8 +1227,7 @@ def RunTestsInPlatformMode(args, result_sink_client=None):
           ui_screenshot_file.write(ui_screenshots)
         logging.critical('UI Screenshots: %s', ui_screenshot_file.Link())
 
-  return (0 if all(r.DidRunPass() for r in all_iteration_results)
-          else constants.ERROR_EXIT_CODE)
+  return (0 if all(all_iterations_passed) else constants.ERROR_EXIT_CODE)
 
 
 def _LogRerunStatement(failed_tests, wrapper_arg_str):
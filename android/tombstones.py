@@ -10,6 +10,7 @@
 # Assumes tombstone file was created with current symbols.
 
 import argparse
+import collections
 import datetime
 import logging
 import os
@@ -123,6 +124,13 @@ def _ResolveTombstones(jobs, tombstones, tombstone_symbolizer):
   if not tombstones:
     logging.warning('No tombstones to resolve.')
     return []
+  # Symbolize the frames of all tombstones in one batch, so that frames shared
+  # by several tombstones are only symbolized once.
+  data_by_abi = collections.defaultdict(list)
+  for tombstone in tombstones:
+    data_by_abi[tombstone['device_abi']].extend(tombstone['data'])
+  for device_abi, data in data_by_abi.items():
+    tombstone_symbolizer.PrefetchNativeStackTraces(data, device_abi)
   if len(tombstones) == 1:
     data = [_ResolveTombstone([tombstones[0], tombstone_symbolizer])]
   else:
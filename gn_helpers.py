@@ -31,6 +31,22 @@ _CHROMIUM_ROOT = os.path.join(os.path.dirname(__file__), os.pardir)
 BUILD_VARS_FILENAME = 'build_vars.json'
 IMPORT_RE = re.compile(r'^import\("//(\S+)"\)')
 
+# Tokenizing is done with regular expressions matched at the current position
+# rather than character by character, since inputs can be several MB.
+# Comments must run to the end of the line, so that a match cannot stop within
+# one when more of a pattern follows.
+_WHITESPACE_AND_COMMENTS = r'[ \t\n]*(?:#[^\n]*(?:\n|\Z)[ \t\n]*)*'
+_IDENT = r'[^\W\d]\w*'
+_WHITESPACE_AND_COMMENTS_RE = re.compile(_WHITESPACE_AND_COMMENTS)
+_IDENT_RE = re.compile(_IDENT)
+# Matches "<ident> =", for the common case of a valid assignment.
+_ASSIGNMENT_RE = re.compile('(%s)%s=' % (_IDENT, _WHITESPACE_AND_COMMENTS))
+_NUMBER_RE = re.compile(r'[-0-9]\d*')
+# Matches the contents of a string up to the closing quote, or up to a trailing
+# backslash or the end of input for invalid strings.
+_STRING_BODY_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_UNESCAPE_RE = re.compile(r'\\([$"\\]|\Z)')
+
 
 class GNError(Exception):
   pass
@@ -229,23 +245,12 @@ def UnescapeGNString(value):
   Args:
     value: Input string to unescape.
   """
-  result = ''
-  i = 0
-  while i < len(value):
-    if value[i] == '\\':
-      if i < len(value) - 1:
-        next_char = value[i + 1]
-        if next_char in ('$', '"', '\\'):
-          # These are the escaped characters GN supports.
-          result += next_char
-          i += 1
-        else:
-          # Any other backslash is a literal.
-          result += '\\'
-    else:
-      result += value[i]
-    i += 1
-  return result
+  if '\\' not in value:
+    return value
+  # '$', '"' and '\\' are the escaped characters GN supports. Any other
+  # backslash is a literal, except for a trailing one, which is dropped.
+  # Splitting keeps the escaped characters, and is faster than sub().
+  return ''.join(_UNESCAPE_RE.split(value))
 
 
 def _IsDigitOrMinus(char):
@@ -272,44 +277,35 @@ class GNValueParser(object):
   def ReplaceImports(self):
     """Replaces import(...) lines with the contents of the imports.
 
-    Recurses on itself until there are no imports remaining, in the case of
-    nested imports.
+    Repeats until there are no imports remaining, in the case of nested
+    imports. Each imported file is read only once.
     """
-    lines = self.input.splitlines()
-    if not any(line.startswith('import(') for line in lines):
-      return
-    for line in lines:
-      if not line.startswith('import('):
-        continue
-      regex_match = IMPORT_RE.match(line)
-      if not regex_match:
-        raise GNError('Not a valid import string: %s' % line)
-      import_path = os.path.join(self.checkout_root, regex_match.group(1))
-      with open(import_path) as f:
-        imported_args = f.read()
-      self.input = self.input.replace(line, imported_args)
-    # Call ourselves again if we've just replaced an import() with additional
-    # imports.
-    self.ReplaceImports()
-
-
-  def _ConsumeWhitespace(self):
-    while not self.IsDone() and self.input[self.cur] in ' \t\n':
-      self.cur += 1
+    imported_args_by_path = {}
+    while 'import(' in self.input:
+      lines = self.input.splitlines(True)
+      found_import = False
+      for i, line in enumerate(lines):
+        if not line.startswith('import('):
+          continue
+        found_import = True
+        # Keeps the line ending, as it is not part of the import statement.
+        statement = line.splitlines()[0]
+        regex_match = IMPORT_RE.match(statement)
+        if not regex_match:
+          raise GNError('Not a valid import string: %s' % statement)
+        import_path = os.path.join(self.checkout_root, regex_match.group(1))
+        imported_args = imported_args_by_path.get(import_path)
+        if imported_args is None:
+          with open(import_path) as f:
+            imported_args = f.read()
+          imported_args_by_path[import_path] = imported_args
+        lines[i] = imported_args + line[len(statement):]
+      if not found_import:
+        return
+      self.input = ''.join(lines)
 
   def ConsumeCommentAndWhitespace(self):
-    self._ConsumeWhitespace()
-
-    # Consume each comment, line by line.
-    while not self.IsDone() and self.input[self.cur] == '#':
-      # Consume the rest of the comment, up until the end of the line.
-      while not self.IsDone() and self.input[self.cur] != '\n':
-        self.cur += 1
-      # Move the cursor to the next line (if there is one).
-      if not self.IsDone():
-        self.cur += 1
-
-      self._ConsumeWhitespace()
+    self.cur = _WHITESPACE_AND_COMMENTS_RE.match(self.input, self.cur).end()
 
   def Parse(self):
     """Converts a string representing a printed GN value to the Python type.
@@ -352,33 +348,33 @@ class GNValueParser(object):
     self.ConsumeCommentAndWhitespace()
 
     while not self.IsDone():
-      ident = self._ParseIdent()
-      self.ConsumeCommentAndWhitespace()
-      if self.input[self.cur] != '=':
-        raise GNError("Unexpected token: " + self.input[self.cur:])
-      self.cur += 1
-      self.ConsumeCommentAndWhitespace()
-      val = self._ParseAllowTrailing()
-      self.ConsumeCommentAndWhitespace()
+      ident, val = self._ParseAssignment()
       d[ident] = val
 
     return d
 
   def _ParseAllowTrailing(self):
     """Internal version of Parse() that doesn't check for trailing stuff."""
-    self.ConsumeCommentAndWhitespace()
-    if self.IsDone():
+    input_string = self.input
+    cur = _WHITESPACE_AND_COMMENTS_RE.match(input_string, self.cur).end()
+    self.cur = cur
+    if cur == len(input_string):
       raise GNError("Expected input to parse.")
 
-    next_char = self.input[self.cur]
-    if next_char == '[':
+    next_char = input_string[cur]
+    if next_char == '"':
+      # Inlines the common case of ParseString(), which reports errors.
+      end = _STRING_BODY_RE.match(input_string, cur + 1).end()
+      if end < len(input_string) and input_string[end] == '"':
+        self.cur = end + 1
+        return UnescapeGNString(input_string[cur + 1:end])
+      return self.ParseString()
+    elif next_char == '[':
       return self.ParseList()
     elif next_char == '{':
       return self.ParseScope()
     elif _IsDigitOrMinus(next_char):
       return self.ParseNumber()
-    elif next_char == '"':
-      return self.ParseString()
     elif self._ConstantFollows('true'):
       return True
     elif self._ConstantFollows('false'):
@@ -387,40 +383,43 @@ class GNValueParser(object):
       raise GNError("Unexpected token: " + self.input[self.cur:])
 
   def _ParseIdent(self):
-    ident = ''
-
-    next_char = self.input[self.cur]
-    if not next_char.isalpha() and not next_char=='_':
+    match = _IDENT_RE.match(self.input, self.cur)
+    if not match:
       raise GNError("Expected an identifier: " + self.input[self.cur:])
+    self.cur = match.end()
+    return match.group()
 
-    ident += next_char
+  def _ConsumeEquals(self):
+    if self.IsDone() or self.input[self.cur] != '=':
+      raise GNError("Unexpected token: " + self.input[self.cur:])
     self.cur += 1
 
-    next_char = self.input[self.cur]
-    while next_char.isalpha() or next_char.isdigit() or next_char=='_':
-      ident += next_char
-      self.cur += 1
-      next_char = self.input[self.cur]
-
-    return ident
+  def _ParseAssignment(self):
+    """Returns (ident, value) of an assignment, consuming whitespace after it."""
+    match = _ASSIGNMENT_RE.match(self.input, self.cur)
+    if match:
+      ident = match.group(1)
+      self.cur = match.end()
+    else:
+      # Raises the appropriate error.
+      ident = self._ParseIdent()
+      self.ConsumeCommentAndWhitespace()
+      self._ConsumeEquals()
+    val = self._ParseAllowTrailing()
+    self.ConsumeCommentAndWhitespace()
+    return ident, val
 
   def ParseNumber(self):
     self.ConsumeCommentAndWhitespace()
     if self.IsDone():
       raise GNError('Expected number but got nothing.')
 
-    begin = self.cur
-
     # The first character can include a negative sign.
-    if not self.IsDone() and _IsDigitOrMinus(self.input[self.cur]):
-      self.cur += 1
-    while not self.IsDone() and self.input[self.cur].isdigit():
-      self.cur += 1
-
-    number_string = self.input[begin:self.cur]
-    if not len(number_string) or number_string == '-':
+    match = _NUMBER_RE.match(self.input, self.cur)
+    if not match or match.group() == '-':
       raise GNError('Not a valid number.')
-    return int(number_string)
+    self.cur = match.end()
+    return int(match.group())
 
   def ParseString(self):
     self.ConsumeCommentAndWhitespace()
@@ -433,18 +432,14 @@ class GNValueParser(object):
     self.cur += 1  # Skip over quote.
 
     begin = self.cur
-    while not self.IsDone() and self.input[self.cur] != '"':
-      if self.input[self.cur] == '\\':
-        self.cur += 1  # Skip over the backslash.
-        if self.IsDone():
-          raise GNError('String ends in a backslash in:\n  ' + self.input)
-      self.cur += 1
-
-    if self.IsDone():
+    # Escaped characters, including quotes, are skipped over.
+    end = _STRING_BODY_RE.match(self.input, begin).end()
+    if end == len(self.input):
       raise GNError('Unterminated string:\n  ' + self.input[begin:])
+    if self.input[end] == '\\':
+      raise GNError('String ends in a backslash in:\n  ' + self.input)
 
-    end = self.cur
-    self.cur += 1  # Consume trailing ".
+    self.cur = end + 1  # Consume trailing ".
 
     return UnescapeGNString(self.input[begin:end])
 
@@ -461,27 +456,30 @@ class GNValueParser(object):
     if self.IsDone():
       raise GNError('Unterminated list:\n  ' + self.input)
 
+    # The loop uses locals rather than IsDone() and friends since lists can have
+    # many thousands of items.
+    input_string = self.input
+    input_length = len(input_string)
+    skip = _WHITESPACE_AND_COMMENTS_RE.match
     list_result = []
     previous_had_trailing_comma = True
-    while not self.IsDone():
-      if self.input[self.cur] == ']':
+    while self.cur < input_length:
+      if input_string[self.cur] == ']':
         self.cur += 1  # Skip over ']'.
         return list_result
 
       if not previous_had_trailing_comma:
         raise GNError('List items not separated by comma.')
 
-      list_result += [ self._ParseAllowTrailing() ]
-      self.ConsumeCommentAndWhitespace()
-      if self.IsDone():
+      list_result.append(self._ParseAllowTrailing())
+      self.cur = skip(input_string, self.cur).end()
+      if self.cur == input_length:
         break
 
       # Consume comma if there is one.
-      previous_had_trailing_comma = self.input[self.cur] == ','
+      previous_had_trailing_comma = input_string[self.cur] == ','
       if previous_had_trailing_comma:
-        # Consume comma.
-        self.cur += 1
-        self.ConsumeCommentAndWhitespace()
+        self.cur = skip(input_string, self.cur + 1).end()
 
     raise GNError('Unterminated list:\n  ' + self.input)
 
@@ -504,14 +502,7 @@ class GNValueParser(object):
         self.cur += 1
         return scope_result
 
-      ident = self._ParseIdent()
-      self.ConsumeCommentAndWhitespace()
-      if self.input[self.cur] != '=':
-        raise GNError("Unexpected token: " + self.input[self.cur:])
-      self.cur += 1
-      self.ConsumeCommentAndWhitespace()
-      val = self._ParseAllowTrailing()
-      self.ConsumeCommentAndWhitespace()
+      ident, val = self._ParseAssignment()
       scope_result[ident] = val
 
     raise GNError('Unterminated scope:\n ' + self.input)
@@ -527,11 +518,8 @@ class GNValueParser(object):
       input. In this case, the string is consumed as a side effect. Otherwise,
       returns False and the current position is unchanged.
     """
-    end = self.cur + len(constant)
-    if end > len(self.input):
-      return False  # Not enough room.
-    if self.input[self.cur:end] == constant:
-      self.cur = end
+    if self.input.startswith(constant, self.cur):
+      self.cur += len(constant)
       return True
     return False
 
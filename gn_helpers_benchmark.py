@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+"""Measures the speed of gn_helpers parsing on generated multi-MB inputs.
+
+Run after changing GNValueParser to make sure it did not get slower:
+  build/gn_helpers_benchmark.py --size-mb 8
+"""
+
+import argparse
+import time
+
+import gn_helpers
+
+
+def _GenerateList(size):
+  """Returns a GN list of strings, as passed to actions via @FileArg."""
+  items = []
+  total = 0
+  i = 0
+  while total < size:
+    item = gn_helpers.ToGNString('gen/foo/bar_%d/\\$escaped"path.jar' % i)
+    items.append(item)
+    total += len(item) + 2
+    i += 1
+  return '[' + ', '.join(items) + ']'
+
+
+def _GenerateArgs(size):
+  """Returns args.gn style assignments, with comments and nested values."""
+  parts = []
+  total = 0
+  i = 0
+  while total < size:
+    part = ('# Comment for arg_%d.\n'
+            'arg_%d = true\n'
+            'num_%d = -%d  # Trailing comment.\n'
+            'list_%d = [\n  "a_%d",\n  1,\n  false,\n  [],\n]\n'
+            'scope_%d = { x = "y" z = [ "w" ] }\n') % ((i, ) * 7)
+    parts.append(part)
+    total += len(part)
+    i += 1
+  return ''.join(parts)
+
+
+def _Time(func, value, repeat):
+  best = None
+  for _ in range(repeat):
+    start = time.time()
+    func(value)
+    elapsed = time.time() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument('--size-mb',
+                      type=float,
+                      default=4,
+                      help='Size of each generated input.')
+  parser.add_argument('--repeat',
+                      type=int,
+                      default=3,
+                      help='Number of runs per input. The fastest is reported.')
+  args = parser.parse_args()
+
+  size = int(args.size_mb * 1024 * 1024)
+  cases = [
+      ('FromGNString (list of strings)', gn_helpers.FromGNString,
+       _GenerateList(size)),
+      ('FromGNArgs (args.gn)', gn_helpers.FromGNArgs, _GenerateArgs(size)),
+  ]
+  for name, func, value in cases:
+    elapsed = _Time(func, value, args.repeat)
+    print('%-32s %6.2fs  %6.1f MB/s' %
+          (name, elapsed, len(value) / elapsed / 1024 / 1024))
+
+
+if __name__ == '__main__':
+  main()
@@ -3,6 +3,7 @@
 # found in the LICENSE file.
 
 import mock
+import os
 import sys
 import textwrap
 import unittest
@@ -81,6 +82,8 @@ class UnitTest(unittest.TestCase):
     self.assertEqual(
         gn_helpers.UnescapeGNString('\\as\\$\\\\asd\\"'),
         '\\as$\\asd"')
+    # A trailing backslash is dropped.
+    self.assertEqual(gn_helpers.UnescapeGNString('a\\'), 'a')
 
   def test_FromGNString(self):
     self.assertEqual(
@@ -122,6 +125,13 @@ class UnitTest(unittest.TestCase):
     with self.assertRaises(gn_helpers.GNError):
       parser = gn_helpers.GNValueParser('"trailing')  # Unterminated.
       parser.ParseString()
+    with self.assertRaisesRegex(gn_helpers.GNError, 'ends in a backslash'):
+      parser = gn_helpers.GNValueParser('"trailing\\')
+      parser.ParseString()
+
+    parser = gn_helpers.GNValueParser('"a\\"b\\\\" "c"')  # Escaped quotes.
+    self.assertEqual(parser.ParseString(), 'a"b\\')
+    self.assertEqual(parser.ParseString(), 'c')
 
   def test_ParseList(self):
     parser = gn_helpers.GNValueParser('[1,]')  # Optional end comma OK.
@@ -236,10 +246,20 @@ class UnitTest(unittest.TestCase):
                          ]
                      }})
 
+    # An "=" within a comment is not an assignment.
+    with self.assertRaisesRegex(gn_helpers.GNError, 'Unexpected token: bar'):
+      gn_helpers.FromGNArgs('foo # = 1\nbar')
+
     # Non-identifiers should raise an exception.
     with self.assertRaises(gn_helpers.GNError):
       gn_helpers.FromGNArgs('123 = true')
 
+    # Incomplete assignments should raise an exception.
+    with self.assertRaises(gn_helpers.GNError):
+      gn_helpers.FromGNArgs('foo')
+    with self.assertRaises(gn_helpers.GNError):
+      gn_helpers.FromGNArgs('foo =')
+
     # References to other variables should raise an exception.
     with self.assertRaises(gn_helpers.GNError):
       gn_helpers.FromGNArgs('foo = bar')
@@ -292,6 +312,34 @@ class UnitTest(unittest.TestCase):
         some_arg2 = "val2"
     """))
 
+    # Nested imports should be replaced too, and the same file read once.
+    parser = gn_helpers.GNValueParser(
+        textwrap.dedent("""
+        import("//outer.gni")
+        import("//inner.gni")
+    """))
+    imports = {
+        'outer.gni': 'import("//inner.gni")\nouter_arg = 1',
+        'inner.gni': 'inner_arg = 2',
+    }
+    read_paths = []
+
+    def fake_open(path):
+      read_paths.append(path)
+      return mock.mock_open(read_data=imports[os.path.basename(path)])()
+
+    with mock.patch(open_fun, side_effect=fake_open):
+      parser.ReplaceImports()
+    self.assertEqual(
+        parser.input,
+        textwrap.dedent("""
+        inner_arg = 2
+        outer_arg = 1
+        inner_arg = 2
+    """))
+    self.assertEqual(['outer.gni', 'inner.gni'],
+                     [os.path.basename(p) for p in read_paths])
+
     # No trailing parenthesis should raise an exception.
     with self.assertRaises(gn_helpers.GNError):
       parser = gn_helpers.GNValueParser(
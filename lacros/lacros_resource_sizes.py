@@ -47,6 +47,8 @@ BUILD_COMMON_PATH = os.path.join(DIR_SOURCE_ROOT, 'build', 'util', 'lib',
 TRACING_PATH = os.path.join(DIR_SOURCE_ROOT, 'third_party', 'catapult',
                             'tracing')
 
+ANDROID_GYP_PATH = os.path.join(DIR_SOURCE_ROOT, 'build', 'android', 'gyp')
+
 EU_STRIP_PATH = os.path.join(DIR_SOURCE_ROOT, 'buildtools', 'third_party',
                              'eu-strip', 'bin', 'eu-strip')
 
@@ -56,6 +58,9 @@ with _SysPath(BUILD_COMMON_PATH):
 with _SysPath(TRACING_PATH):
   from tracing.value import convert_chart_json  # pylint: disable=import-error
 
+with _SysPath(ANDROID_GYP_PATH):
+  from util import elf_reader  # pylint: disable=import-error
+
 _BASE_CHART = {
     'format_version': '0.1',
     'benchmark_name': 'resource_sizes',
@@ -140,12 +145,6 @@ def _visit_paths(base_dir, paths):
       logging.critical('Not found: %s', path)
 
 
-def _is_probably_elf(filename):
-  """Heuristically decides whether |filename| is ELF via magic signature."""
-  with open(filename, 'rb') as fh:
-    return fh.read(4) == '\x7FELF'
-
-
 def _is_unstrippable_elf(filename):
   """Identifies known-unstrippable ELF files to denoise the system."""
   return filename.endswith('.nexe') or filename.endswith('libwidevinecdm.so')
@@ -196,7 +195,7 @@ def _get_catagorized_filesizes(filename):
   sizes[_KEY_STRIPPED] = sizes[_KEY_RAW]
   sizes[_KEY_STRIPPED_GZIPPED] = sizes[_KEY_GZIPPED]
 
-  if _is_probably_elf(filename) and not _is_unstrippable_elf(filename):
+  if elf_reader.IsElf(filename) and not _is_unstrippable_elf(filename):
     try:
       fd, temp_file = tempfile.mkstemp()
       os.close(fd)
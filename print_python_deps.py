@@ -7,17 +7,70 @@
 
 The primary use-case for this script is to generate the list of python modules
 required for .isolate files.
+
+Dependencies are found by reading the source of modules rather than importing
+them. Imports and sys.path changes that run when a module is loaded are
+followed, as are util.action_startup.LazyImport() calls. Paths added to
+sys.path are understood when computed from constants, __file__, os.path
+functions and module-level variables (e.g. host_paths.DEVIL_PATH).
+
+To regenerate or verify every .pydeps file under build/ at once:
+  build/print_python_deps.py --update
+  build/print_python_deps.py --check
 """
 
-import argparse
 import os
-import pipes
 import sys
 
 # Don't use any helper modules, or else they will end up in the results.
+# Modules that only the static analysis needs are imported where they are used,
+# since md5_check.py imports this module from most actions.
 
 
 _SRC_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+_BUILD_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Stands for the standard library and site-packages within the emulated
+# sys.path. Paths appended by scripts come after it, as they do at runtime.
+_SYSTEM_PATH = None
+
+_KNOWN_CONSTANTS = {
+    'os.curdir': os.curdir,
+    'os.pardir': os.pardir,
+    'os.sep': os.sep,
+    'os.path.curdir': os.curdir,
+    'os.path.pardir': os.pardir,
+    'os.path.sep': os.sep,
+}
+
+_KNOWN_FUNCTIONS = {
+    'os.environ.get': lambda name, default=None: default,
+    'os.getenv': lambda name, default=None: default,
+    'os.path.abspath': os.path.abspath,
+    'os.path.dirname': os.path.dirname,
+    'os.path.join': os.path.join,
+    'os.path.normpath': os.path.normpath,
+    'os.path.realpath': os.path.realpath,
+    # Scripts find the same files whichever directory paths are relative to.
+    'os.path.relpath': os.path.abspath,
+}
+
+# Parsed modules shared by all analyses of this process.
+_ast_cache = {}
+_dir_cache = {}
+_system_module_cache = {}
+
+
+def _GetModuleFile(module):
+  """Returns the __file__ of a sys.modules entry, or None.
+
+  Does not use getattr(), which would load modules that were imported via
+  importlib.util.LazyLoader and not used yet.
+  """
+  try:
+    return object.__getattribute__(module, '__dict__').get('__file__')
+  except AttributeError:
+    return None
 
 
 def ComputePythonDependencies():
@@ -26,12 +79,11 @@ def ComputePythonDependencies():
   A path is assumed to be a "system" import if it is outside of chromium's
   src/. The paths will be relative to the current directory.
   """
-  module_paths = (m.__file__ for m in sys.modules.values()
-                  if m and hasattr(m, '__file__') and m.__file__)
+  module_paths = (_GetModuleFile(m) for m in sys.modules.values())
 
   src_paths = set()
   for path in module_paths:
-    if path == __file__:
+    if not path or path == __file__:
       continue
     path = os.path.abspath(path)
     if not path.startswith(_SRC_ROOT):
@@ -45,6 +97,371 @@ def ComputePythonDependencies():
   return src_paths
 
 
+def _ParseFile(path):
+  tree = _ast_cache.get(path)
+  if tree is None:
+    import ast
+    with open(path, 'rb') as f:
+      tree = ast.parse(f.read(), path)
+    _ast_cache[path] = tree
+  return tree
+
+
+def _ListDirectory(path):
+  """Returns {name: is_dir} for the entries of |path|."""
+  entries = _dir_cache.get(path)
+  if entries is None:
+    try:
+      entries = {e.name: e.is_dir() for e in os.scandir(path)}
+    except OSError:
+      entries = {}
+    _dir_cache[path] = entries
+  return entries
+
+
+def _IsSystemModule(name):
+  """Returns whether the standard library or site-packages has |name|."""
+  ret = _system_module_cache.get(name)
+  if ret is None:
+    if name in sys.builtin_module_names:
+      ret = True
+    else:
+      import importlib.machinery
+      # Leaves out the directory of this script.
+      spec = importlib.machinery.PathFinder.find_spec(name, sys.path[1:])
+      ret = spec is not None
+    _system_module_cache[name] = ret
+  return ret
+
+
+class _Module:
+  """A module found within a directory of the emulated sys.path."""
+
+  def __init__(self, name, path, package_dirs):
+    self.name = name
+    # None for namespace packages.
+    self.path = path
+    # Directories to find submodules in, or None if this is not a package.
+    self.package_dirs = package_dirs
+    # Values of module-level variables that could be computed.
+    self.namespace = {'__file__': path, '__name__': name}
+
+
+class _SystemModule:
+  """A module or attribute of a module that is not analyzed."""
+
+  def __init__(self, name):
+    self.name = name
+
+
+class _ImportResolver:
+  """Follows the imports of a script as if it were run.
+
+  Keeps the sys.path and sys.modules state that running the script would have,
+  so should be used for a single script.
+  """
+
+  def __init__(self, script_path):
+    self._script_path = script_path
+    self._sys_path = [os.path.dirname(script_path), _SYSTEM_PATH]
+    self._modules = {}
+    # Paths of all modules that were found.
+    self.paths = set()
+
+  def Run(self):
+    name = os.path.splitext(os.path.basename(self._script_path))[0]
+    self._LoadModule(name, self._script_path, None)
+
+  def _LoadModule(self, name, path, package_dirs):
+    module = _Module(name, path, package_dirs)
+    self._modules[name] = module
+    parent_name, _, child_name = name.rpartition('.')
+    if parent_name in self._modules:
+      self._modules[parent_name].namespace[child_name] = module
+    if path:
+      self.paths.add(path)
+      self._RunBody(module, _ParseFile(path).body)
+    return module
+
+  def _FindModule(self, name, search_dirs):
+    """Loads |name| from the first of |search_dirs| that has it, or None."""
+    namespace_dirs = []
+    basename = name.rpartition('.')[2]
+    for search_dir in search_dirs:
+      if search_dir is _SYSTEM_PATH:
+        if '.' not in name and _IsSystemModule(name):
+          module = _SystemModule(name)
+          self._modules[name] = module
+          return module
+        continue
+      entries = _ListDirectory(search_dir)
+      package_dir = os.path.join(search_dir, basename)
+      is_dir = entries.get(basename)
+      if is_dir and '__init__.py' in _ListDirectory(package_dir):
+        return self._LoadModule(name, os.path.join(package_dir, '__init__.py'),
+                                [package_dir])
+      if entries.get(basename + '.py') is False:
+        return self._LoadModule(name, package_dir + '.py', None)
+      if is_dir:
+        namespace_dirs.append(package_dir)
+    if namespace_dirs:
+      return self._LoadModule(name, None, namespace_dirs)
+    return None
+
+  def _Import(self, name):
+    """Imports |name| and its parent packages.
+
+    Returns:
+      A tuple of the top-level module and the module |name|, either of which is
+      None when not found.
+    """
+    parts = name.split('.')
+    top = self._modules.get(parts[0])
+    if top is None:
+      top = self._FindModule(parts[0], self._sys_path)
+    module = top
+    for i in range(1, len(parts)):
+      if module is None:
+        break
+      module = self._ImportSubmodule(module, '.'.join(parts[:i + 1]))
+    return top, module
+
+  def _ImportSubmodule(self, parent, name):
+    module = self._modules.get(name)
+    if module is not None:
+      return module
+    if isinstance(parent, _SystemModule):
+      return _SystemModule(name)
+    if parent.package_dirs is None:
+      return None
+    return self._FindModule(name, parent.package_dirs)
+
+  def _ResolveRelativeName(self, module, name, level):
+    package = module.name if module.package_dirs else module.name.rpartition(
+        '.')[0]
+    for _ in range(level - 1):
+      package = package.rpartition('.')[0]
+    if not package:
+      return None
+    return package + '.' + name if name else package
+
+  def _RunImportFrom(self, module, node):
+    name = node.module or ''
+    if node.level:
+      name = self._ResolveRelativeName(module, name, node.level)
+      if name is None:
+        return
+    _, base = self._Import(name)
+    for alias in node.names:
+      value = None
+      if isinstance(base, _SystemModule):
+        value = _SystemModule(base.name + '.' + alias.name)
+      elif base is not None:
+        if alias.name == '*':
+          module.namespace.update((k, v) for k, v in base.namespace.items()
+                                  if not k.startswith('_'))
+          continue
+        value = base.namespace.get(alias.name)
+        if value is None and base.package_dirs:
+          value = self._ImportSubmodule(base, name + '.' + alias.name)
+      module.namespace[alias.asname or alias.name] = value
+
+  def _Evaluate(self, module, node):
+    """Returns the value of the expression |node|, or None if unknown."""
+    import ast
+    if isinstance(node, ast.Constant):
+      return node.value
+    if isinstance(node, ast.Name):
+      return module.namespace.get(node.id)
+    if isinstance(node, ast.Attribute):
+      value = self._Evaluate(module, node.value)
+      if isinstance(value, _Module):
+        return value.namespace.get(node.attr)
+      if isinstance(value, _SystemModule):
+        name = value.name + '.' + node.attr
+        if name in _KNOWN_CONSTANTS:
+          return _KNOWN_CONSTANTS[name]
+        return _SystemModule(name)
+      return None
+    if isinstance(node, ast.Call):
+      func_name = getattr(node.func, 'attr', getattr(node.func, 'id', None))
+      if (func_name == 'LazyImport' and len(node.args) == 1
+          and isinstance(node.args[0], ast.Constant)):
+        return self._Import(node.args[0].value)[1]
+      func = self._Evaluate(module, node.func)
+      if isinstance(func, _SystemModule) and func.name in _KNOWN_FUNCTIONS:
+        args = [self._Evaluate(module, a) for a in node.args]
+        if node.keywords or not all(isinstance(a, str) for a in args):
+          return None
+        try:
+          return _KNOWN_FUNCTIONS[func.name](*args)
+        except (TypeError, ValueError):
+          return None
+      for arg in node.args:
+        self._Evaluate(module, arg)
+      return None
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+      left = self._Evaluate(module, node.left)
+      right = self._Evaluate(module, node.right)
+      if isinstance(left, str) and isinstance(right, str):
+        return left + right
+      return None
+    if isinstance(node, (ast.List, ast.Tuple)):
+      return [self._Evaluate(module, e) for e in node.elts]
+    return None
+
+  def _EvaluatePath(self, module, node):
+    value = self._Evaluate(module, node)
+    return os.path.abspath(value) if isinstance(value, str) else None
+
+  def _RunSysPathCall(self, module, node):
+    """Applies calls such as sys.path.insert(0, path)."""
+    op = node.func.attr
+    args = node.args
+    if op == 'append' and len(args) == 1:
+      path = self._EvaluatePath(module, args[0])
+      if path:
+        self._sys_path.append(path)
+    elif op == 'insert' and len(args) == 2:
+      index = self._Evaluate(module, args[0])
+      path = self._EvaluatePath(module, args[1])
+      if isinstance(index, int) and path:
+        self._sys_path.insert(index, path)
+    elif op == 'extend' and len(args) == 1:
+      paths = self._Evaluate(module, args[0])
+      if isinstance(paths, list):
+        self._sys_path.extend(
+            os.path.abspath(p) for p in paths if isinstance(p, str))
+    elif op == 'remove' and len(args) == 1:
+      path = self._EvaluatePath(module, args[0])
+      if path in self._sys_path:
+        self._sys_path.remove(path)
+    elif op == 'pop' and len(args) <= 1:
+      index = self._Evaluate(module, args[0]) if args else -1
+      if isinstance(index, int) and len(self._sys_path) > 1:
+        self._sys_path.pop(index)
+
+  def _AssignSysPathSlice(self, module, node, paths):
+    """Applies sys.path[lower:upper] = paths."""
+    lower = self._Evaluate(module, node.lower) if node.lower else 0
+    upper = self._Evaluate(module, node.upper) if node.upper else len(
+        self._sys_path)
+    if isinstance(lower, int) and isinstance(upper, int):
+      self._sys_path[lower:upper] = [
+          os.path.abspath(p) for p in paths if isinstance(p, str)
+      ]
+
+  def _RunWith(self, module, node):
+    """Applies "with SysPath(path, position):" around the body."""
+    import ast
+    added_paths = []
+    for item in node.items:
+      call = item.context_expr
+      func_name = getattr(call, 'func', None)
+      func_name = getattr(func_name, 'attr', getattr(func_name, 'id', ''))
+      if not (isinstance(call, ast.Call) and func_name.endswith('SysPath')
+              and call.args):
+        self._Evaluate(module, call)
+        continue
+      path = self._EvaluatePath(module, call.args[0])
+      position = call.args[1] if len(call.args) > 1 else None
+      for keyword in call.keywords:
+        if keyword.arg == 'position':
+          position = keyword.value
+      position = self._Evaluate(module, position) if position else None
+      if not path:
+        continue
+      if isinstance(position, int):
+        self._sys_path.insert(position, path)
+      else:
+        self._sys_path.append(path)
+      added_paths.append(path)
+    self._RunBody(module, node.body)
+    for path in added_paths:
+      if path in self._sys_path:
+        self._sys_path.remove(path)
+
+  def _RunBody(self, module, body):
+    """Follows the imports and sys.path changes of module-level statements.
+
+    Both branches of conditions are followed, except for the main block.
+    Functions are not, since their imports run only when they are called.
+    """
+    import ast
+    for node in body:
+      if isinstance(node, ast.Import):
+        for alias in node.names:
+          top, imported = self._Import(alias.name)
+          if alias.asname:
+            module.namespace[alias.asname] = imported
+          else:
+            module.namespace[alias.name.partition('.')[0]] = top
+      elif isinstance(node, ast.ImportFrom):
+        self._RunImportFrom(module, node)
+      elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+        if node.value is None:
+          continue
+        value = self._Evaluate(module, node.value)
+        targets = node.targets if isinstance(node, ast.Assign) else [
+            node.target
+        ]
+        for target in targets:
+          if isinstance(target, ast.Name):
+            module.namespace[target.id] = value
+          elif (isinstance(target, ast.Subscript)
+                and isinstance(target.slice, ast.Slice)
+                and _IsSysPath(target.value) and isinstance(value, list)):
+            self._AssignSysPathSlice(module, target.slice, value)
+      elif isinstance(node, ast.Expr):
+        call = node.value
+        if (isinstance(call, ast.Call)
+            and isinstance(call.func, ast.Attribute)
+            and _IsSysPath(call.func.value)):
+          self._RunSysPathCall(module, call)
+        else:
+          self._Evaluate(module, call)
+      elif isinstance(node, ast.If):
+        if not _IsMainCheck(node.test):
+          self._RunBody(module, node.body)
+        self._RunBody(module, node.orelse)
+      elif isinstance(node, ast.With):
+        self._RunWith(module, node)
+      elif isinstance(node, ast.Try):
+        self._RunBody(module, node.body)
+        for handler in node.handlers:
+          self._RunBody(module, handler.body)
+        self._RunBody(module, node.orelse)
+        self._RunBody(module, node.finalbody)
+      elif isinstance(node, (ast.For, ast.While)):
+        self._RunBody(module, node.body)
+        self._RunBody(module, node.orelse)
+      elif isinstance(node,
+                      (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        module.namespace[node.name] = None
+
+
+def _IsSysPath(node):
+  return (getattr(node, 'attr', None) == 'path'
+          and getattr(node.value, 'id', None) == 'sys')
+
+
+def _IsMainCheck(node):
+  """Returns whether |node| is: __name__ == '__main__'."""
+  import ast
+  return (isinstance(node, ast.Compare)
+          and getattr(node.left, 'id', None) == '__name__'
+          and len(node.comparators) == 1
+          and getattr(node.comparators[0], 'value', None) == '__main__')
+
+
+def _ComputeStaticDependencies(script_path):
+  """Returns the absolute paths of modules that |script_path| imports."""
+  script_path = os.path.abspath(script_path)
+  resolver = _ImportResolver(script_path)
+  resolver.Run()
+  return {p for p in resolver.paths if p.startswith(_SRC_ROOT)}
+
+
 def quote(string):
   if string.count(' ') > 0:
     return '"%s"' % string
@@ -54,6 +471,7 @@ def quote(string):
 
 def _NormalizeCommandLine(options):
   """Returns a string that when run from SRC_ROOT replicates the command."""
+  import shlex
   args = ['build/print_python_deps.py']
   root = os.path.relpath(options.root, _SRC_ROOT)
   if root != '.':
@@ -68,7 +486,7 @@ def _NormalizeCommandLine(options):
   if os.name == 'nt':
     return ' '.join(quote(x) for x in args).replace('\\', '/')
   else:
-    return ' '.join(pipes.quote(x) for x in args)
+    return ' '.join(shlex.quote(x) for x in args)
 
 
 def _FindPythonInDirectory(directory, allow_test):
@@ -80,26 +498,43 @@ def _FindPythonInDirectory(directory, allow_test):
         yield os.path.join(root, filename)
 
 
-def _ImportModuleByPath(module_path):
-  """Imports a module by its source file."""
-  # Replace the path entry for print_python_deps.py with the one for the given
-  # module.
-  sys.path[0] = os.path.dirname(module_path)
+def _GenerateOutput(options):
+  """Returns the contents of the .pydeps file described by |options|."""
+  modules = [options.module]
+  if os.path.isdir(options.module):
+    modules = list(_FindPythonInDirectory(options.module, allow_test=True))
+  if not modules:
+    raise ValueError('Input directory does not contain any python files!')
+
+  paths_set = set()
+  for module in modules:
+    paths_set.update(_ComputeStaticDependencies(module))
+
+  for path in options.allowlists:
+    paths_set.update(
+        os.path.abspath(p)
+        for p in _FindPythonInDirectory(path, allow_test=False))
 
-  # https://docs.python.org/3/library/importlib.html#importing-a-source-file-directly
-  module_name = os.path.splitext(os.path.basename(module_path))[0]
-  import importlib.util  # Python 3 only, since it's unavailable in Python 2.
-  spec = importlib.util.spec_from_file_location(module_name, module_path)
-  module = importlib.util.module_from_spec(spec)
-  sys.modules[module_name] = module
-  spec.loader.exec_module(module)
+  paths = [os.path.relpath(p, options.root) for p in paths_set]
 
+  lines = []
+  if not options.no_header:
+    lines.append('# Generated by running:')
+    lines.append('#   %s' % _NormalizeCommandLine(options))
+  prefix = '//' if options.gn_paths else ''
+  lines.extend(prefix + path.replace('\\', '/') for path in sorted(paths))
+  return ''.join(line + '\n' for line in lines)
 
-def main():
+
+def _CreateArgumentParser():
+  import argparse
   parser = argparse.ArgumentParser(
       description='Prints all non-system dependencies for the given module.')
   parser.add_argument('module',
-                      help='The python module to analyze.')
+                      nargs='*',
+                      help='The python module to analyze. With --update or '
+                      '--check: .pydeps files, or directories to search for '
+                      'them (default: build/).')
   parser.add_argument('--root', default='.',
                       help='Directory to make paths relative to.')
   parser.add_argument('--output',
@@ -112,16 +547,116 @@ def main():
                       help='Do not write the "# Generated by" header.')
   parser.add_argument('--gn-paths', action='store_true',
                       help='Write paths as //foo/bar/baz.py')
-  parser.add_argument('--did-relaunch', action='store_true',
-                      help=argparse.SUPPRESS)
   parser.add_argument('--allowlist',
                       default=[],
                       action='append',
                       dest='allowlists',
                       help='Recursively include all non-test python files '
                       'within this directory. May be specified multiple times.')
+  group = parser.add_mutually_exclusive_group()
+  group.add_argument('--update',
+                     action='store_true',
+                     help='Regenerate .pydeps files using the command in '
+                     'their header.')
+  group.add_argument('--check',
+                     action='store_true',
+                     help='Like --update, but only lists stale .pydeps files '
+                     'and fails if there are any.')
+  parser.add_argument('-j',
+                      '--jobs',
+                      type=int,
+                      default=os.cpu_count(),
+                      help='Number of .pydeps files to process in parallel '
+                      'with --update or --check.')
+  return parser
+
+
+def _ParseHeader(parser, pydeps_path):
+  """Returns the options of the command in the header of a .pydeps file."""
+  import shlex
+  with open(pydeps_path) as f:
+    header = [f.readline(), f.readline()]
+  if header[0] != '# Generated by running:\n' or not header[1].startswith('#'):
+    raise ValueError('%s does not start with a "# Generated by" header.' %
+                     pydeps_path)
+  args = shlex.split(header[1][1:])[1:]
+  options = parser.parse_args(args)
+  if len(options.module) != 1 or options.update or options.check:
+    raise ValueError('Unexpected command in %s: %s' % (pydeps_path, header[1]))
+  # The command is run from the source root.
+  options.module = os.path.join(_SRC_ROOT, options.module[0])
+  options.root = os.path.join(_SRC_ROOT, options.root)
+  options.output = os.path.join(_SRC_ROOT, options.output)
+  options.allowlists = [os.path.join(_SRC_ROOT, p) for p in options.allowlists]
+  if os.path.abspath(options.output) != os.path.abspath(pydeps_path):
+    raise ValueError('%s is generated with --output %s' %
+                     (pydeps_path, options.output))
+  return options
+
+
+def _ProcessPydepsFile(args):
+  """Regenerates a .pydeps file in a worker process.
+
+  Returns:
+    Whether the file was stale.
+  """
+  pydeps_path, write = args
+  options = _ParseHeader(_CreateArgumentParser(), pydeps_path)
+  contents = _GenerateOutput(options)
+  with open(pydeps_path, newline='') as f:
+    if f.read() == contents:
+      return False
+  if write:
+    with open(pydeps_path, 'w', newline='') as f:
+      f.write(contents)
+  return True
+
+
+def _FindPydepsFiles(paths):
+  ret = []
+  for path in paths:
+    if not os.path.isdir(path):
+      ret.append(path)
+      continue
+    for root, _dirnames, filenames in os.walk(path):
+      ret.extend(
+          os.path.join(root, f) for f in filenames if f.endswith('.pydeps'))
+  return sorted(ret)
+
+
+def _UpdatePydepsFiles(options):
+  """Regenerates or checks many .pydeps files using a pool of processes."""
+  import multiprocessing
+  pydeps_paths = _FindPydepsFiles(options.module or [_BUILD_DIR])
+  tasks = [(p, options.update) for p in pydeps_paths]
+  if options.jobs > 1 and len(tasks) > 1:
+    # Each process keeps its own cache of parsed modules across files.
+    chunksize = max(1, len(tasks) // (options.jobs * 4))
+    with multiprocessing.Pool(options.jobs) as pool:
+      results = pool.map(_ProcessPydepsFile, tasks, chunksize)
+  else:
+    results = [_ProcessPydepsFile(t) for t in tasks]
+
+  stale_paths = [p for p, stale in zip(pydeps_paths, results) if stale]
+  for path in stale_paths:
+    verb = 'Updated' if options.update else 'Stale'
+    print('%s: %s' % (verb, os.path.relpath(path)))
+  if options.check and stale_paths:
+    print('Run build/print_python_deps.py --update to fix.')
+    return 1
+  return 0
+
+
+def main():
+  parser = _CreateArgumentParser()
   options = parser.parse_args()
 
+  if options.update or options.check:
+    return _UpdatePydepsFiles(options)
+
+  if len(options.module) != 1:
+    parser.error('Expected exactly one module.')
+  options.module = options.module[0]
   if options.inplace:
     if options.output:
       parser.error('Cannot use --inplace and --output at the same time!')
@@ -130,56 +665,15 @@ def main():
     options.output = options.module + 'deps'
     options.root = os.path.dirname(options.module)
 
-  modules = [options.module]
-  if os.path.isdir(options.module):
-    modules = list(_FindPythonInDirectory(options.module, allow_test=True))
-  if not modules:
-    parser.error('Input directory does not contain any python files!')
-
-  is_vpython = 'vpython' in sys.executable
-  if not is_vpython:
-    # Prevent infinite relaunch if something goes awry.
-    assert not options.did_relaunch
-    # Re-launch using vpython will cause us to pick up modules specified in
-    # //.vpython, but does not cause it to pick up modules defined inline via
-    # [VPYTHON:BEGIN] ... [VPYTHON:END] comments.
-    # TODO(agrieve): Add support for this if the need ever arises.
-    os.execvp('vpython3', ['vpython3'] + sys.argv + ['--did-relaunch'])
-
-  # Work-around for protobuf library not being loadable via importlib
-  # This is needed due to compile_resources.py.
-  import importlib._bootstrap_external
-  importlib._bootstrap_external._NamespacePath.sort = lambda self, **_: 0
-
-  paths_set = set()
   try:
-    for module in modules:
-      _ImportModuleByPath(module)
-      paths_set.update(ComputePythonDependencies())
-  except Exception:
-    # Output extra diagnostics when loading the script fails.
-    sys.stderr.write('Error running print_python_deps.py.\n')
-    sys.stderr.write('is_vpython={}\n'.format(is_vpython))
-    sys.stderr.write('did_relanuch={}\n'.format(options.did_relaunch))
-    sys.stderr.write('python={}\n'.format(sys.executable))
-    raise
-
-  for path in options.allowlists:
-    paths_set.update(
-        os.path.abspath(p)
-        for p in _FindPythonInDirectory(path, allow_test=False))
-
-  paths = [os.path.relpath(p, options.root) for p in paths_set]
+    contents = _GenerateOutput(options)
+  except ValueError as e:
+    parser.error(str(e))
 
-  normalized_cmdline = _NormalizeCommandLine(options)
   out = open(options.output, 'w', newline='') if options.output else sys.stdout
   with out:
-    if not options.no_header:
-      out.write('# Generated by running:\n')
-      out.write('#   %s\n' % normalized_cmdline)
-    prefix = '//' if options.gn_paths else ''
-    for path in sorted(paths):
-      out.write(prefix + path.replace('\\', '/') + '\n')
+    out.write(contents)
+  return 0
 
 
 if __name__ == '__main__':
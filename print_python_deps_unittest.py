@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Copyright 2022 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import tempfile
+import textwrap
+import unittest
+
+import print_python_deps
+
+_FILES = {
+    'script.py':
+    """
+    import json
+    import os
+    import sys
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), 'lib'))
+    import helper
+    from pkg import sub
+    from pkg.sub import CONSTANT
+
+    with helper.SysPath(helper.EXTRA_DIR):
+      import extra
+
+    try:
+      import missing_module
+    except ImportError:
+      missing_module = None
+
+    lazy_module = helper.LazyImport('lazy_module')
+
+
+    def main():
+      import in_function
+
+
+    if __name__ == '__main__':
+      import in_main
+      main()
+    """,
+    'lib/helper.py':
+    """
+    import os
+
+    EXTRA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'extra')
+
+
+    def SysPath(path):
+      pass
+
+
+    def LazyImport(name):
+      pass
+    """,
+    # Shadowed by the standard library, since lib/ was appended to sys.path.
+    'lib/json.py': '',
+    'lib/lazy_module.py': '',
+    'pkg/__init__.py': '',
+    'pkg/sub.py': 'from . import relative\nCONSTANT = 1\n',
+    'pkg/relative.py': '',
+    'extra/extra.py': '',
+    # Not imported when the script is loaded.
+    'in_function.py': '',
+    'in_main.py': '',
+    'unused.py': '',
+}
+
+
+class ImportResolverTest(unittest.TestCase):
+  def setUp(self):
+    self._tmp_dir = tempfile.mkdtemp()
+    for name, source in _FILES.items():
+      path = os.path.join(self._tmp_dir, name)
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      with open(path, 'w') as f:
+        f.write(textwrap.dedent(source))
+
+  def tearDown(self):
+    shutil.rmtree(self._tmp_dir)
+
+  def testResolve(self):
+    script_path = os.path.join(self._tmp_dir, 'script.py')
+    # pylint: disable=protected-access
+    resolver = print_python_deps._ImportResolver(script_path)
+    resolver.Run()
+    self.assertEqual([
+        'extra/extra.py',
+        'lib/helper.py',
+        'lib/lazy_module.py',
+        'pkg/__init__.py',
+        'pkg/relative.py',
+        'pkg/sub.py',
+        'script.py',
+    ], sorted(os.path.relpath(p, self._tmp_dir) for p in resolver.paths))
+
+
+if __name__ == '__main__':
+  unittest.main()